@@ -4,12 +4,14 @@ F1 25 テレメトリー 分析ツール
 F1 25 から記録した UDP データを分析します。
 """
 
-import pandas as pd
 import numpy as np
 import glob
 import os
 from pathlib import Path
 
+# pandas を使わない軽量な読み込み (起動を速くするため)
+from src.normalization import load_columns
+
 
 def find_latest_telemetry():
     """最新のテレメトリーファイルを探します。
@@ -50,7 +52,8 @@ def analyze_telemetry(filepath):
     print(f"\n📄 最新ファイル: {os.path.basename(filepath)}\n")
     
     try:
-        df = pd.read_csv(filepath)
+        # 形式ごとのスケーリングと範囲チェック (範囲外は欠損になります)
+        columns = load_columns(filepath, verbose=True)
     except Exception as e:
         print(f"❌ ファイルを読み込めません: {e}")
         return
@@ -60,13 +63,17 @@ def analyze_telemetry(filepath):
     print(f"ファイル: {os.path.basename(filepath)}\n")
     
     # Type 6 (カーテレメトリー) をフィルタします
-    # 無効なデータを除く
-    telemetry_data = df[(df['packet_type'] == 6) & (df['speed_kph'] > 0)].copy()
+    # 無効なデータ (正規化で欠損になった行) を除く
+    mask = ~np.isnan(columns['speed_kph'])
+    if 'packet_type' in columns:
+        mask &= columns['packet_type'] == 6
+    telemetry_data = {name: values[mask] for name, values in columns.items()}
+    count = int(mask.sum())
     
     print(f"📊 データを読み込んでいます...")
-    print(f"   {len(telemetry_data)} 件のデータを読み込みました\n")
+    print(f"   {count} 件のデータを読み込みました\n")
     
-    if len(telemetry_data) == 0:
+    if count == 0:
         print("❌ 有効なテレメトリーデータがありません")
         return
     
@@ -74,18 +81,19 @@ def analyze_telemetry(filepath):
     print(f"🏁 速度分析")
     print("-" * 60)
     
-    speed_mean = telemetry_data['speed_kph'].mean()
-    speed_max = telemetry_data['speed_kph'].max()
-    speed_min = telemetry_data['speed_kph'].min()
-    speed_median = telemetry_data['speed_kph'].median()
-    speed_std = telemetry_data['speed_kph'].std()
+    speed = telemetry_data['speed_kph']
+    speed_mean = speed.mean()
+    speed_max = speed.max()
+    speed_min = speed.min()
+    speed_median = np.median(speed)
+    speed_std = speed.std(ddof=1)
     
     print(f"   平均速度:     {speed_mean:.1f} km/h")
     print(f"   最大速度:         {speed_max:.0f} km/h")
     print(f"   最小速度:         {speed_min:.0f} km/h")
     print(f"   中平値:      {speed_median:.1f} km/h")
     print(f"   速度の散らかり:   {speed_std:.1f} km/h (標準偏差)")
-    print(f"   データ数:      {len(telemetry_data)} 件")
+    print(f"   データ数:      {count} 件")
     print(f"   ✅ 速度データは正しいです!\n")
     
     # ==================== お作光分析 ====================
@@ -93,10 +101,12 @@ def analyze_telemetry(filepath):
     print("-" * 60)
     
     # ========== アクセル ==========
-    throttle_mean = telemetry_data['throttle'].mean()
-    throttle_max = telemetry_data['throttle'].max()
-    throttle_min = telemetry_data['throttle'].min()
-    throttle_full = (telemetry_data['throttle'] == 100).sum() / len(telemetry_data) * 100
+    # 正規化後は 0-1 なので % に直します
+    throttle = telemetry_data['throttle'] * 100
+    throttle_mean = np.nanmean(throttle)
+    throttle_max = np.nanmax(throttle)
+    throttle_min = np.nanmin(throttle)
+    throttle_full = (throttle >= 99.5).sum() / count * 100
     
     print(f"   アクセル:")
     print(f"      平均:         {throttle_mean:.1f}%")
@@ -105,10 +115,11 @@ def analyze_telemetry(filepath):
     print(f"      全つっと:   {throttle_full:.1f}% (時間)\n")
     
     # ========== ブレーキ ==========
-    brake_mean = telemetry_data['brake'].mean()
-    brake_max = telemetry_data['brake'].max()
-    brake_min = telemetry_data['brake'].min()
-    braking_time = (telemetry_data['brake'] > 0).sum() / len(telemetry_data) * 100
+    brake = telemetry_data['brake'] * 100
+    brake_mean = np.nanmean(brake)
+    brake_max = np.nanmax(brake)
+    brake_min = np.nanmin(brake)
+    braking_time = (brake > 0).sum() / count * 100
     
     print(f"   ブレーキ:")
     print(f"      平均:         {brake_mean:.1f}%")
@@ -120,13 +131,13 @@ def analyze_telemetry(filepath):
     print(f"🕐 RPM 分析")
     print("-" * 60)
     
-    # 0 より大きい RPM データをフィルタ
-    rpm_data = telemetry_data[telemetry_data['rpm'] > 0]
+    # 範囲チェックを通った RPM データをフィルタ
+    rpm_data = telemetry_data['rpm'][~np.isnan(telemetry_data['rpm'])]
     
     if len(rpm_data) > 0:
-        rpm_mean = rpm_data['rpm'].mean()
-        rpm_max = rpm_data['rpm'].max()
-        rpm_min = rpm_data['rpm'].min()
+        rpm_mean = rpm_data.mean()
+        rpm_max = rpm_data.max()
+        rpm_min = rpm_data.min()
         
         print(f"   平均 RPM:       {rpm_mean:.0f}")
         print(f"   最大 RPM:           {rpm_max:.0f}")
@@ -12,6 +12,8 @@ from datetime import datetime
 from collections import defaultdict
 import os
 
+from src.capture_writer import CaptureWriter
+
 
 class F1テレメトリーレコーダー:
     """F1 25 の UDP データをすべて保存します。
@@ -65,11 +67,15 @@ class F1テレメトリーレコーダー:
         self.writer.writeheader()
         self.csv_file.flush()
         
+        # 生データをバイナリでも保存します (src/raw_capture.py で mmap して読めます)
+        self.capture = CaptureWriter(filepath)
+        
         # パケット数をカウントします
         self.packet_count = defaultdict(int)
         self.start_time = datetime.now()
         
         print(f"🏎️  ファイルに保存します: {filepath}")
+        print(f"   バイナリ: {self.capture.path}")
         print(f"   モード: 完全 (すべてのパケットタイプ)")
     
     def parse_header(self, data):
@@ -135,8 +141,7 @@ class F1テレメトリーレコーダー:
             
             # RPM を読みます (2 バイト)
             rpm = struct.unpack('<H', data[offset+22:offset+24])[0]
-            # RPM を正しい値に変換します
-            rpm = rpm * 20 if 300 < rpm < 1500 else rpm
+            # RPM の補正は読み込み時に src/normalization.py で行います
             
             # ハンドルを読みます (2 バイト、符号付き)
             try:
@@ -173,6 +178,7 @@ class F1テレメトリーレコーダー:
         
         packet_type = header['packet_id']
         self.packet_count[packet_type] += 1
+        self.capture.write(data)
         
         # パケットを 16 進数に変換
         packet_hex = data.hex()
@@ -206,6 +212,7 @@ class F1テレメトリーレコーダー:
     def close(self):
         """ファイルを閉じます。統計を表示します。"""
         self.csv_file.close()
+        self.capture.close()
         elapsed = (datetime.now() - self.start_time).total_seconds()
         
         print(f"\n✅ 保存が完了しました!")
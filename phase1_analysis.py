@@ -7,26 +7,21 @@ Phase 1 分析スクリプト
 
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib
 from pathlib import Path
 import warnings
-import platform
 from datetime import datetime
 import os
 
-warnings.filterwarnings('ignore')
-
-# 日本語フォント設定 - OS別対応
-if platform.system() == 'Darwin':  # macOS
-    matplotlib.rcParams['font.family'] = 'Hiragino Sans'
-elif platform.system() == 'Windows':
-    matplotlib.rcParams['font.family'] = 'MS Gothic'
-else:  # Linux
-    matplotlib.rcParams['font.family'] = 'DejaVu Sans'
+from src.corners import corner_metrics, get_corner_map
+from src.laps import extract_laps, track_name_from_path
+from src.live_delta import ReferenceLap
+from src.normalization import load_capture
+from src.reports import compare_statistics
+from src.sync_scores import distance_from_speed, lap_from_trace, session_sync
+from src.plotting import DEFAULT_MAX_POINTS, FigureSpec, HLine, Panel, Series, render_figures
+from src.rollup import load_rollup
 
-matplotlib.rcParams['axes.unicode_minus'] = False
-plt.rcParams['figure.figsize'] = (14, 10)
+warnings.filterwarnings('ignore')
 
 
 class Phase1分析:
@@ -48,17 +43,14 @@ class Phase1分析:
         print("ステップ 1️⃣  : ユーザーデータ読み込み")
         print("="*70)
         
-        self.ユーザーデータ = pd.read_csv(self.CSVパス)
+        # ✅ CSV形式の正規化 (throttle/brake の 0-255 -> 0-1 など) は読み込み時にまとめて適用
+        self.ユーザーデータ = load_capture(self.CSVパス, verbose=True)
         print(f"✓ データ読み込み完了: {len(self.ユーザーデータ)} 行")
         print(f"✓ カラム: {list(self.ユーザーデータ.columns)}")
         
         print(f"\n✓ セッション時間: {self.ユーザーデータ['session_time'].min():.1f}秒 ～ {self.ユーザーデータ['session_time'].max():.1f}秒")
         print(f"✓ 走行時間: {(self.ユーザーデータ['session_time'].max() - self.ユーザーデータ['session_time'].min()):.1f}秒")
         
-        # ✅ CSV形式の正規化: throttle/brake を 0-255 から 0-1 に変換
-        self.ユーザーデータ['throttle'] = self.ユーザーデータ['throttle'] / 255
-        self.ユーザーデータ['brake'] = self.ユーザーデータ['brake'] / 255
-        
         # 基本統計
         print(f"\n【基本統計情報】")
         print(f"  最高速: {self.ユーザーデータ['speed_kph'].max():.1f} km/h")
@@ -135,6 +127,15 @@ class Phase1分析:
             if 'Brake' in self.職業選手データ.columns:
                 self.職業選手データ['Brake'] = self.職業選手データ['Brake'].astype(float) / 100  # 0-100 -> 0-1
             
+            # ライブ delta 用のリファレンスラップとしてキャッシュ (cache/reference/)
+            if {'Distance', 'Time'} <= set(self.職業選手データ.columns):
+                リファレンス = ReferenceLap(
+                    self.職業選手データ['Distance'].astype(float).tolist(),
+                    self.職業選手データ['Time'].dt.total_seconds().tolist(),
+                    name=f"pro_VER_{self.職業選手年号}_{gp_name.split()[0]}",
+                )
+                print(f"  リファレンス保存: {リファレンス.save()}")
+            
             # ドライバー情報を保存（証明用）
             self.取得ドライバー情報 = {
                 'ドライバーコード': 'VER',
@@ -164,7 +165,8 @@ class Phase1分析:
         
         # ユーザーデータより若干高いパフォーマンスのデータ生成
         demo_data = pd.DataFrame({
-            'Time': np.linspace(0, 120, n),
+            # 速度 1.08 倍なので同じ距離を 1/1.08 の時間で走る
+            'Time': (self.ユーザーデータ['session_time'].values - self.ユーザーデータ['session_time'].values[0]) / 1.08,
             'Speed': self.ユーザーデータ['speed_kph'].values * 1.08 + np.random.normal(0, 2, n),
             'Throttle': np.where(
                 self.ユーザーデータ['speed_kph'].values < self.ユーザーデータ['speed_kph'].mean(),
@@ -187,53 +189,98 @@ class Phase1分析:
         print(f"✓ デモデータ生成完了: {len(demo_data)} データポイント")
         return demo_data
     
+    def ユーザーデータ図(self) -> FigureSpec:
+        """ユーザーテレメトリーデータの図 (4 段)
+        
+        全サンプルではなくロールアップ (min / max の包絡線) から描くので、長いセッションでも読む量は一定。
+        """
+        ロールアップ = load_rollup(self.CSVパス)
+        平均速度 = ロールアップ.stats('speed_kph')['mean']
+        
+        def 系列(チャンネル, 倍率=1, **見た目):
+            return ロールアップ.query(チャンネル, points=DEFAULT_MAX_POINTS // 2).series(
+                倍率, points=DEFAULT_MAX_POINTS, **見た目)
+        
+        panels = [
+            # グラフ 1: 速度
+            Panel('速度 vs セッション時間', '速度 (km/h)',
+                  [系列('speed_kph', color='#1f77b4')],
+                  hlines=[HLine(平均速度, label=f'平均: {平均速度:.1f}')], legend='best'),
+            # グラフ 2: 油門/ブレーキ
+            Panel('油門 vs ブレーキ入力', '入力 (0-100%)', [
+                系列('throttle', 100, label='油門', color='green'),
+                系列('brake', 100, label='ブレーキ', color='red'),
+            ], legend='best'),
+            # グラフ 3: ステアリング
+            Panel('ステアリング角度', 'ステアリング (-1 ～ +1)',
+                  [系列('steering', color='purple')]),
+        ]
+        # グラフ 4: RPM
+        if 'rpm' in ロールアップ.channels:
+            panels.append(Panel('エンジン RPM', 'RPM', [系列('rpm', color='orange')]))
+        panels[-1].xlabel = 'セッション時間 (秒)'
+        
+        return FigureSpec(
+            path=Path('analysis_results/your_telemetry_overview.png'),
+            title='あなたのテレメトリーデータ - モンツァ',
+            panels=panels,
+        )
+    
+    def 職業選手対比図(self) -> FigureSpec:
+        """ユーザー vs 職業選手の対比図 (4 段)"""
+        # 安全チェック: Speed をクリップして不正な値を防ぐ
+        speed_data = self.職業選手データ['Speed'].values.clip(0, 400)
+        throttle_data = self.職業選手データ['Throttle'].values.clip(0, 1)
+        brake_data = self.職業選手データ['Brake'].values.clip(0, 1)
+        steering_data = self.職業選手データ['Steering'].values.clip(-1, 1)
+        
+        title = f'あなた vs {self.職業選手名} ({self.職業選手年号}年) - モンツァ'
+        if not self.実数値フラグ:
+            title += ' 【シミュ】'
+        
+        # 時間軸の正規化
+        your_time = np.linspace(0, 1, len(self.ユーザーデータ))
+        pro_time = np.linspace(0, 1, len(speed_data))
+        
+        def 対比(タイトル, ラベル, あなた, プロ, 色, xlabel=None):
+            return Panel(タイトル, ラベル, [
+                Series(your_time, あなた, label='あなた', color=色[0], linewidth=2),
+                Series(pro_time, プロ, label=f'{self.職業選手名}', color=色[1], linewidth=2, alpha=0.7),
+            ], xlabel=xlabel, legend='upper right')
+        
+        return FigureSpec(
+            path=Path('analysis_results/you_vs_pro_comparison.png'),
+            title=title,
+            title_size=14,
+            panels=[
+                # グラフ 1: 速度対比
+                対比('速度対比', '速度 (km/h)', self.ユーザーデータ['speed_kph'].values, speed_data,
+                     ('#1f77b4', '#ff7f0e')),
+                # グラフ 2: 油門対比
+                対比('油門入力対比', '油門 (0-100%)', self.ユーザーデータ['throttle'].values * 100,
+                     throttle_data * 100, ('#2ca02c', '#d62728')),
+                # グラフ 3: ブレーキ対比
+                対比('ブレーキ入力対比', 'ブレーキ (0-100%)', self.ユーザーデータ['brake'].values * 100,
+                     brake_data * 100, ('#9467bd', '#8c564b')),
+                # グラフ 4: ステアリング対比
+                対比('ステアリング入力対比', 'ステアリング角度', self.ユーザーデータ['steering'].values,
+                     steering_data, ('#e377c2', '#7f7f7f'), xlabel='ラップ進捗 (0=開始, 1=終了)'),
+            ],
+        )
+    
+    def _グラフ保存(self, specs):
+        """図を間引いて描画 (複数なら並列) し、保存結果を表示"""
+        for output_path in render_figures(specs):
+            print(f"✓ グラフ保存: {output_path}")
+            print(f"✓ ファイルサイズ: {os.path.getsize(output_path) / 1024:.1f} KB")
+    
     def ユーザーデータ可視化(self):
         """ユーザーテレメトリーデータ可視化"""
         print("\n" + "="*70)
         print("ステップ 3️⃣  : ユーザーデータ可視化")
         print("="*70)
         
-        fig, axes = plt.subplots(4, 1, figsize=(14, 10))
-        fig.suptitle('あなたのテレメトリーデータ - モンツァ', fontsize=16, fontweight='bold')
-        
-        time = self.ユーザーデータ['session_time']
-        
-        # グラフ 1: 速度
-        axes[0].plot(time, self.ユーザーデータ['speed_kph'], color='#1f77b4', linewidth=1.5)
-        axes[0].set_title('速度 vs セッション時間', fontsize=12, fontweight='bold')
-        axes[0].set_ylabel('速度 (km/h)')
-        axes[0].grid(True, alpha=0.3)
-        axes[0].axhline(y=self.ユーザーデータ['speed_kph'].mean(), color='red', linestyle='--', alpha=0.5, label=f'平均: {self.ユーザーデータ["speed_kph"].mean():.1f}')
-        axes[0].legend()
-        
-        # グラフ 2: 油門/ブレーキ
-        axes[1].plot(time, self.ユーザーデータ['throttle'] * 100, label='油門', color='green', linewidth=1.5)
-        axes[1].plot(time, self.ユーザーデータ['brake'] * 100, label='ブレーキ', color='red', linewidth=1.5)
-        axes[1].set_title('油門 vs ブレーキ入力', fontsize=12, fontweight='bold')
-        axes[1].set_ylabel('入力 (0-100%)')
-        axes[1].grid(True, alpha=0.3)
-        axes[1].legend()
-        
-        # グラフ 3: ステアリング
-        axes[2].plot(time, self.ユーザーデータ['steering'], color='purple', linewidth=1.5)
-        axes[2].set_title('ステアリング角度', fontsize=12, fontweight='bold')
-        axes[2].set_ylabel('ステアリング (-1 ～ +1)')
-        axes[2].grid(True, alpha=0.3)
-        
-        # グラフ 4: RPM
-        axes[3].plot(time, self.ユーザーデータ['rpm'], color='orange', linewidth=1.5)
-        axes[3].set_title('エンジン RPM', fontsize=12, fontweight='bold')
-        axes[3].set_ylabel('RPM')
-        axes[3].set_xlabel('セッション時間 (秒)')
-        axes[3].grid(True, alpha=0.3)
-        
-        plt.tight_layout()
-        output_path = Path('analysis_results/your_telemetry_overview.png')
-        output_path.parent.mkdir(exist_ok=True)
-        plt.savefig(output_path, dpi=150, bbox_inches='tight')
-        print(f"✓ グラフ保存: {output_path}")
-        print(f"✓ ファイルサイズ: {os.path.getsize(output_path) / 1024:.1f} KB")
-        plt.close()
+        self._グラフ保存([self.ユーザーデータ図()])
     
     def 職業選手対比可視化(self):
         """ユーザー vs 職業選手対比可視化"""
@@ -244,63 +291,55 @@ class Phase1分析:
         data_type = "【実数値】" if self.実数値フラグ else "【シミュレーション】"
         print(f"\n対比対象: {data_type} {self.職業選手名}")
         
-        # 安全チェック: Speed をクリップして不正な値を防ぐ
-        speed_data = self.職業選手データ['Speed'].values.clip(0, 400)
-        throttle_data = self.職業選手データ['Throttle'].values.clip(0, 1)
-        brake_data = self.職業選手データ['Brake'].values.clip(0, 1)
-        steering_data = self.職業選手データ['Steering'].values.clip(-1, 1)
-        
-        fig, axes = plt.subplots(4, 1, figsize=(14, 10))
-        
-        title = f'あなた vs {self.職業選手名} ({self.職業選手年号}年) - モンツァ'
-        if not self.実数値フラグ:
-            title += ' 【シミュ】'
-        fig.suptitle(title, fontsize=14, fontweight='bold')
+        self._グラフ保存([self.職業選手対比図()])
+    
+    def 可視化一括実行(self):
+        """ステップ 3・4 の図を並列で描画"""
+        print("\n" + "="*70)
+        print(f"ステップ 3️⃣ 4️⃣ : グラフ生成 (ユーザーデータ + vs {self.職業選手名})")
+        print("="*70)
         
-        # 時間軸の正規化
-        your_time = np.linspace(0, 1, len(self.ユーザーデータ))
-        pro_time = np.linspace(0, 1, len(speed_data))
+        data_type = "【実数値】" if self.実数値フラグ else "【シミュレーション】"
+        print(f"\n対比対象: {data_type} {self.職業選手名}")
         
-        # グラフ 1: 速度対比
-        axes[0].plot(your_time, self.ユーザーデータ['speed_kph'], label='あなた', linewidth=2, color='#1f77b4')
-        axes[0].plot(pro_time, speed_data, label=f'{self.職業選手名}', linewidth=2, color='#ff7f0e', alpha=0.7)
-        axes[0].set_title('速度対比', fontsize=12, fontweight='bold')
-        axes[0].set_ylabel('速度 (km/h)')
-        axes[0].legend(loc='upper right')
-        axes[0].grid(True, alpha=0.3)
-        
-        # グラフ 2: 油門対比
-        axes[1].plot(your_time, self.ユーザーデータ['throttle'] * 100, label='あなた', linewidth=2, color='#2ca02c')
-        axes[1].plot(pro_time, throttle_data * 100, label=f'{self.職業選手名}', linewidth=2, color='#d62728', alpha=0.7)
-        axes[1].set_title('油門入力対比', fontsize=12, fontweight='bold')
-        axes[1].set_ylabel('油門 (0-100%)')
-        axes[1].legend(loc='upper right')
-        axes[1].grid(True, alpha=0.3)
-        
-        # グラフ 3: ブレーキ対比
-        axes[2].plot(your_time, self.ユーザーデータ['brake'] * 100, label='あなた', linewidth=2, color='#9467bd')
-        axes[2].plot(pro_time, brake_data * 100, label=f'{self.職業選手名}', linewidth=2, color='#8c564b', alpha=0.7)
-        axes[2].set_title('ブレーキ入力対比', fontsize=12, fontweight='bold')
-        axes[2].set_ylabel('ブレーキ (0-100%)')
-        axes[2].legend(loc='upper right')
-        axes[2].grid(True, alpha=0.3)
-        
-        # グラフ 4: ステアリング対比
-        axes[3].plot(your_time, self.ユーザーデータ['steering'], label='あなた', linewidth=2, color='#e377c2')
-        axes[3].plot(pro_time, steering_data, label=f'{self.職業選手名}', linewidth=2, color='#7f7f7f', alpha=0.7)
-        axes[3].set_title('ステアリング入力対比', fontsize=12, fontweight='bold')
-        axes[3].set_ylabel('ステアリング角度')
-        axes[3].set_xlabel('ラップ進捗 (0=開始, 1=終了)')
-        axes[3].legend(loc='upper right')
-        axes[3].grid(True, alpha=0.3)
-        
-        plt.tight_layout()
-        output_path = Path('analysis_results/you_vs_pro_comparison.png')
-        output_path.parent.mkdir(exist_ok=True)
-        plt.savefig(output_path, dpi=150, bbox_inches='tight')
-        print(f"✓ グラフ保存: {output_path}")
-        print(f"✓ ファイルサイズ: {os.path.getsize(output_path) / 1024:.1f} KB")
-        plt.close()
+        self._グラフ保存([self.ユーザーデータ図(), self.職業選手対比図()])
+    
+    def _同期度計算(self, 職業選手):
+        """ユーザーのラップと職業選手のラップをラップ距離で揃え、同期度 (ズレ込み) を一括計算
+        
+        Returns:
+            (最速ラップのチャンネル別 SyncScore, 最速ラップ)
+        """
+        ユーザー = self.ユーザーデータ
+        セッション名 = Path(self.CSVパス).name
+        ラップ一覧 = [ラップ for ラップ in extract_laps(ユーザー, session=セッション名) if ラップ.complete]
+        if not ラップ一覧:
+            # lap_distance がないデータは速度を積分して距離を作り、全体を 1 ラップとして扱う
+            時間 = ユーザー['session_time'].values
+            ラップ一覧 = [lap_from_trace(distance_from_speed(時間, ユーザー['speed_kph']), 時間, ユーザー,
+                                        session=セッション名)]
+        
+        プロ = self.職業選手データ
+        if hasattr(プロ['Time'], 'dt'):
+            プロ時間 = プロ['Time'].dt.total_seconds().values
+        else:
+            プロ時間 = プロ['Time'].values.astype(float)
+        if 'Distance' in プロ.columns:
+            プロ距離 = プロ['Distance'].values.astype(float)
+        else:
+            プロ距離 = distance_from_speed(プロ時間, 職業選手['speed_kph'])
+        
+        self.同期度 = session_sync(ラップ一覧, lap_from_trace(プロ距離, プロ時間, 職業選手))
+        最速 = min(range(len(ラップ一覧)), key=lambda i: ラップ一覧[i].lap_time)
+        return self.同期度.lap_scores(最速), ラップ一覧[最速]
+    
+    def _ズレ表示(self, 項目):
+        """同期度が最大になるズレ (m) の表示"""
+        ズレ = 項目.get('lag_m')
+        if ズレ is None or ズレ != ズレ:
+            return
+        向き = "遅い" if ズレ > 0 else "早い" if ズレ < 0 else "一致"
+        print(f"  ズレ (ラップ距離): {ズレ:+.0f} m ({向き})")
     
     def 統計分析(self):
         """統計分析と相関性計算"""
@@ -320,56 +359,105 @@ class Phase1分析:
                 print(f"  {key}: {value}")
             print("="*70)
         
-        # データの正規化（比較用）
-        your_speed_norm = (self.ユーザーデータ['speed_kph'] - self.ユーザーデータ['speed_kph'].min()) / (self.ユーザーデータ['speed_kph'].max() - self.ユーザーデータ['speed_kph'].min())
-        pro_speed_norm = (self.職業選手データ['Speed'] - self.職業選手データ['Speed'].min()) / (self.職業選手データ['Speed'].max() - self.職業選手データ['Speed'].min())
+        # 比較統計 (src/reports.py と同じ計算、結果はデータとして保持)
+        職業選手 = {'speed_kph': self.職業選手データ['Speed'].values}
+        for 列, 正規名 in (('Throttle', 'throttle'), ('Brake', 'brake'), ('Steering', 'steering')):
+            if 列 in self.職業選手データ.columns:
+                職業選手[正規名] = self.職業選手データ[列].values.astype(float)
+        同期, 比較ラップ = self._同期度計算(職業選手)
+        self.統計 = 統計 = compare_statistics(self.ユーザーデータ, 職業選手, 同期)
+        速度 = 統計['speed']
         
         print("\n【🏎️ 速度分析】")
-        print(f"  あなたの最高速: {self.ユーザーデータ['speed_kph'].max():.1f} km/h")
-        print(f"  {self.職業選手名}の最高速: {self.職業選手データ['Speed'].max():.1f} km/h")
-        print(f"  差異: {self.職業選手データ['Speed'].max() - self.ユーザーデータ['speed_kph'].max():+.1f} km/h")
+        print(f"  あなたの最高速: {速度['user_max']:.1f} km/h")
+        print(f"  {self.職業選手名}の最高速: {速度['reference_max']:.1f} km/h")
+        print(f"  差異: {速度['max_diff']:+.1f} km/h")
         
-        print(f"\n  あなたの平均速: {self.ユーザーデータ['speed_kph'].mean():.1f} km/h")
-        print(f"  {self.職業選手名}の平均速: {self.職業選手データ['Speed'].mean():.1f} km/h")
-        speed_diff_pct = (self.職業選手データ['Speed'].mean() - self.ユーザーデータ['speed_kph'].mean()) / self.ユーザーデータ['speed_kph'].mean() * 100
-        print(f"  差畩: {speed_diff_pct:+.1f}%")
+        print(f"\n  あなたの平均速: {速度['user_mean']:.1f} km/h")
+        print(f"  {self.職業選手名}の平均速: {速度['reference_mean']:.1f} km/h")
+        print(f"  差畩: {速度['mean_diff_pct']:+.1f}%")
         
         print("\n【⚙️ 油門分析】")
-        print(f"  あなたの平均油門: {self.ユーザーデータ['throttle'].mean():.1%}")
-        print(f"  {self.職業選手名}の平均油門: {self.職業選手データ['Throttle'].mean():.1%}")
-        throttle_corr = self.ユーザーデータ['throttle'].corr(self.職業選手データ['Throttle'].iloc[:len(self.ユーザーデータ)])
-        print(f"  同期度 (相関性): {throttle_corr:.3f}")
+        print(f"  あなたの平均油門: {統計['throttle']['user_mean']:.1%}")
+        print(f"  {self.職業選手名}の平均油門: {統計['throttle']['reference_mean']:.1%}")
+        print(f"  同期度 (相関性): {統計['throttle']['sync']:.3f}")
+        self._ズレ表示(統計['throttle'])
         
         print("\n【🛑 ブレーキ分析】")
-        print(f"  あなたの平均ブレーキ: {self.ユーザーデータ['brake'].mean():.1%}")
-        print(f"  {self.職業選手名}の平均ブレーキ: {self.職業選手データ['Brake'].mean():.1%}")
-        brake_corr = self.ユーザーデータ['brake'].corr(self.職業選手データ['Brake'].iloc[:len(self.ユーザーデータ)])
-        print(f"  同期度 (相関性): {brake_corr:.3f}")
-        
-        print("\n【🎯 ステアリング分析】")
-        print(f"  あなたの平均ステアリング: {self.ユーザーデータ['steering'].mean():.3f}")
-        print(f"  {self.職業選手名}の平均ステアリング: {self.職業選手データ['Steering'].mean():.3f}")
-        steer_corr = self.ユーザーデータ['steering'].corr(self.職業選手データ['Steering'].iloc[:len(self.ユーザーデータ)])
-        print(f"  精密度 (相関性): {steer_corr:.3f}")
+        print(f"  あなたの平均ブレーキ: {統計['brake']['user_mean']:.1%}")
+        print(f"  {self.職業選手名}の平均ブレーキ: {統計['brake']['reference_mean']:.1%}")
+        print(f"  同期度 (相関性): {統計['brake']['sync']:.3f}")
+        self._ズレ表示(統計['brake'])
+        
+        if 'steering' in 統計:
+            print("\n【🎯 ステアリング分析】")
+            print(f"  あなたの平均ステアリング: {統計['steering']['user_mean']:.3f}")
+            print(f"  {self.職業選手名}の平均ステアリング: {統計['steering']['reference_mean']:.3f}")
+            print(f"  精密度 (相関性): {統計['steering']['sync']:.3f}")
+            self._ズレ表示(統計['steering'])
+        
+        if len(self.同期度.lap_numbers) > 1:
+            print(f"\n【📏 ラップ別 同期度 (ラップ距離で整列、表示は Lap {比較ラップ.number})】")
+            print(self.同期度.to_frame().pivot(index='lap', columns='channel', values=['peak', 'lag_m']).round(3).to_string())
         
         # 詳細な改善ポイント
         print("\n" + "="*70)
         print("🔧 改善ポイント")
         print("="*70)
         
-        if self.職業選手データ['Speed'].mean() > self.ユーザーデータ['speed_kph'].mean():
-            print(f"\n⚠️  速度: {self.職業選手名}より{speed_diff_pct:.1f}%遅い")
-            print(f"  → 油門のタイミングと踏み込み力度を改善しましょう")
-        
-        if abs(throttle_corr) < 0.7:
-            print(f"\n⚠️  油門タイミング: 同期度が低い ({throttle_corr:.3f})")
-            print(f"  → {self.職業選手名}は加速するタイミングが異なります")
-        
-        if abs(brake_corr) < 0.7:
-            print(f"\n⚠️  ブレーキタイミング: 同期度が低い ({brake_corr:.3f})")
-            print(f"  → {self.職業選手名}の減速ポイントをもっと早く始めましょう")
+        for ポイント in 統計['improvements']:
+            if ポイント['item'] == 'speed':
+                print(f"\n⚠️  速度: {self.職業選手名}より{ポイント['value']:.1f}%遅い")
+                print(f"  → 油門のタイミングと踏み込み力度を改善しましょう")
+            elif ポイント['item'] == 'throttle_sync':
+                print(f"\n⚠️  油門タイミング: 同期度が低い ({ポイント['value']:.3f})")
+                print(f"  → {self.職業選手名}は加速するタイミングが異なります")
+            elif ポイント['item'] == 'brake_sync':
+                print(f"\n⚠️  ブレーキタイミング: 同期度が低い ({ポイント['value']:.3f})")
+                print(f"  → {self.職業選手名}の減速ポイントをもっと早く始めましょう")
+            elif ポイント['item'] == 'throttle_lag':
+                向き = "遅く" if ポイント['value'] > 0 else "早く"
+                print(f"\n⚠️  油門タイミング: {self.職業選手名}より {abs(ポイント['value']):.0f} m {向き}踏んでいます")
+                print(f"  → 立ち上がりでアクセルを踏み始める地点を見直しましょう")
+            elif ポイント['item'] == 'brake_lag':
+                向き = "遅く" if ポイント['value'] > 0 else "早く"
+                print(f"\n⚠️  ブレーキタイミング: {self.職業選手名}より {abs(ポイント['value']):.0f} m {向き}ブレーキングしています")
+                print(f"  → ブレーキングポイントを {self.職業選手名}に合わせましょう")
         
         print("\n" + "="*70)
+        return 統計
+    
+    def コーナー別分析(self):
+        """コーナー別分析 (lap_distance がある CSV のみ)"""
+        print("\n" + "="*70)
+        print("ステップ 6️⃣  : コーナー別分析")
+        print("="*70)
+        
+        ラップ一覧 = extract_laps(self.ユーザーデータ, session=Path(self.CSVパス).name)
+        if not ラップ一覧:
+            print("✗ lap_number / lap_distance がないため、コーナー別分析をスキップします")
+            return None
+        
+        # サーキットごとのコーナーマップ (cache/corners/ にキャッシュ)
+        コーナーマップ = get_corner_map(track_name_from_path(self.CSVパス), ラップ一覧)
+        print(f"✓ {コーナーマップ}")
+        if not コーナーマップ.corners:
+            print("✗ コーナーを検出できませんでした")
+            return None
+        
+        指標 = corner_metrics(コーナーマップ, ラップ一覧).to_frame()
+        集計 = 指標.groupby('corner').agg(
+            進入速度=('entry_speed', 'mean'),
+            最低速度=('min_speed', 'mean'),
+            脱出速度=('exit_speed', 'mean'),
+            平均ロス=('time_lost', 'mean'),
+        )
+        print(f"\n【コーナー別 (全 {len(ラップ一覧)} ラップ平均)】")
+        print(集計.round(2).to_string())
+        
+        最大ロス = 集計['平均ロス'].idxmax()
+        print(f"\n⚠️  最もタイムを失っているコーナー: ターン {最大ロス} (平均 {集計.loc[最大ロス, '平均ロス']:.3f}秒)")
+        return 指標
     
     def フル分析実行(self):
         """フル分析実行"""
@@ -381,9 +469,9 @@ class Phase1分析:
         # ステップ実行
         self.ユーザーデータ読み込み()
         self.職業選手データ抽出()
-        self.ユーザーデータ可視化()
-        self.職業選手対比可視化()
+        self.可視化一括実行()
         self.統計分析()
+        self.コーナー別分析()
         
         print("\n" + "="*70)
         print("✓✓✓ Phase 1分析完了！ ✓✓✓")
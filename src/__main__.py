@@ -0,0 +1,6 @@
+"""python -m src <command>"""
+
+from .cli import main
+
+
+main()
@@ -0,0 +1,78 @@
+"""
+F1 25 Capture Writer
+受信した UDP パケットを .f1cap / .f1idx に追記する (標準ライブラリのみ)
+
+f1_recorder.py から numpy なしで使えるように、書き込み側だけをここに置く。
+読み込み (mmap + NumPy) は raw_capture.CaptureReader。
+"""
+
+import struct
+from pathlib import Path
+
+
+CAPTURE_SUFFIX = '.f1cap'
+INDEX_SUFFIX = '.f1idx'
+
+# ファイル先頭のマジック (形式を変えたら番号を上げる)
+CAPTURE_MAGIC = b'F1C1'
+
+# パケットごとの長さプレフィックス
+PACKET_LENGTH = struct.Struct('<H')
+# ヘッダーの session_time, frame_identifier, overall_frame_identifier (offset 15)
+_HEADER_FIELDS = struct.Struct('<fII')
+_HEADER_FIELDS_OFFSET = 15
+_HEADER_SIZE = 29
+
+# インデックス 1 件 (raw_capture.INDEX_DTYPE と同じ並び)
+_INDEX_ROW = struct.Struct('<QHBIIf')
+
+
+def index_path_for(path) -> Path:
+    return Path(path).with_suffix(INDEX_SUFFIX)
+
+
+def index_row(offset: int, data) -> bytes:
+    """パケット 1 件分のインデックス (ヘッダーが足りなければ時刻・フレームは 0)"""
+    packet_type = data[6] if len(data) > 6 else 255
+    if len(data) >= _HEADER_SIZE:
+        session_time, frame, overall = _HEADER_FIELDS.unpack_from(data, _HEADER_FIELDS_OFFSET)
+    else:
+        session_time, frame, overall = 0.0, 0, 0
+    return _INDEX_ROW.pack(offset, len(data), packet_type, frame, overall, session_time)
+
+
+class CaptureWriter:
+    """受信したパケットを .f1cap と .f1idx に追記する"""
+
+    def __init__(self, path):
+        self.path = Path(path).with_suffix(CAPTURE_SUFFIX)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._data = open(self.path, 'wb')
+        self._index = open(index_path_for(self.path), 'wb')
+        self._data.write(CAPTURE_MAGIC)
+        self._offset = len(CAPTURE_MAGIC)
+        self.packet_count = 0
+
+    def write(self, data: bytes):
+        if len(data) > 0xFFFF:
+            raise ValueError(f"パケットが大きすぎます: {len(data)} bytes")
+        self._data.write(PACKET_LENGTH.pack(len(data)))
+        self._data.write(data)
+        self._index.write(index_row(self._offset + PACKET_LENGTH.size, data))
+        self._offset += PACKET_LENGTH.size + len(data)
+        self.packet_count += 1
+
+    def flush(self):
+        self._data.flush()
+        self._index.flush()
+
+    def close(self):
+        if not self._data.closed:
+            self._data.close()
+            self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
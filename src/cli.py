@@ -0,0 +1,774 @@
+"""
+F1 25 Telemetry CLI
+分析ツールの共通エントリーポイント (python -m src <command>)
+
+重い依存 (pandas / matplotlib / fastf1) は各コマンドの中で必要になった時だけ読み込む。
+"""
+
+import argparse
+import glob
+import os
+import sys
+
+
+TELEMETRY_DIR = 'telemetry_data'
+
+
+def _latest_capture():
+    """telemetry_data 内で最新の CSV"""
+    files = glob.glob(os.path.join(TELEMETRY_DIR, 'telemetry_*.csv'))
+    if not files:
+        files = glob.glob(os.path.join('data', 'f1_telemetry_*.csv'))
+    return max(files, key=os.path.getctime) if files else None
+
+
+def _resolve(paths):
+    """引数のファイル (なければ最新ファイル) を返す"""
+    if paths:
+        return paths
+    latest = _latest_capture()
+    if latest is None:
+        print("❌ テレメトリーファイルがないです")
+        sys.exit(1)
+    return [latest]
+
+
+def _expand_dirs(paths):
+    """フォルダはその中の telemetry_*.csv / f1_telemetry_*.csv に展開する"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(glob.glob(os.path.join(path, 'telemetry_*.csv')) + glob.glob(os.path.join(path, 'f1_telemetry_*.csv')))
+        else:
+            files.append(path)
+    return files
+
+
+def _incident_config(args):
+    """--lockup-slip などのしきい値 (指定がなければ既定値)"""
+    from .incidents import IncidentConfig
+
+    config = IncidentConfig()
+    for name in ('lockup_slip', 'wheelspin_slip', 'off_track_wheels', 'window', 'trigger'):
+        value = getattr(args, name)
+        if value is not None:
+            setattr(config, name, value)
+    return config
+
+
+def _add_incident_arguments(p):
+    p.add_argument('--lockup-slip', type=float, help='ロックアップとみなすスリップ率 (既定 0.2)')
+    p.add_argument('--wheelspin-slip', type=float, help='ホイールスピンとみなすスリップ率 (既定 0.2)')
+    p.add_argument('--off-track-wheels', type=int, help='コースアウトとみなす車輪数 (既定 2)')
+    p.add_argument('--window', type=int, help='判定の窓 (サンプル数、既定 6)')
+    p.add_argument('--trigger', type=int, help='窓の中で何サンプル続いたら検出するか (既定 3)')
+
+
+def cmd_summary(args):
+    """ラップごとの簡易サマリー (numpy のみ、pandas なし)"""
+    import numpy as np
+    from .laps import extract_laps
+    from .normalization import load_columns
+
+    for path in _resolve(args.files):
+        columns = load_columns(path, verbose=args.verbose)
+        print(f"\n📄 {os.path.basename(path)}")
+        laps = extract_laps(columns, session=os.path.basename(path))
+        if not laps:
+            speed = columns.get('speed_kph', np.array([]))
+            speed = speed[~np.isnan(speed)]
+            if len(speed) == 0:
+                print("   ❌ 有効なデータがありません")
+                continue
+            print(f"   (ラップ情報なし) {len(speed)} 件  平均 {speed.mean():.1f} km/h  最高 {speed.max():.0f} km/h")
+            continue
+
+        print(f"   {'Lap':>4} {'Time':>10} {'Max':>6} {'Avg':>6} {'Full%':>6} {'Brake%':>7}")
+        for lap in laps:
+            speed = lap.channels.get('speed_kph', np.array([np.nan]))
+            throttle = lap.channels.get('throttle', np.array([np.nan]))
+            brake = lap.channels.get('brake', np.array([np.nan]))
+            lap_time = f"{lap.lap_time:10.3f}" if lap.lap_time == lap.lap_time else f"{'-':>10}"
+            mark = '' if lap.complete else ' (途中)'
+            print(
+                f"   {lap.number:>4} {lap_time} {np.nanmax(speed):6.0f} {np.nanmean(speed):6.1f} "
+                f"{(throttle >= 0.995).mean() * 100:6.1f} {(brake > 0.05).mean() * 100:7.1f}{mark}"
+            )
+
+
+def cmd_analyze(args):
+    """analyze_telemetry.py と同じ分析"""
+    from analyze_telemetry import analyze_telemetry
+
+    for path in _resolve(args.files):
+        analyze_telemetry(path)
+
+
+def cmd_phase1(args):
+    """Phase 1 分析 (プロジェクトのルートで実行)"""
+    from phase1_analysis import Phase1分析
+
+    path = _resolve([args.file] if args.file else [])[0]
+    Phase1分析(path, 職業選手名=args.driver, 職業選手年号=args.year).フル分析実行()
+
+
+def cmd_corners(args):
+    """コーナーマップの作成 / 表示"""
+    import numpy as np
+
+    from .corners import corner_metrics, get_corner_map
+    from .laps import extract_laps, track_name_from_path
+    from .normalization import load_columns
+
+    paths = _resolve(args.files)
+    laps = []
+    for path in paths:
+        laps += extract_laps(load_columns(path), session=os.path.basename(path))
+    track = args.track or track_name_from_path(paths[0])
+    corner_map = get_corner_map(track, laps, refresh=args.refresh)
+    print(f"✓ {corner_map}")
+    for corner in corner_map.corners:
+        print(f"   T{corner.number:<3} {corner.entry:7.0f}m → {corner.apex:7.0f}m → {corner.exit:7.0f}m")
+    if corner_map.corners and laps:
+        metrics = corner_metrics(corner_map, laps)
+        # そのコーナーを通っていないラップは NaN なので除いて平均 (どのラップも通っていないコーナーは候補外)
+        lost = metrics.time_lost
+        covered = ~np.isnan(lost).all(axis=0)
+        if covered.any():
+            mean_lost = np.full(lost.shape[1], np.nan)
+            mean_lost[covered] = np.nanmean(lost[:, covered], axis=0)
+            print(f"   最大ロス: T{int(np.nanargmax(mean_lost)) + 1}")
+
+
+def cmd_trackmap(args):
+    """Motion 位置付きのラップからトラックマップ (中心線 + 空間インデックス) を作る"""
+    from .laps import track_name_from_path
+    from .normalization import load_columns
+    from .track_map import get_track_map, laps_with_positions
+
+    paths = _resolve(args.files)
+    laps = []
+    for path in paths:
+        laps += laps_with_positions(load_columns(path), session=os.path.basename(path))
+    try:
+        track_map = get_track_map(args.track or track_name_from_path(paths[0]), laps, refresh=args.refresh)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+    print(f"✓ {track_map}")
+    # マップを作ったラップはコース幅の基準なので、それ以外のラップだけで判定する
+    held_out = [lap for lap in laps if 'position_x' in lap.channels and not track_map.built_from(lap)]
+    if not held_out:
+        print("   コース外の判定: マップに使っていないラップがありません")
+        return
+    off = sum(int(track_map.off_track(lap.channels['position_x'], lap.channels['position_z']).sum())
+              for lap in held_out)
+    print(f"   コース外のサンプル: {off} ({len(held_out)} 周)")
+
+
+def cmd_race(args):
+    """全車のレース分析 (ペース順位・ピットロス・オーバーテイク)"""
+    from .race_analytics import load_race, overtakes, pace_ranking, pit_stop_deltas
+
+    paths = args.files or sorted(glob.glob(os.path.join('data', '*.race.npz')))[-1:]
+    if not paths:
+        print("❌ レースデータ (.race.npz / CSV / .f1cap) がないです")
+        sys.exit(1)
+    for path in paths:
+        try:
+            race = load_race(path)
+        except ValueError as e:
+            print(f"❌ {e}")
+            continue
+        print(f"\n📄 {os.path.basename(path)}: {race}")
+        print(f"   {'#':>3} {'Car':>4} {'Pace':>9} {'Best':>9} {'Gap':>7} {'Pos':>4}")
+        for row in pace_ranking(race, last_n=args.last):
+            print(
+                f"   {row['rank']:>3} {row['car']:>4} {row['pace_ms'] / 1000:9.3f} {row['best_ms'] / 1000:9.3f} "
+                f"{row['gap_to_fastest_ms'] / 1000:+7.3f} {row['position']:4.0f}"
+            )
+        for stop in pit_stop_deltas(race):
+            print(f"   🔧 Car {stop['car']} Lap {stop['lap']}: ピットロス {stop['time_lost_ms'] / 1000:.1f}s")
+        passes = overtakes(race)
+        print(f"   オーバーテイク: {len(passes)} 回")
+        for p in passes[:args.show]:
+            print(f"     Lap {p['lap']}: Car {p['car']} が Car {p['passed']} を抜いて P{p['position']}")
+
+
+def cmd_capture(args):
+    """バイナリ記録 (.f1cap) の作成 (packet_hex 付き CSV から) / パケット種別・フレーム範囲の確認"""
+    import time
+    from .packet_parser import PacketType
+    from .raw_capture import CAPTURE_SUFFIX, CaptureReader, convert_csv
+
+    paths = args.files or sorted(glob.glob(os.path.join(TELEMETRY_DIR, '*' + CAPTURE_SUFFIX)))
+    if not paths:
+        print("❌ 記録ファイル (.f1cap / packet_hex 付き CSV) がないです")
+        sys.exit(1)
+    for path in paths:
+        capture = os.path.splitext(path)[0] + CAPTURE_SUFFIX
+        if not path.endswith(CAPTURE_SUFFIX) and (args.refresh or not os.path.exists(capture)):
+            try:
+                convert_csv(path, capture)
+            except ValueError as e:
+                print(f"❌ {e}")
+                continue
+        with CaptureReader(capture) as reader:
+            print(f"\n📄 {os.path.basename(capture)}: {len(reader)} パケット")
+            for packet_type, count in reader.counts().items():
+                name = PacketType(packet_type).name if packet_type in PacketType._value2member_map_ else '?'
+                print(f"   Type {packet_type:2d} {name:<22} {count:8d}")
+            if args.type is not None:
+                start, end = args.frames or (None, None)
+                t0 = time.perf_counter()
+                views = reader.views(args.type, start, end)
+                elapsed = (time.perf_counter() - t0) * 1000
+                print(f"   Type {args.type} フレーム {start}-{end}: {len(views)} パケット "
+                      f"({sum(len(v) for v in views) / 1e6:.1f} MB, {elapsed:.1f} ms)")
+                del views
+
+
+def cmd_stints(args):
+    """スティントごとのタイヤ摩耗・燃料・ERS のペース (保存済みの列のみ使う)"""
+    from .normalization import load_columns
+    from .stints import TYRE_NAMES, stint_analysis
+
+    for path in _resolve(args.files):
+        print(f"\n📄 {os.path.basename(path)}")
+        stints = stint_analysis(load_columns(path), wear_limit=args.wear_limit)
+        if not stints:
+            print("   ❌ Car Status / Car Damage の列がありません")
+            continue
+        for stint in stints:
+            wear = "  ".join(f"{name} {rate:.2f}" for name, rate in zip(TYRE_NAMES, stint.wear_per_lap))
+            print(f"   Stint {stint.number} ({stint.compound}) Lap {stint.first_lap}-{stint.last_lap}")
+            print(f"     摩耗 (%/周): {wear}  → {args.wear_limit:.0f}% まで あと {stint.laps_to_wear_limit:.1f} 周")
+            print(f"     燃料: {stint.fuel_per_lap:.2f} kg/周  残り {stint.fuel_left:.1f} kg ({stint.fuel_laps:.1f} 周分)")
+            print(f"     ERS: 放出 {stint.ers_deployed_per_lap:.2f} MJ/周  回生 {stint.ers_harvested_per_lap:.2f} MJ/周")
+
+
+def cmd_events(args):
+    """イベントタイムライン (.events.npy) の一覧と、イベント前後のテレメトリー"""
+    from pathlib import Path
+
+    import numpy as np
+    from .events import EventTimeline, describe
+    from .normalization import load_columns
+
+    for path in _resolve(args.files):
+        timeline_path = Path(path).with_suffix('.events.npy')
+        print(f"\n📄 {os.path.basename(path)}")
+        if not timeline_path.exists():
+            print("   ❌ イベントタイムライン (.events.npy) がありません")
+            continue
+        timeline = EventTimeline.load(timeline_path)
+        events = timeline.of(args.code) if args.code else timeline.events
+        for event in events:
+            print(f"   {describe(event)}")
+        if args.code and args.window:
+            columns = load_columns(path)
+            for event, window in zip(events, timeline.around(columns, args.code, args.window, args.window)):
+                speed = window.get('speed_kph', np.array([]))
+                if len(speed):
+                    print(f"   {event['session_time']:9.2f}s ±{args.window:g}s: {len(speed)} 件  "
+                          f"速度 {np.nanmin(speed):.0f}-{np.nanmax(speed):.0f} km/h")
+
+
+def cmd_degradation(args):
+    """保存済みセッションからサーキット × コンパウンドの劣化モデルを作る (変更のあったサーキットだけ)"""
+    from .degradation import fit_archive
+
+    paths = _expand_dirs(args.files) if args.files else sorted(
+        glob.glob(os.path.join(TELEMETRY_DIR, 'telemetry_*.csv')) + glob.glob(os.path.join('data', 'f1_telemetry_*.csv'))
+    )
+    for path in [path for path in paths if not os.path.isfile(path)]:
+        print(f"   ❌ {path}: ファイルがありません")
+        paths.remove(path)
+    if not paths:
+        print("❌ テレメトリーファイルがないです")
+        sys.exit(1)
+    models = fit_archive(paths, workers=args.workers, refresh=args.refresh)
+    if args.track:
+        models = {track: m for track, m in models.items() if track == args.track}
+
+    for track, track_models in models.items():
+        print(f"\n🏁 {track} ({len(track_models.sources)} セッション)")
+        if not track_models.compounds:
+            print("   ❌ ラップタイム / Car Status の列があるラップが足りません")
+            continue
+        print(f"   {'Compound':<8} {'Laps':>5} {'Base':>9} {'s/周':>7} {'s/kg':>7} {'RMSE':>6} {'kg/周':>6}")
+        for name, fit in track_models.compounds.items():
+            c = fit.lap_time
+            print(f"   {name:<8} {fit.laps:>5} {c['intercept']:9.3f} {c['tyre_age']:7.3f} {c['fuel']:7.4f} "
+                  f"{fit.lap_time_rmse:6.3f} {fit.fuel_per_lap:6.2f}")
+        if args.compound and args.laps:
+            if args.compound not in track_models.compounds:
+                print(f"   ❌ {args.compound} のモデルがありません")
+                continue
+            times = track_models.stint_projection(args.compound, args.laps, start_age=args.age, start_fuel=args.fuel)
+            print(f"   {args.compound} {args.laps} 周の予測: 合計 {times.sum():.3f}s  "
+                  f"(1 周目 {times[0]:.3f}s → 最終周 {times[-1]:.3f}s)")
+
+
+def cmd_dataset(args):
+    """セッションとラップの一覧 (メタデータのみ、ラップの配列は読まない)"""
+    from .dataset import TelemetryDataset
+
+    dataset = TelemetryDataset(args.source, workers=args.workers)
+    dataset.refresh(force=args.refresh)
+    for name, error in dataset.failed.items():
+        print(f"   ❌ {name}: {error}")
+    for info in dataset.sessions(track=args.track):
+        complete = [lap for lap in info.laps if lap.complete and lap.lap_time == lap.lap_time]
+        best = min(complete, key=lambda lap: lap.lap_time) if complete else None
+        best_text = f"ベスト Lap {best.number} {best.lap_time:.3f}s" if best else "ラップ情報なし"
+        print(f"📄 {info.name} [{info.track}, {info.format}] {info.rows} 行  {len(info.laps)} 周 ({len(complete)} 完走)  {best_text}")
+    print(f"\n✓ {dataset}")
+
+
+def cmd_best(args):
+    """理論ベストラップ (mini-sector のベストをつないだもの)"""
+    from .theoretical_best import theoretical_best_for_captures
+
+    try:
+        best = theoretical_best_for_captures(_resolve(args.files), track=args.track, mini_sectors=args.sectors)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+    print(f"✓ {best}")
+
+
+def cmd_reports(args):
+    """ラップ / セッション単位のレポートを一括生成 (変更のあったセッションだけ)"""
+    from .reports import REPORT_DIR, build_reports
+
+    paths = args.files or sorted(glob.glob(os.path.join(TELEMETRY_DIR, 'telemetry_*.csv')))
+    manifest = build_reports(paths, out_dir=args.output or REPORT_DIR, workers=args.workers, refresh=args.refresh)
+    print(f"✓ {len(manifest['updated'])} セッションを更新 / 全 {len(manifest['sessions'])} セッション")
+    if manifest['pruned']:
+        print(f"   古いレポート {manifest['pruned']} ファイルを削除")
+    for name, error in manifest['failed'].items():
+        print(f"   ❌ {name}: {error}")
+
+
+def cmd_redecode(args):
+    """packet_hex 付きの記録 CSV を正しいレイアウトでまとめて再デコード (collector と同じ形式の CSV)"""
+    from .redecode import REDECODE_DIR, redecode_archive
+
+    paths = args.files or sorted(glob.glob(os.path.join(TELEMETRY_DIR, 'telemetry_*.csv')))
+    results = redecode_archive(paths, out_dir=args.output or REDECODE_DIR, workers=args.workers, refresh=args.refresh)
+    done = sum('error' not in result for result in results.values())
+    print(f"✓ {done} ファイルを再デコード / 全 {len(paths)} ファイル")
+    for path, result in results.items():
+        if 'error' in result:
+            print(f"   ❌ {os.path.basename(path)}: {result['error']}")
+            continue
+        skipped = f" (未対応 {result['skipped']} パケット)" if result['skipped'] else ""
+        print(f"   {os.path.basename(path)}: {result['frames']} フレーム → {result['output']}{skipped}")
+
+
+def cmd_archive(args):
+    """走り終わったセッションを .f1z (ラップ単位で読める圧縮形式) に保存"""
+    from .cold_storage import archive_directory
+
+    paths = args.files or sorted(glob.glob(os.path.join(TELEMETRY_DIR, 'telemetry_*.csv')))
+    results = archive_directory(paths, out_dir=args.output, codec=args.codec,
+                                workers=args.workers, refresh=args.refresh, remove=args.remove)
+    source_total = size_total = 0
+    for path, result in results.items():
+        if 'error' in result:
+            print(f"   ❌ {os.path.basename(path)}: {result['error']}")
+            continue
+        source_total += result['source_size']
+        size_total += result['size']
+        print(f"   {os.path.basename(path)}: {result['source_size'] / 1e6:.1f} MB → {result['size'] / 1e6:.2f} MB "
+              f"({result['source_size'] / result['size']:.1f}x)" + (" CSV を削除" if result.get('removed') else ""))
+        if 'kept' in result:
+            print(f"      ⚠ {result['kept']}")
+    if size_total:
+        print(f"✓ {source_total / 1e6:.1f} MB → {size_total / 1e6:.2f} MB ({source_total / size_total:.1f}x)")
+    else:
+        print("✓ 圧縮するセッションはありません")
+
+
+def cmd_coach(args):
+    """保存済みセッションをコーチングルールに流して、ラップごとのキューを表示"""
+    from .coaching import engine_for_sessions
+    from .laps import extract_laps
+    from .normalization import load_columns
+
+    paths = _resolve(args.files)
+    try:
+        engine, laps = engine_for_sessions(_resolve(args.reference) if args.reference else paths, track=args.track,
+                                           min_interval=args.interval)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+    if args.reference:
+        laps = []
+        for path in paths:
+            laps += extract_laps(load_columns(path), session=os.path.basename(path))
+    print(f"✓ リファレンス: {engine.reference_name} ({len(engine.corner_map.corners)} コーナー)")
+    cues = engine.replay([lap for lap in laps if {'throttle', 'brake', 'speed_kph'} <= set(lap.channels)])
+    for cue in cues:
+        print(f"   Lap {cue.lap:<3} {cue.distance:6.0f}m  {cue.message}")
+    print(f"   キュー {len(cues)} 件 (間引き {engine.suppressed} 件)")
+
+
+def cmd_overview(args):
+    """セッション全体 / 区間の min・平均・max (ロールアップの一番粗く足りる段から読む)"""
+    from .rollup import load_rollup
+
+    channels = args.channels or ['speed_kph', 'throttle', 'brake']
+    unit = 's' if args.axis == 'time' else 'm'
+    paths = _resolve(args.files)
+    for path in paths:
+        rollup = load_rollup(path, refresh=args.refresh)
+        print(f"\n📄 {os.path.basename(path)}")
+        pyramid = rollup.pyramid(args.axis)
+        if not pyramid.samples:
+            print(f"   ❌ {args.axis} 軸のデータがありません")
+            continue
+        channels = [name for name in channels if name in rollup.channels]
+        parts = [rollup.query(name, args.axis, args.start, args.end, points=args.points).merged(args.points)
+                 for name in channels]
+        lo, hi = pyramid.extent
+        print(f"   {pyramid}  範囲 {lo:.0f}-{hi:.0f}{unit}  幅 {parts[0].width:g}{unit}")
+        print(f"   {args.axis:>10} " + ' '.join(f"{name:>24}" for name in channels))
+        for i, x in enumerate(parts[0].x):
+            cells = [f"{part.min[i]:7.2f} {part.mean[i]:7.2f} {part.max[i]:8.2f}" for part in parts]
+            print(f"   {x:10.1f} " + ' '.join(cells))
+        if args.plot:
+            from pathlib import Path
+            from .plotting import DEFAULT_MAX_POINTS, FigureSpec, Panel, render_figures
+
+            panels = [
+                Panel(name, name, [rollup.query(name, args.axis, args.start, args.end,
+                                                points=DEFAULT_MAX_POINTS // 2).series(points=DEFAULT_MAX_POINTS)])
+                for name in channels
+            ]
+            panels[-1].xlabel = f"{args.axis} ({unit})"
+            output = Path(args.plot)
+            if len(paths) > 1:
+                output = output.with_name(f"{output.stem}_{Path(path).stem}{output.suffix}")
+            render_figures([FigureSpec(path=output, title=os.path.basename(path), panels=panels)], workers=1)
+            print(f"   ✓ {output}")
+
+
+def cmd_laps(args):
+    """Session History のラップタイム索引から、全セッション横断のベスト N 周"""
+    from .lap_index import LapIndex
+
+    paths = args.files or sorted(
+        glob.glob(os.path.join(TELEMETRY_DIR, '*.laps.npz')) + glob.glob(os.path.join(TELEMETRY_DIR, '*.f1cap'))
+        + glob.glob(os.path.join('data', '*.laps.npz'))
+    )
+    with LapIndex() as index:
+        results = index.update(paths, refresh=args.refresh)
+        print(f"✓ {index} (取り込み {sum(n >= 0 for n in results.values())} ファイル)")
+        try:
+            entries = index.leaderboard(args.track, n=args.top, team=args.team, compound=args.compound,
+                                        weather=args.weather, valid_only=not args.all, player_only=args.player)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return
+    if not entries:
+        print("   該当するラップがありません")
+        return
+    print(f"   {'#':>3} {'Time':>9} {'S1':>7} {'S2':>7} {'S3':>7}  {'Track':<12} {'Car':>3} {'Lap':>3}  {'Tyre':<6} {'Weather':<11} Session")
+    for rank, entry in enumerate(entries, 1):
+        s1, s2, s3 = entry.sectors
+        mark = '' if entry.valid else ' (無効)'
+        player = ' *' if entry.player else ''
+        print(f"   {rank:>3} {entry.lap_time:9.3f} {s1:7.3f} {s2:7.3f} {s3:7.3f}  {entry.track:<12} {entry.car:>3} "
+              f"{entry.lap:>3}  {entry.compound_name:<6} {entry.weather_name:<11} {entry.session}{player}{mark}")
+
+
+def cmd_similar(args):
+    """リファレンスのラップ (全周 / コーナー / 距離範囲) に近いラップを全セッションから探す"""
+    from .corners import get_corner_map
+    from .lap_search import lap_search_for_captures
+    from .laps import extract_laps
+    from .normalization import load_columns
+
+    paths = _resolve(args.files)
+    try:
+        index = lap_search_for_captures(paths, track=args.track, refresh=args.refresh)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"❌ {e}")
+        return
+    print(f"✓ {index}")
+
+    reference_path = args.reference or paths[0]
+    try:
+        laps = extract_laps(load_columns(reference_path), session=os.path.basename(reference_path))
+    except (OSError, ValueError, KeyError) as e:
+        print(f"❌ {os.path.basename(reference_path)}: {e}")
+        return
+    if args.lap is not None:
+        reference = next((lap for lap in laps if lap.number == args.lap), None)
+    else:
+        complete = [lap for lap in laps if lap.complete]
+        reference = min(complete, key=lambda lap: lap.lap_time) if complete else None
+    if reference is None:
+        print(f"❌ リファレンスのラップがありません: {reference_path}")
+        return
+
+    segment = None
+    try:
+        if args.corners:
+            segment = index.segment(get_corner_map(index.track, laps), args.corners)
+        elif args.range:
+            segment = tuple(args.range)
+        matches = index.query(reference, k=args.k, segment=segment)
+    except (ValueError, KeyError) as e:
+        print(f"❌ {e}")
+        return
+    where = '全周' if segment is None else f"{segment[0]:.0f}-{segment[1]:.0f}m"
+    print(f"   リファレンス: {reference.session} #{reference.number} ({reference.lap_time:.3f}s) / {where}")
+    if not matches:
+        print("   該当するラップがありません")
+        return
+    for rank, match in enumerate(matches, 1):
+        mark = '' if match.complete else ' (途中)'
+        print(f"   {rank:>3} {match.distance:8.4f}  {match.lap_time:9.3f}  {match.session} #{match.lap}{mark}")
+
+
+def cmd_incidents(args):
+    """ロックアップ・ホイールスピン・コースアウトの一覧 (.incidents.npy / .f1cap を再生)"""
+    from .incidents import KIND_NAMES, load_incidents
+
+    paths = args.files or sorted(
+        glob.glob(os.path.join(TELEMETRY_DIR, '*.incidents.npy')) + glob.glob(os.path.join(TELEMETRY_DIR, '*.f1cap'))
+        + glob.glob(os.path.join('data', '*.incidents.npy'))
+    )
+    if not paths:
+        print("❌ .incidents.npy / .f1cap がありません")
+        return
+    config = _incident_config(args)
+    for path in paths:
+        try:
+            incidents = load_incidents(path, config)
+        except (OSError, ValueError) as e:
+            print(f"❌ {os.path.basename(path)}: {e}")
+            continue
+        incidents = [incident for incident in incidents
+                     if (not args.kind or incident.kind in args.kind) and incident.severity >= args.min_severity]
+        counts = ', '.join(f"{name} {sum(i.kind == kind for i in incidents)}" for kind, name in KIND_NAMES.items())
+        print(f"✓ {os.path.basename(path)}: {counts}")
+        for incident in incidents:
+            print(f"   {incident.time:9.2f}s  {incident}")
+
+
+def cmd_record(args):
+    """f1_recorder.py でパケットを記録"""
+    from f1_recorder import main as record_main
+
+    record_main()
+
+
+def cmd_listen(args):
+    """src の listener で受信して CSV に保存 (リファレンスがあればライブ delta、--serve でライブ配信、--coach でコーチング)"""
+    from .f1_telemetry_listener import F1TelemetryListener
+    from .lap_index import INDEX_PATH
+    from .live_delta import LiveDeltaEngine, ReferenceLap
+
+    delta_engine = LiveDeltaEngine(ReferenceLap.load(args.reference)) if args.reference else None
+    coach = None
+    if args.coach:
+        from .coaching import engine_for_sessions
+
+        coach, _ = engine_for_sessions(_resolve(args.coach))
+        print(f"✓ コーチング: {coach.reference_name} ({len(coach.corner_map.corners)} コーナー)")
+    live_server = None
+    if args.serve is not None:
+        from .live_server import LiveServer
+
+        live_server = LiveServer(host=args.serve_host, port=args.serve)
+    try:
+        listener = F1TelemetryListener(port=args.port, delta_engine=delta_engine, live_server=live_server,
+                                       coach=coach, incident_config=_incident_config(args),
+                                       lap_index_path=INDEX_PATH if args.lap_index else None)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+    listener.start(timeout=args.timeout)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m src', description='F1 25 テレメトリー ツール')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('summary', help='ラップごとの簡易サマリー (高速)')
+    p.add_argument('files', nargs='*')
+    p.add_argument('-v', '--verbose', action='store_true', help='正規化レポートを表示')
+    p.set_defaults(func=cmd_summary)
+
+    p = sub.add_parser('analyze', help='テレメトリー分析 (analyze_telemetry.py)')
+    p.add_argument('files', nargs='*')
+    p.set_defaults(func=cmd_analyze)
+
+    p = sub.add_parser('phase1', help='Phase 1 分析 (グラフ + プロ比較)')
+    p.add_argument('file', nargs='?')
+    p.add_argument('--driver', default="マックス・フェルスタッペン (Max Verstappen)")
+    p.add_argument('--year', type=int, default=2025)
+    p.set_defaults(func=cmd_phase1)
+
+    p = sub.add_parser('corners', help='コーナーマップの作成 / 表示')
+    p.add_argument('files', nargs='*')
+    p.add_argument('--track')
+    p.add_argument('--refresh', action='store_true', help='キャッシュを作り直す')
+    p.set_defaults(func=cmd_corners)
+
+    p = sub.add_parser('trackmap', help='トラックマップの作成 (Motion 位置が必要)')
+    p.add_argument('files', nargs='*')
+    p.add_argument('--track')
+    p.add_argument('--refresh', action='store_true', help='キャッシュを作り直す')
+    p.set_defaults(func=cmd_trackmap)
+
+    p = sub.add_parser('race', help='全車のレース分析 (.race.npz / CSV (隣の .race.npz か packet_hex) / .f1cap)')
+    p.add_argument('files', nargs='*', help='省略時は data/ の最新 .race.npz')
+    p.add_argument('--last', type=int, help='直近 n 周のクリーンラップでペースを比べる')
+    p.add_argument('--show', type=int, default=10, help='表示するオーバーテイクの数')
+    p.set_defaults(func=cmd_race)
+
+    p = sub.add_parser('capture', help='バイナリ記録 (.f1cap) の作成 / 確認')
+    p.add_argument('files', nargs='*', help='.f1cap または packet_hex 付き CSV (省略時は telemetry_data/ の .f1cap)')
+    p.add_argument('--type', type=int, help='取り出すパケット種別 (2 = Lap Data, 6 = Car Telemetry など)')
+    p.add_argument('--frames', type=int, nargs=2, metavar=('START', 'END'), help='フレーム範囲')
+    p.add_argument('--refresh', action='store_true', help='CSV から作り直す')
+    p.set_defaults(func=cmd_capture)
+
+    p = sub.add_parser('stints', help='スティントごとのタイヤ摩耗・燃料・ERS')
+    p.add_argument('files', nargs='*')
+    p.add_argument('--wear-limit', type=float, default=70.0, help='残り周回を数える摩耗の上限 (%%)')
+    p.set_defaults(func=cmd_stints)
+
+    p = sub.add_parser('events', help='イベントタイムライン (ペナルティ・SC など)')
+    p.add_argument('files', nargs='*')
+    p.add_argument('--code', help='イベントコードで絞り込む (PENA, SCAR, FTLP など)')
+    p.add_argument('--window', type=float, help='--code の各イベントの前後 n 秒のテレメトリーを表示')
+    p.set_defaults(func=cmd_events)
+
+    p = sub.add_parser('degradation', help='サーキット × コンパウンドのタイヤ / 燃料劣化モデル')
+    p.add_argument('files', nargs='*', help='CSV かフォルダ (中の CSV)。省略時は telemetry_data/ と data/ の全 CSV')
+    p.add_argument('--track', help='表示するサーキット')
+    p.add_argument('--compound', help='スティント予測するコンパウンド (Soft, Medium, Hard など)')
+    p.add_argument('--laps', type=int, help='スティント予測の周回数')
+    p.add_argument('--age', type=int, default=0, help='スティント開始時のタイヤ使用周回')
+    p.add_argument('--fuel', type=float, help='スティント開始時の燃料 (kg)')
+    p.add_argument('--workers', type=int)
+    p.add_argument('--refresh', action='store_true', help='キャッシュを作り直す')
+    p.set_defaults(func=cmd_degradation)
+
+    p = sub.add_parser('dataset', help='セッション / ラップの一覧 (メタデータのみ)')
+    p.add_argument('source', nargs='?', default=TELEMETRY_DIR, help='セッションのフォルダ')
+    p.add_argument('--track')
+    p.add_argument('--workers', type=int)
+    p.add_argument('--refresh', action='store_true', help='メタデータを作り直す')
+    p.set_defaults(func=cmd_dataset)
+
+    p = sub.add_parser('best', help='理論ベストラップ')
+    p.add_argument('files', nargs='*')
+    p.add_argument('--track')
+    p.add_argument('--sectors', type=int, default=50)
+    p.set_defaults(func=cmd_best)
+
+    p = sub.add_parser('reports', help='レポートの一括生成 (analysis_results/reports)')
+    p.add_argument('files', nargs='*', help='省略時は telemetry_data/ の全 CSV')
+    p.add_argument('--output')
+    p.add_argument('--workers', type=int)
+    p.add_argument('--refresh', action='store_true', help='キャッシュを無視して作り直す')
+    p.set_defaults(func=cmd_reports)
+
+    p = sub.add_parser('redecode', help='packet_hex 付き記録 CSV の一括再デコード')
+    p.add_argument('files', nargs='*', help='省略時は telemetry_data/ の全 CSV')
+    p.add_argument('--output', help='出力フォルダ (省略時は telemetry_data/redecoded)')
+    p.add_argument('--workers', type=int)
+    p.add_argument('--refresh', action='store_true', help='出力が新しくても作り直す')
+    p.set_defaults(func=cmd_redecode)
+
+    p = sub.add_parser('archive', help='セッションを圧縮保存 (.f1z、ラップ単位で読める)')
+    p.add_argument('files', nargs='*', help='省略時は telemetry_data/ の全 CSV')
+    p.add_argument('--output', help='出力フォルダ (省略時は CSV のフォルダの archive/)')
+    p.add_argument('--codec', choices=['lzma', 'zlib'], default='lzma')
+    p.add_argument('--workers', type=int)
+    p.add_argument('--remove', action='store_true',
+                   help='一致を確かめた CSV を消す (以降の分析は .f1z から読む、出力先が CSV の隣か archive/ の時だけ)')
+    p.add_argument('--refresh', action='store_true', help='圧縮済みでも作り直す')
+    p.set_defaults(func=cmd_archive)
+
+    p = sub.add_parser('record', help='UDP パケットの記録 (f1_recorder.py)')
+    p.set_defaults(func=cmd_record)
+
+    p = sub.add_parser('coach', help='保存済みセッションにコーチングルールを当てる (ラップごとのキュー)')
+    p.add_argument('files', nargs='*')
+    p.add_argument('--reference', nargs='+', help='リファレンス (最速の完走ラップ) を取るセッション (既定は files)')
+    p.add_argument('--track')
+    p.add_argument('--interval', type=float, default=3.0, help='キューの最小間隔 (s)')
+    p.set_defaults(func=cmd_coach)
+
+    p = sub.add_parser('laps', help='Session History のラップタイム索引 (サーキット / チーム / タイヤ / 天候ごとのベスト N 周)')
+    p.add_argument('files', nargs='*', help='.laps.npz / .f1cap (省略時は telemetry_data/ と data/ の全部)')
+    p.add_argument('--track')
+    p.add_argument('--top', type=int, default=10)
+    p.add_argument('--team', type=int, help='team_id')
+    p.add_argument('--compound', help='Soft / Medium / Hard / Inter / Wet')
+    p.add_argument('--weather', type=int, help='0=晴れ 1=薄曇り 2=曇り 3=小雨 4=大雨 5=嵐')
+    p.add_argument('--player', action='store_true', help='自分の車だけ')
+    p.add_argument('--all', action='store_true', help='無効ラップも含める')
+    p.add_argument('--refresh', action='store_true', help='取り込み済みのファイルも読み直す')
+    p.set_defaults(func=cmd_laps)
+
+    p = sub.add_parser('similar', help='リファレンスに近いラップを探す (全周 / コーナー / 距離範囲、距離グリッドの特徴索引)')
+    p.add_argument('files', nargs='*', help='検索対象のセッション')
+    p.add_argument('--reference', help='リファレンスのセッション CSV (既定は files の最初)')
+    p.add_argument('--lap', type=int, help='リファレンスの周回番号 (既定は最速の完走ラップ)')
+    p.add_argument('--corners', type=int, nargs='+', help='この番号のコーナー区間だけで比べる')
+    p.add_argument('--range', type=float, nargs=2, metavar=('START', 'END'), help='この距離範囲 (m) だけで比べる')
+    p.add_argument('-k', '--k', type=int, default=5)
+    p.add_argument('--track')
+    p.add_argument('--refresh', action='store_true', help='索引を作り直す')
+    p.set_defaults(func=cmd_similar)
+
+    p = sub.add_parser('overview', help='セッション全体 / 区間の min・平均・max (ロールアップ、長いセッションでも一定時間)')
+    p.add_argument('files', nargs='*')
+    p.add_argument('--axis', choices=['time', 'distance'], default='time')
+    p.add_argument('--start', type=float, help='範囲の始め (s または m)')
+    p.add_argument('--end', type=float, help='範囲の終わり (s または m)')
+    p.add_argument('--points', type=int, default=20, help='表示する行数')
+    p.add_argument('--channels', nargs='+', help='既定は speed_kph throttle brake')
+    p.add_argument('--plot', metavar='PNG', help='包絡線 (min / max) の図も保存する')
+    p.add_argument('--refresh', action='store_true', help='キャッシュを使わず作り直す')
+    p.set_defaults(func=cmd_overview)
+
+    p = sub.add_parser('incidents', help='ロックアップ・ホイールスピン・コースアウトの一覧 (周回・距離・深刻度)')
+    p.add_argument('files', nargs='*', help='.incidents.npy / .f1cap / CSV (省略時は telemetry_data/ と data/ の全部)')
+    p.add_argument('--kind', nargs='+', choices=['lockup', 'wheelspin', 'off_track'])
+    p.add_argument('--min-severity', type=float, default=0.0, help='深刻度 (ピーク / しきい値) がこれ以上のものだけ')
+    _add_incident_arguments(p)
+    p.set_defaults(func=cmd_incidents)
+
+    p = sub.add_parser('listen', help='UDP 受信 + CSV 保存 (src listener)')
+    p.add_argument('--port', type=int, default=20777)
+    p.add_argument('--timeout', type=int, default=600)
+    p.add_argument('--reference', help='ライブ delta 用のリファレンスラップ CSV')
+    p.add_argument('--serve', type=int, nargs='?', const=20780, metavar='PORT',
+                   help='確定フレームを WebSocket / SSE で配信 (既定 20780)')
+    p.add_argument('--serve-host', default='127.0.0.1', help='配信の待ち受けアドレス')
+    p.add_argument('--coach', nargs='+', metavar='CSV', help='ライブコーチングのリファレンスを取るセッション')
+    p.add_argument('--lap-index', action='store_true',
+                   help='保存時に .laps.npz を cache/lap_index の索引にも取り込む (省略時は laps コマンドで取り込む)')
+    _add_incident_arguments(p)
+    p.set_defaults(func=cmd_listen)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,457 @@
+"""
+F1 25 Live Coaching
+コーナー / 距離区間ごとのルールを受信中のテレメトリーにその場で当てて、同じ周のうちにキューを出す
+
+ルールは宣言的に書く (Rule: 指標・比較・しきい値・メッセージ)。CoachingEngine はルールから
+必要な指標だけを区間ごとの逐次集計 (1 サンプル O(1)) に組み立て、指標が確定した時点
+(ブレーキ開始・全開になった地点、または区間の出口) で評価する。
+リファレンスとの比較値は、同じ集計をリファレンスラップに流して作る。
+
+ホットパスは標準ライブラリのみ (bisect) で、CarTelemetry 1 パケットあたり数 µs。
+"""
+
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+
+# 入力のしきい値
+BRAKE_ON = 0.1          # ブレーキを踏んだとみなす入力
+FULL_THROTTLE = 0.95    # 全開とみなすアクセル
+COAST_INPUT = 0.05      # アクセル・ブレーキともにこれ未満なら惰性走行
+LIFT_ARMED = 0.3        # アクセル戻しを数え始めるアクセル量
+
+# コーナー区間はブレーキング開始 (entry) のこれだけ手前から (早すぎるブレーキも拾う)
+CORNER_LEAD = 150.0
+# 立ち上がり (exit) の後、全開・アクセル戻しを見る距離 (次のコーナー区間の手前まで)
+CORNER_TRAIL = 200.0
+# 距離区間の長さ (m)
+WINDOW_LENGTH = 200.0
+
+
+@dataclass
+class Rule:
+    """コーチングルール 1 つ
+
+    metric の値 (relative なら リファレンスとの差) を compare / threshold で判定し、
+    成立したら message を format してキューにする。message で使える名前:
+    corner, where, value, reference, delta, amount (= |delta|)
+    """
+    name: str
+    metric: str                 # METRICS のどれか
+    compare: str                # '>' / '<'
+    threshold: float
+    message: str
+    scope: str = 'corner'       # 'corner' (コーナーマップ) / 'window' (WINDOW_LENGTH ごと)
+    relative: bool = True       # リファレンスとの差で判定する
+    cooldown: float = 60.0      # 同じルール × 同じ区間のキューの最小間隔 (session time, s)
+
+    def check(self, delta: float) -> bool:
+        return delta > self.threshold if self.compare == '>' else delta < self.threshold
+
+
+DEFAULT_RULES = [
+    Rule('late_braking', 'brake_point', '>', 15.0, "T{corner}: ブレーキが {amount:.0f} m 遅い"),
+    Rule('early_braking', 'brake_point', '<', -25.0, "T{corner}: ブレーキが {amount:.0f} m 早い"),
+    Rule('apex_speed', 'min_speed', '<', -6.0, "T{corner}: 最低速度が {amount:.0f} km/h 低い"),
+    Rule('late_throttle', 'throttle_on', '>', 25.0, "T{corner}: 全開が {amount:.0f} m 遅い"),
+    Rule('throttle_hesitation', 'throttle_lift', '>', 0.25,
+         "T{corner}: 立ち上がりでアクセルを {value:.0%} 戻しています", relative=False),
+    Rule('coasting', 'coasting', '>', 25.0, "{where}: 惰性走行が {amount:.0f} m 長い", scope='window'),
+]
+
+
+# --- 区間ごとの逐次集計 ---------------------------------------------------
+# update() は指標が確定した時に True を返す (その場でルールを評価する)。
+# 確定しないもの (None のまま) は区間の出口で評価する。
+
+class _BrakePoint:
+    """区間で最初にブレーキを踏んだ地点 (m)"""
+    __slots__ = ('value',)
+
+    def reset(self, apex: float):
+        self.value = None
+
+    def update(self, distance, throttle, brake, speed) -> bool:
+        if self.value is None and brake >= BRAKE_ON:
+            self.value = distance
+            return True
+        return False
+
+    def close(self):
+        return self.value
+
+
+class _ThrottleOn:
+    """エイペックス以降で最初に全開にした地点 (m)"""
+    __slots__ = ('value', 'apex')
+
+    def reset(self, apex: float):
+        self.value = None
+        self.apex = apex
+
+    def update(self, distance, throttle, brake, speed) -> bool:
+        if self.value is None and distance >= self.apex and throttle >= FULL_THROTTLE:
+            self.value = distance
+            return True
+        return False
+
+    def close(self):
+        return self.value
+
+
+class _ThrottleLift:
+    """エイペックス以降、踏み始めたアクセルを最大どれだけ戻したか (0-1)"""
+    __slots__ = ('value', 'apex', 'peak')
+
+    def reset(self, apex: float):
+        self.value = 0.0
+        self.apex = apex
+        self.peak = 0.0
+
+    def update(self, distance, throttle, brake, speed) -> bool:
+        if distance >= self.apex and brake < BRAKE_ON:
+            if throttle > self.peak:
+                self.peak = throttle
+            elif self.peak >= LIFT_ARMED and self.peak - throttle > self.value:
+                self.value = self.peak - throttle
+        return False
+
+    def close(self):
+        return self.value
+
+
+class _Coasting:
+    """アクセルもブレーキも踏んでいない距離 (m)"""
+    __slots__ = ('value', 'previous', 'coasting')
+
+    def reset(self, apex: float):
+        self.value = 0.0
+        self.previous = None
+        self.coasting = False
+
+    def update(self, distance, throttle, brake, speed) -> bool:
+        if self.coasting and self.previous is not None:
+            self.value += distance - self.previous
+        self.previous = distance
+        self.coasting = throttle < COAST_INPUT and brake < COAST_INPUT
+        return False
+
+    def close(self):
+        return self.value
+
+
+class _MinSpeed:
+    """区間の最低速度 (km/h)"""
+    __slots__ = ('value',)
+
+    def reset(self, apex: float):
+        self.value = None
+
+    def update(self, distance, throttle, brake, speed) -> bool:
+        if self.value is None or speed < self.value:
+            self.value = speed
+        return False
+
+    def close(self):
+        return self.value
+
+
+METRICS = {
+    'brake_point': _BrakePoint,
+    'throttle_on': _ThrottleOn,
+    'throttle_lift': _ThrottleLift,
+    'coasting': _Coasting,
+    'min_speed': _MinSpeed,
+}
+
+
+@dataclass
+class Cue:
+    """コーチングのキュー 1 つ"""
+    rule: str
+    message: str
+    lap: int
+    scope: str
+    window: int                 # 区間番号 (コーナーなら corner.number - 1)
+    distance: float             # 出した地点 (m)
+    value: float
+    reference: Optional[float]
+    delta: float
+    time: float                 # session time (s)
+
+    def __str__(self):
+        return self.message
+
+
+class _Scope:
+    """区間の並び (コーナー / 距離区間) と、いま入っている区間の集計"""
+
+    def __init__(self, name: str, starts: Sequence[float], ends: Sequence[float], apexes: Sequence[float],
+                 labels: Sequence[str], rules: List[Rule]):
+        self.name = name
+        self.starts, self.ends, self.apexes, self.labels = list(starts), list(ends), list(apexes), list(labels)
+        self.rules = rules
+        # 使う指標だけ集計する: 指標名 -> (集計, その指標のルール)
+        self.metrics = {}
+        for rule in rules:
+            if rule.metric not in self.metrics:
+                self.metrics[rule.metric] = (METRICS[rule.metric](), [])
+            self.metrics[rule.metric][1].append(rule)
+        self.index = -1         # いま入っている区間 (-1 = 区間外)
+        self.next = 0           # 次に入る区間
+        self.evaluated = set()  # この区間で評価済みの指標
+
+    def locate(self, distance: float):
+        """distance より後ろで次に入る区間を探し直す (周回の開始・巻き戻り時)"""
+        self.index = -1
+        self.next = bisect_right(self.ends, distance)
+
+
+class CoachingEngine:
+    """ルールを受信中のサンプルに当ててキューを出す
+
+    engine = CoachingEngine(corner_map=corner_map, on_cue=print)
+    engine.set_reference(reference_lap)           # laps.Lap (speed_kph / throttle / brake)
+    collector.add_handler(PacketType.LAP_DATA, engine.on_lap_data)
+    collector.add_handler(PacketType.CAR_TELEMETRY, engine.on_telemetry)
+
+    キューは min_interval 秒に 1 つまで (それ以外は suppressed に数える)。
+    """
+
+    def __init__(self, rules: Sequence[Rule] = DEFAULT_RULES, corner_map=None, track_length: Optional[float] = None,
+                 on_cue: Optional[Callable[[Cue], None]] = None, min_interval: float = 3.0,
+                 window_length: float = WINDOW_LENGTH):
+        self.rules = list(rules)
+        unknown = [rule.metric for rule in self.rules if rule.metric not in METRICS]
+        if unknown:
+            raise ValueError(f"不明な指標: {', '.join(unknown)} (使えるもの: {', '.join(METRICS)})")
+        self.corner_map = corner_map
+        self.track_length = track_length or (corner_map.track_length if corner_map is not None else None)
+        self.window_length = window_length
+        self.min_interval = min_interval
+        self.listeners: List[Callable[[Cue], None]] = [on_cue] if on_cue else []
+        self.scopes = self._compile()
+
+        # (scope, metric) -> 区間ごとのリファレンス値
+        self.reference: Dict[Tuple[str, str], List[Optional[float]]] = {}
+        self.reference_name = None
+
+        # set_reference 用: 評価せずに (scope, metric) -> 区間ごとの値 を記録する
+        self._record: Optional[Dict[Tuple[str, str], List[Optional[float]]]] = None
+
+        self.lap_num = -1
+        self.lap_distance = 0.0
+        self.time = 0.0
+        self.samples = 0
+        self.cues: List[Cue] = []
+        self.suppressed = 0
+        self._last_cue_time = None
+        self._last_rule_time: Dict[Tuple[str, int], float] = {}
+
+    def _compile(self) -> List[_Scope]:
+        """ルールを区間の種類ごとにまとめ、必要な指標の集計を用意する"""
+        scopes = []
+        corner_rules = [rule for rule in self.rules if rule.scope == 'corner']
+        corners = self.corner_map.corners if self.corner_map is not None else []
+        if corner_rules and corners:
+            starts, previous_exit = [], 0.0
+            for corner in corners:
+                starts.append(max(corner.entry - CORNER_LEAD, previous_exit))
+                previous_exit = corner.exit
+            limits = starts[1:] + [self.track_length or float('inf')]
+            ends = [max(c.exit, min(c.exit + CORNER_TRAIL, limit)) for c, limit in zip(corners, limits)]
+            scopes.append(_Scope('corner', starts, ends, [c.apex for c in corners],
+                                 [str(c.number) for c in corners], corner_rules))
+        window_rules = [rule for rule in self.rules if rule.scope == 'window']
+        if window_rules and self.track_length:
+            count = max(int(self.track_length // self.window_length), 1)
+            starts = [k * self.window_length for k in range(count)]
+            ends = starts[1:] + [self.track_length]
+            scopes.append(_Scope('window', starts, ends, starts,
+                                 [f"{s:.0f}-{e:.0f} m" for s, e in zip(starts, ends)], window_rules))
+        return scopes
+
+    def add_listener(self, callback: Callable[[Cue], None]):
+        """キューを受け取るコールバックを登録"""
+        self.listeners.append(callback)
+
+    # --- リファレンス ---------------------------------------------------
+
+    def set_reference(self, lap, name: Optional[str] = None):
+        """リファレンスラップ (laps.Lap) に同じ集計を流して、区間ごとの比較値を作る"""
+        recorder = CoachingEngine(self.rules, self.corner_map, self.track_length, min_interval=0.0,
+                                  window_length=self.window_length)
+        values = {(scope.name, metric): [None] * len(scope.starts)
+                  for scope in recorder.scopes for metric in scope.metrics}
+        recorder._record = values
+        channels = lap.channels
+        throttle, brake, speed = channels['throttle'], channels['brake'], channels['speed_kph']
+        for i in range(len(lap.distance)):
+            recorder.update(0, float(lap.distance[i]), float(throttle[i]), float(brake[i]), float(speed[i]))
+        recorder.finish()
+        self.reference = values
+        self.reference_name = name or f"{lap.session} lap {lap.number}"
+
+    # --- ストリーム -----------------------------------------------------
+
+    def on_lap_data(self, header, lap_data):
+        """TelemetryDataCollector の LAP_DATA ハンドラー (現在の周・距離を覚える)"""
+        if lap_data.current_lap_num != self.lap_num:
+            self.finish()
+            self.lap_num = lap_data.current_lap_num
+            self.lap_distance = lap_data.lap_distance
+            for scope in self.scopes:
+                scope.locate(self.lap_distance)
+        elif lap_data.lap_distance >= self.lap_distance:
+            self.lap_distance = lap_data.lap_distance
+
+    def on_telemetry(self, header, telemetry):
+        """TelemetryDataCollector の CAR_TELEMETRY ハンドラー (直近の距離でサンプルを評価)"""
+        if self.lap_num >= 0:
+            self.update(self.lap_num, self.lap_distance, telemetry.throttle, telemetry.brake, telemetry.speed,
+                        header.session_time)
+
+    def update(self, lap_num: int, distance: float, throttle: float, brake: float, speed: float, time: float = 0.0):
+        """サンプル 1 つを取り込む (周が変わったら区間を閉じて最初から)"""
+        if lap_num != self.lap_num:
+            self.finish()
+            self.lap_num = lap_num
+            for scope in self.scopes:
+                scope.locate(distance)
+        if distance < 0:
+            return
+        self.samples += 1
+        # replay / set_reference では on_lap_data を通らないので、finish() が閉じる距離をここで覚える
+        self.lap_distance = distance
+        self.time = time
+        for scope in self.scopes:
+            index = scope.index
+            if index >= 0 and distance >= scope.ends[index]:
+                self._close(scope, distance, time)
+                index = -1
+            if index < 0:
+                if scope.next >= len(scope.starts) or distance < scope.starts[scope.next]:
+                    continue
+                if distance >= scope.ends[scope.next]:
+                    # 区間を飛び越えた (パケット欠落など): その区間は集計しない
+                    scope.locate(distance)
+                    continue
+                index = self._open(scope)
+            for metric, (accumulator, rules) in scope.metrics.items():
+                if accumulator.update(distance, throttle, brake, speed) and metric not in scope.evaluated:
+                    scope.evaluated.add(metric)
+                    self._evaluate(scope, metric, accumulator.value, rules, distance, time)
+
+    def finish(self):
+        """いま入っている区間を閉じる (周の終わり・セッション終了)"""
+        for scope in self.scopes:
+            if scope.index >= 0:
+                self._close(scope, self.lap_distance, self.time)
+
+    def _open(self, scope: _Scope) -> int:
+        index = scope.next
+        scope.index = index
+        scope.next = index + 1
+        scope.evaluated = set()
+        for accumulator, _ in scope.metrics.values():
+            accumulator.reset(scope.apexes[index])
+        return index
+
+    def _close(self, scope: _Scope, distance: float, time: float):
+        for metric, (accumulator, rules) in scope.metrics.items():
+            if metric not in scope.evaluated:
+                self._evaluate(scope, metric, accumulator.close(), rules, distance, time)
+        scope.index = -1
+
+    def _evaluate(self, scope: _Scope, metric: str, value, rules: List[Rule], distance: float, time: float):
+        index = scope.index
+        if self._record is not None:
+            self._record[(scope.name, metric)][index] = value
+            return
+        if value is None:
+            return
+        reference = self.reference.get((scope.name, metric))
+        reference = reference[index] if reference is not None else None
+        for rule in rules:
+            if rule.relative:
+                if reference is None:
+                    continue
+                delta = value - reference
+            else:
+                delta = value
+            if rule.check(delta):
+                self._emit(rule, scope, index, distance, value, reference, delta, time)
+
+    def _emit(self, rule: Rule, scope: _Scope, index: int, distance: float, value: float,
+              reference: Optional[float], delta: float, time: float):
+        """レート制限を通ったキューをコールバックに渡す"""
+        if self._last_cue_time is not None and time < self._last_cue_time:
+            # フラッシュバック / 新しいセッションで時刻が戻った
+            self._last_cue_time = None
+            self._last_rule_time.clear()
+        key = (rule.name, index)
+        last = self._last_rule_time.get(key)
+        if (self._last_cue_time is not None and time - self._last_cue_time < self.min_interval) or \
+                (last is not None and time - last < rule.cooldown):
+            self.suppressed += 1
+            return
+        self._last_cue_time = time
+        self._last_rule_time[key] = time
+        label = scope.labels[index]
+        message = rule.message.format(corner=label, where=label, value=value, reference=reference,
+                                      delta=delta, amount=abs(delta))
+        cue = Cue(rule.name, message, self.lap_num, scope.name, index, distance, value, reference, delta, time)
+        self.cues.append(cue)
+        for callback in self.listeners:
+            callback(cue)
+
+    def replay(self, laps) -> List[Cue]:
+        """保存済みのラップ (laps.Lap) を順に流して、出たキューを返す (session time はラップ時間の累積)"""
+        before = len(self.cues)
+        offset = 0.0
+        for lap in laps:
+            channels = lap.channels
+            throttle, brake, speed = channels['throttle'], channels['brake'], channels['speed_kph']
+            for i in range(len(lap.distance)):
+                self.update(lap.number, float(lap.distance[i]), float(throttle[i]), float(brake[i]),
+                            float(speed[i]), offset + float(lap.time[i]))
+            self.finish()
+            offset += float(lap.time[-1]) if len(lap.time) else 0.0
+        return self.cues[before:]
+
+    def __repr__(self):
+        return (f"CoachingEngine(rules={len(self.rules)}, reference={self.reference_name}, "
+                f"cues={len(self.cues)}, suppressed={self.suppressed})")
+
+
+def engine_for_sessions(paths, rules: Sequence[Rule] = DEFAULT_RULES, track: Optional[str] = None,
+                        **kwargs) -> Tuple[CoachingEngine, list]:
+    """保存済みセッションからコーナーマップを取り、最速の完走ラップをリファレンスにしたエンジンを作る
+
+    Returns:
+        (エンジン, 読み込んだラップ)
+    """
+    import os
+
+    from .corners import get_corner_map
+    from .laps import extract_laps, track_name_from_path
+    from .normalization import load_columns
+
+    paths = [paths] if isinstance(paths, (str, os.PathLike)) else list(paths)
+    laps = []
+    for path in paths:
+        laps += extract_laps(load_columns(path), session=os.path.basename(path))
+    complete = [lap for lap in laps if lap.complete and {'throttle', 'brake', 'speed_kph'} <= set(lap.channels)]
+    if not complete:
+        raise ValueError("リファレンスにできる完走ラップがありません (LapNum / LapDistance 列が必要)")
+    corner_map = get_corner_map(track or track_name_from_path(paths[0]), complete)
+    engine = CoachingEngine(rules, corner_map=corner_map, **kwargs)
+    best = min(complete, key=lambda lap: lap.lap_time if lap.lap_time == lap.lap_time else lap.time[-1])
+    engine.set_reference(best)
+    return engine, laps
+
+
+if __name__ == "__main__":
+    print("✓ Live Coaching モジュール読み込み完了")
+    print(f"- 指標: {', '.join(METRICS)}")
@@ -0,0 +1,397 @@
+"""
+F1 25 Cold Storage
+走り終わったセッションの CSV を、ラップごとに独立して読めるチャンクに圧縮して保存する (.f1z)
+
+列ごとに
+- 小数点以下の桁が決まっている列 (CSV の値はほぼすべて) は 10^k 倍した整数の差分
+- それ以外の float は前の値とのビット XOR
+で変換し、バイト順を入れ替えて (上位バイトの 0 をまとめる) から zlib / lzma で圧縮する。
+チャンクは 1 周 (lap_number が同じ区間) ごとで、ファイル末尾のインデックスにオフセットを持つので、
+1 周だけ読む時はそのチャンクだけ展開すればよい。元の数値は 1 ビットも変わらない。
+
+元の CSV を消しても、load_columns / TelemetryDataset は find_archive で見つかる .f1z から読む。
+"""
+
+import csv
+import json
+import lzma
+import os
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .laps import Lap, extract_laps, track_name_from_path
+from .normalization import FLAGS_COLUMN, detect_format, normalize
+
+
+ARCHIVE_SUFFIX = '.f1z'
+ARCHIVE_DIR = Path("telemetry_data") / "archive"
+
+ARCHIVE_MAGIC = b'F1Z1'
+# ファイル末尾: [インデックスの長さ (uint64)] [マジック]
+_FOOTER = struct.Struct('<Q4s')
+
+CODECS = {
+    'zlib': (lambda data, level: zlib.compress(data, level), zlib.decompress, 9),
+    'lzma': (lambda data, level: lzma.compress(data, preset=level), lzma.decompress, 6),
+}
+DEFAULT_CODEC = 'lzma'
+
+# ラップの列がない形式で 1 チャンクにする行数
+CHUNK_ROWS = 4096
+
+# 整数化を試す小数点以下の桁数の上限
+MAX_DECIMALS = 6
+
+# チャンクのラップに付けない列 (dataset と同じ)
+_STRUCTURAL_COLUMNS = ('lap_number', 'lap_distance', 'last_lap_time_ms', 'lap_time_ms', 'session_time', FLAGS_COLUMN)
+
+
+# ==================== 列のエンコード ====================
+
+def _shuffle(values: np.ndarray) -> bytes:
+    """バイト単位で転置 (各値の 0 バイト目、1 バイト目、... の順に並べる)"""
+    return values.view(np.uint8).reshape(len(values), values.itemsize).T.tobytes()
+
+
+def _unshuffle(data: bytes, dtype: np.dtype, n: int) -> np.ndarray:
+    raw = np.frombuffer(data, dtype=np.uint8).reshape(dtype.itemsize, n)
+    return np.ascontiguousarray(raw.T).view(dtype).ravel()
+
+
+def _decimals(values: np.ndarray) -> Optional[int]:
+    """10^k 倍して整数にしても元に戻る最小の k (なければ None)"""
+    for k in range(MAX_DECIMALS + 1):
+        scale = 10.0 ** k
+        scaled = np.round(values * scale)
+        if np.abs(scaled).max(initial=0) >= 2 ** 52:
+            return None
+        if np.array_equal(scaled / scale, values):
+            return k
+    return None
+
+
+def _int_dtype(values: np.ndarray) -> np.dtype:
+    """values が入る一番小さい符号付き整数型"""
+    low, high = int(values.min(initial=0)), int(values.max(initial=0))
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def encode_column(values: np.ndarray) -> Tuple[Dict, bytes]:
+    """float 列を (メタデータ, バイト列) に変換 (可逆)"""
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    missing = np.isnan(values)
+    meta: Dict = {'n': n}
+    parts = []
+    if missing.all():
+        meta['encoding'] = 'nan'
+        return meta, b''
+    if missing.any():
+        meta['nan'] = True
+        parts.append(np.packbits(missing).tobytes())
+        # 欠損は直前の値で埋める (差分が 0 になって縮む)
+        index = np.where(~missing, np.arange(n), 0)
+        np.maximum.accumulate(index, out=index)
+        values = values[index]
+        values[:np.argmax(~missing)] = values[np.argmax(~missing)]
+
+    decimals = _decimals(values)
+    if decimals is not None:
+        integers = np.round(values * 10.0 ** decimals).astype(np.int64)
+        delta = np.diff(integers, prepend=0)
+        dtype = _int_dtype(delta)
+        meta.update(encoding='delta', decimals=decimals, dtype=dtype.str)
+        parts.append(_shuffle(delta.astype(dtype)))
+    else:
+        bits = values.view(np.uint64)
+        meta['encoding'] = 'xor'
+        parts.append(_shuffle(bits ^ np.concatenate(([np.uint64(0)], bits[:-1]))))
+    return meta, b''.join(parts)
+
+
+def decode_column(meta: Dict, data: bytes) -> np.ndarray:
+    n = meta['n']
+    if meta['encoding'] == 'nan':
+        return np.full(n, np.nan)
+    offset = 0
+    missing = None
+    if meta.get('nan'):
+        size = (n + 7) // 8
+        missing = np.unpackbits(np.frombuffer(data, dtype=np.uint8, count=size))[:n].astype(bool)
+        offset = size
+    if meta['encoding'] == 'delta':
+        delta = _unshuffle(data[offset:], np.dtype(meta['dtype']), n)
+        values = np.cumsum(delta, dtype=np.int64) / 10.0 ** meta['decimals']
+    else:
+        bits = np.bitwise_xor.accumulate(_unshuffle(data[offset:], np.dtype(np.uint64), n))
+        values = bits.view(np.float64).copy()
+    if missing is not None:
+        values[missing] = np.nan
+    return values
+
+
+# ==================== 書き込み ====================
+
+def _read_csv(path) -> Tuple[List[str], Dict[str, np.ndarray], Dict[str, List[str]]]:
+    """CSV を (ヘッダー, 数値の列, 文字列の列) に読み込む"""
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        raw = list(zip(*reader)) or [()] * len(header)
+    numeric, text = {}, {}
+    for name, values in zip(header, raw):
+        try:
+            numeric[name] = np.array([float(v) if v else np.nan for v in values])
+        except ValueError:
+            text[name] = list(values)
+    return header, numeric, text
+
+
+def _chunk_bounds(table: Dict[str, np.ndarray], rows: int) -> List[Tuple[int, int]]:
+    """チャンクの行範囲: ラップ (lap_number が同じ区間) ごと、ラップの列がなければ CHUNK_ROWS 行ごと"""
+    if 'lap_number' in table and rows:
+        lap_number = np.asarray(table['lap_number'], dtype=np.float64)
+        change = np.flatnonzero(np.diff(lap_number) != 0) + 1
+        starts = np.concatenate(([0], change))
+        ends = np.concatenate((change, [rows]))
+    else:
+        starts = np.arange(0, rows, CHUNK_ROWS)
+        ends = np.minimum(starts + CHUNK_ROWS, rows)
+    return [(int(start), int(end)) for start, end in zip(starts, ends)]
+
+
+def archive_session(path, out_path=None, codec: str = DEFAULT_CODEC, level: Optional[int] = None) -> Path:
+    """CSV を .f1z に圧縮して保存"""
+    path = Path(path)
+    out_path = Path(out_path) if out_path else path.with_suffix(ARCHIVE_SUFFIX)
+    compress, _, default_level = CODECS[codec]
+    level = default_level if level is None else level
+
+    header, numeric, text = _read_csv(path)
+    fmt = detect_format(header)
+    rows = len(next(iter(numeric.values()), ())) if numeric else len(next(iter(text.values()), ()))
+    table, _ = normalize(numeric, fmt, copy=True)
+    bounds = _chunk_bounds(table, rows)
+    needed = [name for name in _STRUCTURAL_COLUMNS if name in table]
+
+    chunks = []
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_path, 'wb') as f:
+        f.write(ARCHIVE_MAGIC)
+        for start, end in bounds:
+            columns, parts = {}, []
+            for name, values in numeric.items():
+                meta, data = encode_column(values[start:end])
+                meta['size'] = len(data)
+                columns[name] = meta
+                parts.append(data)
+            for name, values in text.items():
+                data = json.dumps(values[start:end], ensure_ascii=False).encode('utf-8')
+                columns[name] = {'n': end - start, 'encoding': 'text', 'size': len(data)}
+                parts.append(data)
+            blob = compress(b''.join(parts), level)
+            chunk = {'rows': [start, end], 'offset': f.tell(), 'size': len(blob), 'columns': columns}
+            # ラップのメタデータ (公式タイムと完走判定には次の周の先頭行が要るので書き込み時に決めておく)
+            if 'lap_number' in table:
+                laps = extract_laps({name: table[name][start:min(end + 1, rows)] for name in needed}, channels=())
+                if laps:
+                    chunk['lap'] = {'number': laps[0].number, 'lap_time': laps[0].lap_time,
+                                    'complete': laps[0].complete}
+            chunks.append(chunk)
+            f.write(blob)
+
+        index = {
+            'source': path.name, 'track': track_name_from_path(path), 'format': fmt.name,
+            'header': header, 'rows': rows, 'codec': codec, 'source_size': path.stat().st_size,
+            'chunks': chunks,
+        }
+        index_blob = zlib.compress(json.dumps(index, ensure_ascii=False).encode('utf-8'), 9)
+        f.write(index_blob)
+        f.write(_FOOTER.pack(len(index_blob), ARCHIVE_MAGIC))
+    return out_path
+
+
+# ==================== 読み込み ====================
+
+def find_archive(path) -> Optional[Path]:
+    """CSV のアーカイブ (同じフォルダの <stem>.f1z か、archive/<stem>.f1z) があればそのパス"""
+    path = Path(path)
+    for candidate in (path.with_suffix(ARCHIVE_SUFFIX), path.parent / ARCHIVE_DIR.name / (path.stem + ARCHIVE_SUFFIX)):
+        if candidate.exists():
+            return candidate
+    return None
+
+
+class ArchivedSession:
+    """.f1z の読み込み (インデックスだけ先に読み、チャンクは必要な時に展開)"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            if f.read(len(ARCHIVE_MAGIC)) != ARCHIVE_MAGIC:
+                raise ValueError(f"アーカイブの形式が違います: {self.path}")
+            f.seek(-_FOOTER.size, os.SEEK_END)
+            index_size, magic = _FOOTER.unpack(f.read(_FOOTER.size))
+            if magic != ARCHIVE_MAGIC:
+                raise ValueError(f"アーカイブが途中で切れています: {self.path}")
+            f.seek(-_FOOTER.size - index_size, os.SEEK_END)
+            self.index = json.loads(zlib.decompress(f.read(index_size)))
+        self.chunks: List[Dict] = self.index['chunks']
+        self._decompress = CODECS[self.index['codec']][1]
+
+    @property
+    def format(self) -> str:
+        return self.index['format']
+
+    def laps(self) -> List[Dict]:
+        """チャンクごとのラップのメタデータ [{'chunk', 'number', 'lap_time', 'complete'}, ...]"""
+        return [{'chunk': k, **chunk['lap']} for k, chunk in enumerate(self.chunks) if 'lap' in chunk]
+
+    def read_chunk(self, k: int, names: Optional[Sequence[str]] = None, text: bool = False) -> Dict:
+        """チャンク k の列 (CSV の列名 -> 数値配列、text=True なら文字列の列も)"""
+        chunk = self.chunks[k]
+        with open(self.path, 'rb') as f:
+            f.seek(chunk['offset'])
+            data = self._decompress(f.read(chunk['size']))
+        columns = {}
+        offset = 0
+        for name, meta in chunk['columns'].items():
+            part = data[offset:offset + meta['size']]
+            offset += meta['size']
+            if names is not None and name not in names:
+                continue
+            if meta['encoding'] == 'text':
+                if text:
+                    columns[name] = json.loads(part)
+            else:
+                columns[name] = decode_column(meta, part)
+        return columns
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """全チャンクをつないだ正規化済みの列 (load_columns と同じ)"""
+        parts = [self.read_chunk(k) for k in range(len(self.chunks))]
+        if not parts:
+            return {}
+        raw = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+        return normalize(raw, self.format, copy=False)[0]
+
+    def lap(self, number: int) -> Lap:
+        """周回番号のラップ (そのチャンクだけ展開、フラッシュバックで複数あれば完走した最後のもの)"""
+        matches = [lap for lap in self.laps() if lap['number'] == number]
+        if not matches:
+            raise KeyError(f"{self.path.name} に Lap {number} がありません")
+        return self.chunk_lap(([lap for lap in matches if lap['complete']] or matches)[-1]['chunk'])
+
+    def chunk_lap(self, k: int) -> Lap:
+        """チャンク k のラップ (タイムと完走判定は書き込み時のメタデータ)"""
+        meta = self.chunks[k].get('lap')
+        if meta is None:
+            raise ValueError(f"ラップのチャンクではありません: {self.path.name} #{k}")
+        table, _ = normalize(self.read_chunk(k), self.format, copy=False)
+        channels = [name for name in table if name not in _STRUCTURAL_COLUMNS]
+        laps = extract_laps(table, channels=channels, session=self.index['source'])
+        if not laps:
+            raise ValueError(f"ラップを読み込めません: {self.path.name} Lap {meta['number']}")
+        lap = laps[0]
+        lap.lap_time = meta['lap_time']
+        lap.complete = meta['complete']
+        return lap
+
+    @property
+    def ratio(self) -> float:
+        """元の CSV に対する圧縮率"""
+        return self.index['source_size'] / self.path.stat().st_size
+
+    def __repr__(self):
+        return (
+            f"ArchivedSession({self.path.name}, rows={self.index['rows']}, chunks={len(self.chunks)}, "
+            f"{self.ratio:.1f}x)"
+        )
+
+
+def verify_archive(source, archive) -> bool:
+    """アーカイブを展開した数値・文字列が元の CSV と同じか"""
+    _, numeric, text = _read_csv(source)
+    session = ArchivedSession(archive)
+    parts = [session.read_chunk(k, text=True) for k in range(len(session.chunks))]
+    for name, values in numeric.items():
+        restored = np.concatenate([part[name] for part in parts]) if parts else np.empty(0)
+        if not np.array_equal(values, restored, equal_nan=True):
+            return False
+    for name, values in text.items():
+        if [v for part in parts for v in part[name]] != values:
+            return False
+    return True
+
+
+def _archive_output(path, out_dir: Optional[Path]) -> Path:
+    """アーカイブの出力先 (out_dir がなければ CSV のフォルダの archive/)"""
+    path = Path(path)
+    folder = Path(out_dir) if out_dir is not None else path.parent / ARCHIVE_DIR.name
+    return folder / (path.stem + ARCHIVE_SUFFIX)
+
+
+def _archive_job(path: str, out_dir: Optional[str], codec: str, remove: bool) -> Tuple[str, Dict]:
+    try:
+        output = archive_session(path, _archive_output(path, out_dir), codec=codec)
+        if not verify_archive(path, output):
+            output.unlink()
+            return path, {'error': "展開した値が元の CSV と一致しません"}
+        result = {'output': str(output), 'source_size': ArchivedSession(output).index['source_size'],
+                  'size': output.stat().st_size}
+        if remove:
+            # 消した CSV は find_archive で引けるアーカイブから読むので、引けない出力先なら残す
+            found = find_archive(path)
+            if found is not None and found.resolve() == output.resolve():
+                os.remove(path)
+                result['removed'] = True
+            else:
+                result['kept'] = "出力先が CSV の隣でも archive/ でもないので CSV を残しました"
+        return path, result
+    except (ValueError, OSError) as e:
+        return path, {'error': str(e)}
+
+
+def archive_directory(
+    paths: Sequence,
+    out_dir: Optional[Path] = None,
+    codec: str = DEFAULT_CODEC,
+    workers: Optional[int] = None,
+    refresh: bool = False,
+    remove: bool = False,
+) -> Dict[str, Dict]:
+    """セッション群を並列に圧縮 (展開して元と一致したものだけ残す)
+
+    out_dir を省くと各 CSV のフォルダの archive/ (telemetry_data なら ARCHIVE_DIR) に保存する。
+
+    remove=True なら一致したセッションの CSV を消す (find_archive で引ける出力先の時だけ)。
+    圧縮済みのセッションも、remove なら作り直して確かめてから消す。
+    """
+    def up_to_date(path):
+        output = _archive_output(path, out_dir)
+        return output.exists() and output.stat().st_mtime >= Path(path).stat().st_mtime
+
+    pending = [str(path) for path in paths if refresh or remove or not up_to_date(path)]
+    if workers is None:
+        workers = min(len(pending), os.cpu_count() or 1)
+    args = (pending, [None if out_dir is None else str(out_dir)] * len(pending), [codec] * len(pending), [remove] * len(pending))
+    if workers <= 1 or len(pending) <= 1:
+        results = [_archive_job(*job) for job in zip(*args)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_archive_job, *args))
+    return dict(results)
+
+
+if __name__ == "__main__":
+    print("✓ Cold Storage モジュール読み込み完了")
+    print(f"- 圧縮: {list(CODECS)} (既定 {DEFAULT_CODEC})")
@@ -0,0 +1,298 @@
+"""
+F1 25 Corner Detection & Segmentation
+速度・ブレーキ・ステアリングからコーナー (ブレーキング開始 / エイペックス / 立ち上がり) を検出し、
+サーキットごとのコーナーマップをディスクにキャッシュして、以降のラップは二分探索で一括分割する
+"""
+
+import json
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from .laps import Lap, resample, track_length
+
+
+CACHE_DIR = Path("cache") / "corners"
+CORNER_MAP_VERSION = 1
+
+
+@dataclass
+class CornerDetectionConfig:
+    """検出パラメーター"""
+    grid_step: float = 5.0            # 距離グリッドの間隔 (m)
+    smooth_window: int = 5            # 速度の移動平均 (グリッド点数)
+    min_speed_drop: float = 12.0      # エイペックスとみなす最小の速度低下 (km/h)
+    peak_window: float = 150.0        # 極小判定の前後幅 (m)
+    brake_threshold: float = 0.1      # ブレーキ ON とみなす入力
+    steer_threshold: float = 0.08     # 直進に戻ったとみなすステアリング量
+    lookback: float = 400.0           # ブレーキング開始を探す範囲 (m)
+    cluster_gap: float = 80.0         # 同じコーナーとまとめるエイペックス間距離 (m)
+    min_support: float = 0.5          # コーナーとして採用する検出率 (ラップ数比)
+
+
+@dataclass
+class Corner:
+    """コーナー 1 つ分 (距離はすべて lap_distance, m)"""
+    number: int
+    entry: float      # ブレーキング開始 (または減速開始)
+    apex: float       # 最低速度地点
+    exit: float       # 立ち上がり (直進に戻る / 再加速のピーク)
+    support: float = 1.0   # 検出されたラップの割合
+
+
+@dataclass
+class CornerMap:
+    """サーキット 1 つ分のコーナーマップ"""
+    track: str
+    track_length: float
+    corners: List[Corner] = field(default_factory=list)
+    laps_used: int = 0
+    version: int = CORNER_MAP_VERSION
+
+    @property
+    def boundaries(self) -> np.ndarray:
+        """[entry0, exit0, entry1, exit1, ...] (二分探索用、昇順)"""
+        edges = np.array([[c.entry, c.exit] for c in self.corners], dtype=np.float64)
+        return edges.reshape(-1)
+
+    def segment(self, distance: np.ndarray) -> np.ndarray:
+        """各サンプルが属するコーナー番号 (コーナー外は -1) を一括で返す"""
+        position = np.searchsorted(self.boundaries, np.asarray(distance), side='right')
+        inside = (position % 2) == 1
+        return np.where(inside, position // 2, -1)
+
+    def save(self, cache_dir: Path = CACHE_DIR) -> Path:
+        """JSON でキャッシュに保存"""
+        cache_dir = Path(cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        path = cache_dir / f"{self.track}.json"
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(asdict(self), f, ensure_ascii=False, indent=2)
+        return path
+
+    @classmethod
+    def load(cls, track: str, cache_dir: Path = CACHE_DIR) -> Optional['CornerMap']:
+        """キャッシュから読み込み (なければ / 古い形式なら None)"""
+        path = Path(cache_dir) / f"{track}.json"
+        if not path.exists():
+            return None
+        with open(path, encoding='utf-8') as f:
+            raw = json.load(f)
+        if raw.get('version') != CORNER_MAP_VERSION:
+            return None
+        raw['corners'] = [Corner(**c) for c in raw['corners']]
+        return cls(**raw)
+
+    def __repr__(self):
+        return f"CornerMap({self.track}, {len(self.corners)} corners, laps={self.laps_used})"
+
+
+def _moving_average(values: np.ndarray, window: int) -> np.ndarray:
+    """端を保った移動平均"""
+    if window <= 1:
+        return values
+    kernel = np.ones(window) / window
+    padded = np.pad(values, (window // 2, window - 1 - window // 2), mode='edge')
+    return np.convolve(padded, kernel, mode='valid')
+
+
+def detect_corners(lap: Lap, config: Optional[CornerDetectionConfig] = None) -> np.ndarray:
+    """1 ラップからコーナー候補を検出
+
+    Returns:
+        (n, 3) 配列: 各行が [entry, apex, exit] の距離 (m)
+    """
+    config = config if config is not None else CornerDetectionConfig()
+    if 'speed_kph' not in lap.channels or len(lap) < 10:
+        return np.empty((0, 3))
+
+    grid = np.arange(lap.distance[0], lap.distance[-1], config.grid_step)
+    names = [n for n in ('speed_kph', 'brake', 'steering') if n in lap.channels]
+    sampled = resample(lap, grid, names)
+    speed = _moving_average(sampled['speed_kph'], config.smooth_window)
+    brake = sampled.get('brake', np.zeros(len(grid)))
+    steer = np.abs(sampled.get('steering', np.zeros(len(grid))))
+
+    # 前後 peak_window の範囲で最小の点をエイペックス候補にする
+    half = max(1, int(config.peak_window / config.grid_step))
+    if len(speed) <= 2 * half:
+        return np.empty((0, 3))
+    padded = np.pad(speed, half, mode='edge')
+    windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * half + 1)
+    is_min = (speed <= windows.min(axis=1)) & (speed < np.roll(speed, 1))
+    # 速度低下量 (前後の最大速度 - 最低速度) で足切り
+    drop = np.minimum(windows[:, :half].max(axis=1), windows[:, half + 1:].max(axis=1)) - speed
+    apex = np.flatnonzero(is_min & (drop >= config.min_speed_drop))
+    if len(apex) == 0:
+        return np.empty((0, 3))
+
+    # ブレーキング開始: エイペックス手前で最後にブレーキが入った点
+    # (ブレーキなしのコーナーは手前の速度ピークを減速開始とする)
+    lookback = int(config.lookback / config.grid_step)
+    before = np.maximum(apex - lookback, 0)
+    entry = np.array([b + np.argmax(speed[b:a + 1]) for b, a in zip(before, apex)])
+    onsets = np.flatnonzero(np.diff((brake > config.brake_threshold).astype(np.int8)) == 1) + 1
+    if len(onsets):
+        k = np.searchsorted(onsets, apex, side='right') - 1
+        onset = onsets[np.maximum(k, 0)]
+        entry = np.where((k >= 0) & (onset >= before), onset, entry)
+
+    # 立ち上がり: 次の速度ピークと、ステアリングが直進に戻った点の早い方
+    after = np.minimum(apex + lookback, len(speed) - 1)
+    exit_ = np.array([a + np.argmax(speed[a:e + 1]) for a, e in zip(apex, after)])
+    if 'steering' in sampled:
+        straight = np.flatnonzero(steer < config.steer_threshold)
+        if len(straight):
+            s = np.searchsorted(straight, apex, side='right')
+            straight_after = straight[np.minimum(s, len(straight) - 1)]
+            exit_ = np.where(s < len(straight), np.minimum(exit_, straight_after), exit_)
+    exit_ = np.clip(exit_, apex + 1, len(grid) - 1)
+
+    return np.column_stack((grid[entry], grid[apex], grid[exit_]))
+
+
+def build_corner_map(
+    track: str,
+    laps: Sequence[Lap],
+    config: Optional[CornerDetectionConfig] = None,
+) -> CornerMap:
+    """複数ラップの検出結果をまとめて安定したコーナーマップを作る"""
+    config = config if config is not None else CornerDetectionConfig()
+    laps = [lap for lap in laps if lap.complete] or list(laps)
+    detections = [detect_corners(lap, config) for lap in laps]
+    found = np.concatenate([d for d in detections if len(d)] or [np.empty((0, 3))])
+    corner_map = CornerMap(track=track, track_length=track_length(laps), laps_used=len(laps))
+    if len(found) == 0:
+        return corner_map
+
+    # エイペックス距離でソートして、間隔が cluster_gap を超える所で区切る
+    found = found[np.argsort(found[:, 1])]
+    split = np.flatnonzero(np.diff(found[:, 1]) > config.cluster_gap) + 1
+    clusters = np.split(found, split)
+
+    for cluster in clusters:
+        support = len(cluster) / len(laps)
+        if support < config.min_support:
+            continue
+        entry, apex, exit_ = np.median(cluster, axis=0)
+        if corner_map.corners and entry < corner_map.corners[-1].exit:
+            # 前のコーナーの立ち上がりと重なる場合は中間で区切る
+            previous = corner_map.corners[-1]
+            boundary = float(np.clip(
+                (previous.exit + entry) / 2,
+                previous.apex + config.grid_step,
+                apex - config.grid_step,
+            ))
+            previous.exit = round(boundary, 1)
+            entry = boundary
+        if not entry < apex < exit_:
+            continue
+        corner_map.corners.append(Corner(
+            number=len(corner_map.corners) + 1,
+            entry=round(float(entry), 1),
+            apex=round(float(apex), 1),
+            exit=round(float(exit_), 1),
+            support=round(min(support, 1.0), 3),
+        ))
+    return corner_map
+
+
+def get_corner_map(
+    track: str,
+    laps: Sequence[Lap],
+    cache_dir: Path = CACHE_DIR,
+    refresh: bool = False,
+    config: Optional[CornerDetectionConfig] = None,
+) -> CornerMap:
+    """キャッシュがあれば読み込み、なければ laps から作って保存"""
+    if not refresh:
+        cached = CornerMap.load(track, cache_dir)
+        if cached is not None:
+            return cached
+    corner_map = build_corner_map(track, laps, config)
+    if corner_map.corners:
+        corner_map.save(cache_dir)
+    return corner_map
+
+
+@dataclass
+class CornerMetrics:
+    """ラップ × コーナーの指標 (すべて 2 次元配列: [lap, corner])"""
+    lap_numbers: np.ndarray
+    sessions: List[str]
+    entry_speed: np.ndarray     # km/h
+    min_speed: np.ndarray       # km/h
+    exit_speed: np.ndarray      # km/h
+    corner_time: np.ndarray     # entry -> exit の所要時間 (s)
+    time_lost: np.ndarray       # 全ラップ中の最速との差 (s)
+
+    def to_frame(self):
+        """ロング形式の DataFrame に変換"""
+        import pandas as pd
+
+        n_laps, n_corners = self.corner_time.shape
+        return pd.DataFrame({
+            'session': np.repeat(self.sessions, n_corners),
+            'lap': np.repeat(self.lap_numbers, n_corners),
+            'corner': np.tile(np.arange(1, n_corners + 1), n_laps),
+            'entry_speed': self.entry_speed.reshape(-1),
+            'min_speed': self.min_speed.reshape(-1),
+            'exit_speed': self.exit_speed.reshape(-1),
+            'corner_time': self.corner_time.reshape(-1),
+            'time_lost': self.time_lost.reshape(-1),
+        })
+
+
+def corner_metrics(corner_map: CornerMap, laps: Sequence[Lap]) -> CornerMetrics:
+    """全ラップのコーナー別指標をまとめて計算"""
+    n_corners = len(corner_map.corners)
+    entries = np.array([c.entry for c in corner_map.corners])
+    exits = np.array([c.exit for c in corner_map.corners])
+    shape = (len(laps), n_corners)
+    entry_speed = np.full(shape, np.nan)
+    min_speed = np.full(shape, np.nan)
+    exit_speed = np.full(shape, np.nan)
+    corner_time = np.full(shape, np.nan)
+
+    for i, lap in enumerate(laps):
+        if n_corners == 0 or 'speed_kph' not in lap.channels:
+            continue
+        distance, speed = lap.distance, lap.channels['speed_kph']
+        # ラップが走っていない区間のコーナーは NaN のまま
+        covered = (entries >= distance[0]) & (exits <= distance[-1])
+        entry_speed[i] = np.where(covered, np.interp(entries, distance, speed), np.nan)
+        exit_speed[i] = np.where(covered, np.interp(exits, distance, speed), np.nan)
+        corner_time[i] = np.where(
+            covered,
+            np.interp(exits, distance, lap.time) - np.interp(entries, distance, lap.time),
+            np.nan,
+        )
+        # 区間最小は reduceat でまとめて (空区間は補間値で代用)
+        bounds = np.searchsorted(distance, corner_map.boundaries)
+        segment_min = np.minimum.reduceat(
+            np.append(speed, np.inf), np.minimum(bounds, len(speed))
+        )[::2]
+        empty = bounds[1::2] <= bounds[::2]
+        min_speed[i] = np.where(
+            covered,
+            np.minimum(np.where(empty, np.inf, segment_min), np.minimum(entry_speed[i], exit_speed[i])),
+            np.nan,
+        )
+
+    with np.errstate(invalid='ignore'):
+        best = np.nanmin(corner_time, axis=0) if len(laps) else np.full(n_corners, np.nan)
+    return CornerMetrics(
+        lap_numbers=np.array([lap.number for lap in laps]),
+        sessions=[lap.session for lap in laps],
+        entry_speed=entry_speed,
+        min_speed=min_speed,
+        exit_speed=exit_speed,
+        corner_time=corner_time,
+        time_lost=corner_time - best,
+    )
+
+
+if __name__ == "__main__":
+    print("✓ Corners モジュール読み込み完了")
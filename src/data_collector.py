@@ -4,33 +4,100 @@ Packet を受け符わせて CSV に保存する
 """
 
 import csv
+import os
+from collections import defaultdict
 from pathlib import Path
 from datetime import datetime
-from typing import List, Optional
+from typing import Callable, List, Optional
 
+import numpy as np
+
+from .frame_buffer import FrameReorderBuffer, asof_join
+from .events import EventRecorder
+from .incidents import IncidentDetector
+from .lap_index import LapIndex, SessionHistoryRecorder
+from .normalization import FLAGS_COLUMN, INGEST_FORMAT, normalize
 from .packet_parser import PacketParser, PacketType
-from .telemetry_packets import LapDataPacket, CarTelemetryPacket
+from .race_analytics import RaceTracker
+from .rollup import SessionRollup
+from .session_table import SessionTable
+from .telemetry_packets import (
+    CarDamagePacket, CarStatusPacket, CarTelemetryPacket, LapDataPacket, MotionExPacket, MotionPacket,
+)
+
+
+# Car Status / Car Damage をフレームに付ける時の最大の古さ (s)
+STATUS_MAX_AGE = 2.0
+
+# 出力 CSV の列 (normalization の collector_v2 形式)
+CSV_COLUMNS = [
+    'Frame', 'SessionTime(s)', 'Speed(km/h)', 'Throttle', 'Brake', 'Steer',
+    'Gear', 'RPM', 'DRS', 'BrakesTemp(C)', 'TyresTemp(C)', 'TyresPressure(kPa)',
+    'LapNum', 'LapTime(ms)', 'LastLapTime(ms)', 'Sector1(ms)', 'Sector2(ms)',
+    'LapDistance(m)', 'TotalDistance(m)', 'CarPosition', 'QualityFlags',
+    'PosX(m)', 'PosY(m)', 'PosZ(m)',
+    'FuelInTank(kg)', 'FuelRemainingLaps', 'ERSStore(MJ)', 'ERSDeployedLap(MJ)',
+    'ERSHarvestedLap(MJ)', 'ERSMode', 'TyreCompound', 'TyreAge(laps)',
+    'TyreWearRL(%)', 'TyreWearRR(%)', 'TyreWearFL(%)', 'TyreWearFR(%)',
+]
+
+
+def _file_stamp(path) -> List[float]:
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime]
+
+
+def _fmt(value: float, spec: str) -> str:
+    """CSV 用の数値整形 (欠損は空欄)"""
+    return "" if value != value else format(value, spec)
 
 
 class TelemetryDataCollector:
     """F1 25 Telemetry データを収集して CSV に保存"""
     
-    def __init__(self, output_dir: str = "data", player_car_index: int = 0):
+    def __init__(self, output_dir: str = "data", player_car_index: int = 0, reorder_capacity: int = 32,
+                 lap_index_path: Optional[Path] = None):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
         self.player_car_index = player_car_index
+        # 保存時に .laps.npz を取り込む索引 (None なら取り込まない、`laps` コマンドが後から sidecar を取り込む)
+        self.lap_index_path = lap_index_path
+        
+        # 確定したフレームを列ごとに追記 (reorder バッファから確定した順 = frame 昇順)
+        self.table = SessionTable()
+        # 時間軸・距離軸の min / max / mean のピラミッド (CSV と一緒に .rollup.npz に保存)
+        self.rollup = SessionRollup()
+        # motion_ex はインシデント検出だけに使う (table には列がないので入らない)
+        self.reorder = FrameReorderBuffer(
+            slots=['lap_data', 'telemetry', 'motion', 'status', 'damage', 'motion_ex'],
+            capacity=reorder_capacity,
+            on_release=self._on_frame_released,
+        )
         
-        # ティメトリーデータを上佳の頵序で阳上げる
-        self.frame_data = {}
+        # 全車の Lap Data (ギャップ・順位変動・ピット) を車 × ラップ の配列に蓄積
+        self.race = RaceTracker()
+        # Event パケット (ペナルティ・SC・ファステストなど) のタイムライン
+        self.events = EventRecorder()
+        # Session History (ゲームが確定したラップ・セクタータイム) とサーキット・天候・チーム
+        self.lap_history = SessionHistoryRecorder()
+        # ロックアップ・ホイールスピン・コースアウト (Motion Ex のスリップ率 + 入力・路面、.incidents.npy に保存)
+        # 受信順ではなく確定フレーム (frame_id 順) で流す
+        self.incidents = IncidentDetector()
         
-        # 託費リクエスト
-        self.lap_data_frames = set()
-        self.car_telemetry_frames = set()
+        # 受理した Packet ごとに呼ぶハンドラー (live delta など): PacketType -> [callback(header, data)]
+        self.handlers = defaultdict(list)
+        # reorder バッファから確定したフレームを受け取るハンドラー (live server など): [callback(frame)]
+        self.frame_handlers = []
         
         # 統計
+        self.normalization_report = None
         self.total_packets = 0
         self.lap_data_count = 0
         self.car_telemetry_count = 0
+        self.motion_count = 0
+        self.status_count = 0
+        self.damage_count = 0
+        self.motion_ex_count = 0
     
     def process_packet(self, data: bytes) -> bool:
         """UDP Packet を受け取り、データを抽出"""
@@ -44,29 +111,64 @@ class TelemetryDataCollector:
             
             frame_id = header.frame_identifier
             
-            # Frame ごとの辞書を初期化
-            if frame_id not in self.frame_data:
-                self.frame_data[frame_id] = {
-                    'frame_id': frame_id,
-                    'timestamp': header.session_time,
-                    'lap_data': None,
-                    'telemetry': None,
-                }
-            
-            # Packet Type ごとに処理
+            # Packet Type ごとに処理 (重複・遅延は reorder バッファが弾く)
             if header.packet_type == PacketType.LAP_DATA:
                 lap_data = LapDataPacket.parse_lap_data(data, self.player_car_index)
                 if lap_data:
-                    self.frame_data[frame_id]['lap_data'] = lap_data
-                    self.lap_data_count += 1
-                    self.lap_data_frames.add(frame_id)
+                    status = self.reorder.push(frame_id, 'lap_data', lap_data, header.session_time)
+                    if status == FrameReorderBuffer.ACCEPTED:
+                        self.lap_data_count += 1
+                        self.race.push(header, data)
+                        self.events.update_position(lap_data.current_lap_num, lap_data.lap_distance)
+                        self._dispatch(header, lap_data)
             
             elif header.packet_type == PacketType.CAR_TELEMETRY:
                 telemetry = CarTelemetryPacket.parse_car_telemetry(data, self.player_car_index)
                 if telemetry:
-                    self.frame_data[frame_id]['telemetry'] = telemetry
-                    self.car_telemetry_count += 1
-                    self.car_telemetry_frames.add(frame_id)
+                    status = self.reorder.push(frame_id, 'telemetry', telemetry, header.session_time)
+                    if status == FrameReorderBuffer.ACCEPTED:
+                        self.car_telemetry_count += 1
+                        self._dispatch(header, telemetry)
+            
+            elif header.packet_type == PacketType.MOTION:
+                motion = MotionPacket.parse_car_motion(data, self.player_car_index)
+                if motion:
+                    status = self.reorder.push(frame_id, 'motion', motion, header.session_time)
+                    if status == FrameReorderBuffer.ACCEPTED:
+                        self.motion_count += 1
+                        self._dispatch(header, motion)
+            
+            elif header.packet_type == PacketType.MOTION_EX:
+                motion_ex = MotionExPacket.parse_motion_ex(data)
+                if motion_ex:
+                    status = self.reorder.push(frame_id, 'motion_ex', motion_ex, header.session_time)
+                    if status == FrameReorderBuffer.ACCEPTED:
+                        self.motion_ex_count += 1
+                        self._dispatch(header, motion_ex)
+            
+            elif header.packet_type == PacketType.EVENT:
+                if self.events.push(header, data):
+                    self._dispatch(header, data)
+            
+            elif header.packet_type in (PacketType.SESSION_HISTORY, PacketType.SESSION, PacketType.PARTICIPANTS):
+                if self.lap_history.push(header, data):
+                    self._dispatch(header, data)
+            
+            elif header.packet_type == PacketType.CAR_STATUS:
+                status_data = CarStatusPacket.parse_car_status(data, self.player_car_index)
+                if status_data:
+                    status = self.reorder.push(frame_id, 'status', status_data, header.session_time)
+                    if status == FrameReorderBuffer.ACCEPTED:
+                        self.status_count += 1
+                        self._dispatch(header, status_data)
+            
+            elif header.packet_type == PacketType.CAR_DAMAGE:
+                damage = CarDamagePacket.parse_car_damage(data, self.player_car_index)
+                if damage:
+                    status = self.reorder.push(frame_id, 'damage', damage, header.session_time)
+                    if status == FrameReorderBuffer.ACCEPTED:
+                        self.damage_count += 1
+                        self._dispatch(header, damage)
             
             return True
         
@@ -74,59 +176,165 @@ class TelemetryDataCollector:
             print(f"エラー: Packet 処理失敗 - {e}")
             return False
     
+    def add_handler(self, packet_type: PacketType, callback: Callable):
+        """受理した Packet (重複・遅延を除く) を受け取るハンドラーを登録"""
+        self.handlers[packet_type].append(callback)
+    
+    def _dispatch(self, header, data):
+        """登録されたハンドラーを呼ぶ"""
+        for callback in self.handlers.get(header.packet_type, ()):
+            callback(header, data)
+    
+    def add_frame_handler(self, callback: Callable):
+        """確定したフレーム (frame_id 昇順、各スロットは解析済み) を受け取るハンドラーを登録"""
+        self.frame_handlers.append(callback)
+    
+    def _on_frame_released(self, frame: dict):
+        """reorder バッファから確定したフレームを順番に受け取る"""
+        # フラッシュバックで同じ frame_id が再来した場合は table が後の行だけを有効にする
+        self.table.append(frame)
+        self.rollup.add_frame(frame)
+        self.incidents.on_frame(frame)
+        for callback in self.frame_handlers:
+            callback(frame)
+    
+    def flush(self):
+        """バッファに残っているフレームをすべて確定する"""
+        self.reorder.flush()
+    
     def save_to_csv(self, filename: Optional[str] = None) -> Path:
         """CSV ファイルに保存"""
+        self.flush()
+        
         if not filename:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"f1_telemetry_{timestamp}.csv"
         
         output_path = self.output_dir / filename
         
-        # 並べ理をポブ粗いを割り形を整理して、佳い出力を生成
+        # 両方のデータが揃ったフレームだけを出力 (table は既に frame 順)
+        table = self.table
+        rows = np.flatnonzero(table.present('lap_data') & table.present('telemetry'))
+        
+        def column(name: str) -> np.ndarray:
+            return table.column(name)[rows]
+        
+        # Motion は同じフレームに届いていれば位置を付ける (なければ NaN = 欠損)
+        status_columns = self._status_columns(rows)
+        
+        # 取り込み時の正規化・範囲チェックを列単位でまとめて適用
+        columns, report = normalize({
+            'speed_kph': column('speed').astype(np.float64),
+            'throttle': column('throttle').astype(np.float64),
+            'brake': column('brake').astype(np.float64),
+            'steering': column('steer').astype(np.float64),
+            'gear': column('gear').astype(np.float64),
+            'rpm': column('engine_rpm').astype(np.float64),
+            'drs': column('drs_open').astype(np.float64),
+            'position_x': column('world_position_x').astype(np.float64),
+            'position_y': column('world_position_y').astype(np.float64),
+            'position_z': column('world_position_z').astype(np.float64),
+        }, INGEST_FORMAT, copy=False)
+        self.normalization_report = report
+        
+        # 4 輪の値: ブレーキは RL、タイヤ温度・空気圧は 4 輪平均
+        brakes = column('brakes_temp')
+        surface = column('tyres_surface_temp').astype(np.int64)
+        pressure = column('tyres_pressure').astype(np.float64)
+        fields = [
+            column('frame_id').tolist(),
+            [f"{t:.3f}" for t in column('timestamp').tolist()],  # session time (s)
+            *[[_fmt(v, spec) for v in columns[name].tolist()] for name, spec in (
+                ('speed_kph', ".0f"), ('throttle', ".3f"), ('brake', ".3f"), ('steering', ".3f"),
+                ('gear', ".0f"), ('rpm', ".0f"), ('drs', ".0f"),
+            )],
+            [f"{v:.1f}" for v in brakes[:, 0].tolist()],
+            [f"{v:.1f}" for v in (surface.sum(axis=1) / 4).tolist()],
+            [f"{v:.1f}" for v in ((0.0 + pressure[:, 0] + pressure[:, 1] + pressure[:, 2] + pressure[:, 3]) / 4).tolist()],
+            column('current_lap_num').tolist(),
+            column('current_lap_time_in_ms').tolist(),
+            column('last_lap_time_in_ms').tolist(),
+            column('sector_1_time_in_ms').tolist(),
+            column('sector_2_time_in_ms').tolist(),
+            [f"{v:.1f}" for v in column('lap_distance').tolist()],
+            [f"{v:.1f}" for v in column('total_distance').tolist()],
+            column('car_position').tolist(),
+            columns[FLAGS_COLUMN].astype(np.int64).tolist(),
+            *[[_fmt(v, ".2f") for v in columns[name].tolist()] for name in ('position_x', 'position_y', 'position_z')],
+            *[[_fmt(v, spec) for v in values.tolist()] for values, spec in status_columns],
+        ]
+        
         with open(output_path, 'w', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
-            
-            # ヘッダー
-            writer.writerow([
-                'Frame', 'Time(s)', 'Speed(km/h)', 'Throttle', 'Brake', 'Steer',
-                'Gear', 'RPM', 'DRS', 'BrakesTemp(C)', 'TyresTemp(C)', 'TyresPressure(kPa)',
-                'LapNum', 'LapTime(ms)', 'LastLapTime(ms)', 'Sector1(ms)', 'Sector2(ms)',
-                'LapDistance(m)', 'TotalDistance(m)', 'CarPosition'
-            ])
-            
-            # データを上佳の頵序で連等ごとに書き込み
-            for frame_id in sorted(self.frame_data.keys()):
-                frame = self.frame_data[frame_id]
-                lap = frame['lap_data']
-                telem = frame['telemetry']
-                
-                # 両方のデータがいれば学習
-                if lap and telem:
-                    writer.writerow([
-                        frame_id,
-                        f"{frame['timestamp'] / 1000:.2f}",  # 空時間 (s)
-                        telem.speed,
-                        f"{telem.throttle:.3f}",
-                        f"{telem.brake:.3f}",
-                        f"{telem.steer:.3f}",
-                        telem.gear,
-                        telem.engine_rpm,
-                        int(telem.drs_open),
-                        f"{telem.brakes_temp[0]:.1f}",  # 前輊の决平
-                        f"{sum(telem.tyres_surface_temp) / 4:.1f}",  # タイヤ温度平均
-                        f"{sum(telem.tyres_pressure) / 4:.1f}",  # タイヤ気圧平均
-                        lap.current_lap_num,
-                        lap.current_lap_time_in_ms,
-                        lap.last_lap_time_in_ms,
-                        lap.sector_1_time_in_ms,
-                        lap.sector_2_time_in_ms,
-                        f"{lap.lap_distance:.1f}",
-                        f"{lap.total_distance:.1f}",
-                        lap.car_position,
-                    ])
+            writer.writerow(CSV_COLUMNS)
+            writer.writerows(zip(*fields))
+        
+        # 全車のレースデータは同じ名前の .race.npz、イベントは .events.npy、インシデントは .incidents.npy に保存
+        race = self.race.history()
+        if len(race.cars):
+            race.save(output_path.with_suffix('.race.npz'))
+        if len(self.events):
+            self.events.timeline().save(output_path.with_suffix('.events.npy'))
+        self.incidents.finish()
+        if self.motion_ex_count or len(self.incidents):
+            np.save(output_path.with_suffix('.incidents.npy'), self.incidents.to_array())
+        # ラップ履歴は .laps.npz に保存し、指定があれば全セッション横断の索引にも追加
+        if len(self.lap_history):
+            history = self.lap_history.history()
+            laps_path = history.save(output_path.with_suffix('.laps.npz'))
+            if self.lap_index_path is not None:
+                with LapIndex(self.lap_index_path) as index:
+                    index.update([laps_path])
+        # 記録中に作ったピラミッドは .rollup.npz (load_rollup が CSV より先に使う)。
+        # フラッシュバックで置き換えられたフレームも入っているので、その時は CSV と同じ行から作り直す
+        if len(rows):
+            if table.rewound:
+                self.rollup = SessionRollup()
+                self.rollup.extend({
+                    **columns,
+                    'session_time': column('timestamp').astype(np.float64),
+                    'total_distance': column('total_distance').astype(np.float64),
+                })
+            self.rollup.save(output_path.with_suffix('.rollup.npz'), stamp=_file_stamp(output_path))
         
         return output_path
     
+    def _status_columns(self, rows: np.ndarray) -> List[tuple]:
+        """Car Status / Car Damage を出力行 (table の行番号) に as-of join した列 [(配列, 書式), ...]
+
+        低頻度のパケットなので、確定順で出力フレーム以前にある最新の値を付ける
+        (STATUS_MAX_AGE 秒より古い値・フラッシュバックをまたぐ値は付けない)。
+        """
+        table = self.table
+        times = table.column('timestamp')
+        
+        def joined(slot: str, values: List[np.ndarray]) -> List[np.ndarray]:
+            samples = np.flatnonzero(table.present(slot))
+            index = asof_join(rows, samples, STATUS_MAX_AGE, times[rows], times[samples])
+            out = np.full((len(rows), len(values)), np.nan)
+            if len(samples):
+                hit = index >= 0
+                out[hit] = np.column_stack([v[samples] for v in values])[index[hit]]
+            return list(out.T)
+        
+        def column(name: str) -> np.ndarray:
+            return table.column(name).astype(np.float64)
+        
+        status = joined('status', [
+            column('fuel_in_tank'),
+            column('fuel_remaining_laps'),
+            column('ers_store_energy') / 1e6,
+            column('ers_deployed_this_lap') / 1e6,
+            (column('ers_harvested_this_lap_mguk') + column('ers_harvested_this_lap_mguh')) / 1e6,
+            column('ers_deploy_mode'),
+            column('visual_tyre_compound'),
+            column('tyres_age_laps'),
+        ])
+        wear = table.column('tyres_wear').astype(np.float64)
+        wear = joined('damage', [wear[:, i] for i in range(4)])
+        specs = [".3f", ".2f", ".4f", ".4f", ".4f", ".0f", ".0f", ".0f"] + [".2f"] * 4
+        return list(zip(status + wear, specs))
+    
     def print_stats(self):
         """収集情報を出力"""
         print(f"\n{'='*60}")
@@ -135,8 +343,18 @@ class TelemetryDataCollector:
         print(f"総 Packet 数: {self.total_packets}")
         print(f"Lap Data Packet: {self.lap_data_count}")
         print(f"Car Telemetry Packet: {self.car_telemetry_count}")
-        print(f"総フレーム数: {len(self.frame_data)}")
-        print(f"完全なデータ (Lap + Telemetry): {len(self.lap_data_frames & self.car_telemetry_frames)}")
+        print(f"Motion Packet: {self.motion_count}")
+        print(f"Car Status Packet: {self.status_count}")
+        print(f"Car Damage Packet: {self.damage_count}")
+        print(f"Motion Ex Packet: {self.motion_ex_count}")
+        print(f"Event: {len(self.events)}")
+        print(f"インシデント: {len(self.incidents)}")
+        print(f"総フレーム数: {len(self.table) + len(self.reorder)}")
+        print(f"重複 Packet (破棄): {self.reorder.duplicate_count}")
+        print(f"遅延 Packet (確定済みフレーム宛): {self.reorder.late_count}")
+        print(f"完全なデータ (Lap + Telemetry): {int(np.count_nonzero(self.table.present('lap_data') & self.table.present('telemetry')))}")
+        if self.normalization_report and self.normalization_report.repaired:
+            print(f"範囲外の値 (修復済み): {self.normalization_report.repaired}")
         print(f"上佳値輹出ディレクトリ: {self.output_dir.absolute()}")
         print(f"{'='*60}\n")
 
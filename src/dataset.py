@@ -0,0 +1,406 @@
+"""
+F1 25 Telemetry Dataset
+保存済みセッションのフォルダを、ラップ単位で必要な時だけ読み込むデータセットとして扱う
+
+セッションとラップの一覧はメタデータ (ラップごとの行範囲とファイル内のバイト位置) だけで作り、
+cache/dataset/ に保存する。ラップの配列は初めて見た時にそのバイト範囲だけを読んでデコードし、
+メモリ上限付きの LRU キャッシュに置く。何百セッションあっても、実際に見たラップの分しかメモリを使わない。
+CSV を消して .f1z (cold_storage) だけ残したセッションは、アーカイブのラップ単位のチャンクから読む。
+
+ds = TelemetryDataset('telemetry_data')
+for info in ds.laps(track='monza', complete_only=True):
+    lap = ds.lap(info)          # 2 回目以降はキャッシュから
+"""
+
+import json
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .cold_storage import ARCHIVE_DIR, ARCHIVE_SUFFIX, ArchivedSession, find_archive
+from .laps import Lap, extract_laps, track_name_from_path
+from .normalization import FLAGS_COLUMN, detect_format, normalize, read_column_range, read_columns, read_header
+
+
+CACHE_DIR = Path("cache") / "dataset"
+
+# メタデータの形式を変えたら上げる
+INDEX_VERSION = 1
+
+# ラップのキャッシュの上限 (bytes)
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+
+# ラップに付けない列 (ラップの区切り・距離・時刻として別に持つもの)
+_STRUCTURAL_COLUMNS = ('lap_number', 'lap_distance', 'last_lap_time_ms', 'lap_time_ms', 'session_time', FLAGS_COLUMN)
+
+
+@dataclass
+class LapInfo:
+    """1 ラップ分のメタデータ (配列は持たない)"""
+    session: str
+    index: int                        # セッション内の通し番号 (フラッシュバックで同じ周回番号が続いても区別する)
+    number: int
+    lap_time: float
+    complete: bool
+    rows: Tuple[int, int]             # データ行の範囲 [start, end) (次の周の先頭行を含む)
+    offsets: Tuple[int, int]          # rows に対応するファイル内のバイト範囲 (.f1z ならチャンク番号 (k, k))
+
+    def __repr__(self):
+        return f"LapInfo({self.session} #{self.number}, time={self.lap_time:.3f}s, complete={self.complete})"
+
+
+@dataclass
+class SessionInfo:
+    """1 セッション分のメタデータ"""
+    name: str
+    path: str
+    track: str
+    format: str
+    rows: int
+    columns: List[str]                # 数値の列 (CSV の列名)
+    laps: List[LapInfo] = field(default_factory=list)
+    stamp: List[float] = field(default_factory=list)    # [サイズ, 更新時刻]
+    version: int = INDEX_VERSION
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, raw: Dict) -> 'SessionInfo':
+        raw = dict(raw)
+        raw['laps'] = [
+            LapInfo(**{**lap, 'rows': tuple(lap['rows']), 'offsets': tuple(lap['offsets'])}) for lap in raw['laps']
+        ]
+        return cls(**raw)
+
+    def __repr__(self):
+        return f"SessionInfo({self.name}, track={self.track}, rows={self.rows}, laps={len(self.laps)})"
+
+
+def _file_stamp(path) -> List[float]:
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime]
+
+
+def _row_offsets(path) -> np.ndarray:
+    """各データ行の先頭のバイト位置 (最後にファイル末尾を付ける)"""
+    with open(path, 'rb') as f:
+        buffer = np.frombuffer(f.read(), dtype=np.uint8)
+    newlines = np.flatnonzero(buffer == ord('\n'))
+    starts = newlines + 1
+    # 末尾の改行の後は行ではない
+    if len(starts) and starts[-1] >= len(buffer):
+        starts = starts[:-1]
+    return np.concatenate((starts, [len(buffer)])).astype(np.int64)
+
+
+def scan_session(path) -> SessionInfo:
+    """ファイルを 1 回読んでラップのメタデータを作る"""
+    path = Path(path)
+    header = read_header(path)
+    fmt = detect_format(header)
+    raw = read_columns(path)
+    table, _ = normalize(raw, fmt, copy=True)
+    rows = len(next(iter(raw.values()), ()))
+    info = SessionInfo(
+        name=path.name, path=str(path), track=track_name_from_path(path), format=fmt.name,
+        rows=rows, columns=list(raw), stamp=_file_stamp(path),
+    )
+    if 'lap_number' not in table or 'lap_distance' not in table or rows == 0:
+        return info
+
+    offsets = _row_offsets(path)[:rows + 1]
+    lap_number = np.asarray(table['lap_number'], dtype=np.float64)
+    change = np.flatnonzero(np.diff(lap_number) != 0) + 1
+    starts = np.concatenate(([0], change))
+    ends = np.concatenate((change, [rows]))
+    needed = [name for name in _STRUCTURAL_COLUMNS if name in table]
+    for start, end in zip(starts, ends):
+        # 公式ラップタイムと完走判定のために次の周の先頭行まで含める (TelemetryDataset.lap と同じ範囲)
+        stop = min(end + 1, rows)
+        laps = extract_laps({name: table[name][start:stop] for name in needed}, channels=(), session=path.name)
+        if not laps:
+            continue
+        lap = laps[0]
+        info.laps.append(LapInfo(
+            session=path.name, index=len(info.laps), number=lap.number, lap_time=lap.lap_time,
+            complete=lap.complete, rows=(int(start), int(stop)),
+            offsets=(int(offsets[start]), int(offsets[stop])),
+        ))
+    return info
+
+
+def scan_archive(path) -> SessionInfo:
+    """.f1z のインデックス (書き込み時のラップのメタデータ) からメタデータを作る (チャンクは展開しない)"""
+    path = Path(path)
+    archive = ArchivedSession(path)
+    index = archive.index
+    info = SessionInfo(
+        name=index['source'], path=str(path), track=index['track'], format=archive.format,
+        rows=index['rows'], columns=list(index['header']), stamp=_file_stamp(path),
+    )
+    for lap in archive.laps():
+        start, end = archive.chunks[lap['chunk']]['rows']
+        info.laps.append(LapInfo(
+            session=info.name, index=len(info.laps), number=lap['number'], lap_time=lap['lap_time'],
+            complete=lap['complete'], rows=(start, min(end + 1, info.rows)), offsets=(lap['chunk'], lap['chunk']),
+        ))
+    return info
+
+
+def _session_paths(source: Path, pattern: str) -> List[Path]:
+    """フォルダの CSV と、CSV を消したセッションのアーカイブ (同じフォルダ / archive/ の .f1z)"""
+    paths = sorted(source.glob(pattern))
+    stems = {path.stem for path in paths}
+    archive_pattern = str(Path(pattern).with_suffix(ARCHIVE_SUFFIX))
+    for folder in (source, source / ARCHIVE_DIR.name):
+        for path in sorted(folder.glob(archive_pattern)):
+            if path.stem not in stems:
+                stems.add(path.stem)
+                paths.append(path)
+    return paths
+
+
+def _lap_bytes(lap: Lap) -> int:
+    return lap.distance.nbytes + lap.time.nbytes + sum(values.nbytes for values in lap.channels.values())
+
+
+class LapCache:
+    """メモリ上限付きの LRU キャッシュ (キー -> Lap)"""
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._items: 'OrderedDict[tuple, Tuple[Lap, int]]' = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Optional[Lap]:
+        item = self._items.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item[0]
+
+    def put(self, key, lap: Lap):
+        if key in self._items:
+            self.bytes -= self._items.pop(key)[1]
+        size = _lap_bytes(lap)
+        self._items[key] = (lap, size)
+        self.bytes += size
+        # 古いものから捨てる (今入れたものは残す)
+        while self.bytes > self.max_bytes and len(self._items) > 1:
+            _, (_, evicted) = self._items.popitem(last=False)
+            self.bytes -= evicted
+
+    def clear(self):
+        self._items.clear()
+        self.bytes = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __repr__(self):
+        return (
+            f"LapCache(laps={len(self)}, {self.bytes / 1e6:.1f}/{self.max_bytes / 1e6:.0f} MB, "
+            f"hits={self.hits}, misses={self.misses})"
+        )
+
+
+class TelemetryDataset:
+    """保存済みセッションのフォルダ (またはファイル群) をラップ単位で遅延読み込みする"""
+
+    def __init__(
+        self,
+        source: Union[str, Path, Sequence] = 'telemetry_data',
+        pattern: str = '*.csv',
+        cache_dir: Path = CACHE_DIR,
+        cache_bytes: int = DEFAULT_CACHE_BYTES,
+        workers: Optional[int] = None,
+    ):
+        if isinstance(source, (str, Path)):
+            self.paths = _session_paths(Path(source), pattern)
+        else:
+            # 消した CSV はアーカイブに置き換える
+            self.paths = [Path(path) if Path(path).exists() else find_archive(path) or Path(path) for path in source]
+        self.cache_dir = Path(cache_dir)
+        self.workers = workers
+        self.cache = LapCache(cache_bytes)
+        self._sessions: Optional[Dict[str, SessionInfo]] = None
+        self.failed: Dict[str, str] = {}
+
+    # ---------- メタデータ ----------
+
+    def _index_path(self, path: Path) -> Path:
+        return self.cache_dir / f"{path.name}.json"
+
+    def _load_index(self, path: Path) -> Optional[SessionInfo]:
+        index_path = self._index_path(path)
+        if not index_path.exists():
+            return None
+        with open(index_path, encoding='utf-8') as f:
+            raw = json.load(f)
+        if raw.get('version') != INDEX_VERSION or raw.get('stamp') != _file_stamp(path):
+            return None
+        return SessionInfo.from_dict(raw)
+
+    def _save_index(self, info: SessionInfo):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(self._index_path(Path(info.path)), 'w', encoding='utf-8') as f:
+            json.dump(info.to_dict(), f, ensure_ascii=False)
+
+    def refresh(self, force: bool = False) -> Dict[str, SessionInfo]:
+        """メタデータを読み込む (キャッシュがない / ファイルが変わったセッションだけスキャン)"""
+        sessions: Dict[Path, SessionInfo] = {}
+        pending = []
+        for path in self.paths:
+            info = None if force else self._load_index(path)
+            if info is None:
+                pending.append(path)
+            else:
+                sessions[path] = info
+
+        workers = self.workers
+        if workers is None:
+            workers = min(len(pending), os.cpu_count() or 1)
+        if workers <= 1 or len(pending) <= 1:
+            scanned = [_scan_job(str(path)) for path in pending]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                scanned = list(pool.map(_scan_job, [str(path) for path in pending]))
+
+        self.failed = {}
+        for path, result in zip(pending, scanned):
+            if isinstance(result, str):
+                self.failed[path.name] = result
+                continue
+            self._save_index(result)
+            sessions[path] = result
+        # 入力の順に並べる (アーカイブもセッション名は元の CSV の名前)
+        self._sessions = {sessions[path].name: sessions[path] for path in self.paths if path in sessions}
+        return self._sessions
+
+    def sessions(self, track: Optional[str] = None) -> List[SessionInfo]:
+        if self._sessions is None:
+            self.refresh()
+        return [info for info in self._sessions.values() if track is None or info.track == track]
+
+    def session(self, name: str) -> SessionInfo:
+        if self._sessions is None:
+            self.refresh()
+        if name not in self._sessions:
+            raise KeyError(f"セッションがありません: {name}")
+        return self._sessions[name]
+
+    def laps(self, session: Optional[str] = None, track: Optional[str] = None,
+             complete_only: bool = False) -> List[LapInfo]:
+        """ラップのメタデータ一覧 (配列は読まない)"""
+        infos = [self.session(session)] if session else self.sessions(track)
+        return [
+            lap for info in infos for lap in info.laps
+            if not complete_only or lap.complete
+        ]
+
+    def best_laps(self, track: Optional[str] = None, n: int = 10, index_path=None, **filters) -> List[LapInfo]:
+        """プレイヤーの速い周 n 件
+
+        .laps.npz (Session History) のあるセッションはラップタイム索引を引き、
+        ないセッションはメタデータの完走ラップのタイムを使う。
+        filters は LapIndex.leaderboard の条件 (compound / weather / session_type / valid_only など)。
+        """
+        from .lap_index import INDEX_PATH, LapIndex
+
+        sessions = self.sessions(track)
+        sidecars = {info.name: Path(info.path).with_suffix('.laps.npz') for info in sessions}
+        indexed = [name for name, path in sidecars.items() if path.exists()]
+        timed = []
+        if indexed:
+            with LapIndex(index_path or INDEX_PATH) as index:
+                index.update([sidecars[name] for name in indexed])
+                entries = index.leaderboard(n=None, player_only=True, sessions=indexed, **filters)
+            for entry in entries:
+                try:
+                    timed.append((entry.lap_time, self._find(entry.session, entry.lap)))
+                except KeyError:
+                    continue
+        timed += [
+            (lap.lap_time, lap) for info in sessions if info.name not in indexed
+            for lap in info.laps if lap.complete and lap.lap_time == lap.lap_time
+        ]
+        timed.sort(key=lambda item: item[0])
+        return [lap for _, lap in timed[:n]]
+
+    def tracks(self) -> Dict[str, int]:
+        """サーキット -> セッション数"""
+        counts: Dict[str, int] = {}
+        for info in self.sessions():
+            counts[info.track] = counts.get(info.track, 0) + 1
+        return counts
+
+    # ---------- ラップの配列 ----------
+
+    def _find(self, session: str, number: int) -> LapInfo:
+        """周回番号から LapInfo (フラッシュバックで複数あれば完走した最後のもの)"""
+        matches = [lap for lap in self.session(session).laps if lap.number == number]
+        if not matches:
+            raise KeyError(f"{session} に Lap {number} がありません")
+        complete = [lap for lap in matches if lap.complete]
+        return (complete or matches)[-1]
+
+    def lap(self, lap: Union[LapInfo, str], number: Optional[int] = None) -> Lap:
+        """ラップの配列 (lap(info) または lap(session, number))、見たことのあるラップはキャッシュから"""
+        info = lap if isinstance(lap, LapInfo) else self._find(lap, number)
+        key = (info.session, info.index)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        loaded = self._read_lap(info)
+        self.cache.put(key, loaded)
+        return loaded
+
+    def _read_lap(self, info: LapInfo) -> Lap:
+        session = self.session(info.session)
+        if Path(session.path).suffix == ARCHIVE_SUFFIX:
+            return ArchivedSession(session.path).chunk_lap(info.offsets[0])
+        header = read_header(session.path)
+        raw = read_column_range(session.path, header, *info.offsets, names=set(session.columns))
+        table, _ = normalize(raw, session.format, copy=False)
+        channels = [name for name in table if name not in _STRUCTURAL_COLUMNS]
+        laps = extract_laps(table, channels=channels, session=info.session)
+        if not laps:
+            raise ValueError(f"ラップを読み込めません: {info}")
+        return laps[0]
+
+    def iter_laps(self, infos: Optional[Sequence[LapInfo]] = None) -> Iterator[Lap]:
+        """ラップを順に読み込む (キャッシュを通す)"""
+        for info in self.laps() if infos is None else infos:
+            yield self.lap(info)
+
+    def __len__(self):
+        return len(self.sessions())
+
+    def __repr__(self):
+        sessions = self._sessions
+        if sessions is None:
+            return f"TelemetryDataset(files={len(self.paths)}, not indexed)"
+        laps = sum(len(info.laps) for info in sessions.values())
+        return f"TelemetryDataset(sessions={len(sessions)}, laps={laps}, cache={self.cache})"
+
+
+def _scan_job(path: str) -> Union[SessionInfo, str]:
+    """ProcessPool 用 (読めないファイルはエラー文字列を返す)"""
+    try:
+        return scan_archive(path) if Path(path).suffix == ARCHIVE_SUFFIX else scan_session(path)
+    except (ValueError, OSError, StopIteration) as e:
+        return f"{type(e).__name__}: {e}"
+
+
+if __name__ == "__main__":
+    print("✓ Telemetry Dataset モジュール読み込み完了")
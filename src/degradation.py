@@ -0,0 +1,410 @@
+"""
+F1 25 Degradation Models
+保存済みセッション全体から、ラップタイム (タイヤ使用周回・燃料) と タイヤ温度 / 空気圧 (周回) の
+劣化カーブを サーキット × コンパウンド (と スティント) ごとに当てはめて保存する
+
+全ラップを 1 つの配列に積み、グループごとの最小二乗は正規方程式を bincount でまとめて作って一括で解く。
+サーキットごとにプロセスプールで並列に処理し、結果は cache/degradation/{track}.json に保存するので、
+戦略用の予測 (project / stint_projection) は保存済みパラメーターの参照と掛け算だけで済む。
+"""
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .laps import extract_laps, track_name_from_path
+from .stints import COMPOUND_NAMES, lap_resources
+
+
+CACHE_DIR = Path("cache") / "degradation"
+
+# モデルの形・サンプルの選び方を変えたら上げる -> 全サーキットを当てはめ直す
+MODEL_VERSION = 1
+
+# lap_time = intercept + tyre_age * 劣化 + fuel * 燃料の重さ
+LAP_TIME_TERMS = ('intercept', 'tyre_age', 'fuel')
+# tyre_temp / tyre_pressure = intercept + tyre_age * 傾き
+TREND_TERMS = ('intercept', 'tyre_age')
+
+# セッションの中央値からこれ以上遅いラップ (インラップ・アウトラップ・ミス) は除く
+OUTLIER_RATIO = 1.07
+
+# 当てはめに使う最小のラップ数
+MIN_LAPS = 3
+
+# タイヤ使用周回と燃料の相関がこれ以上なら、燃料の効果は推定せず固定する
+COLLINEAR_CORR = 0.98
+# 燃料 1 kg あたりのラップタイムの増加 (s/kg) の一般的な目安
+DEFAULT_FUEL_EFFECT = 0.03
+
+
+# ==================== サンプル (セッション -> ラップの配列) ====================
+def _per_lap_mean(values: np.ndarray, lap_number: np.ndarray, numbers: np.ndarray) -> np.ndarray:
+    """lap_number ごとの平均 (欠損は無視)"""
+    valid = ~np.isnan(values) & ~np.isnan(lap_number)
+    index = np.searchsorted(numbers, lap_number[valid])
+    inside = (index < len(numbers)) & (numbers[np.minimum(index, len(numbers) - 1)] == lap_number[valid])
+    sums = np.bincount(index[inside], values[valid][inside], minlength=len(numbers))
+    counts = np.bincount(index[inside], minlength=len(numbers))
+    with np.errstate(invalid='ignore'):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+def session_samples(path) -> Dict[str, np.ndarray]:
+    """1 セッションの完走ラップを 列名 -> 配列 にする (ワーカーから呼ばれる)
+
+    Car Status の列がない古い形式は コンパウンド不明・スティント 1・燃料なし として扱い、
+    タイヤ使用周回はセッション内の周回数で代用する。
+    """
+    from .normalization import load_columns
+
+    path = Path(path)
+    table = load_columns(path)
+    laps = [lap for lap in extract_laps(table, session=path.name, complete_only=True) if lap.lap_time > 0]
+    if not laps:
+        return {}
+    numbers = np.array([lap.number for lap in laps], dtype=np.float64)
+    lap_time = np.array([lap.lap_time for lap in laps])
+
+    resources = lap_resources(table)
+    if resources is not None:
+        index = np.searchsorted(resources.lap, numbers)
+        index = np.minimum(index, len(resources) - 1)
+        found = resources.lap[index] == numbers
+        pick = lambda values: np.where(found, values[index], np.nan)
+        compound = pick(resources.compound)
+        tyre_age = pick(resources.tyre_age)
+        fuel = pick(resources.fuel_end)
+        stint = np.where(found, resources.stint[index], 0)
+    else:
+        compound = np.full(len(laps), np.nan)
+        tyre_age = np.full(len(laps), np.nan)
+        fuel = np.full(len(laps), np.nan)
+        stint = np.ones(len(laps), dtype=np.int64)
+    # タイヤ使用周回がなければセッション内の周回数
+    tyre_age = np.where(np.isnan(tyre_age), numbers - numbers[0], tyre_age)
+
+    lap_number = np.asarray(table['lap_number'], dtype=np.float64)
+    columns = {
+        'lap': numbers,
+        'lap_time': lap_time,
+        'tyre_age': tyre_age,
+        'fuel': fuel,
+        'compound': compound,
+        'stint': stint.astype(np.int64),
+    }
+    for name in ('tyres_temp', 'tyres_pressure'):
+        values = np.asarray(table[name], dtype=np.float64) if name in table else np.full(len(lap_number), np.nan)
+        columns[name] = _per_lap_mean(values, lap_number, numbers)
+
+    keep = lap_time <= np.median(lap_time) * OUTLIER_RATIO
+    return {name: values[keep] for name, values in columns.items()}
+
+
+# ==================== 一括最小二乗 ====================
+def fit_groups(X: np.ndarray, y: np.ndarray, groups: np.ndarray, n_groups: int):
+    """グループごとの最小二乗 y ≈ X @ beta を正規方程式でまとめて解く
+
+    X: (n, k)、y: (n,)、groups: (n,) のグループ番号 (0..n_groups-1)
+    XtX / Xty は bincount で全グループ分を一度に作り、疑似逆行列 (スタック) で解くので、
+    データのない項 (全部 0 の列) は係数 0 になる。
+
+    Returns:
+        (beta (n_groups, k), サンプル数 (n_groups,), RMSE (n_groups,))
+    """
+    n, k = X.shape
+    XtX = np.empty((n_groups, k, k))
+    Xty = np.empty((n_groups, k))
+    for i in range(k):
+        Xty[:, i] = np.bincount(groups, X[:, i] * y, minlength=n_groups)
+        for j in range(i, k):
+            XtX[:, i, j] = XtX[:, j, i] = np.bincount(groups, X[:, i] * X[:, j], minlength=n_groups)
+    beta = np.einsum('gij,gj->gi', np.linalg.pinv(XtX), Xty)
+    count = np.bincount(groups, minlength=n_groups)
+    residual = y - np.einsum('nk,nk->n', X, beta[groups])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rmse = np.sqrt(np.bincount(groups, residual * residual, minlength=n_groups) / count)
+    return beta, count, rmse
+
+
+def _group_index(*keys: np.ndarray):
+    """複数のキー列の組み合わせを 0.. のグループ番号にする"""
+    stacked = np.rec.fromarrays(keys)
+    unique, groups = np.unique(stacked, return_inverse=True)
+    return unique, groups.reshape(-1)
+
+
+def _compound_name(code: float) -> str:
+    if code != code:
+        return 'unknown'
+    return COMPOUND_NAMES.get(int(code), str(int(code)))
+
+
+@dataclass
+class DegradationFit:
+    """1 グループ分の当てはめ結果"""
+    compound: str
+    laps: int
+    lap_time: Dict[str, float]            # LAP_TIME_TERMS -> 係数 (s, s/周, s/kg)
+    lap_time_rmse: float
+    tyre_temp: Dict[str, float] = field(default_factory=dict)       # TREND_TERMS -> 係数 (℃, ℃/周)
+    tyre_pressure: Dict[str, float] = field(default_factory=dict)   # TREND_TERMS -> 係数 (kPa, kPa/周)
+    fuel_per_lap: float = float('nan')    # 燃料消費の中央値 (kg/周)
+    session: str = ''                     # スティント単位の時のみ
+    stint: int = 0
+
+    def lap_time_at(self, tyre_age, fuel=0.0):
+        """タイヤ使用周回・燃料 (kg) でのラップタイム (s)"""
+        c = self.lap_time
+        return c['intercept'] + c['tyre_age'] * np.asarray(tyre_age) + c['fuel'] * np.asarray(fuel)
+
+
+def _trend(values: np.ndarray, age: np.ndarray, groups: np.ndarray, n_groups: int) -> List[Dict[str, float]]:
+    """グループごとの 値 = a + b * tyre_age (欠損の行は除く)"""
+    valid = ~np.isnan(values)
+    if not valid.any():
+        return [{} for _ in range(n_groups)]
+    X = np.stack([np.ones(valid.sum()), age[valid]], axis=1)
+    beta, count, _ = fit_groups(X, values[valid], groups[valid], n_groups)
+    return [
+        dict(zip(TREND_TERMS, map(float, beta[g]))) if count[g] >= 2 else {}
+        for g in range(n_groups)
+    ]
+
+
+def _group_corr(x: np.ndarray, y: np.ndarray, groups: np.ndarray, n_groups: int) -> np.ndarray:
+    """グループごとの x と y の相関 (どちらかの分散が 0 なら 1 = 区別できない)"""
+    n = np.bincount(groups, minlength=n_groups).astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mx = np.bincount(groups, x, minlength=n_groups) / n
+        my = np.bincount(groups, y, minlength=n_groups) / n
+        vx = np.bincount(groups, x * x, minlength=n_groups) / n - mx * mx
+        vy = np.bincount(groups, y * y, minlength=n_groups) / n - my * my
+        cov = np.bincount(groups, x * y, minlength=n_groups) / n - mx * my
+        corr = cov / np.sqrt(vx * vy)
+    return np.where((vx > 1e-12) & (vy > 1e-12), corr, 1.0)
+
+
+def _lap_time_fit(age: np.ndarray, fuel: np.ndarray, lap_time: np.ndarray, groups: np.ndarray,
+                  n_groups: int, fixed_fuel: Optional[np.ndarray] = None):
+    """ラップタイム = a + b * tyre_age + c * fuel をグループごとに当てはめる
+
+    燃料の係数 c が決まらないグループ (燃料データなし・1 スティント内のように周回と燃料が比例) は
+    fixed_fuel (なければ燃料なし 0 / 比例なら DEFAULT_FUEL_EFFECT) に固定して a, b だけを解き直す。
+    """
+    has_fuel = np.bincount(groups, ~np.isnan(fuel), minlength=n_groups) > 0
+    # 燃料のあるグループでは燃料のないラップは使わない (燃料 0 として入ると係数が偏る)
+    usable = ~np.isnan(fuel) | ~has_fuel[groups]
+    age, fuel, lap_time, groups = age[usable], np.nan_to_num(fuel[usable]), lap_time[usable], groups[usable]
+    ones = np.ones(len(age))
+    beta, count, rmse = fit_groups(np.stack([ones, age, fuel], axis=1), lap_time, groups, n_groups)
+
+    if fixed_fuel is None:
+        collinear = np.abs(_group_corr(age, fuel, groups, n_groups)) > COLLINEAR_CORR
+        fixed_fuel = np.where(~has_fuel, 0.0, np.where(collinear, DEFAULT_FUEL_EFFECT, np.nan))
+    redo = ~np.isnan(fixed_fuel)
+    if redo.any():
+        adjusted = lap_time - np.nan_to_num(fixed_fuel)[groups] * fuel
+        beta2, _, rmse2 = fit_groups(np.stack([ones, age], axis=1), adjusted, groups, n_groups)
+        beta[redo] = np.column_stack([beta2[redo], fixed_fuel[redo]])
+        rmse[redo] = rmse2[redo]
+    return beta, count, rmse
+
+
+def _burn_per_lap(samples: Dict[str, np.ndarray]) -> np.ndarray:
+    """同じセッションの連続ラップの燃料の差 (kg、給油・欠損は NaN)"""
+    fuel = samples['fuel']
+    burn = np.full(len(fuel), np.nan)
+    same = (samples['session'][1:] == samples['session'][:-1]) & (np.diff(samples['lap']) == 1)
+    with np.errstate(invalid='ignore'):
+        burn[1:] = np.where(same, fuel[:-1] - fuel[1:], np.nan)
+        burn[~(burn > 0)] = np.nan
+    return burn
+
+
+def _fits(unique, groups, beta, count, rmse, temp, pressure, burn, per_stint: bool) -> List[DegradationFit]:
+    fits = []
+    for g, key in enumerate(unique):
+        if count[g] < MIN_LAPS:
+            continue
+        rows = burn[groups == g]
+        rows = rows[~np.isnan(rows)]
+        fits.append(DegradationFit(
+            compound=_compound_name(key[0] if key[0] >= 0 else np.nan),
+            laps=int(count[g]),
+            lap_time=dict(zip(LAP_TIME_TERMS, map(float, beta[g]))),
+            lap_time_rmse=float(rmse[g]),
+            tyre_temp=temp[g],
+            tyre_pressure=pressure[g],
+            fuel_per_lap=float(np.median(rows)) if len(rows) else float('nan'),
+            session=str(key[1]) if per_stint else '',
+            stint=int(key[2]) if per_stint else 0,
+        ))
+    return fits
+
+
+def fit_samples(samples: Dict[str, np.ndarray]):
+    """積み上げたラップ配列 (stack_samples) をコンパウンドごと・スティントごとに当てはめる
+
+    スティント単位では周回と燃料が比例して燃料の効果が分からないので、
+    燃料の係数はそのコンパウンドの当てはめの値に固定する。
+
+    Returns:
+        (コンパウンド別の DegradationFit のリスト, スティント別の DegradationFit のリスト)
+    """
+    if len(samples['lap_time']) == 0:
+        return [], []
+    compound = np.nan_to_num(samples['compound'], nan=-1).astype(np.int64)
+    age, fuel, lap_time = samples['tyre_age'], samples['fuel'], samples['lap_time']
+    burn = _burn_per_lap(samples)
+
+    results = []
+    unique, groups = _group_index(compound)
+    beta, count, rmse = _lap_time_fit(age, fuel, lap_time, groups, len(unique))
+    fuel_effect = dict(zip(unique['f0'].tolist(), beta[:, 2]))
+    for per_stint in (False, True):
+        if per_stint:
+            unique, groups = _group_index(compound, samples['session'], samples['stint'])
+            fixed = np.array([fuel_effect[key[0]] for key in unique])
+            beta, count, rmse = _lap_time_fit(age, fuel, lap_time, groups, len(unique), fixed)
+        n_groups = len(unique)
+        temp = _trend(samples['tyres_temp'], age, groups, n_groups)
+        pressure = _trend(samples['tyres_pressure'], age, groups, n_groups)
+        results.append(_fits(unique, groups, beta, count, rmse, temp, pressure, burn, per_stint))
+    return results[0], results[1]
+
+
+def stack_samples(per_session: Sequence[Dict[str, np.ndarray]], sessions: Sequence[str]) -> Dict[str, np.ndarray]:
+    """セッションごとのラップ配列を 1 つに積む ('session' 列を付ける)"""
+    parts = [(samples, name) for samples, name in zip(per_session, sessions) if samples]
+    if not parts:
+        return {'lap_time': np.empty(0)}
+    names = list(parts[0][0])
+    stacked = {name: np.concatenate([samples[name] for samples, _ in parts]) for name in names}
+    stacked['session'] = np.concatenate([np.full(len(samples['lap']), name) for samples, name in parts])
+    return stacked
+
+
+# ==================== サーキット単位の当てはめと保存 ====================
+@dataclass
+class TrackModels:
+    """1 サーキット分のモデル (コンパウンド別 + スティント別)"""
+    track: str
+    compounds: Dict[str, DegradationFit]
+    stints: List[DegradationFit]
+    sources: Dict[str, List[float]]       # 使ったファイル -> [サイズ, 更新時刻]
+    version: int = MODEL_VERSION
+
+    def save(self, cache_dir: Path = CACHE_DIR) -> Path:
+        cache_dir = Path(cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        path = cache_dir / f"{self.track}.json"
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(asdict(self), f, ensure_ascii=False, indent=2)
+        return path
+
+    @classmethod
+    def load(cls, track: str, cache_dir: Path = CACHE_DIR) -> Optional['TrackModels']:
+        """キャッシュから読み込み (なければ / 古い形式なら None)"""
+        path = Path(cache_dir) / f"{track}.json"
+        if not path.exists():
+            return None
+        with open(path, encoding='utf-8') as f:
+            raw = json.load(f)
+        if raw.get('version') != MODEL_VERSION:
+            return None
+        raw['compounds'] = {name: DegradationFit(**fit) for name, fit in raw['compounds'].items()}
+        raw['stints'] = [DegradationFit(**fit) for fit in raw['stints']]
+        return cls(**raw)
+
+    def project(self, compound: str, tyre_age, fuel=0.0):
+        """コンパウンドのラップタイム予測 (s)"""
+        if compound not in self.compounds:
+            raise KeyError(f"{self.track} の {compound} のモデルがありません: {sorted(self.compounds)}")
+        return self.compounds[compound].lap_time_at(tyre_age, fuel)
+
+    def stint_projection(self, compound: str, laps: int, start_age: int = 0,
+                         start_fuel: Optional[float] = None) -> np.ndarray:
+        """スティント laps 周分のラップタイム予測 (燃料は実測の消費ペースで減らす)"""
+        fit = self.compounds[compound]
+        age = start_age + np.arange(laps)
+        fuel = 0.0
+        if start_fuel is not None and fit.fuel_per_lap == fit.fuel_per_lap:
+            fuel = np.maximum(start_fuel - fit.fuel_per_lap * np.arange(laps), 0.0)
+        return fit.lap_time_at(age, fuel)
+
+    def __repr__(self):
+        return f"TrackModels({self.track}, compounds={sorted(self.compounds)}, stints={len(self.stints)})"
+
+
+def _file_stamp(path: Path) -> List[float]:
+    stat = path.stat()
+    return [stat.st_size, stat.st_mtime]
+
+
+def fit_track(track: str, paths: Sequence) -> TrackModels:
+    """1 サーキットの全セッションを積んで当てはめる (ワーカーから呼ばれる)"""
+    paths = [Path(path) for path in paths]
+    per_session = []
+    for path in paths:
+        try:
+            per_session.append(session_samples(path))
+        except ValueError:
+            per_session.append({})
+    compounds, stints = fit_samples(stack_samples(per_session, [path.name for path in paths]))
+    return TrackModels(
+        track=track,
+        compounds={fit.compound: fit for fit in compounds},
+        stints=stints,
+        sources={path.name: _file_stamp(path) for path in paths},
+    )
+
+
+def _unchanged(models: Optional[TrackModels], paths: Sequence[Path]) -> bool:
+    """前回と同じファイル群 (サイズ・更新時刻も同じ) から当てはめたモデルか"""
+    if models is None:
+        return False
+    return models.sources == {path.name: _file_stamp(path) for path in paths}
+
+
+def fit_archive(
+    paths: Sequence,
+    cache_dir: Path = CACHE_DIR,
+    workers: Optional[int] = None,
+    refresh: bool = False,
+) -> Dict[str, TrackModels]:
+    """保存済みセッション群をサーキットごとに並列で当てはめて保存 (変更のあったサーキットだけ)"""
+    by_track: Dict[str, List[Path]] = {}
+    for path in paths:
+        by_track.setdefault(track_name_from_path(path), []).append(Path(path))
+
+    results: Dict[str, TrackModels] = {}
+    pending = []
+    for track, track_paths in sorted(by_track.items()):
+        cached = None if refresh else TrackModels.load(track, cache_dir)
+        if _unchanged(cached, track_paths):
+            results[track] = cached
+        else:
+            pending.append(track)
+
+    if workers is None:
+        workers = min(len(pending), os.cpu_count() or 1)
+    if workers <= 1 or len(pending) <= 1:
+        fitted = [fit_track(track, by_track[track]) for track in pending]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            fitted = list(pool.map(fit_track, pending, [by_track[track] for track in pending]))
+
+    for models in fitted:
+        models.save(cache_dir)
+        results[models.track] = models
+    return results
+
+
+if __name__ == "__main__":
+    print("✓ Degradation Models モジュール読み込み完了")
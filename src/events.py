@@ -0,0 +1,258 @@
+"""
+F1 25 Event Timeline
+Packet 3 (Event) をデコードし、セッションごとに session_time 順のコンパクトな配列 (タイムライン) にする
+
+イベントは code ごとの時刻配列に分けて持つので、「ペナルティの前後 3 秒のテレメトリー」や
+「セーフティカー以降のラップ」は保存済みテーブルへの二分探索だけで取り出せる。
+"""
+
+import struct
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+EVENT_CODE_OFFSET = 29
+EVENT_DETAIL_OFFSET = 33
+
+# イベントコード -> 説明
+EVENT_NAMES = {
+    'SSTA': 'セッション開始',
+    'SEND': 'セッション終了',
+    'FTLP': 'ファステストラップ',
+    'RTMT': 'リタイア',
+    'DRSE': 'DRS 有効',
+    'DRSD': 'DRS 無効',
+    'TMPT': 'チームメイトがピットイン',
+    'CHQF': 'チェッカーフラッグ',
+    'RCWN': 'レース勝者',
+    'PENA': 'ペナルティ',
+    'SPTP': 'スピードトラップ',
+    'STLG': 'スタートライト',
+    'LGOT': 'ライトアウト',
+    'DTSV': 'ドライブスルー消化',
+    'SGSV': 'ストップ&ゴー消化',
+    'FLBK': 'フラッシュバック',
+    'BUTN': 'ボタン',
+    'RDFL': '赤旗',
+    'OVTK': 'オーバーテイク',
+    'SCAR': 'セーフティカー',
+    'COLL': '接触',
+}
+
+# SCAR の event_type
+SAFETY_CAR_DEPLOYED = 0
+SAFETY_CAR_RETURNING = 1
+SAFETY_CAR_RETURNED = 2
+SAFETY_CAR_RESUME = 3
+
+# タイムライン 1 件
+TIMELINE_DTYPE = np.dtype([
+    ('session_time', '<f8'),
+    ('frame', '<u4'),
+    ('code', 'S4'),
+    ('lap', '<i2'),            # プレイヤーの周回 (不明なら -1)
+    ('lap_distance', '<f4'),   # プレイヤーの lap_distance (m)
+    ('vehicle', '<i2'),        # 対象の車 (なければ -1)
+    ('other', '<i2'),          # 相手の車 (オーバーテイクされた車、接触相手など)
+    ('value', '<f4'),          # ラップタイム / 速度 / 停止時間 / ペナルティ秒 など
+    ('detail', '<u4'),         # ペナルティ種別 / SC 種別 / ボタン / フラッシュバック先フレーム など
+])
+
+# code -> (struct 形式, 詳細の取り出し関数 -> (vehicle, other, value, detail))
+_DETAILS = {
+    'FTLP': ('<Bf', lambda v: (v[0], -1, v[1], 0)),
+    'RTMT': ('<BB', lambda v: (v[0], -1, 0.0, v[1])),
+    'DRSD': ('<B', lambda v: (-1, -1, 0.0, v[0])),
+    'TMPT': ('<B', lambda v: (v[0], -1, 0.0, 0)),
+    'RCWN': ('<B', lambda v: (v[0], -1, 0.0, 0)),
+    # penalty type | infringement type << 8 | places gained << 16、value は秒
+    'PENA': ('<7B', lambda v: (v[2], v[3] if v[3] != 255 else -1, float(v[4]), v[0] | v[1] << 8 | v[6] << 16)),
+    'SPTP': ('<BfBBBf', lambda v: (v[0], v[4], v[1], v[2] | v[3] << 1)),
+    'STLG': ('<B', lambda v: (-1, -1, 0.0, v[0])),
+    'DTSV': ('<B', lambda v: (v[0], -1, 0.0, 0)),
+    'SGSV': ('<Bf', lambda v: (v[0], -1, v[1], 0)),
+    'FLBK': ('<If', lambda v: (-1, -1, v[1], v[0])),
+    'BUTN': ('<I', lambda v: (-1, -1, 0.0, v[0])),
+    'OVTK': ('<BB', lambda v: (v[0], v[1], 0.0, 0)),
+    # safety car type | event type << 8
+    'SCAR': ('<BB', lambda v: (-1, -1, 0.0, v[0] | v[1] << 8)),
+    'COLL': ('<BB', lambda v: (v[0], v[1], 0.0, 0)),
+}
+
+
+def parse_event(data: bytes) -> Optional[Tuple[str, int, int, float, int]]:
+    """Event パケットを (code, vehicle, other, value, detail) にデコード"""
+    if len(data) < EVENT_DETAIL_OFFSET:
+        return None
+    try:
+        code = data[EVENT_CODE_OFFSET:EVENT_DETAIL_OFFSET].decode('ascii')
+    except UnicodeDecodeError:
+        return None
+    if code not in EVENT_NAMES:
+        return None
+    detail = _DETAILS.get(code)
+    if detail is None:
+        return code, -1, -1, 0.0, 0
+    fmt, fields = detail
+    if len(data) < EVENT_DETAIL_OFFSET + struct.calcsize(fmt):
+        return None
+    vehicle, other, value, extra = fields(struct.unpack_from(fmt, data, EVENT_DETAIL_OFFSET))
+    return code, vehicle, other, value, extra
+
+
+class EventTimeline:
+    """session_time 順のイベント配列 + code ごとの時刻インデックス"""
+
+    def __init__(self, events: Optional[np.ndarray] = None):
+        events = np.empty(0, dtype=TIMELINE_DTYPE) if events is None else np.asarray(events, dtype=TIMELINE_DTYPE)
+        self.events = events[np.argsort(events['session_time'], kind='stable')]
+        # code ごとに並べ替えた位置 (各 code の中でも時刻順): code -> events のインデックス
+        order = np.argsort(self.events['code'], kind='stable')
+        codes = self.events['code'][order]
+        bounds = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+        self._by_code: Dict[str, np.ndarray] = {
+            chunk_codes[0].decode(): chunk
+            for chunk, chunk_codes in zip(np.split(order, bounds), np.split(codes, bounds))
+            if len(chunk)
+        }
+
+    def __len__(self):
+        return len(self.events)
+
+    def of(self, code: str) -> np.ndarray:
+        """code のイベント (時刻順)"""
+        return self.events[self._by_code.get(code, np.empty(0, dtype=np.int64))]
+
+    def times(self, code: str) -> np.ndarray:
+        """code のイベントの session_time (昇順)"""
+        return self.of(code)['session_time']
+
+    def between(self, start: float, end: float) -> np.ndarray:
+        """[start, end] のイベント (二分探索)"""
+        times = self.events['session_time']
+        lo = np.searchsorted(times, start, side='left')
+        hi = np.searchsorted(times, end, side='right')
+        return self.events[lo:hi]
+
+    def counts(self) -> Dict[str, int]:
+        return {code: len(index) for code, index in self._by_code.items()}
+
+    def windows(self, session_time, code: str, before: float = 3.0, after: float = 3.0) -> np.ndarray:
+        """code の各イベントの前後 [before, after] 秒に入るテーブルの行範囲 [[start, end), ...]
+
+        session_time はテーブルの時刻列 (昇順であること、flashback を含む場合は先に並べ替える)。
+        """
+        session_time = np.asarray(session_time, dtype=np.float64)
+        times = self.times(code)
+        starts = np.searchsorted(session_time, times - before, side='left')
+        ends = np.searchsorted(session_time, times + after, side='right')
+        return np.stack([starts, ends], axis=1)
+
+    def around(self, table, code: str, before: float = 3.0, after: float = 3.0) -> List[Dict[str, np.ndarray]]:
+        """code の各イベントの前後のテーブル (列名 -> 配列 の dict のリスト)"""
+        columns = {name: np.asarray(table[name]) for name in table.keys()}
+        if np.any(np.diff(columns['session_time']) < 0):
+            # flashback で時刻が戻っている場合は時刻順に並べ替えてから探す
+            order = np.argsort(columns['session_time'], kind='stable')
+            columns = {name: values[order] for name, values in columns.items()}
+        return [
+            {name: values[start:end] for name, values in columns.items()}
+            for start, end in self.windows(columns['session_time'], code, before, after)
+        ]
+
+    def first_time(self, code: str, detail: Optional[int] = None, mask: int = 0xFFFFFFFF) -> float:
+        """code (と detail & mask == detail) を満たす最初のイベントの時刻 (なければ NaN)"""
+        events = self.of(code)
+        if detail is not None:
+            events = events[(events['detail'] & mask) == detail]
+        return float(events['session_time'][0]) if len(events) else float('nan')
+
+    def safety_car_time(self) -> float:
+        """最初にセーフティカー (VSC を含む) が出動した時刻"""
+        return self.first_time('SCAR', SAFETY_CAR_DEPLOYED << 8, 0xFF00)
+
+    def laps_after(self, table, start_time: float) -> np.ndarray:
+        """start_time 以降に始まったラップ番号 (テーブルの session_time は昇順)"""
+        session_time = np.asarray(table['session_time'], dtype=np.float64)
+        lap_number = np.asarray(table['lap_number'], dtype=np.float64)
+        if start_time != start_time:
+            return np.empty(0, dtype=np.int64)
+        first = np.searchsorted(session_time, start_time, side='left')
+        laps = lap_number[first:]
+        laps = laps[~np.isnan(laps)].astype(np.int64)
+        # イベントの時点で走っていた周は含めない
+        current = lap_number[first - 1] if first > 0 else np.nan
+        return np.unique(laps[laps != current]) if current == current else np.unique(laps)
+
+    def save(self, path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.save(path, self.events)
+        return path
+
+    @classmethod
+    def load(cls, path) -> 'EventTimeline':
+        return cls(np.load(path))
+
+    def __repr__(self):
+        return f"EventTimeline(events={len(self)}, codes={self.counts()})"
+
+
+class EventRecorder:
+    """受信した Event パケットを溜めて EventTimeline にする (同じフレーム・同じ code の重複は捨てる)"""
+
+    def __init__(self):
+        self.rows: List[tuple] = []
+        self._seen = set()
+        self.duplicate_count = 0
+        # イベント発生時のプレイヤーの位置 (Lap Data から更新)
+        self.lap = -1
+        self.lap_distance = float('nan')
+
+    def update_position(self, lap: int, lap_distance: float):
+        self.lap = lap
+        self.lap_distance = lap_distance
+
+    def push(self, header, data: bytes) -> bool:
+        event = parse_event(data)
+        if event is None:
+            return False
+        code, vehicle, other, value, detail = event
+        key = (header.overall_frame_identifier, code, vehicle, other)
+        if key in self._seen:
+            self.duplicate_count += 1
+            return False
+        self._seen.add(key)
+        self.rows.append((header.session_time, header.overall_frame_identifier, code.encode('ascii'),
+                          self.lap, self.lap_distance, vehicle, other, value, detail))
+        return True
+
+    def timeline(self) -> EventTimeline:
+        return EventTimeline(np.array(self.rows, dtype=TIMELINE_DTYPE))
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def describe(event) -> str:
+    """イベント 1 件の表示用文字列"""
+    code = event['code'].decode()
+    text = f"{event['session_time']:9.2f}s  {code} {EVENT_NAMES.get(code, '')}"
+    if event['lap'] >= 0:
+        text += f"  (Lap {event['lap']}, {event['lap_distance']:.0f}m)"
+    if event['vehicle'] >= 0:
+        text += f"  Car {event['vehicle']}"
+    if event['other'] >= 0:
+        text += f" / Car {event['other']}"
+    if code in ('FTLP', 'SGSV'):
+        text += f"  {event['value']:.3f}s"
+    elif code == 'SPTP':
+        text += f"  {event['value']:.1f} km/h"
+    return text
+
+
+if __name__ == "__main__":
+    print("✓ Event Timeline モジュール読み込み完了")
+    print(f"- 対応イベント: {list(EVENT_NAMES)}")
@@ -7,17 +7,43 @@ import socket
 import logging
 
 from .data_collector import TelemetryDataCollector
+from .incidents import IncidentDetector
+from .live_delta import LiveDeltaEngine, ReferenceLap
+from .packet_parser import PacketType
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
 class F1TelemetryListener:
-    def __init__(self, ip="0.0.0.0", port=20777, player_car_index=0):
+    def __init__(self, ip="0.0.0.0", port=20777, player_car_index=0, delta_engine=None, live_server=None,
+                 coach=None, incident_config=None, lap_index_path=None):
         self.ip = ip
         self.port = port
         self.socket = None
-        self.collector = TelemetryDataCollector(player_car_index=player_car_index)
+        self.collector = TelemetryDataCollector(player_car_index=player_car_index, lap_index_path=lap_index_path)
+        
+        # リファレンスラップとのライブ delta (LapData 受信ごとに更新)
+        self.delta_engine = delta_engine
+        if delta_engine is not None:
+            self.collector.add_handler(PacketType.LAP_DATA, delta_engine.on_lap_data)
+        
+        # コーナーごとのライブコーチング (coaching.CoachingEngine、キューはコンソールに表示)
+        self.coach = coach
+        if coach is not None:
+            self.collector.add_handler(PacketType.LAP_DATA, coach.on_lap_data)
+            self.collector.add_handler(PacketType.CAR_TELEMETRY, coach.on_telemetry)
+            coach.add_listener(lambda cue: print(f"  🗣 Lap {cue.lap} {cue.message}"))
+        
+        # ロックアップ・ホイールスピン・コースアウト (incidents.IncidentDetector、コンソールに表示)
+        if incident_config is not None:
+            self.collector.incidents = IncidentDetector(incident_config)
+        self.collector.incidents.add_listener(lambda incident: print(f"  ⚠ {incident}"))
+        
+        # 確定フレームをローカルのダッシュボードに配信 (live_server.LiveServer)
+        self.live_server = live_server
+        if live_server is not None:
+            live_server.attach(self.collector)
         
     def setup(self):
         """UDP ソケットを初期化する"""
@@ -39,6 +65,10 @@ class F1TelemetryListener:
             if not self.setup():
                 return
         
+        if self.live_server is not None:
+            self.live_server.start()
+            print(f"✓ ライブ配信: ws://{self.live_server.host}:{self.live_server.port}/ws")
+        
         print(f"\n待機中... ({timeout}秒でタイムアウト)")
         logger.info("Waiting for F1 25 data...")
         
@@ -53,12 +83,18 @@ class F1TelemetryListener:
                 
                 # Packet を処理してデータ収集
                 self.collector.process_packet(data)
+                if self.live_server is not None:
+                    self.live_server.publish_packet(data)
                 
                 if packet_count == 1:
                     print(f"\n✓ データ受信開始！")
                 
                 if packet_count % 500 == 0:
                     print(f"✓ {packet_count} パケット受信 (Lap: {self.collector.lap_data_count}, Telemetry: {self.collector.car_telemetry_count})")
+                    if self.delta_engine is not None:
+                        print(f"  Δ {self.delta_engine.delta:+.3f}s ({self.delta_engine.reference.name})")
+                    if self.live_server is not None and self.live_server.client_count:
+                        print(f"  ライブ配信: {self.live_server.client_count} クライアント")
         
         except socket.timeout:
             print(f"\n⏱ タイムアウト ({packet_count} パケット受信)")
@@ -70,18 +106,29 @@ class F1TelemetryListener:
             print(f"\n✗ エラー: {e}")
             logger.error(f"Error: {e}")
         finally:
+            if self.live_server is not None:
+                self.live_server.stop()
             if self.socket:
                 self.socket.close()
                 print("\nソケットをクローズしました")
                 
                 # 統計情報を表示して CSV に保存
+                self.collector.flush()
                 self.collector.print_stats()
                 
-                if self.collector.frame_data:
+                if len(self.collector.table):
                     output_file = self.collector.save_to_csv()
                     print(f"✓ CSV ファイルを保存しました: {output_file}")
 
 
 if __name__ == "__main__":
-    listener = F1TelemetryListener()
+    import sys
+    
+    # 引数にリファレンスラップ (cache/reference/*.csv) を渡すとライブ delta を表示
+    delta_engine = None
+    if len(sys.argv) > 1:
+        delta_engine = LiveDeltaEngine(ReferenceLap.load(sys.argv[1]))
+        print(f"✓ リファレンス: {delta_engine.reference}")
+    
+    listener = F1TelemetryListener(delta_engine=delta_engine)
     listener.start(timeout=600)  # 10 、テコードーで反標を受け取るようにしました
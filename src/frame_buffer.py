@@ -0,0 +1,135 @@
+"""
+F1 25 Frame Reorder Buffer
+UDP の順序入れ替え・重複パケットを frame_identifier で整列してから出力する
+
+送信頻度の低いパケット (Car Status / Car Damage) は asof_join で直前の値をフレームに付ける。
+"""
+
+import heapq
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+
+class FrameReorderBuffer:
+    """frame_identifier をキーにした固定容量の並べ替えバッファ
+
+    - 最大フレーム番号から capacity 以上遅れたフレームを順番に確定 (release)
+    - 同じフレーム・同じ slot の 2 回目以降は重複として破棄
+    - 確定済み (watermark 以下) のフレームに届いたパケットは遅延として記録
+    - watermark から capacity より大きく巻き戻ったらフラッシュバック / 新セッションとして基準をリセット
+      (並べ替えで待てるのは capacity フレームまでなので、それより古いものは遅延ではなく巻き戻り)
+    """
+
+    ACCEPTED = "accepted"
+    DUPLICATE = "duplicate"
+    LATE = "late"
+
+    # 遅延記録の保持上限 (長時間セッションでメモリを食わないように)
+    MAX_LATE_RECORDS = 1000
+
+    def __init__(
+        self,
+        slots: List[str],
+        capacity: int = 32,
+        on_release: Optional[Callable[[dict], None]] = None,
+    ):
+        if capacity < 1:
+            raise ValueError(f"capacity は 1 以上が必要です: {capacity}")
+
+        self.slots = list(slots)
+        self.capacity = capacity
+        self.on_release = on_release
+
+        self.pending: Dict[int, dict] = {}
+        self._heap: List[int] = []
+        self.watermark = -1        # 最後に確定したフレーム番号
+        self.max_seen = -1         # 受信した最大フレーム番号
+
+        # 統計
+        self.released_count = 0
+        self.duplicate_count = 0
+        self.late_count = 0
+        self.reset_count = 0
+        self.late_records: List[tuple] = []   # (frame_id, slot, watermark)
+
+    def push(self, frame_id: int, slot: str, value, timestamp: float = 0.0) -> str:
+        """1 パケット分のデータを登録し、受理・重複・遅延のいずれかを返す"""
+        if frame_id <= self.watermark:
+            if self.watermark - frame_id > self.capacity:
+                # 大きな巻き戻り: 溜まっている分を吐き出して基準をリセット
+                self.flush()
+                self.watermark = -1
+                self.max_seen = -1
+                self.reset_count += 1
+            else:
+                self.late_count += 1
+                if len(self.late_records) < self.MAX_LATE_RECORDS:
+                    self.late_records.append((frame_id, slot, self.watermark))
+                return self.LATE
+
+        frame = self.pending.get(frame_id)
+        if frame is None:
+            frame = {'frame_id': frame_id, 'timestamp': timestamp}
+            for name in self.slots:
+                frame[name] = None
+            self.pending[frame_id] = frame
+            heapq.heappush(self._heap, frame_id)
+        elif frame[slot] is not None:
+            self.duplicate_count += 1
+            return self.DUPLICATE
+
+        frame[slot] = value
+        if frame_id > self.max_seen:
+            self.max_seen = frame_id
+
+        self._release_until(self.max_seen - self.capacity)
+        return self.ACCEPTED
+
+    def flush(self) -> int:
+        """保留中のフレームをすべて順番に確定する"""
+        before = self.released_count
+        if self._heap:
+            self._release_until(max(self._heap))
+        return self.released_count - before
+
+    def _release_until(self, limit: int):
+        """limit 以下のフレームを昇順で確定"""
+        heap = self._heap
+        while heap and (heap[0] <= limit or len(heap) > self.capacity):
+            frame_id = heapq.heappop(heap)
+            frame = self.pending.pop(frame_id)
+            self.watermark = frame_id
+            self.released_count += 1
+            if self.on_release:
+                self.on_release(frame)
+
+    def __len__(self):
+        return len(self.pending)
+
+    def __repr__(self):
+        return (
+            f"FrameReorderBuffer(pending={len(self.pending)}, "
+            f"watermark={self.watermark}, "
+            f"dup={self.duplicate_count}, late={self.late_count})"
+        )
+
+
+def asof_join(left_keys, right_keys, max_age: Optional[float] = None,
+              left_time=None, right_time=None) -> np.ndarray:
+    """left の各キーに対して、キー以下で最も新しい right の位置を返す (なければ -1)
+
+    left_keys / right_keys は昇順 (確定順の通し番号など)。max_age を指定すると、
+    時刻差 left_time - right_time が [0, max_age] に入らない組 (古すぎる値・巻き戻り) も -1 にする。
+    """
+    left_keys = np.asarray(left_keys)
+    right_keys = np.asarray(right_keys)
+    index = np.searchsorted(right_keys, left_keys, side='right') - 1
+    if max_age is not None and len(right_keys):
+        age = np.asarray(left_time, dtype=np.float64) - np.asarray(right_time, dtype=np.float64)[np.maximum(index, 0)]
+        index[(age < 0) | (age > max_age)] = -1
+    return index
+
+
+if __name__ == "__main__":
+    print("✓ Frame Reorder Buffer モジュール読み込み完了")
@@ -0,0 +1,326 @@
+"""
+F1 25 Incident Detection
+ロックアップ・ホイールスピン・コースアウトを受信中のチャンネルから検出し、周回・距離・深刻度つきのインシデントにする
+
+判定に使うのは Motion Ex (Packet 13) のスリップ率と Car Telemetry のブレーキ・アクセル・路面。
+種類ごとに直近 window サンプルの「条件を満たしたか」をビット列で持ち、trigger 個以上で
+インシデントを開始、window 内に 1 つもなくなったら終了してコールバックに渡す。
+1 パケットの処理は window の長さに関係なく一定 (ビット演算と 4 輪のループだけ)。
+
+detector = IncidentDetector(on_incident=print)
+collector.add_frame_handler(detector.on_frame)    # lap_data / telemetry / motion_ex の確定フレーム
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+
+# 4 輪の並び (パケットと同じ)
+WHEELS = ('rl', 'rr', 'fl', 'fr')
+# 駆動輪 (ホイールスピンを見る車輪)
+DRIVEN_WHEELS = (0, 1)
+
+# コース外とみなす路面 (3 = 岩, 4 = グラベル, 5 = 泥, 6 = 砂, 7 = 芝, 8 = 水)
+OFF_TRACK_SURFACES = frozenset((3, 4, 5, 6, 7, 8))
+
+KIND_NAMES = {
+    'lockup': 'ロックアップ',
+    'wheelspin': 'ホイールスピン',
+    'off_track': 'コースアウト',
+}
+
+# 保存するインシデント 1 件
+INCIDENT_DTYPE = np.dtype([
+    ('kind', 'S10'),
+    ('lap', '<i2'),            # 開始時の周回 (不明なら -1)
+    ('lap_distance', '<f4'),   # 開始時の lap_distance (m)
+    ('session_time', '<f8'),   # 開始時刻 (s)
+    ('duration', '<f4'),       # 最初から最後に条件を満たしたサンプルまで (s)
+    ('wheel', '<i1'),          # いちばん大きかった車輪 (WHEELS の番号、コースアウトは -1)
+    ('peak', '<f4'),           # スリップ率の絶対値の最大 / コース外に出た車輪数の最大
+    ('severity', '<f4'),       # peak / しきい値 (1 = ぎりぎり)
+])
+
+
+@dataclass
+class IncidentConfig:
+    """検出のしきい値と窓 (サンプル数は Motion Ex / Car Telemetry のパケット数)"""
+    lockup_slip: float = 0.2          # ブレーキ中の車輪のスリップ率がこれ以下 (負側) でロック
+    lockup_brake: float = 0.2         # ロックアップを見るブレーキ入力
+    wheelspin_slip: float = 0.2       # 駆動輪のスリップ率がこれ以上で空転
+    wheelspin_throttle: float = 0.3   # ホイールスピンを見るアクセル入力
+    off_track_wheels: int = 2         # コース外の路面に出た車輪がこれ以上でコースアウト
+    min_speed_kph: float = 30.0       # これより遅い時はスリップを見ない (停車・発進直後の揺れ)
+    window: int = 6                   # 直近何サンプルを見るか
+    trigger: int = 3                  # window 内で何サンプル条件を満たしたら開始するか
+
+
+@dataclass
+class Incident:
+    """インシデント 1 件"""
+    kind: str
+    lap: int
+    distance: float
+    time: float
+    duration: float
+    wheel: int
+    peak: float
+    severity: float
+
+    @property
+    def name(self) -> str:
+        return KIND_NAMES.get(self.kind, self.kind)
+
+    def __str__(self):
+        wheel = f" ({WHEELS[self.wheel].upper()})" if self.wheel >= 0 else ""
+        return (f"Lap {self.lap} {self.distance:.0f}m {self.name}{wheel} "
+                f"x{self.severity:.1f} {self.duration:.2f}s")
+
+
+class _Episode:
+    """1 種類分の窓と、いま続いているインシデント
+
+    bits の下位 window ビットが直近 window サンプルの判定 (最下位が最新)、count はその 1 の数。
+    """
+    __slots__ = ('kind', 'threshold', 'window', 'trigger', 'mask', 'bits', 'count',
+                 'active', 'start', 'last_time', 'peak', 'wheel')
+
+    def __init__(self, kind: str, threshold: float, window: int, trigger: int):
+        self.kind = kind
+        self.threshold = threshold
+        self.window = window
+        self.trigger = trigger
+        self.mask = (1 << window) - 1
+        self.reset()
+
+    def reset(self):
+        self.bits = 0
+        self.count = 0
+        self.active = False
+        self.start = None
+        self.last_time = 0.0
+        self.peak = 0.0
+        self.wheel = -1
+
+    def update(self, flagged: bool, value: float, wheel: int, lap: int, distance: float,
+               time: float) -> Optional[Incident]:
+        """サンプル 1 つ分の判定を窓に入れ、インシデントが終わったらそれを返す"""
+        self.count += flagged - ((self.bits >> (self.window - 1)) & 1)
+        self.bits = ((self.bits << 1) | flagged) & self.mask
+        if flagged:
+            if self.start is None:
+                self.start = (lap, distance, time)
+            if value > self.peak:
+                self.peak = value
+                self.wheel = wheel
+            self.last_time = time
+            if not self.active and self.count >= self.trigger:
+                self.active = True
+        elif self.count == 0 and self.start is not None:
+            return self.close()
+        return None
+
+    def close(self) -> Optional[Incident]:
+        """続いているインシデントを閉じる (開始していなければ None)"""
+        incident = None
+        if self.active:
+            lap, distance, time = self.start
+            incident = Incident(self.kind, lap, distance, time, self.last_time - time, self.wheel,
+                                self.peak, self.peak / self.threshold)
+        self.reset()
+        return incident
+
+
+class IncidentDetector:
+    """受信中のスリップ率・入力・路面からインシデントを検出する
+
+    Car Telemetry で入力と路面、Motion Ex でスリップ率を受け取り、Lap Data の周回・距離を付ける。
+    受信中は FrameReorderBuffer の確定フレーム (on_frame) で流す。受信順のまま update_* に渡すと、
+    UDP の順序入れ替えで時刻が戻るたびにフラッシュバックとみなして窓を空にしてしまう。
+    検出したインシデントは incidents に溜め、on_incident / add_listener のコールバックに渡す。
+    """
+
+    def __init__(self, config: Optional[IncidentConfig] = None,
+                 on_incident: Optional[Callable[[Incident], None]] = None):
+        config = config if config is not None else IncidentConfig()
+        if not 1 <= config.trigger <= config.window:
+            raise ValueError(f"trigger は 1 以上 window 以下が必要です: trigger={config.trigger}, window={config.window}")
+        self.config = config
+        self.listeners: List[Callable[[Incident], None]] = [on_incident] if on_incident else []
+        self.lockup = _Episode('lockup', config.lockup_slip, config.window, config.trigger)
+        self.wheelspin = _Episode('wheelspin', config.wheelspin_slip, config.window, config.trigger)
+        self.off_track = _Episode('off_track', config.off_track_wheels, config.window, config.trigger)
+
+        self.lap = -1
+        self.lap_distance = float('nan')
+        self.time = 0.0
+        self.throttle = 0.0
+        self.brake = 0.0
+        self.speed = 0.0
+        self.samples = 0
+        self.incidents: List[Incident] = []
+
+    def add_listener(self, callback: Callable[[Incident], None]):
+        """インシデントを受け取るコールバックを登録"""
+        self.listeners.append(callback)
+
+    # --- ストリーム -----------------------------------------------------
+
+    def on_frame(self, frame: dict):
+        """TelemetryDataCollector のフレームハンドラー (frame_id 順に確定した lap_data / telemetry / motion_ex)
+
+        時刻が戻るのは reorder バッファが巻き戻りでリセットした時 (フラッシュバック / 新しいセッション) だけ。
+        """
+        time = frame['timestamp']
+        lap_data = frame.get('lap_data')
+        if lap_data is not None:
+            self.lap = lap_data.current_lap_num
+            self.lap_distance = lap_data.lap_distance
+        telemetry = frame.get('telemetry')
+        if telemetry is not None:
+            self.update_inputs(telemetry.throttle, telemetry.brake, telemetry.speed)
+            self.update_surface(telemetry.surface_type, time)
+        motion_ex = frame.get('motion_ex')
+        if motion_ex is not None:
+            self.update_slip(motion_ex.wheel_slip_ratio, time)
+
+    def update_inputs(self, throttle: float, brake: float, speed: float):
+        self.throttle = throttle
+        self.brake = brake
+        self.speed = speed
+
+    def update_slip(self, slip_ratio: Sequence[float], time: float):
+        """4 輪のスリップ率 (RL, RR, FL, FR) でロックアップ・ホイールスピンの窓を進める"""
+        self._check_time(time)
+        self.samples += 1
+        config = self.config
+        fast = self.speed >= config.min_speed_kph
+
+        locked, lock_value, lock_wheel = False, 0.0, -1
+        if fast and self.brake >= config.lockup_brake:
+            for wheel in range(4):
+                value = -slip_ratio[wheel]
+                if value > lock_value:
+                    lock_value, lock_wheel = value, wheel
+            locked = lock_value >= config.lockup_slip
+        self._emit(self.lockup.update(locked, lock_value, lock_wheel, self.lap, self.lap_distance, time))
+
+        spinning, spin_value, spin_wheel = False, 0.0, -1
+        if fast and self.throttle >= config.wheelspin_throttle:
+            for wheel in DRIVEN_WHEELS:
+                value = slip_ratio[wheel]
+                if value > spin_value:
+                    spin_value, spin_wheel = value, wheel
+            spinning = spin_value >= config.wheelspin_slip
+        self._emit(self.wheelspin.update(spinning, spin_value, spin_wheel, self.lap, self.lap_distance, time))
+
+    def update_surface(self, surface_type: Sequence[int], time: float):
+        """4 輪の路面でコースアウトの窓を進める"""
+        self._check_time(time)
+        outside = sum(surface in OFF_TRACK_SURFACES for surface in surface_type)
+        self._emit(self.off_track.update(outside >= self.config.off_track_wheels, float(outside), -1,
+                                         self.lap, self.lap_distance, time))
+
+    def finish(self) -> List[Incident]:
+        """続いているインシデントを閉じる (セッション終了)"""
+        before = len(self.incidents)
+        for episode in (self.lockup, self.wheelspin, self.off_track):
+            self._emit(episode.close())
+        return self.incidents[before:]
+
+    def _check_time(self, time: float):
+        if time < self.time:
+            # フラッシュバック / 新しいセッション: 続いていたものは捨てて窓を空にする
+            for episode in (self.lockup, self.wheelspin, self.off_track):
+                episode.reset()
+        self.time = time
+
+    def _emit(self, incident: Optional[Incident]):
+        if incident is None:
+            return
+        self.incidents.append(incident)
+        for callback in self.listeners:
+            callback(incident)
+
+    # --- 保存 -----------------------------------------------------------
+
+    def to_array(self) -> np.ndarray:
+        return incidents_to_array(self.incidents)
+
+    def __len__(self):
+        return len(self.incidents)
+
+    def __repr__(self):
+        counts = {kind: sum(incident.kind == kind for incident in self.incidents) for kind in KIND_NAMES}
+        return f"IncidentDetector(samples={self.samples}, incidents={counts})"
+
+
+def incidents_to_array(incidents: Sequence[Incident]) -> np.ndarray:
+    """インシデントの列 -> INCIDENT_DTYPE の配列"""
+    return np.array([
+        (i.kind.encode('ascii'), i.lap, i.distance, i.time, i.duration, i.wheel, i.peak, i.severity)
+        for i in incidents
+    ], dtype=INCIDENT_DTYPE)
+
+
+def incidents_from_array(array: np.ndarray) -> List[Incident]:
+    return [
+        Incident(row['kind'].decode(), int(row['lap']), float(row['lap_distance']), float(row['session_time']),
+                 float(row['duration']), int(row['wheel']), float(row['peak']), float(row['severity']))
+        for row in array
+    ]
+
+
+def replay_incidents(path, config: Optional[IncidentConfig] = None) -> List[Incident]:
+    """.f1cap の Lap Data / Car Telemetry / Motion Ex を受信時と同じ reorder バッファに通して検出する"""
+    from .frame_buffer import FrameReorderBuffer
+    from .packet_parser import PacketParser, PacketType
+    from .raw_capture import CaptureReader
+    from .telemetry_packets import CarTelemetryPacket, LapDataPacket, MotionExPacket
+
+    detector = IncidentDetector(config)
+    reorder = FrameReorderBuffer(['lap_data', 'telemetry', 'motion_ex'], on_release=detector.on_frame)
+    with CaptureReader(path) as reader:
+        rows = np.sort(np.concatenate([
+            reader.rows(packet_type) for packet_type in
+            (PacketType.LAP_DATA, PacketType.CAR_TELEMETRY, PacketType.MOTION_EX)
+        ]))
+        for row in rows:
+            data = reader.view(int(row))
+            header = PacketParser.parse_header(data)
+            if not header:
+                continue
+            if header.packet_type == PacketType.LAP_DATA:
+                slot, value = 'lap_data', LapDataPacket.parse_lap_data(data, header.player_car_index)
+            elif header.packet_type == PacketType.CAR_TELEMETRY:
+                slot, value = 'telemetry', CarTelemetryPacket.parse_car_telemetry(data, header.player_car_index)
+            else:
+                slot, value = 'motion_ex', MotionExPacket.parse_motion_ex(data)
+            if value:
+                reorder.push(header.frame_identifier, slot, value, header.session_time)
+    reorder.flush()
+    detector.finish()
+    return detector.incidents
+
+
+def load_incidents(path, config: Optional[IncidentConfig] = None) -> List[Incident]:
+    """.incidents.npy (collector が保存) / .f1cap (再生して検出) / CSV (同じ名前の .incidents.npy) から読み込む
+
+    config を渡すと .f1cap はそのしきい値で検出し直す (.incidents.npy は保存時のしきい値のまま)。
+    """
+    from .raw_capture import CAPTURE_SUFFIX
+
+    path = Path(path)
+    if path.suffix == CAPTURE_SUFFIX:
+        return replay_incidents(path, config)
+    if path.suffix == '.csv':
+        path = path.with_suffix('.incidents.npy')
+    return incidents_from_array(np.load(path))
+
+
+if __name__ == "__main__":
+    print("✓ Incident Detection モジュール読み込み完了")
+    print(f"- 検出: {', '.join(KIND_NAMES.values())}")
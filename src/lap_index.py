@@ -0,0 +1,571 @@
+"""
+F1 25 Lap Index
+Session History (Packet 11) をデコードした「ゲームが確定したラップタイム」の表と、全セッション横断のリーダーボード
+
+Session History には車ごとに全周のラップタイム・セクタータイム・有効フラグ・タイヤのスティントが入っている。
+LastLapTime から推定する代わりにこれをそのまま使う。Session (Packet 1) のサーキット・天候と、
+Participants (Packet 4) のチームも一緒に取っておく。
+
+collector は記録中にこれらを SessionHistoryRecorder にため、CSV の隣に .laps.npz として保存する。
+保存と同時に、cache/lap_index/laps.sqlite (LapIndex) にも upsert する。
+LapIndex は (サーキット, 有効, タイム) に索引を持つ。そのため「サーキット / チーム / タイヤ / 天候ごとのベスト N 周」や
+「このセッションのプレイヤーの有効ラップ」は、CSV を読み直さずに索引を引くだけで取り出せる。
+
+with LapIndex() as index:
+    index.update(glob.glob('telemetry_data/*.laps.npz'))     # 変わったファイルだけ
+    for entry in index.leaderboard('monza', n=10, compound='Soft'):
+        print(entry)
+"""
+
+import json
+import os
+import sqlite3
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .packet_parser import PacketType
+
+
+CACHE_DIR = Path("cache") / "lap_index"
+INDEX_PATH = CACHE_DIR / "laps.sqlite"
+
+# 表の形式を変えたら上げる (古い表は作り直す)
+SCHEMA_VERSION = 1
+
+NUM_CARS = 22
+HEADER_SIZE = 29
+MAX_LAPS = 100
+MAX_STINTS = 8
+
+# Session History のラップ 1 周分 (14 bytes)
+LAP_HISTORY_DTYPE = np.dtype([
+    ('lap_time_in_ms', '<u4'),
+    ('sector1_time_ms_part', '<u2'),
+    ('sector1_time_minutes_part', 'u1'),
+    ('sector2_time_ms_part', '<u2'),
+    ('sector2_time_minutes_part', 'u1'),
+    ('sector3_time_ms_part', '<u2'),
+    ('sector3_time_minutes_part', 'u1'),
+    ('lap_valid_bit_flags', 'u1'),
+])
+
+# Session History のタイヤスティント 1 つ分 (3 bytes)
+TYRE_STINT_DTYPE = np.dtype([
+    ('end_lap', 'u1'),                  # 255 = 今のスティント
+    ('tyre_actual_compound', 'u1'),
+    ('tyre_visual_compound', 'u1'),
+])
+
+# car_idx, num_laps, num_tyre_stints, best lap / sector 1-3 の周
+_HISTORY_HEAD = struct.Struct('<7B')
+_LAPS_OFFSET = HEADER_SIZE + _HISTORY_HEAD.size
+_STINTS_OFFSET = _LAPS_OFFSET + MAX_LAPS * LAP_HISTORY_DTYPE.itemsize
+SESSION_HISTORY_SIZE = _STINTS_OFFSET + MAX_STINTS * TYRE_STINT_DTYPE.itemsize
+
+# Session パケットの先頭: weather, track_temperature, air_temperature, total_laps, track_length,
+# session_type, track_id, formula
+_SESSION_HEAD = struct.Struct('<BbbBHBbB')
+
+# Participants: num_active_cars の後に 1 台 57 bytes (ai_controlled, driver_id, network_id, team_id, ...)
+_PARTICIPANT_SIZE = 57
+_PARTICIPANT_TEAM_OFFSET = 3
+
+# lap_valid_bit_flags
+LAP_VALID = 0x01
+SECTOR_VALID = (0x02, 0x04, 0x08)
+
+# track_id -> サーキット名 (ファイル名の telemetry_{track}_ と同じ小文字)
+TRACK_NAMES = {
+    0: 'melbourne', 2: 'shanghai', 3: 'bahrain', 4: 'catalunya', 5: 'monaco', 6: 'montreal',
+    7: 'silverstone', 9: 'hungaroring', 10: 'spa', 11: 'monza', 12: 'singapore', 13: 'suzuka',
+    14: 'abudhabi', 15: 'austin', 16: 'interlagos', 17: 'austria', 19: 'mexico', 20: 'baku',
+    26: 'zandvoort', 27: 'imola', 29: 'jeddah', 30: 'miami', 31: 'lasvegas', 32: 'losail',
+    39: 'silverstonereverse', 40: 'austriareverse', 41: 'zandvoortreverse',
+}
+
+# weather の表示名
+WEATHER_NAMES = {0: 'Clear', 1: 'Light cloud', 2: 'Overcast', 3: 'Light rain', 4: 'Heavy rain', 5: 'Storm'}
+
+# visual_tyre_compound の表示名 (stints と同じ)
+COMPOUND_NAMES = {16: 'Soft', 17: 'Medium', 18: 'Hard', 7: 'Inter', 8: 'Wet'}
+
+# 1 周分のレコード (.laps.npz と LapIndex の 1 行)
+LAP_RECORD_DTYPE = np.dtype([
+    ('session_uid', '<u8'),
+    ('car', 'u1'),
+    ('lap', 'u1'),
+    ('lap_time_ms', '<u4'),
+    ('sector1_ms', '<u4'),
+    ('sector2_ms', '<u4'),
+    ('sector3_ms', '<u4'),
+    ('valid_flags', 'u1'),              # lap_valid_bit_flags
+    ('compound', 'u1'),                 # visual (0 = 不明)
+    ('actual_compound', 'u1'),
+    ('team_id', 'u1'),                  # 255 = 不明
+])
+
+# セッション 1 つ分の条件
+SESSION_INFO_DTYPE = np.dtype([
+    ('session_uid', '<u8'),
+    ('track_id', 'i1'),                 # -1 = 不明
+    ('session_type', 'u1'),
+    ('weather', 'u1'),                  # 255 = 不明
+    ('track_temp', 'i1'),
+    ('air_temp', 'i1'),
+    ('player_car', 'u1'),
+])
+
+
+def _sector_ms(laps: np.ndarray, n: int) -> np.ndarray:
+    return (laps[f'sector{n}_time_minutes_part'].astype(np.uint32) * 60000
+            + laps[f'sector{n}_time_ms_part'].astype(np.uint32))
+
+
+def parse_session_history(data) -> Optional[Tuple[int, int, np.ndarray, np.ndarray]]:
+    """Session History パケット -> (car_idx, num_laps, ラップ [num_laps], スティント [num_tyre_stints])"""
+    if len(data) < SESSION_HISTORY_SIZE:
+        return None
+    car, num_laps, num_stints = _HISTORY_HEAD.unpack_from(data, HEADER_SIZE)[:3]
+    num_laps = min(num_laps, MAX_LAPS)
+    laps = np.frombuffer(data, dtype=LAP_HISTORY_DTYPE, count=num_laps, offset=_LAPS_OFFSET)
+    stints = np.frombuffer(data, dtype=TYRE_STINT_DTYPE, count=min(num_stints, MAX_STINTS), offset=_STINTS_OFFSET)
+    return car, num_laps, laps, stints
+
+
+def lap_records(session_uid: int, car: int, laps: np.ndarray, stints: np.ndarray,
+                team_id: int = 255) -> np.ndarray:
+    """Session History 1 台分 -> 走り終えた周の LAP_RECORD_DTYPE (ラップタイム 0 = 走行中の周は除く)"""
+    numbers = np.arange(1, len(laps) + 1)
+    done = laps['lap_time_in_ms'] > 0
+    records = np.zeros(int(done.sum()), dtype=LAP_RECORD_DTYPE)
+    if not len(records):
+        return records
+    records['session_uid'] = session_uid
+    records['car'] = car
+    records['lap'] = numbers[done]
+    records['lap_time_ms'] = laps['lap_time_in_ms'][done]
+    for n in (1, 2, 3):
+        records[f'sector{n}_ms'] = _sector_ms(laps, n)[done]
+    records['valid_flags'] = laps['lap_valid_bit_flags'][done]
+    records['team_id'] = team_id
+    if len(stints):
+        # 各周は end_lap がその周以上の最初のスティント (255 = 今のスティント)
+        end_laps = np.where(stints['end_lap'] == 255, MAX_LAPS + 1, stints['end_lap'])
+        stint = np.minimum(np.searchsorted(np.maximum.accumulate(end_laps), records['lap']), len(stints) - 1)
+        records['compound'] = stints['tyre_visual_compound'][stint]
+        records['actual_compound'] = stints['tyre_actual_compound'][stint]
+    return records
+
+
+class LapHistory:
+    """セッション (session_uid) ごとの条件と全車のラップ (.laps.npz)"""
+
+    def __init__(self, laps: Optional[np.ndarray] = None, sessions: Optional[np.ndarray] = None):
+        self.laps = np.empty(0, dtype=LAP_RECORD_DTYPE) if laps is None else laps
+        self.sessions = np.empty(0, dtype=SESSION_INFO_DTYPE) if sessions is None else sessions
+
+    def __len__(self):
+        return len(self.laps)
+
+    def save(self, path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(path, laps=self.laps, sessions=self.sessions)
+        return path
+
+    @classmethod
+    def load(cls, path) -> 'LapHistory':
+        with np.load(path) as data:
+            return cls(data['laps'], data['sessions'])
+
+    def invalid_player_laps(self) -> set:
+        """ゲームが無効にしたプレイヤーの周回番号 (トラックリミットなど)"""
+        invalid = set()
+        for session in self.sessions:
+            laps = self.laps[(self.laps['session_uid'] == session['session_uid'])
+                             & (self.laps['car'] == session['player_car'])]
+            invalid.update(laps['lap'][(laps['valid_flags'] & LAP_VALID) == 0].tolist())
+        return invalid
+
+    def __repr__(self):
+        return f"LapHistory(sessions={len(self.sessions)}, laps={len(self.laps)})"
+
+
+class SessionHistoryRecorder:
+    """Session History / Session / Participants パケットを受け取り、セッション × 車ごとの最新の履歴を持つ
+
+    Session History は全車を順番に送ってくるので、同じ内容のパケットはバイト比較だけで読み飛ばす。
+    """
+
+    def __init__(self):
+        # (session_uid, car) -> (ラップ, スティント) の最新
+        self._history: Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]] = {}
+        self._raw: Dict[Tuple[int, int], bytes] = {}
+        # session_uid -> SESSION_INFO_DTYPE の 1 行 / チーム [car]
+        self._sessions: Dict[int, np.ndarray] = {}
+        self._teams: Dict[int, np.ndarray] = {}
+        self.packet_count = 0
+
+    def _session(self, header) -> np.ndarray:
+        info = self._sessions.get(header.session_uid)
+        if info is None:
+            info = np.zeros((), dtype=SESSION_INFO_DTYPE)
+            info['session_uid'] = header.session_uid
+            info['track_id'] = -1
+            info['weather'] = 255
+            self._sessions[header.session_uid] = info
+        info['player_car'] = header.player_car_index
+        return info
+
+    def push(self, header, data: bytes) -> bool:
+        """受け取ったら True (対象外の種類・短いパケットは False)"""
+        packet_type = header.packet_type
+        if packet_type == PacketType.SESSION_HISTORY:
+            if len(data) < SESSION_HISTORY_SIZE:
+                return False
+            car = data[HEADER_SIZE]
+            key = (header.session_uid, car)
+            raw = bytes(data[HEADER_SIZE:SESSION_HISTORY_SIZE])
+            if self._raw.get(key) != raw:
+                self._raw[key] = raw
+                _, _, laps, stints = parse_session_history(data)
+                self._history[key] = (laps.copy(), stints.copy())
+                self._session(header)
+        elif packet_type == PacketType.SESSION:
+            if len(data) < HEADER_SIZE + _SESSION_HEAD.size:
+                return False
+            weather, track_temp, air_temp, _, _, session_type, track_id, _ = _SESSION_HEAD.unpack_from(data, HEADER_SIZE)
+            info = self._session(header)
+            info['weather'], info['track_temp'], info['air_temp'] = weather, track_temp, air_temp
+            info['session_type'], info['track_id'] = session_type, track_id
+        elif packet_type == PacketType.PARTICIPANTS:
+            end = HEADER_SIZE + 1 + NUM_CARS * _PARTICIPANT_SIZE
+            if len(data) < end:
+                return False
+            raw = np.frombuffer(data, dtype=np.uint8, count=end - HEADER_SIZE - 1, offset=HEADER_SIZE + 1)
+            self._teams[header.session_uid] = raw.reshape(NUM_CARS, _PARTICIPANT_SIZE)[:, _PARTICIPANT_TEAM_OFFSET].copy()
+            self._session(header)
+        else:
+            return False
+        self.packet_count += 1
+        return True
+
+    def history(self) -> LapHistory:
+        """今までのラップ (セッション・車・周の順)"""
+        records = []
+        for (uid, car), (laps, stints) in sorted(self._history.items()):
+            teams = self._teams.get(uid)
+            records.append(lap_records(uid, car, laps, stints, int(teams[car]) if teams is not None else 255))
+        laps = np.concatenate(records) if records else np.empty(0, dtype=LAP_RECORD_DTYPE)
+        sessions = np.array([self._sessions[uid] for uid in sorted(self._sessions)], dtype=SESSION_INFO_DTYPE)
+        return LapHistory(laps, sessions)
+
+    def __len__(self):
+        return sum(int((laps['lap_time_in_ms'] > 0).sum()) for laps, _ in self._history.values())
+
+
+def replay_history(path) -> LapHistory:
+    """.f1cap の Session History / Session / Participants を再生して LapHistory を作る"""
+    from .packet_parser import PacketParser
+    from .raw_capture import CaptureReader
+
+    recorder = SessionHistoryRecorder()
+    with CaptureReader(path) as reader:
+        rows = np.sort(np.concatenate([
+            reader.rows(packet_type) for packet_type in
+            (PacketType.SESSION, PacketType.PARTICIPANTS, PacketType.SESSION_HISTORY)
+        ]))
+        for row in rows:
+            data = reader.view(int(row))
+            header = PacketParser.parse_header(data)
+            if header:
+                recorder.push(header, data)
+    return recorder.history()
+
+
+def load_history(path) -> LapHistory:
+    """.laps.npz / .f1cap から読み込む"""
+    from .raw_capture import CAPTURE_SUFFIX
+
+    path = Path(path)
+    if path.suffix == CAPTURE_SUFFIX:
+        return replay_history(path)
+    return LapHistory.load(path)
+
+
+def session_name_for(path) -> str:
+    """.laps.npz / .f1cap に対応する CSV のファイル名 (TelemetryDataset のセッション名)"""
+    name = Path(path).name
+    for suffix in ('.laps.npz', '.f1cap'):
+        if name.endswith(suffix):
+            return name[:-len(suffix)] + '.csv'
+    return name
+
+
+# ==================== 索引 (sqlite) ====================
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS sources (path TEXT PRIMARY KEY, stamp TEXT);
+CREATE TABLE IF NOT EXISTS sessions (
+    session_uid TEXT PRIMARY KEY,
+    name TEXT, track TEXT, track_id INTEGER, session_type INTEGER,
+    weather INTEGER, track_temp INTEGER, air_temp INTEGER, player_car INTEGER
+);
+CREATE TABLE IF NOT EXISTS laps (
+    session_uid TEXT NOT NULL, car INTEGER NOT NULL, lap INTEGER NOT NULL,
+    lap_time_ms INTEGER, sector1_ms INTEGER, sector2_ms INTEGER, sector3_ms INTEGER,
+    valid INTEGER, valid_flags INTEGER, compound INTEGER, actual_compound INTEGER, team_id INTEGER,
+    player INTEGER, name TEXT, track TEXT, weather INTEGER, session_type INTEGER,
+    PRIMARY KEY (session_uid, car, lap)
+);
+CREATE INDEX IF NOT EXISTS laps_leaderboard ON laps (track, valid, lap_time_ms);
+CREATE INDEX IF NOT EXISTS laps_by_session ON laps (name, player, lap);
+"""
+
+_UPSERT_LAP = """
+INSERT INTO laps VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (session_uid, car, lap) DO UPDATE SET
+    lap_time_ms = excluded.lap_time_ms, sector1_ms = excluded.sector1_ms,
+    sector2_ms = excluded.sector2_ms, sector3_ms = excluded.sector3_ms,
+    valid = excluded.valid, valid_flags = excluded.valid_flags, compound = excluded.compound,
+    actual_compound = excluded.actual_compound, team_id = excluded.team_id, player = excluded.player,
+    name = excluded.name, track = excluded.track, weather = excluded.weather, session_type = excluded.session_type
+"""
+
+_UPSERT_SESSION = """
+INSERT INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (session_uid) DO UPDATE SET
+    name = excluded.name, track = excluded.track, track_id = excluded.track_id,
+    session_type = excluded.session_type, weather = excluded.weather, track_temp = excluded.track_temp,
+    air_temp = excluded.air_temp, player_car = excluded.player_car
+"""
+
+_LAP_COLUMNS = (
+    'name, track, session_uid, car, lap, lap_time_ms, sector1_ms, sector2_ms, sector3_ms, '
+    'valid, valid_flags, compound, team_id, weather, session_type, player'
+)
+
+
+@dataclass
+class LapEntry:
+    """索引の 1 周"""
+    session: str            # CSV のファイル名 (TelemetryDataset のセッション名)
+    track: str
+    session_uid: int
+    car: int
+    lap: int
+    lap_time: float         # s
+    sectors: Tuple[float, float, float]
+    valid: bool
+    valid_flags: int
+    compound: int
+    team_id: int
+    weather: int
+    session_type: int
+    player: bool
+
+    @classmethod
+    def from_row(cls, row) -> 'LapEntry':
+        (name, track, uid, car, lap, lap_time, s1, s2, s3, valid, flags, compound, team,
+         weather, session_type, player) = row
+        return cls(
+            session=name, track=track, session_uid=int(uid), car=car, lap=lap, lap_time=lap_time / 1000.0,
+            sectors=(s1 / 1000.0, s2 / 1000.0, s3 / 1000.0), valid=bool(valid), valid_flags=flags,
+            compound=compound, team_id=team, weather=weather, session_type=session_type, player=bool(player),
+        )
+
+    @property
+    def compound_name(self) -> str:
+        return COMPOUND_NAMES.get(self.compound, '-')
+
+    @property
+    def weather_name(self) -> str:
+        return WEATHER_NAMES.get(self.weather, '-')
+
+    def __repr__(self):
+        mark = '' if self.valid else ' (無効)'
+        return (
+            f"LapEntry({self.track} {self.session} car {self.car} #{self.lap}, "
+            f"{self.lap_time:.3f}s, {self.compound_name}{mark})"
+        )
+
+
+def _file_stamp(path) -> str:
+    stat = os.stat(path)
+    return json.dumps([stat.st_size, stat.st_mtime])
+
+
+def _compound_id(compound) -> Optional[int]:
+    """'Soft' などの表示名 / 番号 -> visual compound"""
+    if compound is None or isinstance(compound, int):
+        return compound
+    names = {name.lower(): number for number, name in COMPOUND_NAMES.items()}
+    if compound.lower() not in names:
+        raise ValueError(f"タイヤの種類が不明です: {compound} ({', '.join(COMPOUND_NAMES.values())})")
+    return names[compound.lower()]
+
+
+class LapIndex:
+    """全セッションのラップタイムの索引 (sqlite)
+
+    with LapIndex() as index:
+        index.upsert(history, name='telemetry_monza_....csv')
+        index.leaderboard('monza', n=10)
+        index.laps(session='telemetry_monza_....csv', valid_only=True)
+    """
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = Path(path)
+        if str(path) != ':memory:':
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(path))
+        self._check_schema()
+
+    def _check_schema(self):
+        self.db.executescript(_SCHEMA)
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row is not None and int(row[0]) == SCHEMA_VERSION:
+            return
+        if row is not None:
+            self.db.executescript(
+                "DROP TABLE IF EXISTS laps; DROP TABLE IF EXISTS sessions; DROP TABLE IF EXISTS sources;"
+            )
+            self.db.executescript(_SCHEMA)
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(SCHEMA_VERSION),))
+        self.db.commit()
+
+    # ---------- 書き込み ----------
+
+    def upsert(self, history: LapHistory, name: str = '', track: Optional[str] = None) -> int:
+        """LapHistory を追加 / 更新する (同じ session_uid × 車 × 周は上書き)。書いた周の数を返す
+
+        Args:
+            name: 対応する CSV のファイル名
+            track: Session パケットがなかった時のサーキット名 (既定はファイル名から)
+        """
+        from .laps import track_name_from_path
+
+        fallback = track or track_name_from_path(name)
+        sessions = {}
+        for info in history.sessions.tolist():
+            uid, track_id, session_type, weather, track_temp, air_temp, player_car = info
+            sessions[uid] = (TRACK_NAMES.get(track_id, fallback), weather, session_type, player_car)
+            self.db.execute(_UPSERT_SESSION, (
+                str(uid), name, sessions[uid][0], track_id, session_type, weather, track_temp, air_temp, player_car,
+            ))
+        laps = history.laps
+        rows = []
+        for record in laps.tolist():
+            uid, car, lap, lap_time, s1, s2, s3, flags, compound, actual, team = record
+            session_track, weather, session_type, player_car = sessions.get(uid, (fallback, 255, 0, 255))
+            rows.append((
+                str(uid), car, lap, lap_time, s1, s2, s3, flags & LAP_VALID, flags, compound, actual, team,
+                int(car == player_car), name, session_track, weather, session_type,
+            ))
+        self.db.executemany(_UPSERT_LAP, rows)
+        self.db.commit()
+        return len(rows)
+
+    def update(self, paths: Iterable, refresh: bool = False) -> Dict[str, int]:
+        """.laps.npz / .f1cap を取り込む (前回からサイズ・更新時刻が変わったものだけ)
+
+        Returns:
+            パス -> 書いた周の数 (エラーは -1)
+        """
+        results = {}
+        for path in paths:
+            path = str(path)
+            stamp = _file_stamp(path)
+            row = self.db.execute("SELECT stamp FROM sources WHERE path = ?", (path,)).fetchone()
+            if not refresh and row is not None and row[0] == stamp:
+                continue
+            try:
+                history = load_history(path)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️  ラップ履歴を読めません: {path} ({e})")
+                results[path] = -1
+                continue
+            results[path] = self.upsert(history, name=session_name_for(path))
+            self.db.execute("INSERT OR REPLACE INTO sources VALUES (?, ?)", (path, stamp))
+            self.db.commit()
+        return results
+
+    # ---------- 読み出し ----------
+
+    def _select(self, where: List[str], params: list, order: str, limit: Optional[int]) -> List[LapEntry]:
+        sql = f"SELECT {_LAP_COLUMNS} FROM laps"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order}"
+        if limit:
+            sql += " LIMIT ?"
+            params = params + [int(limit)]
+        return [LapEntry.from_row(row) for row in self.db.execute(sql, params)]
+
+    @staticmethod
+    def _filters(track=None, team=None, compound=None, weather=None, session_type=None,
+                 valid_only=True, player_only=False, sessions: Optional[Sequence[str]] = None):
+        where, params = [], []
+        for column, value in (('track', track), ('team_id', team), ('compound', _compound_id(compound)),
+                              ('weather', weather), ('session_type', session_type)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if valid_only:
+            where.append("valid = 1")
+        if player_only:
+            where.append("player = 1")
+        if sessions is not None:
+            sessions = list(sessions)
+            where.append(f"name IN ({', '.join('?' * len(sessions))})")
+            params += sessions
+        return where, params
+
+    def leaderboard(self, track: Optional[str] = None, n: int = 10, team: Optional[int] = None,
+                    compound=None, weather: Optional[int] = None, session_type: Optional[int] = None,
+                    valid_only: bool = True, player_only: bool = False,
+                    sessions: Optional[Sequence[str]] = None) -> List[LapEntry]:
+        """条件に合う周を速い順に n 件 (track + valid の索引をタイム順に読むだけ)"""
+        where, params = self._filters(track, team, compound, weather, session_type, valid_only, player_only, sessions)
+        return self._select(where, params, "lap_time_ms", n)
+
+    def laps(self, session: Optional[str] = None, track: Optional[str] = None, player_only: bool = True,
+             valid_only: bool = False, **filters) -> List[LapEntry]:
+        """セッション (CSV のファイル名) / サーキットの周を周回順に"""
+        where, params = self._filters(track, valid_only=valid_only, player_only=player_only,
+                                      sessions=None if session is None else [session], **filters)
+        return self._select(where, params, "name, session_uid, car, lap", None)
+
+    def best_lap(self, track: Optional[str] = None, **filters) -> Optional[LapEntry]:
+        best = self.leaderboard(track, n=1, **filters)
+        return best[0] if best else None
+
+    def tracks(self) -> Dict[str, int]:
+        """サーキット -> 周の数"""
+        return dict(self.db.execute("SELECT track, COUNT(*) FROM laps GROUP BY track ORDER BY track").fetchall())
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM laps").fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        sessions = self.db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return f"LapIndex({self.path}, sessions={sessions}, laps={len(self)})"
+
+
+if __name__ == "__main__":
+    print("✓ Lap Index モジュール読み込み完了")
+    print(f"- Session History: {SESSION_HISTORY_SIZE} bytes, 1 周 {LAP_HISTORY_DTYPE.itemsize} bytes")
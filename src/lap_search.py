@@ -0,0 +1,327 @@
+"""
+F1 25 Lap Similarity Search
+ラップを距離グリッドに載せた固定長の特徴ベクトルで索引にし、リファレンスに近いラップを k 近傍で探す
+
+1 サーキットにつき 1 つの索引で、全ラップを同じ距離グリッド (STEP m 間隔) に補間して
+[ラップ, チャンネル, 点] の配列に積む。区間 (コーナー / 任意の距離範囲) のベクトルはその範囲の列なので、
+どの区間でも全ラップが同じ長さになる。
+検索は「両方が走っている点だけの二乗平均の差」を全ラップまとめて行列 x ベクトルで計算する。
+ファイルを読み直して相関を取る必要はない。
+
+index = lap_search_for_captures(glob.glob('telemetry_data/telemetry_monza_*.csv'))
+lesmo = index.segment(corner_map, [6, 7])
+for match in index.query(reference_lap, k=5, segment=lesmo):
+    print(match)
+"""
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .laps import Lap, extract_laps, resample, track_name_from_path, track_length
+
+
+CACHE_DIR = Path("cache") / "lap_search"
+
+# 保存形式を変えたら上げる
+INDEX_VERSION = 1
+
+# 距離グリッドの間隔 (m)
+STEP = 10.0
+
+# 特徴にするチャンネルと、差を揃えるための倍率 (速度 10 km/h の差 = 入力 10% の差)
+CHANNEL_SCALES = {'speed_kph': 0.01, 'throttle': 1.0, 'brake': 1.0, 'steering': 1.0}
+
+# コーナー区間の前後に足す余白 (m)
+CORNER_MARGIN = 30.0
+
+# 比べた点がクエリの点のこの割合未満のラップは候補にしない
+MIN_OVERLAP = 0.9
+
+
+def _file_stamp(path) -> List[float]:
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime]
+
+
+@dataclass
+class Match:
+    """検索結果 1 件"""
+    session: str
+    lap: int
+    lap_time: float
+    complete: bool
+    distance: float        # 二乗平均の差の平方根 (倍率をかけた単位)
+    overlap: float         # 比べた点の割合
+
+    def __repr__(self):
+        return (
+            f"Match({self.session} #{self.lap}, distance={self.distance:.4f}, "
+            f"time={self.lap_time:.3f}s, overlap={self.overlap:.0%})"
+        )
+
+
+class LapSearchIndex:
+    """1 サーキット分のラップの特徴ベクトル
+
+    features[i] はラップ i を grid に補間して倍率をかけた (チャンネル, 点) の配列。
+    走っていない点は NaN (= 比べない)。
+    """
+
+    def __init__(self, track: str, track_length: float, step: float = STEP,
+                 channels: Sequence[str] = tuple(CHANNEL_SCALES)):
+        self.track = track
+        self.track_length = float(track_length)
+        self.step = float(step)
+        self.channels = list(channels)
+        self.grid = np.arange(0.0, self.track_length, self.step)
+        self._scales = np.array([CHANNEL_SCALES.get(name, 1.0) for name in self.channels])
+        self.features = np.empty((0, len(self.channels), len(self.grid)), dtype=np.float32)
+        # ラップ i の (セッション, 周回番号, ラップタイム, 完走)
+        self.keys: List[Tuple[str, int, float, bool]] = []
+        self.file_stamps: Dict[str, List[float]] = {}   # 取り込み済みファイルの [サイズ, 更新時刻]
+        # 検索用の (欠損を 0 にした値, その 2 乗, 欠損でないか) (追加のたびに作り直す)
+        self._prepared = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    # ==================== 特徴ベクトル ====================
+    def vector(self, lap: Lap) -> np.ndarray:
+        """ラップ -> (チャンネル, 点) の特徴 (走っていない点・ないチャンネルは NaN)"""
+        out = np.full((len(self.channels), len(self.grid)), np.nan, dtype=np.float32)
+        names = [name for name in self.channels if name in lap.channels]
+        values = resample(lap, self.grid, names)
+        outside = (self.grid < lap.distance[0]) | (self.grid > lap.distance[-1])
+        for c, name in enumerate(self.channels):
+            if name in values:
+                row = values[name] * self._scales[c]
+                row[outside] = np.nan
+                out[c] = row
+        return out
+
+    def add_laps(self, laps: Sequence[Lap]) -> int:
+        """ラップをまとめて追加 (既にある (セッション, 周回番号) は置き換え)、追加した数を返す
+
+        フラッシュバックで同じ周回番号が複数あれば最後のものだけを残す。
+        """
+        latest = {(lap.session, lap.number): lap for lap in laps if len(lap) >= 2}
+        laps = list(latest.values())
+        if not laps:
+            return 0
+        new_keys = {(lap.session, lap.number) for lap in laps}
+        keep = [i for i, key in enumerate(self.keys) if (key[0], key[1]) not in new_keys]
+        vectors = np.stack([self.vector(lap) for lap in laps])
+        self.features = np.concatenate((self.features[keep], vectors))
+        self.keys = [self.keys[i] for i in keep] + [
+            (lap.session, lap.number, float(lap.lap_time), bool(lap.complete)) for lap in laps
+        ]
+        self._prepared = None
+        return len(laps)
+
+    def add_lap(self, lap: Lap) -> int:
+        return self.add_laps([lap])
+
+    def remove_session(self, session: str) -> int:
+        """セッションのラップを取り除く (ファイルが変わった時の入れ替え用)"""
+        keep = [i for i, key in enumerate(self.keys) if key[0] != session]
+        removed = len(self.keys) - len(keep)
+        if removed:
+            self.features = self.features[keep]
+            self.keys = [self.keys[i] for i in keep]
+            self._prepared = None
+        return removed
+
+    def update_from_captures(self, paths: Iterable, workers: Optional[int] = None) -> int:
+        """保存済みセッションのうち新しい / 変わったファイルのラップだけを取り込む"""
+        pending = []
+        for path in paths:
+            path = Path(path)
+            stamp = _file_stamp(path)
+            if self.file_stamps.get(path.name) != stamp:
+                pending.append((path, stamp))
+        if not pending:
+            return 0
+
+        if workers is None:
+            workers = min(len(pending), os.cpu_count() or 1)
+        jobs = [str(path) for path, _ in pending]
+        if workers <= 1 or len(pending) <= 1:
+            results = [_laps_job(path, self.channels) for path in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_laps_job, jobs, [self.channels] * len(jobs)))
+
+        added = 0
+        for (path, stamp), laps in zip(pending, results):
+            self.remove_session(path.name)
+            added += self.add_laps(laps)
+            self.file_stamps[path.name] = stamp
+        return added
+
+    # ==================== 検索 ====================
+    def segment(self, corner_map, corners: Sequence[int], margin: float = CORNER_MARGIN) -> Tuple[float, float]:
+        """コーナー番号 (1 始まり) の範囲 -> (開始, 終了) m (最初のコーナーの entry から最後の exit まで)"""
+        wanted = set(corners)
+        picked = [corner for corner in corner_map.corners if corner.number in wanted]
+        if not picked:
+            raise ValueError(f"コーナーがありません: {list(corners)} (全 {len(corner_map.corners)} コーナー)")
+        return min(c.entry for c in picked) - margin, max(c.exit for c in picked) + margin
+
+    def _columns(self, segment: Optional[Tuple[float, float]]) -> slice:
+        if segment is None:
+            return slice(0, len(self.grid))
+        lo, hi = np.searchsorted(self.grid, [max(segment[0], 0.0), min(segment[1], self.track_length)])
+        if hi - lo < 2:
+            raise ValueError(f"区間が短すぎます: {segment[0]:.0f}-{segment[1]:.0f}m (グリッド {self.step:g}m)")
+        return slice(int(lo), int(hi))
+
+    def _prepare(self):
+        if self._prepared is None:
+            present = ~np.isnan(self.features)
+            filled = np.where(present, self.features, 0.0).astype(np.float32)
+            self._prepared = (filled, filled * filled, present.astype(np.float32))
+        return self._prepared
+
+    def distances(self, query: np.ndarray, segment: Optional[Tuple[float, float]] = None
+                  ) -> Tuple[np.ndarray, np.ndarray]:
+        """全ラップとの差 (RMS) と比べた点の割合
+
+        差の 2 乗和は Σ m·q² - 2 Σ x·q + Σ x²·mq (m, mq = 欠損でないか) に分けて、
+        [ラップ, 次元] x [次元] の積 3 回で全ラップ分を一度に計算する。
+        """
+        columns = self._columns(segment)
+        filled, squared, present = (values[:, :, columns].reshape(len(self), -1) for values in self._prepare())
+        query = np.asarray(query, dtype=np.float32)[:, columns].reshape(-1)
+        query_present = ~np.isnan(query)
+        weight = query_present.astype(np.float32)
+        q = np.where(query_present, query, 0.0).astype(np.float32)
+        total = present @ (q * q) - 2.0 * (filled @ q) + squared @ weight
+        counts = present @ weight
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rms = np.sqrt(np.maximum(total, 0.0) / counts)
+        overlap = counts / max(float(weight.sum()), 1.0)
+        return rms.astype(np.float64), overlap.astype(np.float64)
+
+    def query(self, lap, k: int = 5, segment: Optional[Tuple[float, float]] = None,
+              exclude: Sequence[Tuple[str, int]] = (), min_overlap: float = MIN_OVERLAP) -> List[Match]:
+        """lap (Lap または vector()) に近いラップを k 件、近い順に
+
+        Args:
+            segment: (開始, 終了) m の区間だけで比べる (segment() でコーナーから作れる)
+            exclude: 除く (セッション, 周回番号) (リファレンス自身など)
+        """
+        if not len(self):
+            return []
+        if isinstance(lap, Lap):
+            exclude = list(exclude) + [(lap.session, lap.number)]
+            lap = self.vector(lap)
+        rms, overlap = self.distances(lap, segment)
+        candidate = (overlap >= min_overlap) & np.isfinite(rms)
+        excluded = set(exclude)
+        for i, key in enumerate(self.keys):
+            if (key[0], key[1]) in excluded:
+                candidate[i] = False
+        rows = np.flatnonzero(candidate)
+        if len(rows) > k:
+            rows = rows[np.argpartition(rms[rows], k)[:k]]
+        rows = rows[np.argsort(rms[rows], kind='stable')]
+        return [
+            Match(*self.keys[i][:2], self.keys[i][2], self.keys[i][3], float(rms[i]), float(overlap[i]))
+            for i in rows
+        ]
+
+    def query_lap(self, session: str, number: int, **kwargs) -> List[Match]:
+        """索引にあるラップを基準に検索 (自身は除く)"""
+        for i, key in enumerate(self.keys):
+            if key[0] == session and key[1] == number:
+                exclude = list(kwargs.pop('exclude', ())) + [(session, number)]
+                return self.query(self.features[i], exclude=exclude, **kwargs)
+        raise KeyError(f"索引にないラップです: {session} #{number}")
+
+    # ==================== 保存 / 読み込み ====================
+    def save(self, cache_dir: Path = CACHE_DIR) -> Path:
+        """npz に保存 (次回はここから増分更新)"""
+        cache_dir = Path(cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        path = cache_dir / f"{self.track}.npz"
+        meta = {
+            'version': INDEX_VERSION,
+            'track': self.track,
+            'track_length': self.track_length,
+            'step': self.step,
+            'channels': self.channels,
+            'keys': self.keys,
+            'file_stamps': self.file_stamps,
+        }
+        np.savez_compressed(path, meta=np.array(json.dumps(meta, ensure_ascii=False)), features=self.features)
+        return path
+
+    @classmethod
+    def load(cls, track: str, cache_dir: Path = CACHE_DIR) -> Optional['LapSearchIndex']:
+        """保存した索引を読み込み (なければ / 古い形式なら None)"""
+        path = Path(cache_dir) / f"{track}.npz"
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            if meta.get('version') != INDEX_VERSION:
+                return None
+            index = cls(meta['track'], meta['track_length'], meta['step'], meta['channels'])
+            index.features = data['features']
+        index.keys = [tuple(key) for key in meta['keys']]
+        index.file_stamps = meta['file_stamps']
+        return index
+
+    def __repr__(self):
+        sessions = len({key[0] for key in self.keys})
+        return (
+            f"LapSearchIndex({self.track}, laps={len(self)}, sessions={sessions}, "
+            f"{len(self.channels)}x{len(self.grid)} points, {self.features.nbytes / 1e6:.1f} MB)"
+        )
+
+
+def _laps_job(path: str, channels: Sequence[str]) -> List[Lap]:
+    """ProcessPool 用: 1 ファイルのラップ (distance が揃っているもの)"""
+    from .normalization import load_columns
+
+    return extract_laps(load_columns(path), channels=channels, session=Path(path).name)
+
+
+def lap_search_for_captures(
+    paths: Sequence,
+    track: Optional[str] = None,
+    cache_dir: Path = CACHE_DIR,
+    workers: Optional[int] = None,
+    refresh: bool = False,
+) -> LapSearchIndex:
+    """キャッシュ済みの索引に新しい / 変わったセッションのラップだけを足して保存する"""
+    paths = list(paths)
+    cache_dir = Path(cache_dir)
+    track = track or track_name_from_path(paths[0])
+    index = None if refresh else LapSearchIndex.load(track, cache_dir)
+    if index is None:
+        # グリッドの長さは完走ラップのある最初のセッションから決める (どこにもなければラップのある最初のもの)
+        reference = []
+        for path in paths:
+            laps = _laps_job(str(path), tuple(CHANNEL_SCALES))
+            if any(lap.complete for lap in laps):
+                reference = laps
+                break
+            reference = reference or laps
+        if not reference:
+            raise ValueError(f"ラップがありません (LapNum / LapDistance 列が必要): {len(paths)} ファイル")
+        index = LapSearchIndex(track, track_length(reference))
+    if index.update_from_captures(paths, workers=workers) or not (cache_dir / f"{track}.npz").exists():
+        index.save(cache_dir)
+    return index
+
+
+if __name__ == "__main__":
+    print("✓ Lap Similarity Search モジュール読み込み完了")
+    print(f"- 特徴: {', '.join(CHANNEL_SCALES)} / {STEP:g} m")
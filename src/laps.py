@@ -0,0 +1,153 @@
+"""
+F1 25 Lap Extraction
+正規化済みテーブルをラップ単位の配列 (lap_distance 基準) に分割する
+"""
+
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+# ラップ単位で切り出すチャンネル (存在するものだけ)
+DEFAULT_CHANNELS = ('speed_kph', 'throttle', 'brake', 'steering', 'gear', 'rpm')
+
+# ラップの開始とみなす lap_distance の上限 (m)
+LAP_START_TOLERANCE = 50.0
+
+
+@dataclass
+class Lap:
+    """1 ラップ分の配列 (distance で昇順)"""
+    number: int
+    distance: np.ndarray              # lap_distance (m)
+    time: np.ndarray                  # ラップ開始からの経過時間 (s)
+    channels: Dict[str, np.ndarray] = field(default_factory=dict)
+    lap_time: float = float('nan')    # 公式ラップタイム (s, 分かる場合)
+    complete: bool = False            # スタートラインから次のラップまで走り切ったか
+    session: str = ''                 # 由来するセッション (ファイル名など)
+
+    def __len__(self):
+        return len(self.distance)
+
+    def __repr__(self):
+        return (
+            f"Lap(#{self.number}, samples={len(self)}, "
+            f"time={self.lap_time:.3f}s, complete={self.complete})"
+        )
+
+
+def track_name_from_path(path) -> str:
+    """telemetry_{track}_... 形式のファイル名からサーキット名を取り出す"""
+    match = re.match(r"telemetry_([a-z0-9]+)", Path(path).name.lower())
+    return match.group(1) if match else "unknown"
+
+
+def _lap_elapsed(table, rows: np.ndarray) -> Optional[np.ndarray]:
+    """ラップ内の経過時間 (s)"""
+    if 'lap_time_ms' in table:
+        return np.asarray(table['lap_time_ms'], dtype=np.float64)[rows] / 1000.0
+    if 'session_time' in table:
+        session_time = np.asarray(table['session_time'], dtype=np.float64)[rows]
+        return session_time - session_time[0]
+    return None
+
+
+def extract_laps(
+    table,
+    channels: Sequence[str] = DEFAULT_CHANNELS,
+    session: str = '',
+    complete_only: bool = False,
+) -> List[Lap]:
+    """正規化済みテーブル (DataFrame / dict) をラップに分割
+
+    lap_number が連続している区間を 1 ラップとし、lap_distance が
+    単調増加していないサンプル (スタートライン手前の負の距離など) は除く。
+    """
+    if 'lap_number' not in table or 'lap_distance' not in table:
+        return []
+
+    lap_number = np.asarray(table['lap_number'], dtype=np.float64)
+    distance = np.asarray(table['lap_distance'], dtype=np.float64)
+    if len(lap_number) == 0:
+        return []
+    last_lap_ms = (
+        np.asarray(table['last_lap_time_ms'], dtype=np.float64)
+        if 'last_lap_time_ms' in table else None
+    )
+    available = [name for name in channels if name in table]
+    columns = {name: np.asarray(table[name], dtype=np.float64) for name in available}
+
+    # lap_number が変わる位置で区切る
+    change = np.flatnonzero(np.diff(lap_number) != 0) + 1
+    starts = np.concatenate(([0], change))
+    ends = np.concatenate((change, [len(lap_number)]))
+
+    laps = []
+    for k, (start, end) in enumerate(zip(starts, ends)):
+        number = lap_number[start]
+        if number != number:   # NaN
+            continue
+        rows = np.arange(start, end)
+        d = distance[rows]
+        # 単調増加する部分だけを残す
+        running_max = np.maximum.accumulate(np.where(d >= 0, d, -np.inf))
+        previous_max = np.concatenate(([-np.inf], running_max[:-1]))
+        keep = (d >= 0) & (d > previous_max)
+        rows = rows[keep]
+        if len(rows) < 2:
+            continue
+
+        elapsed = _lap_elapsed(table, rows)
+        if elapsed is None:
+            continue
+
+        # 次のラップの先頭行の last_lap_time が、このラップの公式タイム
+        has_next = k + 1 < len(starts) and lap_number[starts[k + 1]] == number + 1
+        lap_time = float('nan')
+        if has_next and last_lap_ms is not None:
+            lap_time = last_lap_ms[starts[k + 1]] / 1000.0
+        complete = bool(has_next and distance[rows[0]] <= LAP_START_TOLERANCE)
+        if complete_only and not complete:
+            continue
+        if not lap_time > 0:
+            lap_time = float(elapsed[-1]) if complete else float('nan')
+
+        laps.append(Lap(
+            number=int(number),
+            distance=distance[rows],
+            time=elapsed,
+            channels={name: values[rows] for name, values in columns.items()},
+            lap_time=lap_time,
+            complete=complete,
+            session=session,
+        ))
+    return laps
+
+
+def resample(lap: Lap, grid: np.ndarray, names: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+    """ラップを距離グリッドに線形補間 ('time' も含む)"""
+    names = list(lap.channels) if names is None else names
+    out = {'time': np.interp(grid, lap.distance, lap.time)}
+    for name in names:
+        values = lap.channels[name]
+        valid = ~np.isnan(values)
+        if valid.sum() < 2:
+            out[name] = np.full(len(grid), np.nan)
+        else:
+            out[name] = np.interp(grid, lap.distance[valid], values[valid])
+    return out
+
+
+def track_length(laps: Sequence[Lap]) -> float:
+    """完走ラップの最大 lap_distance からコース長を推定"""
+    complete = [lap.distance[-1] for lap in laps if lap.complete]
+    if not complete:
+        complete = [lap.distance[-1] for lap in laps]
+    return float(np.median(complete)) if complete else 0.0
+
+
+if __name__ == "__main__":
+    print("✓ Laps モジュール読み込み完了")
@@ -0,0 +1,185 @@
+"""
+F1 25 Live Delta
+リファレンスラップ (自己ベスト / キャッシュ済みプロラップ) との差を LapData 受信ごとに更新する
+
+ホットパスは標準ライブラリのみ (array + bisect) で、1 回の更新は O(log n)。
+"""
+
+import csv
+from array import array
+from bisect import bisect_right
+from pathlib import Path
+from typing import List, Optional
+
+
+REFERENCE_DIR = Path("cache") / "reference"
+
+
+class ReferenceLap:
+    """距離 -> 経過時間 の対応表 (distance は狭義単調増加)"""
+
+    def __init__(self, distance, time, name: str = "reference"):
+        self.distance, self.time = array('d'), array('d')
+        for d, t in zip(distance, time):
+            # 同じ距離が続く点は捨てて狭義単調増加にする
+            if self.distance and d <= self.distance[-1]:
+                continue
+            self.distance.append(d)
+            self.time.append(t)
+        if len(self.distance) < 2:
+            raise ValueError("リファレンスラップには 2 点以上の distance/time が必要です")
+        self.name = name
+
+    @property
+    def length(self) -> float:
+        return self.distance[-1]
+
+    @property
+    def lap_time(self) -> float:
+        return self.time[-1]
+
+    def time_at(self, distance: float) -> float:
+        """distance 地点の経過時間 (二分探索 + 線形補間)"""
+        d = self.distance
+        i = bisect_right(d, distance)
+        if i <= 0:
+            return self.time[0]
+        if i >= len(d):
+            return self.time[-1]
+        d0, d1 = d[i - 1], d[i]
+        t0, t1 = self.time[i - 1], self.time[i]
+        return t0 + (t1 - t0) * (distance - d0) / (d1 - d0)
+
+    @classmethod
+    def from_lap(cls, lap, name: Optional[str] = None) -> 'ReferenceLap':
+        """laps.Lap から作る"""
+        return cls(lap.distance.tolist(), lap.time.tolist(), name or f"{lap.session} lap {lap.number}")
+
+    @classmethod
+    def personal_best(cls, paths) -> 'ReferenceLap':
+        """保存済みセッションの中から最速の完走ラップを選ぶ"""
+        from .laps import extract_laps
+        from .normalization import load_capture
+
+        best = None
+        for path in ([paths] if isinstance(paths, (str, Path)) else paths):
+            for lap in extract_laps(load_capture(path), session=Path(path).name, complete_only=True):
+                if best is None or lap.lap_time < best.lap_time:
+                    best = lap
+        if best is None:
+            raise ValueError("完走ラップが見つかりません")
+        return cls.from_lap(best, name=f"PB {best.session} lap {best.number}")
+
+    def save(self, path=None) -> Path:
+        """CSV (distance,time) でキャッシュに保存"""
+        path = Path(path) if path else REFERENCE_DIR / f"{self.name}.csv"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['distance', 'time'])
+            for d, t in zip(self.distance, self.time):
+                writer.writerow([f"{d:.2f}", f"{t:.4f}"])
+        return path
+
+    @classmethod
+    def load(cls, path) -> 'ReferenceLap':
+        """save() した CSV から読み込み (標準ライブラリのみ)"""
+        path = Path(path)
+        distance, time = array('d'), array('d')
+        with open(path, newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader)
+            for d, t in reader:
+                distance.append(float(d))
+                time.append(float(t))
+        return cls(distance, time, name=path.stem)
+
+    def __repr__(self):
+        return f"ReferenceLap({self.name}, {self.length:.0f}m, {self.lap_time:.3f}s)"
+
+
+class LiveDeltaEngine:
+    """LapData ごとにリファレンスとのタイム差を更新する
+
+    delta > 0 はリファレンスより遅れている (秒)。
+    mini-sector ごとに「区間内でどれだけ差が増減したか」を trend として保持する。
+    """
+
+    def __init__(self, reference: ReferenceLap, mini_sectors: int = 20):
+        self.reference = reference
+        self.mini_sectors = mini_sectors
+        self.sector_length = reference.length / mini_sectors
+
+        self.lap_num = -1
+        self.lap_distance = 0.0
+        self.delta = 0.0
+        self.updates = 0
+        self._sector = 0
+        self._sector_start_delta = 0.0
+        # 現在のラップ / 前のラップの mini-sector ごとの差の変化 (None = 未通過)
+        self.sector_trend: List[Optional[float]] = [None] * mini_sectors
+        self.last_lap_trend: List[Optional[float]] = [None] * mini_sectors
+
+    def update(self, lap_num: int, lap_distance: float, current_lap_time_ms: int) -> float:
+        """現在のラップ・距離・ラップ内経過時間から delta を更新して返す"""
+        if lap_num != self.lap_num:
+            self._new_lap(lap_num)
+        elif lap_distance < self.lap_distance:
+            # 同じラップ内で距離が戻ったパケット (順序入れ替わり) は無視
+            return self.delta
+        if lap_distance < 0:
+            return self.delta
+
+        self.lap_distance = lap_distance
+        self.delta = current_lap_time_ms / 1000.0 - self.reference.time_at(lap_distance)
+        self.updates += 1
+
+        sector = min(int(lap_distance / self.sector_length), self.mini_sectors - 1)
+        if sector != self._sector:
+            # 通過した mini-sector の trend を確定
+            self.sector_trend[self._sector] = self.delta - self._sector_start_delta
+            self._sector = sector
+            self._sector_start_delta = self.delta
+        return self.delta
+
+    def on_lap_data(self, header, lap_data):
+        """TelemetryDataCollector のハンドラーとして登録する用"""
+        self.update(lap_data.current_lap_num, lap_data.lap_distance, lap_data.current_lap_time_in_ms)
+
+    def _new_lap(self, lap_num: int):
+        """ラップが変わったら区間の状態を切り替える"""
+        if self.lap_num >= 0:
+            self.sector_trend[self._sector] = self.delta - self._sector_start_delta
+            self.last_lap_trend = self.sector_trend
+        self.sector_trend = [None] * self.mini_sectors
+        self.lap_num = lap_num
+        self.lap_distance = 0.0
+        self.delta = 0.0
+        self._sector = 0
+        self._sector_start_delta = 0.0
+
+    @property
+    def current_sector(self) -> int:
+        return self._sector
+
+    @property
+    def current_sector_trend(self) -> float:
+        """現在の mini-sector に入ってからの差の変化 (負 = 縮めている)"""
+        return self.delta - self._sector_start_delta
+
+    def snapshot(self) -> dict:
+        """オーバーレイ表示用の軽量な状態"""
+        return {
+            'lap': self.lap_num,
+            'distance': self.lap_distance,
+            'delta': self.delta,
+            'sector': self._sector,
+            'sector_trend': self.current_sector_trend,
+        }
+
+    def __repr__(self):
+        return f"LiveDeltaEngine({self.reference.name}, lap={self.lap_num}, delta={self.delta:+.3f}s)"
+
+
+if __name__ == "__main__":
+    print("✓ Live Delta モジュール読み込み完了")
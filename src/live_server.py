@@ -0,0 +1,452 @@
+"""
+F1 25 Live Server
+listener が確定したフレームを、ローカルのダッシュボードやセカンドスクリーンに WebSocket / HTTP で配信する
+
+標準ライブラリ (asyncio) のみ。サーバーは別スレッドのイベントループで動き、受信ループ側は
+フレームを 1 つ渡すだけ (call_soon_threadsafe) なので、接続数が増えても受信には影響しない。
+
+- WebSocket: ws://127.0.0.1:20780/ws?channels=telemetry,lap_data&rate=20
+  接続後に {"channels": [...], "rate": 10, "cars": [0, 3]} を送ると購読を変更できる
+- Server-Sent Events: http://127.0.0.1:20780/events?channels=grid&cars=0,1,2&rate=4
+- 状態: http://127.0.0.1:20780/status
+
+rate は 1 秒あたりのフレーム数 (session time 基準の間引き、0 = 全フレーム)。
+各クライアントの送信待ちは上限付きで、遅いクライアントは古いものから捨てる。
+同じ購読のクライアントには同じエンコード済みバイト列を送る (1 フレームにつき 1 回だけエンコード)。
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import struct
+import threading
+from collections import deque
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from .packet_parser import PacketType
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 20780
+
+# 購読できるチャンネル (grid 以外はプレイヤー車の確定フレームの各スロット)
+FRAME_CHANNELS = ('lap_data', 'telemetry', 'motion', 'status', 'damage')
+CHANNELS = FRAME_CHANNELS + ('grid',)
+DEFAULT_CHANNELS = ('lap_data', 'telemetry')
+
+# grid チャンネルで送る全車の Lap Data 項目
+GRID_FIELDS = ('car_position', 'current_lap_num', 'lap_distance', 'last_lap_time_in_ms',
+               'pit_status', 'num_pit_stops', 'result_status')
+
+# 間引きの許容誤差 (session time は float32 なので 1 フレームの 1/8 程度)
+_RATE_TOLERANCE = 0.002
+# 送信バッファの上限 (これを超えたら drain を待ち、その間はキューで古いものを捨てる)
+_WRITE_BUFFER_HIGH = 16 * 1024
+
+_WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+_WS_TEXT, _WS_CLOSE, _WS_PING, _WS_PONG = 0x1, 0x8, 0x9, 0xA
+
+
+class Subscription:
+    """1 クライアントの購読内容 (チャンネル・間引き・対象車)"""
+
+    def __init__(self, channels: Iterable[str] = DEFAULT_CHANNELS, rate: float = 0.0,
+                 cars: Optional[Iterable[int]] = None):
+        self.channels: Tuple[str, ...] = ()
+        self.rate = 0.0
+        self.cars: Optional[Tuple[int, ...]] = None
+        self.last_time = None
+        self.update({'channels': list(channels), 'rate': rate, 'cars': cars})
+
+    def update(self, message: dict):
+        """購読の変更 (指定された項目だけ)。不正な値は ValueError"""
+        if 'channels' in message:
+            channels = message['channels']
+            if isinstance(channels, str):
+                channels = [name for name in channels.split(',') if name]
+            unknown = [name for name in channels if name not in CHANNELS]
+            if unknown:
+                raise ValueError(f"不明なチャンネル: {', '.join(map(str, unknown))} (使えるもの: {', '.join(CHANNELS)})")
+            # 順序を固定して、同じ購読どうしでエンコード結果を共有できるようにする
+            self.channels = tuple(name for name in CHANNELS if name in channels)
+        if 'rate' in message:
+            rate = float(message['rate'] or 0.0)
+            if rate < 0:
+                raise ValueError(f"rate は 0 以上: {rate}")
+            self.rate = rate
+            self.last_time = None
+        if 'cars' in message:
+            cars = message['cars']
+            if isinstance(cars, str):
+                cars = None if cars in ('', 'all') else [int(car) for car in cars.split(',')]
+            self.cars = None if cars is None else tuple(sorted({int(car) for car in cars}))
+
+    @classmethod
+    def from_query(cls, query: str) -> 'Subscription':
+        """URL のクエリ (channels=a,b&rate=10&cars=0,1) から作る"""
+        params = {key: values[-1] for key, values in parse_qs(query).items()}
+        subscription = cls()
+        subscription.update(params)
+        return subscription
+
+    def due(self, timestamp: float) -> bool:
+        """このフレームを送るか (rate で間引き、時刻が戻ったら送り直し)"""
+        if self.rate > 0 and self.last_time is not None:
+            elapsed = timestamp - self.last_time
+            if 0 <= elapsed < 1.0 / self.rate - _RATE_TOLERANCE:
+                return False
+        self.last_time = timestamp
+        return True
+
+    @property
+    def key(self) -> tuple:
+        return (self.channels, self.cars if 'grid' in self.channels else None)
+
+    def as_dict(self) -> dict:
+        return {'channels': list(self.channels), 'rate': self.rate,
+                'cars': None if self.cars is None else list(self.cars)}
+
+
+def _ws_frame(payload: bytes, opcode: int = _WS_TEXT) -> bytes:
+    """サーバー → クライアントの WebSocket フレーム (マスクなし、分割なし)"""
+    size = len(payload)
+    if size < 126:
+        header = struct.pack('!BB', 0x80 | opcode, size)
+    elif size < 1 << 16:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, size)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, size)
+    return header + payload
+
+
+async def _read_ws_frame(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    """クライアント → サーバーの WebSocket フレームを 1 つ読む (opcode, マスク解除済みの payload)"""
+    first, second = await reader.readexactly(2)
+    size = second & 0x7F
+    if size == 126:
+        (size,) = struct.unpack('!H', await reader.readexactly(2))
+    elif size == 127:
+        (size,) = struct.unpack('!Q', await reader.readexactly(8))
+    mask = await reader.readexactly(4) if second & 0x80 else b''
+    payload = await reader.readexactly(size)
+    if mask:
+        key = int.from_bytes((mask * (size // 4 + 1))[:size], 'big')
+        payload = (int.from_bytes(payload, 'big') ^ key).to_bytes(size, 'big')
+    return first & 0x0F, payload
+
+
+class _FrameEncoder:
+    """1 フレーム分のエンコード結果を購読ごとにキャッシュする (同じ購読は同じ bytes を共有)"""
+
+    def __init__(self, frame: dict, grid_packet: Optional[bytes]):
+        self.frame = frame
+        self.grid_packet = grid_packet
+        self._fragments: Dict[object, bytes] = {}
+        self._messages: Dict[tuple, bytes] = {}
+        self._grid = None
+
+    def _fragment(self, channel: str, cars) -> bytes:
+        key = (channel, cars) if channel == 'grid' else channel
+        fragment = self._fragments.get(key)
+        if fragment is None:
+            value = self._grid_rows(cars) if channel == 'grid' else self.frame.get(channel)
+            if value is not None and channel != 'grid':
+                value = vars(value)
+            fragment = f'"{channel}":'.encode() + json.dumps(value, separators=(',', ':')).encode()
+            self._fragments[key] = fragment
+        return fragment
+
+    def _grid_rows(self, cars) -> Optional[list]:
+        if self.grid_packet is None:
+            return None
+        if self._grid is None:
+            from .telemetry_packets import LapDataPacket
+
+            grid = LapDataPacket.parse_all(self.grid_packet)
+            columns = {name: grid[name].tolist() for name in GRID_FIELDS}
+            self._grid = [dict(car=car, **{name: columns[name][car] for name in GRID_FIELDS})
+                          for car in range(len(grid))]
+        if cars is None:
+            return self._grid
+        return [self._grid[car] for car in cars if 0 <= car < len(self._grid)]
+
+    def message(self, subscription: Subscription, transport: str) -> bytes:
+        key = (transport,) + subscription.key
+        message = self._messages.get(key)
+        if message is None:
+            json_key = ('json',) + subscription.key
+            payload = self._messages.get(json_key)
+            if payload is None:
+                head = b'{"frame":%d,"time":%.3f' % (self.frame['frame_id'], self.frame['timestamp'])
+                fragments = [self._fragment(channel, subscription.cars) for channel in subscription.channels]
+                payload = b','.join([head] + fragments) + b'}'
+                self._messages[json_key] = payload
+            if transport == 'ws':
+                message = _ws_frame(payload)
+            elif transport == 'sse':
+                message = b'data: ' + payload + b'\n\n'
+            else:
+                message = payload
+            self._messages[key] = message
+        return message
+
+
+class _Client:
+    """接続中のクライアント 1 つ (送信待ちは上限付きで古いものから捨てる)"""
+
+    def __init__(self, writer: asyncio.StreamWriter, transport: str, subscription: Subscription, queue_size: int):
+        self.writer = writer
+        self.transport = transport
+        self.subscription = subscription
+        self.queue = deque(maxlen=queue_size)
+        self.ready = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+        self.peer = writer.get_extra_info('peername')
+
+    def push(self, message: bytes):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(message)
+        self.ready.set()
+
+    async def send_loop(self):
+        writer = self.writer
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            while self.queue:
+                writer.write(self.queue.popleft())
+                self.sent += 1
+                await writer.drain()
+
+    def as_dict(self) -> dict:
+        return dict(peer=f'{self.peer[0]}:{self.peer[1]}' if self.peer else None, transport=self.transport,
+                    sent=self.sent, dropped=self.dropped, queued=len(self.queue), **self.subscription.as_dict())
+
+
+class LiveServer:
+    """確定フレームを WebSocket / SSE で配信するサーバー (別スレッドの asyncio ループで動く)
+
+    server = LiveServer(port=20780)
+    server.attach(collector)          # collector の確定フレームを配信
+    server.start()
+    ...
+    server.publish_packet(data)       # 受信ループから (grid チャンネル用の Lap Data)
+    server.stop()
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = DEFAULT_PORT, queue_size: int = 64):
+        self.host = host
+        self.port = port
+        self.queue_size = queue_size
+        self.published_count = 0
+        self._clients = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server = None
+        self._thread = None
+        self._started = threading.Event()
+        self._error = None
+        # 最新の Lap Data パケット (受信スレッドが差し替え、配信時に必要な分だけ全車を解析)
+        self._grid_packet: Optional[bytes] = None
+
+    # --- 受信スレッド側 -------------------------------------------------
+
+    def attach(self, collector):
+        """TelemetryDataCollector の確定フレームを配信する"""
+        collector.add_frame_handler(self.publish_frame)
+
+    def publish_frame(self, frame: dict):
+        """確定フレーム 1 つを配信キューに渡す (受信スレッドから呼ぶ、クライアントがいなければ何もしない)"""
+        loop = self._loop
+        if loop is not None and self._clients:
+            loop.call_soon_threadsafe(self._broadcast, frame)
+
+    def publish_packet(self, data: bytes):
+        """受信した生パケット (Lap Data だけを grid 用に保持、ループは起こさない)"""
+        if len(data) > 6 and data[6] == PacketType.LAP_DATA:
+            self._grid_packet = data
+
+    @property
+    def client_count(self) -> int:
+        return len(self._clients)
+
+    def start(self):
+        """サーバースレッドを起動 (待ち受けを始めるまで待つ)"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='live-server', daemon=True)
+        self._thread.start()
+        self._started.wait()
+        if self._error is not None:
+            self._thread = None
+            raise self._error
+
+    def stop(self):
+        loop, thread = self._loop, self._thread
+        if loop is None or thread is None:
+            return
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # --- サーバースレッド側 ---------------------------------------------
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            self._server = loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+            self.port = self._server.sockets[0].getsockname()[1]
+        except OSError as e:
+            self._error = e
+            self._started.set()
+            loop.close()
+            return
+        self._loop = loop
+        self._started.set()
+        try:
+            loop.run_forever()
+        finally:
+            self._loop = None
+            self._server.close()
+            for client in list(self._clients):
+                client.writer.close()
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.close()
+
+    def _broadcast(self, frame: dict):
+        self.published_count += 1
+        encoder = _FrameEncoder(frame, self._grid_packet)
+        timestamp = frame['timestamp']
+        for client in self._clients:
+            if client.subscription.due(timestamp):
+                client.push(encoder.message(client.subscription, client.transport))
+
+    def status(self) -> dict:
+        return {'frames': self.published_count, 'channels': list(CHANNELS),
+                'clients': [client.as_dict() for client in self._clients]}
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await reader.readuntil(b'\r\n\r\n')
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+        lines = request.decode('latin-1').split('\r\n')
+        method, target = (lines[0].split(' ') + ['', ''])[:2]
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        url = urlsplit(target)
+
+        try:
+            if method != 'GET':
+                await self._respond(writer, 405, {'error': f"{method} は使えません"})
+            elif url.path in ('/', '/status'):
+                await self._respond(writer, 200, self.status())
+            elif url.path not in ('/ws', '/events'):
+                await self._respond(writer, 404, {'error': f"{url.path} はありません"})
+            else:
+                try:
+                    subscription = Subscription.from_query(url.query)
+                except (ValueError, TypeError) as e:
+                    await self._respond(writer, 400, {'error': str(e)})
+                    return
+                if url.path == '/ws':
+                    if headers.get('upgrade', '').lower() != 'websocket' or 'sec-websocket-key' not in headers:
+                        await self._respond(writer, 400, {'error': "WebSocket の Upgrade リクエストではありません"})
+                        return
+                    await self._serve_websocket(reader, writer, headers['sec-websocket-key'], subscription)
+                else:
+                    await self._serve_events(reader, writer, subscription)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # 切断 / サーバー停止
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, code: int, body: dict):
+        reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed'}
+        payload = json.dumps(body, ensure_ascii=False).encode()
+        writer.write(f'HTTP/1.1 {code} {reasons[code]}\r\nContent-Type: application/json; charset=utf-8\r\n'
+                     f'Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n'.encode() + payload)
+        await writer.drain()
+
+    async def _stream(self, client: _Client, receive):
+        """送信ループと受信ループを並べて走らせ、どちらかが終わったら切断"""
+        client.writer.transport.set_write_buffer_limits(high=_WRITE_BUFFER_HIGH)
+        self._clients.add(client)
+        logger.info(f"Live client connected: {client.peer} ({client.transport})")
+        sender = asyncio.ensure_future(client.send_loop())
+        receiver = asyncio.ensure_future(receive())
+        try:
+            await asyncio.wait([sender, receiver], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self._clients.discard(client)
+            for task in (sender, receiver):
+                task.cancel()
+            await asyncio.gather(sender, receiver, return_exceptions=True)
+            logger.info(f"Live client disconnected: {client.peer} (sent {client.sent}, dropped {client.dropped})")
+
+    async def _serve_events(self, reader, writer, subscription: Subscription):
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n'
+                     b'Access-Control-Allow-Origin: *\r\n\r\n')
+        await writer.drain()
+        client = _Client(writer, 'sse', subscription, self.queue_size)
+
+        async def receive():
+            # SSE はクライアントから送られてこない (切断の検出だけ)
+            while await reader.read(1024):
+                pass
+
+        await self._stream(client, receive)
+
+    async def _serve_websocket(self, reader, writer, key: str, subscription: Subscription):
+        accept = base64.b64encode(hashlib.sha1((key + _WS_GUID).encode()).digest()).decode()
+        writer.write(('HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                      f'Sec-WebSocket-Accept: {accept}\r\n\r\n').encode())
+        await writer.drain()
+        client = _Client(writer, 'ws', subscription, self.queue_size)
+
+        async def receive():
+            while True:
+                opcode, payload = await _read_ws_frame(reader)
+                if opcode == _WS_CLOSE:
+                    writer.write(_ws_frame(payload[:2], _WS_CLOSE))
+                    return
+                if opcode == _WS_PING:
+                    writer.write(_ws_frame(payload, _WS_PONG))
+                elif opcode == _WS_TEXT:
+                    # 購読の変更 (エラーはそのクライアントにだけ返す)
+                    try:
+                        message = json.loads(payload)
+                        if not isinstance(message, dict):
+                            raise ValueError("購読は JSON オブジェクトで送ってください")
+                        subscription.update(message)
+                        reply = {'subscription': subscription.as_dict()}
+                    except (ValueError, TypeError) as e:
+                        reply = {'error': str(e)}
+                    writer.write(_ws_frame(json.dumps(reply, ensure_ascii=False).encode()))
+
+        await self._stream(client, receive)
+
+
+if __name__ == "__main__":
+    print("✓ Live Server モジュール読み込み完了")
+    print(f"- チャンネル: {', '.join(CHANNELS)}")
@@ -0,0 +1,369 @@
+"""
+F1 25 Telemetry Normalization
+保存形式ごとのスケーリング・範囲チェックを列単位 (ベクトル化) でまとめて適用する
+
+取り込み時 (TelemetryDataCollector.save_to_csv) と保存済み CSV の読み込み時
+(load_capture) の両方で同じルールを使うので、各スクリプトで個別に直さないこと。
+"""
+
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+# ==================== 品質フラグ (quality_flags のビット) ====================
+FLAG_SPEED = 1 << 0
+FLAG_THROTTLE = 1 << 1
+FLAG_BRAKE = 1 << 2
+FLAG_STEERING = 1 << 3
+FLAG_GEAR = 1 << 4
+FLAG_RPM = 1 << 5
+FLAG_DRS = 1 << 6
+FLAG_POSITION = 1 << 7
+FLAG_SCALED = 1 << 8      # 条件付きスケーリング (推定による補正) を適用した
+
+FLAGS_COLUMN = 'quality_flags'
+
+
+@dataclass(frozen=True)
+class ScaleRule:
+    """列のスケーリング: value * factor + offset
+
+    when が指定されている場合は (lo, hi) の開区間に入る値だけに適用する
+    (推定補正なので FLAG_SCALED を立てる)。
+    """
+    column: str
+    factor: float
+    offset: float = 0.0
+    when: Optional[Tuple[float, float]] = None
+
+
+@dataclass(frozen=True)
+class RangeRule:
+    """範囲チェック: [lo, hi] 外の値にフラグを立てて修復する
+
+    repair: 'clip' (端に寄せる) / 'nan' (欠損扱い) / 'zero' (0 にする)
+    """
+    column: str
+    lo: float
+    hi: float
+    flag: int
+    repair: str = 'nan'
+
+
+@dataclass(frozen=True)
+class CaptureFormat:
+    """保存形式 1 バージョン分の定義"""
+    name: str
+    detect: frozenset                   # この列がすべてあればこの形式
+    rename: Dict[str, str] = field(default_factory=dict)
+    scale: Tuple[ScaleRule, ...] = ()
+    exclude: frozenset = frozenset()    # この列があれば別形式
+
+
+# 正規化後の単位: speed_kph [km/h], throttle/brake [0-1], steering [-1, 1],
+# gear [-1(R)..8], rpm, drs [0/1], session_time [s]
+RANGE_RULES = (
+    RangeRule('speed_kph', 0, 400, FLAG_SPEED, 'nan'),
+    RangeRule('throttle', 0.0, 1.0, FLAG_THROTTLE, 'clip'),
+    RangeRule('brake', 0.0, 1.0, FLAG_BRAKE, 'clip'),
+    RangeRule('steering', -1.0, 1.0, FLAG_STEERING, 'clip'),
+    RangeRule('gear', -1, 8, FLAG_GEAR, 'nan'),
+    RangeRule('rpm', 500, 16000, FLAG_RPM, 'nan'),
+    RangeRule('drs', 0, 1, FLAG_DRS, 'zero'),
+    RangeRule('position_x', -1e5, 1e5, FLAG_POSITION, 'nan'),
+    RangeRule('position_y', -1e5, 1e5, FLAG_POSITION, 'nan'),
+    RangeRule('position_z', -1e5, 1e5, FLAG_POSITION, 'nan'),
+)
+
+# f1_recorder の parse_telemetry_data はバイト値をそのまま書いている
+_RECORDER_BYTE_INPUTS = (
+    ScaleRule('throttle', 1 / 255),
+    ScaleRule('brake', 1 / 255),
+)
+# RPM が 1/20 で読まれているケースの補正 (旧 parse_telemetry_data の推定補正)
+_RECORDER_RPM_FIX = ScaleRule('rpm', 20, when=(300, 1500))
+
+# data_collector の CSV 列名 -> 正規名 (時刻列以外)
+_COLLECTOR_COLUMNS = {
+    'Frame': 'frame_id',
+    'Speed(km/h)': 'speed_kph', 'Throttle': 'throttle', 'Brake': 'brake',
+    'Steer': 'steering', 'Gear': 'gear', 'RPM': 'rpm', 'DRS': 'drs',
+    'BrakesTemp(C)': 'brakes_temp', 'TyresTemp(C)': 'tyres_temp',
+    'TyresPressure(kPa)': 'tyres_pressure', 'LapNum': 'lap_number',
+    'LapTime(ms)': 'lap_time_ms', 'LastLapTime(ms)': 'last_lap_time_ms',
+    'Sector1(ms)': 'sector1_ms', 'Sector2(ms)': 'sector2_ms',
+    'LapDistance(m)': 'lap_distance', 'TotalDistance(m)': 'total_distance',
+    'CarPosition': 'car_position', 'QualityFlags': FLAGS_COLUMN,
+    'PosX(m)': 'position_x', 'PosY(m)': 'position_y', 'PosZ(m)': 'position_z',
+    'FuelInTank(kg)': 'fuel_in_tank', 'FuelRemainingLaps': 'fuel_remaining_laps',
+    'ERSStore(MJ)': 'ers_store_mj', 'ERSDeployedLap(MJ)': 'ers_deployed_lap_mj',
+    'ERSHarvestedLap(MJ)': 'ers_harvested_lap_mj', 'ERSMode': 'ers_deploy_mode',
+    'TyreCompound': 'tyre_compound', 'TyreAge(laps)': 'tyre_age_laps',
+    'TyreWearRL(%)': 'tyre_wear_rl', 'TyreWearRR(%)': 'tyre_wear_rr',
+    'TyreWearFL(%)': 'tyre_wear_fl', 'TyreWearFR(%)': 'tyre_wear_fr',
+}
+
+FORMATS = (
+    # src/data_collector.py の CSV (SessionTime(s) は秒のまま)
+    CaptureFormat(
+        name='collector_v2',
+        detect=frozenset({'Frame', 'SessionTime(s)'}),
+        rename={'SessionTime(s)': 'session_time', **_COLLECTOR_COLUMNS},
+    ),
+    # 旧 src/data_collector.py の CSV (Time(s) が session_time / 1000 で書かれている)
+    CaptureFormat(
+        name='collector_v1',
+        detect=frozenset({'Frame', 'Speed(km/h)'}),
+        rename={'Time(s)': 'session_time', **_COLLECTOR_COLUMNS},
+        scale=(ScaleRule('session_time', 1000),),
+    ),
+    # f1_recorder.py の現行形式 (全パケット + packet_hex)
+    CaptureFormat(
+        name='recorder_hex',
+        detect=frozenset({'packet_type', 'packet_hex'}),
+        scale=_RECORDER_BYTE_INPUTS + (_RECORDER_RPM_FIX,),
+    ),
+    # 初期の記録 (Motion の position_x/y/z 付き、速度列が 'speed')
+    CaptureFormat(
+        name='recorder_v1',
+        detect=frozenset({'packet_type', 'position_x'}),
+        rename={'speed': 'speed_kph'},
+        scale=_RECORDER_BYTE_INPUTS + (_RECORDER_RPM_FIX,),
+    ),
+    # *_fixed_* 形式 (lap_distance 付き、steering が int16 の生値)
+    CaptureFormat(
+        name='recorder_v2',
+        detect=frozenset({'session_time', 'lap_distance', 'ers_deploy_mode'}),
+        scale=_RECORDER_BYTE_INPUTS + (ScaleRule('steering', 1 / 32767), _RECORDER_RPM_FIX),
+    ),
+    # *_final_* / *_swap_test_* 形式 (Type 6 のみ、session_time 付き)
+    CaptureFormat(
+        name='recorder_v3',
+        detect=frozenset({'session_time', 'speed_kph', 'throttle'}),
+        exclude=frozenset({'lap_distance', 'packet_hex'}),
+        scale=_RECORDER_BYTE_INPUTS + (_RECORDER_RPM_FIX,),
+    ),
+)
+
+FORMATS_BY_NAME = {fmt.name: fmt for fmt in FORMATS}
+
+# 取り込み時 (デコード直後の値) 用: スケーリングなし、範囲チェックのみ
+INGEST_FORMAT = CaptureFormat(name='ingest', detect=frozenset())
+
+
+@dataclass
+class NormalizationReport:
+    """正規化の結果 (どの列を何行修復したか)"""
+    format_name: str
+    rows: int
+    scaled: Dict[str, int] = field(default_factory=dict)
+    repaired: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def total_repaired(self) -> int:
+        return sum(self.repaired.values())
+
+    def __repr__(self):
+        return (
+            f"NormalizationReport(format={self.format_name}, rows={self.rows}, "
+            f"repaired={self.repaired}, scaled={self.scaled})"
+        )
+
+
+def detect_format(columns) -> CaptureFormat:
+    """列名から保存形式を判定"""
+    columns = set(columns)
+    for fmt in FORMATS:
+        if fmt.detect <= columns and not (fmt.exclude & columns):
+            return fmt
+    raise ValueError(f"不明な保存形式です: {sorted(columns)}")
+
+
+def _num_rows(table) -> int:
+    """行数 (DataFrame / dict 共通)"""
+    if hasattr(table, 'index'):
+        return len(table.index)
+    return len(next(iter(table.values()), ()))
+
+
+def _column(table, name: str) -> np.ndarray:
+    """列を float 配列として取り出す (DataFrame / dict 共通)"""
+    return np.asarray(table[name], dtype=np.float64)
+
+
+def normalize(table, fmt=None, copy: bool = True):
+    """テーブル (DataFrame または 列名 -> 配列 の dict) を正規化
+
+    Returns:
+        (正規化済みテーブル, NormalizationReport)
+    """
+    if fmt is None:
+        fmt = detect_format(table.keys())
+    elif isinstance(fmt, str):
+        fmt = FORMATS_BY_NAME[fmt]
+
+    if copy:
+        table = table.copy()
+
+    # 列名を正規名に揃える
+    for src, dst in fmt.rename.items():
+        if src in table and src != dst:
+            table[dst] = table[src]
+            del table[src]
+
+    columns = set(table.keys())
+    rows = _num_rows(table)
+    report = NormalizationReport(format_name=fmt.name, rows=rows)
+    if FLAGS_COLUMN in columns:
+        flags = np.nan_to_num(_column(table, FLAGS_COLUMN)).astype(np.uint16)
+    else:
+        flags = np.zeros(rows, dtype=np.uint16)
+
+    # スケーリング
+    for rule in fmt.scale:
+        if rule.column not in columns:
+            continue
+        values = _column(table, rule.column)
+        if rule.when is None:
+            values = values * rule.factor + rule.offset
+        else:
+            lo, hi = rule.when
+            hit = (values > lo) & (values < hi)
+            values = np.where(hit, values * rule.factor + rule.offset, values)
+            flags[hit] |= FLAG_SCALED
+            if hit.any():
+                report.scaled[rule.column] = int(hit.sum())
+        table[rule.column] = values
+
+    # 範囲チェックと修復 (NaN は欠損として素通し)
+    for rule in RANGE_RULES:
+        if rule.column not in columns:
+            continue
+        values = _column(table, rule.column)
+        with np.errstate(invalid='ignore'):
+            bad = (values < rule.lo) | (values > rule.hi)
+        count = int(bad.sum())
+        if count:
+            if rule.repair == 'clip':
+                values = np.clip(values, rule.lo, rule.hi)
+            elif rule.repair == 'zero':
+                values = np.where(bad, 0.0, values)
+            else:
+                values = np.where(bad, np.nan, values)
+            flags[bad] |= rule.flag
+            report.repaired[rule.column] = report.repaired.get(rule.column, 0) + count
+        table[rule.column] = values
+
+    table[FLAGS_COLUMN] = flags
+    return table, report
+
+
+def _parse_columns(header: List[str], rows, names=None) -> Dict[str, np.ndarray]:
+    """csv の行から 列名 -> float 配列 を作る (names 以外の列・数値にならない列は読み飛ばす)"""
+    raw = list(zip(*rows)) or [()] * len(header)
+    columns = {}
+    for name, values in zip(header, raw):
+        if names is not None and name not in names:
+            continue
+        try:
+            columns[name] = np.array([float(v) if v else np.nan for v in values])
+        except ValueError:
+            continue
+    return columns
+
+
+def _read_csv_columns(path):
+    """CSV を (ヘッダー, 列名 -> float 配列) に読み込む (数値にならない列は読み飛ばす)"""
+    import csv
+
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        columns = _parse_columns(header, reader)
+    return header, columns
+
+
+def read_header(path) -> List[str]:
+    """CSV のヘッダー行の列名"""
+    import csv
+
+    with open(path, newline='', encoding='utf-8') as f:
+        return next(csv.reader(f), [])
+
+
+def read_column_range(path, header: List[str], start: int, end: int, names=None) -> Dict[str, np.ndarray]:
+    """CSV のバイト範囲 [start, end) の行だけを 列名 -> float 配列 に読み込む
+
+    start / end は行の先頭のオフセット (TelemetryDataset のインデックスなど)。
+    ファイル全体を読まずに 1 ラップ分だけ取り出す用。
+    """
+    import csv
+    import io
+
+    with open(path, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode('utf-8')
+    return _parse_columns(header, csv.reader(io.StringIO(text, newline='')), names)
+
+
+def read_columns(path) -> Dict[str, np.ndarray]:
+    """CSV を pandas なしで 列名 -> float 配列 の dict に読み込む
+
+    数値にならない列 (timestamp, packet_hex など) は読み飛ばす。
+    """
+    return _read_csv_columns(path)[1]
+
+
+def _print_report(report: NormalizationReport):
+    """正規化レポートの表示"""
+    print(f"✓ 正規化: {report.format_name} 形式, {report.rows} 行")
+    for column, count in report.repaired.items():
+        print(f"  ⚠️  {column}: {count} 件を修復")
+    for column, count in report.scaled.items():
+        print(f"  ⚠️  {column}: {count} 件をスケーリング補正")
+
+
+def load_columns(path, verbose: bool = False) -> Dict[str, np.ndarray]:
+    """保存済み CSV を pandas なしで読み込み、正規化した列の dict を返す (軽量版)
+
+    CSV を消して .f1z だけ残したセッション (archive --remove) はアーカイブから読む。
+    """
+    if not os.path.exists(path):
+        from .cold_storage import ArchivedSession, find_archive
+
+        archive = find_archive(path)
+        if archive is not None:
+            return ArchivedSession(archive).columns()
+    header, columns = _read_csv_columns(path)
+    # 文字列列を読み飛ばしても判定できるように、ヘッダーの列名で形式を決める
+    columns, report = normalize(columns, detect_format(header), copy=False)
+    if verbose:
+        _print_report(report)
+    return columns
+
+
+def load_capture(path, verbose: bool = False):
+    """保存済み CSV を読み込み、形式を判定して正規化した DataFrame を返す"""
+    import pandas as pd
+
+    df = pd.read_csv(path)
+    df, report = normalize(df, copy=False)
+    if verbose:
+        _print_report(report)
+    return df
+
+
+def valid_rows(table, columns: List[str]) -> np.ndarray:
+    """指定した列がすべて欠損でない行のマスク"""
+    mask = np.ones(_num_rows(table), dtype=bool)
+    for name in columns:
+        mask &= ~np.isnan(_column(table, name))
+    return mask
+
+
+if __name__ == "__main__":
+    print("✓ Normalization モジュール読み込み完了")
+    print(f"- 対応形式: {[fmt.name for fmt in FORMATS]}")
@@ -6,6 +6,8 @@ Packet header を解析して packet type を識別する
 import struct
 from enum import IntEnum
 
+import numpy as np
+
 
 class PacketType(IntEnum):
     """F1 25 Packet Types"""
@@ -21,13 +23,36 @@ class PacketType(IntEnum):
     LOBBY_INFO = 9
     CAR_DAMAGE = 10
     SESSION_HISTORY = 11
+    TYRE_SETS = 12
+    MOTION_EX = 13
+    TIME_TRIAL = 14
+    LAP_POSITIONS = 15
+
+
+# ヘッダー (29 bytes) の numpy dtype: 同じ種類のパケットをまとめて np.frombuffer で読む用
+PACKET_HEADER_DTYPE = np.dtype([
+    ('packet_format', '<u2'),
+    ('game_year', 'u1'),
+    ('game_major_version', 'u1'),
+    ('game_minor_version', 'u1'),
+    ('packet_version', 'u1'),
+    ('packet_id', 'u1'),
+    ('session_uid', '<u8'),
+    ('session_time', '<f4'),
+    ('frame_identifier', '<u4'),
+    ('overall_frame_identifier', '<u4'),
+    ('player_car_index', 'u1'),
+    ('secondary_player_car_index', 'u1'),
+])
 
 
 class PacketHeader:
-    """F1 25 Packet Header (最小限の情報を読み取る)"""
+    """F1 25 Packet Header (29 bytes)"""
     
     # 簡略化されたヘッダー読み取り
-    MIN_SIZE = 6  # 最低限 packet type を取得するために必要なバイト数
+    MIN_SIZE = 7  # 最低限 packet type を取得するために必要なバイト数
+    SIZE = 29     # F1 25 のヘッダー全体のサイズ
+    FORMAT_STRING = "<QfIIBB"  # Byte 7 以降 (session_uid ～ secondary_player_car_index)
     
     def __init__(self, data: bytes):
         if len(data) < self.MIN_SIZE:
@@ -39,26 +64,38 @@ class PacketHeader:
             # Byte 2: Game year (uint8)
             # Byte 3: Game major version (uint8) 
             # Byte 4: Game minor version (uint8)
-            # Byte 5: Packet type (uint8)
-            # ... その他のフィールド
+            # Byte 5: Packet version (uint8)
+            # Byte 6: Packet type (uint8)
+            # Bytes 7-14: Session UID (uint64)
+            # Bytes 15-18: Session time (float)
+            # Bytes 19-22: Frame identifier (uint32, フラッシュバックで巻き戻る)
+            # Bytes 23-26: Overall frame identifier (uint32, 巻き戻らない)
+            # Byte 27: Player car index / Byte 28: Secondary player car index
             
             self.format_version = struct.unpack('<H', data[0:2])[0]
             self.game_year = data[2]
             self.game_major_version = data[3]
             self.game_minor_version = data[4]
-            self.packet_type = PacketType(data[5])
+            self.packet_version = data[5]
+            self.packet_type = PacketType(data[6])
             
-            # 追加情報（24バイト以上ある場合のみ）
-            if len(data) >= 24:
-                self.session_uid = struct.unpack('<Q', data[6:14])[0]
-                self.session_time = struct.unpack('<f', data[14:18])[0]
-                self.frame_identifier = struct.unpack('<I', data[18:22])[0]
-                self.player_car_index = data[22]
+            # 追加情報（ヘッダー全体がある場合のみ）
+            if len(data) >= self.SIZE:
+                (
+                    self.session_uid,
+                    self.session_time,
+                    self.frame_identifier,
+                    self.overall_frame_identifier,
+                    self.player_car_index,
+                    self.secondary_player_car_index,
+                ) = struct.unpack_from(self.FORMAT_STRING, data, 7)
             else:
                 self.session_uid = 0
                 self.session_time = 0.0
                 self.frame_identifier = 0
+                self.overall_frame_identifier = 0
                 self.player_car_index = 0
+                self.secondary_player_car_index = 255
                 
         except Exception as e:
             raise ValueError(f"ヘッダー解析エラー: {e}")
@@ -88,10 +125,10 @@ class PacketParser:
     @staticmethod
     def get_packet_type(data: bytes) -> PacketType:
         """データから packet type を取得（高速）"""
-        if len(data) < 6:
+        if len(data) < PacketHeader.MIN_SIZE:
             return None
         try:
-            return PacketType(data[5])
+            return PacketType(data[6])
         except:
             return None
     
@@ -0,0 +1,213 @@
+"""
+F1 25 Plotting
+レポート用グラフの描画 (LTTB で間引いてから、独立した図をプロセスプールで並列に描く)
+
+図は FigureSpec (配列 + 見た目の指定だけ) として組み立て、描画は render_figures に任せる。
+matplotlib はワーカー側 (または描画時) にだけ読み込む。
+"""
+
+import os
+import platform
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# 1 系列あたりの最大点数の既定値 (0 / None で間引きなし)
+# 14 インチ x 150 dpi ≒ 2100 px なので、横 1 ピクセルあたり 2 点弱になる
+DEFAULT_MAX_POINTS = 4000
+
+
+@dataclass
+class Series:
+    """折れ線 1 本"""
+    x: np.ndarray
+    y: np.ndarray
+    label: Optional[str] = None
+    color: Optional[str] = None
+    linewidth: float = 1.5
+    alpha: float = 1.0
+
+
+@dataclass
+class HLine:
+    """水平線 (平均値など)"""
+    y: float
+    color: str = 'red'
+    linestyle: str = '--'
+    alpha: float = 0.5
+    label: Optional[str] = None
+
+
+@dataclass
+class Panel:
+    """サブプロット 1 つ分"""
+    title: str
+    ylabel: str
+    series: List[Series] = field(default_factory=list)
+    xlabel: Optional[str] = None
+    hlines: List[HLine] = field(default_factory=list)
+    legend: Optional[str] = None    # 凡例の位置 ('best', 'upper right' など)、None で凡例なし
+
+
+@dataclass
+class FigureSpec:
+    """縦に並べたサブプロットからなる図 1 枚"""
+    path: Path
+    title: str
+    panels: List[Panel]
+    figsize: Tuple[float, float] = (14, 10)
+    dpi: int = 150
+    title_size: int = 16
+
+
+def _lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """LTTB で選んだ点のインデックス (NaN なしの配列用)"""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # 先頭と末尾は固定、間の n - 2 点を n_out - 2 個のバケツに分ける
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # 各バケツの平均 (次のバケツの代表点として使う)
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    mean_x = np.append(sums_x / counts, x[-1]).tolist()
+    mean_y = np.append(sums_y / counts, y[-1]).tolist()
+
+    picked = np.empty(n_out, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    xs, ys = x.tolist(), y.tolist()
+    edges = edges.tolist()
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = xs[a], ys[a]
+        # 三角形 (選んだ点, 候補, 次のバケツの平均) の面積 x2 は候補の (x, y) について線形
+        kx, ky = mean_y[i + 1] - ay, ax - mean_x[i + 1]
+        area = np.abs(kx * x[lo:hi] + ky * y[lo:hi] - (kx * ax + ky * ay))
+        a = lo + int(area.argmax())
+        picked[i + 1] = a
+    return picked
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Largest-Triangle-Three-Buckets で形状 (ピーク・谷) を保ったまま約 n_out 点に間引く
+
+    NaN で区切られた区間はそれぞれ長さに比例した点数で間引き、
+    間に NaN を 1 点挟んで線が途切れる見た目を保つ。
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n:
+        return x, y
+
+    valid = ~(np.isnan(x) | np.isnan(y))
+    if valid.all():
+        picked = _lttb_indices(x, y, n_out)
+        return x[picked], y[picked]
+
+    # 有効な点が連続する区間 [start, end)
+    change = np.flatnonzero(np.diff(valid.astype(np.int8)))
+    bounds = np.concatenate(([0], change + 1, [n]))
+    runs = [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if valid[a]]
+    total = int(valid.sum())
+    out_x, out_y = [], []
+    for a, b in runs:
+        budget = max(2, n_out * (b - a) // total)
+        picked = a + _lttb_indices(x[a:b], y[a:b], budget)
+        out_x += [x[picked], [np.nan]]
+        out_y += [y[picked], [np.nan]]
+    if not out_x:
+        return x[:0], y[:0]
+    return np.concatenate(out_x[:-1]), np.concatenate(out_y[:-1])
+
+
+def decimate(spec: FigureSpec, max_points: Optional[int] = DEFAULT_MAX_POINTS) -> FigureSpec:
+    """図の全系列を LTTB で間引いたコピーを返す"""
+    if not max_points:
+        return spec
+    panels = []
+    for panel in spec.panels:
+        series = []
+        for s in panel.series:
+            x, y = lttb(s.x, s.y, max_points)
+            series.append(replace(s, x=x, y=y))
+        panels.append(replace(panel, series=series))
+    return replace(spec, panels=panels)
+
+
+def setup_matplotlib():
+    """matplotlib を Agg バックエンドで読み込み、日本語フォントを設定して pyplot を返す"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    # 日本語フォント設定 - OS別対応
+    if platform.system() == 'Darwin':  # macOS
+        matplotlib.rcParams['font.family'] = 'Hiragino Sans'
+    elif platform.system() == 'Windows':
+        matplotlib.rcParams['font.family'] = 'MS Gothic'
+    else:  # Linux
+        matplotlib.rcParams['font.family'] = 'DejaVu Sans'
+
+    matplotlib.rcParams['axes.unicode_minus'] = False
+    plt.rcParams['figure.figsize'] = (14, 10)
+    return plt
+
+
+def render_figure(spec: FigureSpec) -> Path:
+    """図 1 枚を描いて保存 (ワーカープロセスからも呼ばれる)"""
+    plt = setup_matplotlib()
+    fig, axes = plt.subplots(len(spec.panels), 1, figsize=spec.figsize, squeeze=False)
+    fig.suptitle(spec.title, fontsize=spec.title_size, fontweight='bold')
+
+    for ax, panel in zip(axes[:, 0], spec.panels):
+        for s in panel.series:
+            ax.plot(s.x, s.y, label=s.label, color=s.color, linewidth=s.linewidth, alpha=s.alpha)
+        for line in panel.hlines:
+            ax.axhline(y=line.y, color=line.color, linestyle=line.linestyle, alpha=line.alpha, label=line.label)
+        ax.set_title(panel.title, fontsize=12, fontweight='bold')
+        ax.set_ylabel(panel.ylabel)
+        if panel.xlabel:
+            ax.set_xlabel(panel.xlabel)
+        ax.grid(True, alpha=0.3)
+        if panel.legend:
+            ax.legend(loc=panel.legend)
+
+    fig.tight_layout()
+    path = Path(spec.path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fig.savefig(path, dpi=spec.dpi, bbox_inches='tight')
+    plt.close(fig)
+    return path
+
+
+def render_figures(
+    specs: Sequence[FigureSpec],
+    max_points: Optional[int] = DEFAULT_MAX_POINTS,
+    workers: Optional[int] = None,
+) -> List[Path]:
+    """複数の図を間引いてから描画 (2 枚以上ならプロセスプールで並列)
+
+    Args:
+        max_points: 1 系列あたりの最大点数 (None で間引きなし)
+        workers: ワーカー数 (None = min(図の数, CPU 数), 1 = 逐次)
+    """
+    # 間引きは親プロセスで行い、ワーカーに送る配列を小さくする
+    specs = [decimate(spec, max_points) for spec in specs]
+    if workers is None:
+        workers = min(len(specs), os.cpu_count() or 1)
+    if workers <= 1 or len(specs) <= 1:
+        return [render_figure(spec) for spec in specs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(render_figure, specs))
+
+
+if __name__ == "__main__":
+    print("✓ Plotting モジュール読み込み完了")
@@ -0,0 +1,382 @@
+"""
+F1 25 Race Analytics
+全車 (22 台) の Lap Data から、車 × ラップ の配列と順位変動イベントを蓄積し、
+ギャップ推移・オーバーテイク・ピットストップのロス・ペース順位をまとめて計算する
+
+受信中は RaceTracker.push に Lap Data パケットをそのまま渡す (全車を np.frombuffer で 1 回で読むので、
+プレイヤー車だけを struct で読むのとほぼ同じコスト)。保存済みセッションは RaceHistory (npz) か、
+packet_hex 付きの記録 CSV を replay_capture で再生して同じ配列を作る。
+"""
+
+import csv
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .telemetry_packets import LAP_DATA_DTYPE, LapDataPacket
+
+
+NUM_CARS = LapDataPacket.NUM_CARS
+
+# 状態が変わったかを判定するバイト (周回・順位・ピット・結果) のパケット内オフセット
+_KEY_FIELDS = ('car_position', 'current_lap_num', 'pit_status', 'result_status')
+_KEY_OFFSETS = tuple(LapDataPacket.HEADER_SIZE + LAP_DATA_DTYPE.fields[name][1] for name in _KEY_FIELDS)
+_PACKET_END = LapDataPacket.HEADER_SIZE + NUM_CARS * LapDataPacket.SINGLE_CAR_SIZE
+
+# result_status: 2 = 走行中, 3 = 完走 (0 / 1 は未使用スロット、4 以降は DNF など)
+RESULT_ACTIVE = 2
+RESULT_FINISHED = 3
+
+# 順位変動イベント 1 件
+EVENT_DTYPE = np.dtype([
+    ('frame', '<u4'),          # overall frame identifier
+    ('time', '<f4'),           # session time (s)
+    ('lap', '<u1'),            # 変動した時点の周回
+    ('car', '<u1'),
+    ('old', '<u1'),            # 変動前の順位
+    ('new', '<u1'),            # 変動後の順位
+    ('pit', '?'),              # 変動時にピットレーンにいたか
+])
+
+
+def _gap_ms(cars: np.ndarray, name: str) -> np.ndarray:
+    """分 + ミリ秒 に分かれた delta を ms にまとめる"""
+    return cars[f'{name}_minutes'] * 60000.0 + cars[f'{name}_ms_part']
+
+
+@dataclass
+class RaceHistory:
+    """車 × ラップ の配列 (ラップ番号 n の値は [car, n]、0 列目は未使用)"""
+    lap_time_ms: np.ndarray         # [car, lap] ラップタイム
+    position: np.ndarray            # [car, lap] ラップ終了時の順位
+    gap_to_leader_ms: np.ndarray    # [car, lap] ラップ終了時のリーダーとの差
+    gap_to_front_ms: np.ndarray     # [car, lap] ラップ終了時の前車との差
+    pit: np.ndarray                 # [car, lap] その周にピットレーンにいたか
+    pit_lane_ms: np.ndarray         # [car, lap] その周のピットレーン滞在時間
+    grid_position: np.ndarray       # [car] スタート順位 (0 = 不明)
+    result_status: np.ndarray       # [car] 最後の result_status
+    events: np.ndarray              # EVENT_DTYPE の順位変動イベント
+
+    @property
+    def num_laps(self) -> int:
+        """記録済みの最大ラップ番号"""
+        done = np.flatnonzero(~np.isnan(self.lap_time_ms).all(axis=0))
+        return int(done[-1]) if len(done) else 0
+
+    @property
+    def cars(self) -> np.ndarray:
+        """1 周以上記録された車のインデックス"""
+        return np.flatnonzero(~np.isnan(self.lap_time_ms).all(axis=1))
+
+    def save(self, path) -> Path:
+        """npz で保存"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(path, **{f.name: getattr(self, f.name) for f in fields(self)})
+        return path
+
+    @classmethod
+    def load(cls, path) -> 'RaceHistory':
+        with np.load(path) as data:
+            return cls(**{f.name: data[f.name] for f in fields(cls)})
+
+    def __repr__(self):
+        return f"RaceHistory(cars={len(self.cars)}, laps={self.num_laps}, events={len(self.events)})"
+
+
+class RaceTracker:
+    """Lap Data パケット (全車分) を受け取り、RaceHistory 用の配列に蓄積する"""
+
+    def __init__(self, num_cars: int = NUM_CARS, initial_laps: int = 64):
+        self.num_cars = num_cars
+        self._capacity = initial_laps
+        self._lap_arrays = {
+            'lap_time_ms': np.full((num_cars, initial_laps), np.nan),
+            'position': np.full((num_cars, initial_laps), np.nan),
+            'gap_to_leader_ms': np.full((num_cars, initial_laps), np.nan),
+            'gap_to_front_ms': np.full((num_cars, initial_laps), np.nan),
+            'pit': np.zeros((num_cars, initial_laps), dtype=bool),
+            'pit_lane_ms': np.zeros((num_cars, initial_laps)),
+        }
+        self.grid_position = np.zeros(num_cars, dtype=np.uint8)
+        self.result_status = np.zeros(num_cars, dtype=np.uint8)
+
+        self._events = np.empty(256, dtype=EVENT_DTYPE)
+        self._num_events = 0
+        # 前回パケットの状態
+        self._lap = np.zeros(num_cars, dtype=np.int64)
+        self._position = np.zeros(num_cars, dtype=np.int64)
+        self._pit_entry = np.full(num_cars, np.nan)     # ピットレーンに入った session time
+        self._key = None
+        self.packet_count = 0
+
+    def _grow_laps(self, needed: int):
+        """ラップ数が足りなくなったら配列を倍に広げる"""
+        capacity = self._capacity
+        while capacity <= needed:
+            capacity *= 2
+        for name, values in self._lap_arrays.items():
+            fill = False if values.dtype == bool else (0.0 if name == 'pit_lane_ms' else np.nan)
+            grown = np.full((self.num_cars, capacity), fill, dtype=values.dtype)
+            grown[:, :self._capacity] = values
+            self._lap_arrays[name] = grown
+        self._capacity = capacity
+
+    def _add_events(self, frame: int, time: float, lap, car, old, new, pit):
+        n = len(car)
+        if self._num_events + n > len(self._events):
+            grown = np.empty(max(2 * len(self._events), self._num_events + n), dtype=EVENT_DTYPE)
+            grown[:self._num_events] = self._events[:self._num_events]
+            self._events = grown
+        chunk = self._events[self._num_events:self._num_events + n]
+        chunk['frame'], chunk['time'] = frame, time
+        chunk['lap'], chunk['car'], chunk['old'], chunk['new'], chunk['pit'] = lap, car, old, new, pit
+        self._num_events += n
+
+    def push(self, header, data: bytes) -> bool:
+        """Lap Data パケット 1 つを取り込む (header は PacketHeader)
+
+        ほとんどのパケットは周回・順位・ピット状態が前回と同じなので、
+        そのバイトだけをスライスで比べて、変化がなければ配列を読まずに返す。
+        """
+        if len(data) < _PACKET_END:
+            return False
+        key = tuple(data[offset:_PACKET_END:LapDataPacket.SINGLE_CAR_SIZE] for offset in _KEY_OFFSETS)
+        if key == self._key:
+            self.packet_count += 1
+            return True
+        self._key = key
+        return self.push_cars(LapDataPacket.parse_all(data), header.overall_frame_identifier, header.session_time)
+
+    def push_cars(self, cars: np.ndarray, frame: int = 0, time: float = 0.0) -> bool:
+        """LAP_DATA_DTYPE の全車配列 1 つを取り込む"""
+        cars = cars[:self.num_cars]
+        self.packet_count += 1
+        status = cars['result_status']
+        active = status >= RESULT_ACTIVE
+        lap = cars['current_lap_num'].astype(np.int64)
+        position = cars['car_position'].astype(np.int64)
+        if lap.max(initial=0) + 1 >= self._capacity:
+            self._grow_laps(int(lap.max()) + 1)
+        arrays = self._lap_arrays
+
+        # 周回が進んだ車: 直前の周 (前回パケットの lap) を確定
+        crossed = np.flatnonzero(active & (lap > self._lap) & (self._lap > 0))
+        if len(crossed):
+            done = self._lap[crossed]
+            crossed_cars = cars[crossed]
+            arrays['lap_time_ms'][crossed, done] = crossed_cars['last_lap_time_in_ms']
+            arrays['position'][crossed, done] = crossed_cars['car_position']
+            arrays['gap_to_leader_ms'][crossed, done] = _gap_ms(crossed_cars, 'delta_to_race_leader')
+            arrays['gap_to_front_ms'][crossed, done] = _gap_ms(crossed_cars, 'delta_to_car_in_front')
+
+        # ピットレーン滞在 (現在の周に付ける)。滞在時間は出入りの session time の差
+        # (ゲームの pit_lane_time_in_lane_in_ms もあれば大きい方)
+        pitting = active & (cars['pit_status'] > 0)
+        in_pit = np.flatnonzero(pitting)
+        if len(in_pit):
+            arrays['pit'][in_pit, lap[in_pit]] = True
+            entered = in_pit[np.isnan(self._pit_entry[in_pit])]
+            self._pit_entry[entered] = time
+            arrays['pit_lane_ms'][in_pit, lap[in_pit]] = np.maximum(
+                arrays['pit_lane_ms'][in_pit, lap[in_pit]], cars['pit_lane_time_in_lane_in_ms'][in_pit]
+            )
+        left = np.flatnonzero(~pitting & ~np.isnan(self._pit_entry))
+        if len(left):
+            lane_ms = (time - self._pit_entry[left]) * 1000.0
+            arrays['pit_lane_ms'][left, self._lap[left]] = np.maximum(arrays['pit_lane_ms'][left, self._lap[left]], lane_ms)
+            self._pit_entry[left] = np.nan
+
+        # 順位変動 (前回も今回も走行中の車だけ)
+        moved = np.flatnonzero(active & (self._position > 0) & (position > 0) & (position != self._position))
+        if len(moved):
+            self._add_events(frame, time, lap[moved], moved, self._position[moved], position[moved],
+                             cars['pit_status'][moved] > 0)
+
+        started = active & (self.grid_position == 0)
+        self.grid_position[started] = cars['grid_position'][started]
+        self.result_status[:] = status
+        self._lap = np.where(active, lap, self._lap)
+        self._position = np.where(active, position, 0)
+        return True
+
+    def history(self) -> RaceHistory:
+        """現在までの配列のコピー"""
+        n = max(int(self._lap.max(initial=0)) + 1, 1)
+        return RaceHistory(
+            **{name: values[:, :n].copy() for name, values in self._lap_arrays.items()},
+            grid_position=self.grid_position.copy(),
+            result_status=self.result_status.copy(),
+            events=self._events[:self._num_events].copy(),
+        )
+
+    def __len__(self):
+        return self._num_events
+
+
+def replay_capture(path, tracker: Optional[RaceTracker] = None) -> RaceHistory:
+    """記録 (packet_hex 付き CSV / .f1cap) の Lap Data パケットを再生して RaceHistory を作る"""
+    from .packet_parser import PacketParser, PacketType
+    from .raw_capture import CAPTURE_SUFFIX, CaptureReader
+
+    tracker = tracker or RaceTracker()
+    if Path(path).suffix == CAPTURE_SUFFIX:
+        with CaptureReader(path) as reader:
+            for data in reader.views(PacketType.LAP_DATA):
+                header = PacketParser.parse_header(data)
+                if header:
+                    tracker.push(header, data)
+        return tracker.history()
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        if 'packet_hex' not in (reader.fieldnames or ()):
+            raise ValueError(f"packet_hex 列も .race.npz もないため全車データを読めません: {path}")
+        for row in reader:
+            if row.get('packet_type') != str(int(PacketType.LAP_DATA)):
+                continue
+            data = bytes.fromhex(row['packet_hex'])
+            header = PacketParser.parse_header(data)
+            if header:
+                tracker.push(header, data)
+    return tracker.history()
+
+
+def load_race(path) -> RaceHistory:
+    """npz (RaceHistory.save) / CSV (同じ名前の .race.npz、なければ packet_hex を再生) / .f1cap から読み込む"""
+    path = Path(path)
+    if path.suffix == '.npz':
+        return RaceHistory.load(path)
+    # collector の CSV は全車データを .race.npz に保存している (packet_hex を持つのは f1_recorder の CSV だけ)
+    if path.suffix == '.csv' and path.with_suffix('.race.npz').exists():
+        return RaceHistory.load(path.with_suffix('.race.npz'))
+    return replay_capture(path)
+
+
+# ==================== 分析 ====================
+
+def clean_laps(history: RaceHistory) -> np.ndarray:
+    """ペース比較に使えるラップのマスク [car, lap] (1 周目・ピットの周・その次の周を除く)"""
+    clean = ~np.isnan(history.lap_time_ms)
+    clean[:, :2] = False
+    clean &= ~history.pit
+    clean[:, 1:] &= ~history.pit[:, :-1]
+    return clean
+
+
+def gap_evolution(history: RaceHistory, cars: Optional[Iterable[int]] = None) -> np.ndarray:
+    """ラップ終了時点のリーダーとの差 (s) [car, lap]"""
+    gaps = history.gap_to_leader_ms / 1000.0
+    # リーダー自身は delta 0
+    gaps = np.where(history.position == 1, 0.0, gaps)
+    return gaps if cars is None else gaps[list(cars)]
+
+
+def gap_between(history: RaceHistory, car: int, rival: int) -> np.ndarray:
+    """ラップごとの 2 台の差 (s、> 0 = car が rival より後ろ)"""
+    gaps = gap_evolution(history)
+    return gaps[car] - gaps[rival]
+
+
+def overtakes(history: RaceHistory) -> np.ndarray:
+    """コース上のオーバーテイク (ピットによる順位変動を除く)
+
+    同じフレームで 順位を上げた車 (gainer) と、その間の順位から 1 つ以上落ちた車 (loser) を
+    組み合わせる。どちらかがピットレーンにいた変動は含めない。
+
+    Returns:
+        フィールド frame, time, lap, car (抜いた車), passed (抜かれた車), position (抜いた後の順位)
+    """
+    events = history.events
+    on_track = events[~events['pit']]
+    gains = on_track[on_track['new'] < on_track['old']]
+    losses = on_track[on_track['new'] > on_track['old']]
+    dtype = np.dtype([('frame', '<u4'), ('time', '<f4'), ('lap', '<u1'),
+                      ('car', '<u1'), ('passed', '<u1'), ('position', '<u1')])
+    if len(gains) == 0 or len(losses) == 0:
+        return np.empty(0, dtype=dtype)
+
+    # フレームでソートして、同じフレームの組だけを作る
+    losses = losses[np.argsort(losses['frame'], kind='stable')]
+    lo = np.searchsorted(losses['frame'], gains['frame'], side='left')
+    hi = np.searchsorted(losses['frame'], gains['frame'], side='right')
+    counts = hi - lo
+    g = np.repeat(np.arange(len(gains)), counts)
+    l = np.concatenate([np.arange(a, b) for a, b in zip(lo, hi)]) if counts.sum() else np.empty(0, np.int64)
+    gainer, loser = gains[g], losses[l]
+    # 抜かれた車は gainer の新しい順位 〜 元の順位 の間にいた
+    hit = (loser['old'] >= gainer['new']) & (loser['old'] < gainer['old'])
+
+    result = np.empty(int(hit.sum()), dtype=dtype)
+    result['frame'], result['time'], result['lap'] = gainer['frame'][hit], gainer['time'][hit], gainer['lap'][hit]
+    result['car'], result['passed'], result['position'] = gainer['car'][hit], loser['car'][hit], gainer['new'][hit]
+    return result
+
+
+def pit_stop_deltas(history: RaceHistory) -> List[Dict]:
+    """ピットストップごとのロスタイム
+
+    連続してピットレーンにいた周 (ピットレーンがコントロールラインをまたぐと 2 周) を 1 回とし、
+    その周のラップタイム合計 - その車のクリーンラップの中央値 x 周数 をロスとする。
+    """
+    pace = pace_by_car(history)
+    pit = history.pit.astype(np.int8)
+    # 各車のピット区間の開始 / 終了 (終了は含まない)
+    edges = np.diff(np.pad(pit, ((0, 0), (1, 1))), axis=1)
+    starts = np.argwhere(edges == 1)
+    ends = np.argwhere(edges == -1)
+
+    stops = []
+    for (car, start), (_, end) in zip(starts, ends):
+        laps = history.lap_time_ms[car, start:end]
+        lost = np.nansum(laps) - pace[car] * np.count_nonzero(~np.isnan(laps))
+        stops.append({
+            'car': int(car),
+            'lap': int(start),
+            'pit_lane_ms': float(history.pit_lane_ms[car, start:end].max()),
+            'time_lost_ms': float(lost) if np.any(~np.isnan(laps)) else float('nan'),
+        })
+    return stops
+
+
+def pace_by_car(history: RaceHistory, last_n: Optional[int] = None) -> np.ndarray:
+    """クリーンラップのラップタイム中央値 (ms) [car] (last_n 指定時は直近 n 周)"""
+    times = np.where(clean_laps(history), history.lap_time_ms, np.nan)
+    if last_n:
+        # 車ごとに直近 n 本のクリーンラップだけ残す
+        order = np.cumsum(~np.isnan(times[:, ::-1]), axis=1)[:, ::-1]
+        times = np.where(order <= last_n, times, np.nan)
+    pace = np.full(len(times), np.nan)
+    has = ~np.isnan(times).all(axis=1)
+    pace[has] = np.nanmedian(times[has], axis=1)
+    return pace
+
+
+def pace_ranking(history: RaceHistory, last_n: Optional[int] = None) -> List[Dict]:
+    """クリーンラップのペース順 (速い順) の一覧"""
+    pace = pace_by_car(history, last_n)
+    clean = clean_laps(history)
+    best = np.where(clean, history.lap_time_ms, np.inf).min(axis=1)
+    final_position = np.full(len(pace), np.nan)
+    for car in history.cars:
+        done = history.position[car][~np.isnan(history.position[car])]
+        if len(done):
+            final_position[car] = done[-1]
+
+    ranking = []
+    for rank, car in enumerate(np.flatnonzero(~np.isnan(pace))[np.argsort(pace[~np.isnan(pace)])], 1):
+        ranking.append({
+            'rank': rank,
+            'car': int(car),
+            'pace_ms': float(pace[car]),
+            'best_ms': float(best[car]),
+            'clean_laps': int(clean[car].sum()),
+            'position': float(final_position[car]),
+            'gap_to_fastest_ms': float(pace[car] - np.nanmin(pace)),
+        })
+    return ranking
+
+
+if __name__ == "__main__":
+    print("✓ Race Analytics モジュール読み込み完了")
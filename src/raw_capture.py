@@ -0,0 +1,227 @@
+"""
+F1 25 Raw Capture
+受信した UDP パケットをそのままバイナリで記録し、mmap でパケット種別・フレーム範囲ごとに取り出す
+
+記録ファイル (.f1cap) はパケットを [長さ (uint16)] + [生データ] で並べただけのもので、
+横に固定長のインデックス (.f1idx: オフセット・サイズ・種別・フレーム・時刻) を置く。
+読み込みは両方を mmap するので、数 GB の記録でも 1 周分だけならコピーなし (memoryview) で
+struct / NumPy のデコーダーにそのまま渡せる。
+"""
+
+import mmap
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# 書き込み側は numpy なしの capture_writer (CaptureWriter は従来どおりここからも import できる)
+from .capture_writer import CAPTURE_MAGIC, CAPTURE_SUFFIX, PACKET_LENGTH, CaptureWriter, index_path_for, index_row
+
+
+# インデックス 1 件 (記録順、capture_writer の書き込みと同じ並び)
+INDEX_DTYPE = np.dtype([
+    ('offset', '<u8'),          # 生データの先頭 (長さプレフィックスの後)
+    ('size', '<u2'),
+    ('packet_type', 'u1'),
+    ('frame', '<u4'),           # frame_identifier (フラッシュバックで巻き戻る)
+    ('overall_frame', '<u4'),   # overall_frame_identifier (巻き戻らない)
+    ('session_time', '<f4'),
+], align=False)
+
+
+def rebuild_index(path) -> Path:
+    """.f1cap を先頭から読んでインデックスを作り直す (途中で切れた記録は最後の完全なパケットまで)"""
+    path = Path(path)
+    index_path = index_path_for(path)
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        if buffer[:len(CAPTURE_MAGIC)] != CAPTURE_MAGIC:
+            raise ValueError(f"記録ファイルの形式が違います: {path}")
+        rows = []
+        offset = len(CAPTURE_MAGIC)
+        end = len(buffer)
+        while offset + PACKET_LENGTH.size <= end:
+            (size,) = PACKET_LENGTH.unpack_from(buffer, offset)
+            start = offset + PACKET_LENGTH.size
+            if start + size > end:
+                break
+            rows.append(index_row(start, buffer[start:start + size]))
+            offset = start + size
+    with open(index_path, 'wb') as f:
+        f.write(b''.join(rows))
+    return index_path
+
+
+def _read_index(index_path: Path) -> Optional[np.ndarray]:
+    """.f1idx を memmap で (ない / 行の途中で切れていれば None)"""
+    if not index_path.exists() or index_path.stat().st_size % INDEX_DTYPE.itemsize:
+        return None
+    if index_path.stat().st_size == 0:
+        return np.empty(0, dtype=INDEX_DTYPE)
+    return np.memmap(index_path, dtype=INDEX_DTYPE, mode='r')
+
+
+def _indexed_end(index: np.ndarray) -> int:
+    """インデックスの最後のパケットの終わり (.f1cap 内のバイト位置)"""
+    if len(index) == 0:
+        return len(CAPTURE_MAGIC)
+    last = index[-1]
+    return int(last['offset']) + int(last['size'])
+
+
+class CaptureReader:
+    """.f1cap / .f1idx を mmap して、パケット種別 × フレーム範囲の生データを memoryview で返す
+
+    reader = CaptureReader('telemetry_data/telemetry_monza_....f1cap')
+    for data in reader.views(PacketType.LAP_DATA, 1200, 6500):
+        cars = LapDataPacket.parse_all(data)
+    """
+
+    def __init__(self, path):
+        self.path = Path(path).with_suffix(CAPTURE_SUFFIX)
+        self._file = open(self.path, 'rb')
+        self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._buffer[:len(CAPTURE_MAGIC)] != CAPTURE_MAGIC:
+            self.close()
+            raise ValueError(f"記録ファイルの形式が違います: {self.path}")
+        self._view = memoryview(self._buffer)
+        self.index = self._load_index()
+        # packet_type -> インデックスの行番号 (初めて使う時に作る)
+        self._rows_by_type: Dict[int, np.ndarray] = {}
+        # (packet_type, by) -> (その行のフレーム番号, 昇順かどうか)
+        self._frames: Dict[Tuple[int, str], Tuple[np.ndarray, bool]] = {}
+
+    def _load_index(self) -> np.ndarray:
+        index_path = index_path_for(self.path)
+        # インデックスがない / 途中で切れている / 最後に索引したパケットの終わりが記録の終わりと違う
+        # (索引の後にも書き込まれている、記録の方が短い) 場合は作り直す
+        index = _read_index(index_path)
+        if index is None or _indexed_end(index) != len(self._buffer):
+            rebuild_index(self.path)
+            index = _read_index(index_path)
+        return index
+
+    def __len__(self):
+        return len(self.index)
+
+    def counts(self) -> Dict[int, int]:
+        """packet_type -> パケット数"""
+        counts = np.bincount(self.index['packet_type'], minlength=16)
+        return {packet_type: int(n) for packet_type, n in enumerate(counts) if n}
+
+    def _type_rows(self, packet_type: int) -> np.ndarray:
+        rows = self._rows_by_type.get(packet_type)
+        if rows is None:
+            rows = np.flatnonzero(self.index['packet_type'] == packet_type)
+            self._rows_by_type[packet_type] = rows
+        return rows
+
+    def rows(self, packet_type: Optional[int] = None, start: Optional[int] = None, end: Optional[int] = None,
+             by: str = 'frame') -> np.ndarray:
+        """条件に合うインデックスの行番号 (記録順)、フレームは start <= frame <= end
+
+        by='overall_frame' にすると巻き戻らないフレーム番号で選ぶ。
+        フレームが昇順に並んでいれば二分探索、フラッシュバックで戻っていれば全件比較。
+        """
+        rows = np.arange(len(self.index)) if packet_type is None else self._type_rows(int(packet_type))
+        if start is None and end is None:
+            return rows
+        key = (-1 if packet_type is None else int(packet_type), by)
+        cached = self._frames.get(key)
+        if cached is None:
+            frames = np.ascontiguousarray(self.index[by][rows])
+            cached = (frames, bool(np.all(frames[1:] >= frames[:-1])))
+            self._frames[key] = cached
+        frames, ascending = cached
+        low = 0 if start is None else start
+        high = np.iinfo(np.uint32).max if end is None else end
+        if ascending:
+            return rows[np.searchsorted(frames, low, side='left'):np.searchsorted(frames, high, side='right')]
+        return rows[(frames >= low) & (frames <= high)]
+
+    def view(self, row: int) -> memoryview:
+        """インデックス row 番目のパケット (コピーなし)"""
+        entry = self.index[row]
+        offset = int(entry['offset'])
+        return self._view[offset:offset + int(entry['size'])]
+
+    def views(self, packet_type: Optional[int] = None, start: Optional[int] = None, end: Optional[int] = None,
+              by: str = 'frame') -> List[memoryview]:
+        """条件に合うパケットの memoryview のリスト (記録順)"""
+        rows = self.rows(packet_type, start, end, by)
+        offsets = self.index['offset'][rows].tolist()
+        sizes = self.index['size'][rows].tolist()
+        view = self._view
+        return [view[offset:offset + size] for offset, size in zip(offsets, sizes)]
+
+    def packets(self, packet_type: Optional[int] = None, start: Optional[int] = None, end: Optional[int] = None,
+                by: str = 'frame') -> Iterator[Tuple[np.void, memoryview]]:
+        """(インデックスの行, memoryview) を記録順に返す"""
+        for row in self.rows(packet_type, start, end, by):
+            yield self.index[row], self.view(row)
+
+    def stack(self, packet_type: int, start: Optional[int] = None, end: Optional[int] = None,
+              by: str = 'frame') -> np.ndarray:
+        """同じ種別のパケットを [packet, byte] の uint8 配列にまとめる (選んだ分だけコピー)
+
+        サイズの違うパケットが混ざっている場合は一番多いサイズのものだけ使う。
+        """
+        rows = self.rows(packet_type, start, end, by)
+        if len(rows) == 0:
+            return np.empty((0, 0), dtype=np.uint8)
+        sizes = self.index['size'][rows]
+        size = int(np.bincount(sizes).argmax())
+        rows = rows[sizes == size]
+        raw = np.frombuffer(self._buffer, dtype=np.uint8)
+        offsets = self.index['offset'][rows].astype(np.int64)
+        return raw[offsets[:, None] + np.arange(size)]
+
+    def close(self):
+        self.index = None
+        try:
+            if getattr(self, '_view', None) is not None:
+                self._view.release()
+                self._view = None
+            self._buffer.close()
+        except BufferError:
+            # 返した memoryview がまだ使われている間は mmap を閉じられない (参照がなくなれば解放される)
+            pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return f"CaptureReader({self.path.name}, packets={len(self.index)})"
+
+
+def convert_csv(csv_path, capture_path=None) -> Path:
+    """packet_hex 付きの記録 CSV (f1_recorder.py) を .f1cap + .f1idx に変換"""
+    import csv
+
+    csv_path = Path(csv_path)
+    capture_path = Path(capture_path) if capture_path else csv_path.with_suffix(CAPTURE_SUFFIX)
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        # 列がなければ .f1cap を作らない (空の記録が有効なファイルに見えてしまう)
+        if 'packet_hex' not in (reader.fieldnames or ()):
+            raise ValueError(f"packet_hex 列がないため変換できません: {csv_path}")
+        writer = CaptureWriter(capture_path)
+        try:
+            with writer:
+                for row in reader:
+                    if row['packet_hex']:
+                        writer.write(bytes.fromhex(row['packet_hex']))
+        except Exception:
+            # 途中までの記録は残さない
+            writer.path.unlink(missing_ok=True)
+            index_path_for(writer.path).unlink(missing_ok=True)
+            raise
+    return writer.path
+
+
+if __name__ == "__main__":
+    print("✓ Raw Capture モジュール読み込み完了")
+    print(f"- インデックス 1 件: {INDEX_DTYPE.itemsize} bytes")
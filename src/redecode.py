@@ -0,0 +1,281 @@
+"""
+F1 25 Archive Re-decoder
+packet_hex 付きの記録 CSV (f1_recorder.py) を正しいレイアウトでまとめてデコードし直す
+
+f1_recorder.py の記録時のデコード (parse_telemetry_data) はプレイヤーの車を見ず offset 29 固定、
+アクセルを 1 バイトとして読むなどレイアウトが違っていたので、speed_kph / throttle などの列は信用できない。
+生データ (packet_hex) は正しいので、種類・サイズ・パケット形式が同じパケットをまとめて
+1 回の unhexlify + np.frombuffer でデコードし、collector と同じ形式 (collector_v2) の CSV に書き直す。
+"""
+
+import binascii
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .data_collector import CSV_COLUMNS, STATUS_MAX_AGE
+from .frame_buffer import asof_join
+from .normalization import FLAGS_COLUMN, INGEST_FORMAT, normalize
+from .packet_parser import PACKET_HEADER_DTYPE, PacketType
+from .telemetry_packets import (
+    CAR_DAMAGE_DTYPE, CAR_MOTION_DTYPE, CAR_STATUS_DTYPE, CAR_TELEMETRY_DTYPE, LAP_DATA_DTYPE,
+)
+
+
+REDECODE_DIR = Path("telemetry_data") / "redecoded"
+
+# デコードできるパケット形式 (ヘッダーの packet_format)
+SUPPORTED_FORMAT = 2025
+
+NUM_CARS = 22
+
+# packet_type -> 1 台分の dtype
+CAR_LAYOUTS = {
+    PacketType.MOTION: CAR_MOTION_DTYPE,
+    PacketType.LAP_DATA: LAP_DATA_DTYPE,
+    PacketType.CAR_TELEMETRY: CAR_TELEMETRY_DTYPE,
+    PacketType.CAR_STATUS: CAR_STATUS_DTYPE,
+    PacketType.CAR_DAMAGE: CAR_DAMAGE_DTYPE,
+}
+
+# packet_hex の中でのヘッダーの位置 (16 進数 2 文字 = 1 バイト)
+_FORMAT_HEX = slice(0, 4)
+_TYPE_HEX = slice(12, 14)
+
+
+def read_hex_groups(path) -> Dict[Tuple[int, int, int], List[bytes]]:
+    """記録 CSV の packet_hex を (packet_format, packet_type, size) ごとに集める (デコードする種類のみ)
+
+    f1_recorder.py の CSV は packet_hex より前の列 (timestamp, frame_id, ...) に引用符やカンマを含まないので、
+    csv モジュールを通さず各行を packet_hex の所まで split するだけにする (数百 MB で数倍速い)。
+    """
+    wanted = {f"{int(packet_type):02x}".encode() for packet_type in CAR_LAYOUTS}
+    by_prefix: Dict[Tuple[bytes, bytes, int], List[bytes]] = {}
+    with open(path, 'rb') as f:
+        header = f.readline().rstrip(b'\r\n').split(b',')
+        if b'packet_hex' not in header:
+            raise ValueError(f"packet_hex 列がないため再デコードできません: {path}")
+        column = header.index(b'packet_hex')
+        for line in f:
+            fields = line.split(b',', column + 1)
+            if len(fields) <= column:
+                continue
+            packet_hex = fields[column].rstrip(b'\r\n')
+            if packet_hex[_TYPE_HEX] not in wanted:
+                continue
+            key = (packet_hex[_FORMAT_HEX], packet_hex[_TYPE_HEX], len(packet_hex) // 2)
+            by_prefix.setdefault(key, []).append(packet_hex)
+    return {
+        (int.from_bytes(binascii.unhexlify(packet_format), 'little'), int(packet_type, 16), size): rows
+        for (packet_format, packet_type, size), rows in by_prefix.items()
+    }
+
+
+def _packet_dtype(car_dtype: np.dtype, size: int) -> np.dtype:
+    """ヘッダー + 全車 (+ 後ろの残り) を 1 パケットとする dtype"""
+    return np.dtype({
+        'names': ['header', 'cars'],
+        'formats': [PACKET_HEADER_DTYPE, (car_dtype, (NUM_CARS,))],
+        'offsets': [0, PACKET_HEADER_DTYPE.itemsize],
+        'itemsize': size,
+    })
+
+
+def decode_groups(groups: Dict[Tuple[int, int, int], List[bytes]]) -> Tuple[Dict[int, Tuple[np.ndarray, np.ndarray]], int]:
+    """グループごとに 1 回でデコードし、packet_type -> (ヘッダー, プレイヤーの車) にまとめる
+
+    Returns:
+        (packet_type -> (ヘッダー配列, 1 台分の配列), デコードできなかったパケット数)
+    """
+    headers: Dict[int, List[np.ndarray]] = {}
+    cars: Dict[int, List[np.ndarray]] = {}
+    skipped = 0
+    for (packet_format, packet_type, size), hex_rows in groups.items():
+        car_dtype = CAR_LAYOUTS[packet_type]
+        if packet_format != SUPPORTED_FORMAT or size < PACKET_HEADER_DTYPE.itemsize + NUM_CARS * car_dtype.itemsize:
+            skipped += len(hex_rows)
+            continue
+        packets = np.frombuffer(binascii.unhexlify(b''.join(hex_rows)), _packet_dtype(car_dtype, size))
+        player = np.minimum(packets['header']['player_car_index'], NUM_CARS - 1)
+        headers.setdefault(packet_type, []).append(packets['header'])
+        cars.setdefault(packet_type, []).append(packets['cars'][np.arange(len(packets)), player])
+    decoded = {
+        packet_type: (np.concatenate(headers[packet_type]), np.concatenate(cars[packet_type]))
+        for packet_type in headers
+    }
+    return decoded, skipped
+
+
+def _first_per_frame(header: np.ndarray) -> np.ndarray:
+    """overall_frame_identifier ごとに最初に届いたパケットの位置 (フレーム順、重複は捨てる)"""
+    _, first = np.unique(header['overall_frame_identifier'], return_index=True)
+    return first
+
+
+def build_table(decoded: Dict[int, Tuple[np.ndarray, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """Lap Data と Car Telemetry が揃ったフレームの表 (CSV_COLUMNS の順の列名 -> 配列)
+
+    data_collector と同じく Motion は同じフレームのもの、
+    Car Status / Car Damage は STATUS_MAX_AGE 秒以内の直前の値を付ける。
+    """
+    if PacketType.LAP_DATA not in decoded or PacketType.CAR_TELEMETRY not in decoded:
+        return {}
+    lap_header, lap = decoded[PacketType.LAP_DATA]
+    tel_header, tel = decoded[PacketType.CAR_TELEMETRY]
+    lap_rows = _first_per_frame(lap_header)
+    tel_rows = _first_per_frame(tel_header)
+    frames, lap_pick, tel_pick = np.intersect1d(
+        lap_header['overall_frame_identifier'][lap_rows], tel_header['overall_frame_identifier'][tel_rows],
+        assume_unique=True, return_indices=True,
+    )
+    header, lap, tel = lap_header[lap_rows[lap_pick]], lap[lap_rows[lap_pick]], tel[tel_rows[tel_pick]]
+    session_time = header['session_time'].astype(np.float64)
+    n = len(frames)
+    nan = np.full(n, np.nan)
+
+    def same_frame(packet_type, fields):
+        if packet_type not in decoded:
+            return [nan] * len(fields)
+        other_header, values = decoded[packet_type]
+        rows = _first_per_frame(other_header)
+        keys = other_header['overall_frame_identifier'][rows]
+        position = np.minimum(np.searchsorted(keys, frames), max(len(keys) - 1, 0))
+        hit = keys[position] == frames if len(keys) else np.zeros(n, dtype=bool)
+        return [np.where(hit, values[field][rows[position]], np.nan) for field in fields]
+
+    def as_of(packet_type, getters):
+        if packet_type not in decoded:
+            return [nan] * len(getters)
+        other_header, values = decoded[packet_type]
+        rows = _first_per_frame(other_header)
+        values, other_header = values[rows], other_header[rows]
+        index = asof_join(frames, other_header['overall_frame_identifier'], STATUS_MAX_AGE,
+                          session_time, other_header['session_time'])
+        hit = index >= 0
+        return [np.where(hit, get(values)[np.maximum(index, 0)], np.nan) for get in getters]
+
+    position_x, position_y, position_z = same_frame(
+        PacketType.MOTION, ['world_position_x', 'world_position_y', 'world_position_z'])
+    status = as_of(PacketType.CAR_STATUS, [
+        lambda s: s['fuel_in_tank'],
+        lambda s: s['fuel_remaining_laps'],
+        lambda s: s['ers_store_energy'] / 1e6,
+        lambda s: s['ers_deployed_this_lap'] / 1e6,
+        lambda s: (s['ers_harvested_this_lap_mguk'] + s['ers_harvested_this_lap_mguh']) / 1e6,
+        lambda s: s['ers_deploy_mode'],
+        lambda s: s['visual_tyre_compound'],
+        lambda s: s['tyres_age_laps'],
+    ])
+    wear = as_of(PacketType.CAR_DAMAGE, [lambda d, i=i: d['tyres_wear'][:, i] for i in range(4)])
+
+    columns, _ = normalize({
+        'speed_kph': tel['speed'].astype(np.float64),
+        'throttle': tel['throttle'].astype(np.float64),
+        'brake': tel['brake'].astype(np.float64),
+        'steering': tel['steer'].astype(np.float64),
+        'gear': tel['gear'].astype(np.float64),
+        'rpm': tel['engine_rpm'].astype(np.float64),
+        'drs': tel['drs'].astype(np.float64),
+        'position_x': position_x,
+        'position_y': position_y,
+        'position_z': position_z,
+    }, INGEST_FORMAT, copy=False)
+
+    values = [
+        header['frame_identifier'], session_time,
+        columns['speed_kph'], columns['throttle'], columns['brake'], columns['steering'],
+        columns['gear'], columns['rpm'], columns['drs'],
+        tel['brakes_temperature'][:, 0].astype(np.float64),
+        tel['tyres_surface_temperature'].mean(axis=1),
+        tel['tyres_pressure'].astype(np.float64).mean(axis=1),
+        lap['current_lap_num'], lap['current_lap_time_in_ms'], lap['last_lap_time_in_ms'],
+        lap['sector_1_time_ms_part'], lap['sector_2_time_ms_part'],
+        lap['lap_distance'].astype(np.float64), lap['total_distance'].astype(np.float64),
+        lap['car_position'], columns[FLAGS_COLUMN],
+        columns['position_x'], columns['position_y'], columns['position_z'],
+        *status, *wear,
+    ]
+    return dict(zip(CSV_COLUMNS, values))
+
+
+# CSV_COLUMNS ごとの書式 (None は整数のまま)
+_COLUMN_SPECS = [
+    None, ".3f", ".0f", ".3f", ".3f", ".3f", ".0f", ".0f", ".0f", ".1f", ".1f", ".1f",
+    None, None, None, None, None, ".1f", ".1f", None, None, ".2f", ".2f", ".2f",
+    ".3f", ".2f", ".4f", ".4f", ".4f", ".0f", ".0f", ".0f", ".2f", ".2f", ".2f", ".2f",
+]
+
+
+def _format_column(values: np.ndarray, spec: Optional[str]) -> List[str]:
+    if spec is None:
+        return [str(v) for v in values.astype(np.int64).tolist()]
+    return ["" if v != v else format(v, spec) for v in values.tolist()]
+
+
+def write_table(table: Dict[str, np.ndarray], path) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    formatted = [_format_column(np.asarray(table[name]), spec) for name, spec in zip(CSV_COLUMNS, _COLUMN_SPECS)]
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        writer.writerows(zip(*formatted))
+    return path
+
+
+def redecode_file(path, out_dir: Path = REDECODE_DIR) -> Dict:
+    """1 ファイルを再デコードして out_dir に同じ名前で保存"""
+    decoded, skipped = decode_groups(read_hex_groups(path))
+    table = build_table(decoded)
+    if not table:
+        raise ValueError(f"Lap Data と Car Telemetry の揃ったフレームがありません: {path}")
+    output = write_table(table, Path(out_dir) / Path(path).name)
+    return {
+        'output': str(output),
+        'frames': len(table['Frame']),
+        'packets': {PacketType(packet_type).name: len(header) for packet_type, (header, _) in decoded.items()},
+        'skipped': skipped,
+    }
+
+
+def _redecode_job(path: str, out_dir: str) -> Tuple[str, Dict]:
+    try:
+        return path, redecode_file(path, out_dir)
+    except ValueError as e:
+        return path, {'error': str(e)}
+
+
+def _up_to_date(path, out_dir: Path) -> bool:
+    output = Path(out_dir) / Path(path).name
+    return output.exists() and output.stat().st_mtime >= Path(path).stat().st_mtime
+
+
+def redecode_archive(
+    paths: Sequence,
+    out_dir: Path = REDECODE_DIR,
+    workers: Optional[int] = None,
+    refresh: bool = False,
+) -> Dict[str, Dict]:
+    """記録 CSV 群をファイル単位で並列に再デコード (出力が新しいファイルは飛ばす)
+
+    Returns:
+        入力パス -> 結果 (output, frames, packets, skipped / 失敗時は error)
+    """
+    pending = [str(path) for path in paths if refresh or not _up_to_date(path, out_dir)]
+    if workers is None:
+        workers = min(len(pending), os.cpu_count() or 1)
+    if workers <= 1 or len(pending) <= 1:
+        results = [_redecode_job(path, str(out_dir)) for path in pending]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_redecode_job, pending, [str(out_dir)] * len(pending)))
+    return dict(results)
+
+
+if __name__ == "__main__":
+    print("✓ Archive Re-decoder モジュール読み込み完了")
+    print(f"- 対応パケット: {[PacketType(t).name for t in CAR_LAYOUTS]} (packet_format {SUPPORTED_FORMAT})")
@@ -0,0 +1,424 @@
+"""
+F1 25 Batch Reports
+保存済みセッション群からラップ単位 / セッション単位のレポート (JSON + PNG) をまとめて生成する
+
+出力は内容のハッシュ (content key) をファイル名にして保存し、同じ内容のレポートは作り直さない。
+ファイルサイズと更新時刻が変わっていないセッションは読み込み自体を省く。
+マニフェストから参照されなくなった古いハッシュの出力は生成のたびに消す。
+"""
+
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Mapping, Optional, Sequence
+
+import numpy as np
+
+from .laps import Lap, extract_laps, track_name_from_path
+from .plotting import FigureSpec, HLine, Panel, Series, render_figures
+from .sync_scores import score_aligned, session_sync
+
+
+# レポートの中身 (項目・図の体裁) を変えたら上げる -> 全レポートが作り直される
+REPORT_VERSION = 2
+
+REPORT_DIR = Path("analysis_results") / "reports"
+MANIFEST_NAME = "manifest.json"
+
+# content key をファイル名にした出力 (これ以外のファイルは掃除しない)
+OUTPUT_PATTERN = re.compile(r'^[0-9a-f]{20}\.(json|png)$')
+
+# 同期度 (相関) がこれ未満なら改善ポイントとして挙げる
+SYNC_THRESHOLD = 0.7
+
+# ベストのズレがこれ以上 (m) ならタイミングの改善ポイントとして挙げる
+LAG_THRESHOLD = 5.0
+
+# ラップ比較に使う距離グリッドの間隔 (m)
+COMPARISON_STEP = 5.0
+
+
+# ==================== 統計 (統計分析 の中身をデータとして) ====================
+def _finite(values) -> np.ndarray:
+    values = np.asarray(values, dtype=np.float64)
+    return values[~np.isnan(values)]
+
+
+def _mean(values) -> float:
+    values = _finite(values)
+    return float(values.mean()) if len(values) else float('nan')
+
+
+def _max(values) -> float:
+    values = _finite(values)
+    return float(values.max()) if len(values) else float('nan')
+
+
+def _corr(a, b) -> float:
+    """先頭から揃えた 2 系列の相関 (どちらかが NaN の行は除く)"""
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    n = min(len(a), len(b))
+    a, b = a[:n], b[:n]
+    valid = ~(np.isnan(a) | np.isnan(b))
+    if valid.sum() < 2:
+        return float('nan')
+    a, b = a[valid], b[valid]
+    if a.std() == 0 or b.std() == 0:
+        return float('nan')
+    return float(np.corrcoef(a, b)[0, 1])
+
+
+def compare_statistics(user: Mapping, reference: Mapping, sync: Optional[Mapping] = None) -> Dict:
+    """ユーザーとリファレンス (プロ / ベストラップ) の比較統計
+
+    どちらも正規名の列 (speed_kph, throttle, brake, steering) を持つテーブル。
+    sync (チャンネル -> sync_scores.SyncScore) を渡すと、同期度はラップ距離で揃えた
+    ズレ込みの相関になる。渡さない場合は先頭から揃えた単純な相関 (ズレ 0 のみ)。
+    """
+    user_speed_mean = _mean(user['speed_kph'])
+    ref_speed_mean = _mean(reference['speed_kph'])
+    stats = {
+        'speed': {
+            'user_max': _max(user['speed_kph']),
+            'reference_max': _max(reference['speed_kph']),
+            'user_mean': user_speed_mean,
+            'reference_mean': ref_speed_mean,
+        },
+    }
+    stats['speed']['max_diff'] = stats['speed']['reference_max'] - stats['speed']['user_max']
+    stats['speed']['mean_diff_pct'] = (ref_speed_mean - user_speed_mean) / user_speed_mean * 100
+
+    for channel in ('throttle', 'brake', 'steering'):
+        if channel not in user or channel not in reference:
+            continue
+        stats[channel] = {
+            'user_mean': _mean(user[channel]),
+            'reference_mean': _mean(reference[channel]),
+        }
+        if sync is not None and channel in sync:
+            stats[channel]['sync'] = sync[channel].peak
+            stats[channel]['lag_m'] = sync[channel].lag_m
+        else:
+            stats[channel]['sync'] = _corr(user[channel], reference[channel])
+            stats[channel]['lag_m'] = None
+
+    # 改善ポイント (メッセージは表示側で組み立てる)
+    improvements = []
+    if ref_speed_mean > user_speed_mean:
+        improvements.append({'item': 'speed', 'value': stats['speed']['mean_diff_pct']})
+    for channel in ('throttle', 'brake'):
+        if channel not in stats:
+            continue
+        sync_value = stats[channel]['sync']
+        if abs(sync_value) < SYNC_THRESHOLD:
+            improvements.append({'item': f'{channel}_sync', 'value': sync_value})
+        lag = stats[channel]['lag_m']
+        if lag is not None and abs(lag) >= LAG_THRESHOLD:
+            improvements.append({'item': f'{channel}_lag', 'value': lag})
+    stats['improvements'] = improvements
+    return stats
+
+
+def lap_summary(lap: Lap) -> Dict:
+    """1 ラップの基本統計"""
+    channels = lap.channels
+    summary = {
+        'lap': lap.number,
+        'lap_time': lap.lap_time,
+        'complete': lap.complete,
+        'samples': len(lap),
+        'distance': float(lap.distance[-1]),
+    }
+    if 'speed_kph' in channels:
+        summary['max_speed'] = _max(channels['speed_kph'])
+        summary['mean_speed'] = _mean(channels['speed_kph'])
+    if 'throttle' in channels:
+        summary['full_throttle_pct'] = float((channels['throttle'] >= 0.995).mean() * 100)
+    if 'brake' in channels:
+        summary['braking_pct'] = float((channels['brake'] > 0.05).mean() * 100)
+    return summary
+
+
+# ==================== 図 ====================
+def overview_figure(x, table: Mapping, path, title: str, xlabel: str) -> FigureSpec:
+    """速度 / 油門・ブレーキ / ステアリング / RPM の 4 段"""
+    speed = np.asarray(table['speed_kph'], dtype=np.float64)
+    mean_speed = _mean(speed)
+    panels = [
+        Panel('速度', '速度 (km/h)', [Series(x, speed, color='#1f77b4')],
+              hlines=[HLine(mean_speed, label=f'平均: {mean_speed:.1f}')], legend='best'),
+        Panel('油門 vs ブレーキ入力', '入力 (0-100%)', [
+            Series(x, np.asarray(table['throttle']) * 100, label='油門', color='green'),
+            Series(x, np.asarray(table['brake']) * 100, label='ブレーキ', color='red'),
+        ], legend='best'),
+        Panel('ステアリング角度', 'ステアリング (-1 ～ +1)', [Series(x, table['steering'], color='purple')]),
+    ]
+    if 'rpm' in table:
+        panels.append(Panel('エンジン RPM', 'RPM', [Series(x, table['rpm'], color='orange')]))
+    panels[-1].xlabel = xlabel
+    return FigureSpec(path=Path(path), title=title, panels=panels)
+
+
+def comparison_figure(x, user: Mapping, reference: Mapping, path, title: str,
+                      reference_label: str, xlabel: str) -> FigureSpec:
+    """ユーザーとリファレンスを重ねた 4 段"""
+    def pair(name, ylabel, channel, scale, colors):
+        return Panel(name, ylabel, [
+            Series(x, np.asarray(user[channel]) * scale, label='あなた', color=colors[0], linewidth=2),
+            Series(x, np.asarray(reference[channel]) * scale, label=reference_label,
+                   color=colors[1], linewidth=2, alpha=0.7),
+        ], legend='upper right')
+
+    panels = [
+        pair('速度対比', '速度 (km/h)', 'speed_kph', 1, ('#1f77b4', '#ff7f0e')),
+        pair('油門入力対比', '油門 (0-100%)', 'throttle', 100, ('#2ca02c', '#d62728')),
+        pair('ブレーキ入力対比', 'ブレーキ (0-100%)', 'brake', 100, ('#9467bd', '#8c564b')),
+        pair('ステアリング入力対比', 'ステアリング角度', 'steering', 1, ('#e377c2', '#7f7f7f')),
+    ]
+    panels[-1].xlabel = xlabel
+    return FigureSpec(path=Path(path), title=title, panels=panels, title_size=14)
+
+
+# ==================== content key ====================
+def content_key(*parts) -> str:
+    """配列・文字列・数値からなる内容のハッシュ"""
+    digest = hashlib.sha256(f"v{REPORT_VERSION}".encode())
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            digest.update(np.ascontiguousarray(part, dtype=np.float64).tobytes())
+        else:
+            digest.update(repr(part).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()[:20]
+
+
+def _lap_key(lap: Lap) -> str:
+    return content_key(lap.number, lap.lap_time, lap.distance, lap.time,
+                       *(lap.channels[name] for name in sorted(lap.channels)))
+
+
+def _json_safe(value):
+    """NaN / numpy 型を JSON に書ける形にする"""
+    if isinstance(value, dict):
+        return {k: _json_safe(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(v) for v in value]
+    if isinstance(value, (np.floating, float)):
+        return None if value != value else float(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+# ==================== セッション単位の処理 (ワーカー) ====================
+_COMPARE_CHANNELS = ('speed_kph', 'throttle', 'brake', 'steering')
+
+
+def _has_channels(table: Mapping, names: Sequence[str]) -> bool:
+    return all(name in table for name in names)
+
+
+def _build_session(path, out_dir) -> Dict:
+    """1 セッション分のレポートを生成し、マニフェストのエントリーを返す
+
+    既に同じ content key の出力があるレポートは書き直さない (JSON も図も)。
+    """
+    from .laps import resample
+    from .normalization import load_columns
+
+    path = Path(path)
+    out_dir = Path(out_dir)
+    table = load_columns(path)
+    laps = extract_laps(table, session=path.name)
+    complete = [lap for lap in laps if lap.complete]
+    best = min(complete, key=lambda lap: lap.lap_time) if complete else None
+    best_key = _lap_key(best) if best else None
+
+    specs, outputs = [], []
+
+    def emit(kind, key, data, spec_factory):
+        """まだなければ JSON を書き、図を予約する (図がないレポートは png = None)"""
+        json_path = out_dir / f"{key}.json"
+        png_path = out_dir / f"{key}.png"
+        spec = spec_factory(png_path)
+        entry = {'kind': kind, 'key': key, 'json': json_path.name,
+                 'png': png_path.name if spec is not None else None}
+        entry.update({k: data[k] for k in ('lap',) if k in data})
+        outputs.append(entry)
+        if not json_path.exists():
+            json_path.write_text(json.dumps(_json_safe(data), ensure_ascii=False, indent=2), encoding='utf-8')
+        if spec is not None and not png_path.exists():
+            specs.append(spec)
+
+    # ---- ラップ単位 ----
+    for lap in laps:
+        if not _has_channels(lap.channels, _COMPARE_CHANNELS):
+            continue
+        key = content_key(_lap_key(lap), best_key)
+        data = {'session': path.name, 'lap': lap.number, 'summary': lap_summary(lap)}
+        grid = None
+        if best is not None and lap is not best:
+            # ベストラップと距離グリッド上で比較
+            end = min(lap.distance[-1], best.distance[-1])
+            grid = np.arange(max(lap.distance[0], best.distance[0]), end, COMPARISON_STEP)
+        if grid is not None and len(grid) >= 2:
+            user = resample(lap, grid, _COMPARE_CHANNELS)
+            reference = resample(best, grid, _COMPARE_CHANNELS)
+            data['reference'] = {'lap': best.number, 'lap_time': best.lap_time}
+            data['delta'] = lap.lap_time - best.lap_time
+            data['comparison'] = compare_statistics(
+                user, reference, score_aligned(user, reference, COMPARISON_STEP)
+            )
+            factory = lambda png, g=grid, u=user, r=reference, n=lap.number: comparison_figure(
+                g, u, r, png, f'{path.stem} - Lap {n} vs ベスト (Lap {best.number})',
+                f'ベスト Lap {best.number}', 'ラップ距離 (m)')
+        else:
+            factory = lambda png, l=lap: overview_figure(
+                l.distance, l.channels, png, f'{path.stem} - Lap {l.number}', 'ラップ距離 (m)')
+        emit('lap', key, data, factory)
+
+    # ---- セッション単位 ----
+    if laps:
+        session_key = content_key(path.name, *sorted(_lap_key(lap) for lap in laps))
+    else:
+        session_key = content_key(path.name, *(table[name] for name in sorted(table)))
+    data = {
+        'session': path.name,
+        'track': track_name_from_path(path),
+        'rows': len(next(iter(table.values()), ())),
+        'laps': [lap_summary(lap) for lap in laps],
+        'best_lap': best.number if best else None,
+        'best_lap_time': best.lap_time if best else None,
+    }
+    if best is not None and len(laps) > 1:
+        # 全ラップのベストラップとの同期度 (一括計算)
+        sync = session_sync(laps, best)
+        data['sync'] = {
+            'reference_lap': best.number,
+            'laps': {
+                int(number): {name: score.to_dict() for name, score in sync.lap_scores(i).items()}
+                for i, number in enumerate(sync.lap_numbers)
+            },
+        }
+    if _has_channels(table, _COMPARE_CHANNELS):
+        data['speed'] = {'max': _max(table['speed_kph']), 'mean': _mean(table['speed_kph'])}
+    has_time = 'session_time' in table and _has_channels(table, _COMPARE_CHANNELS)
+    emit('session', session_key, data, lambda png: overview_figure(
+        table['session_time'], table, png, f'{path.stem} - セッション概要', 'セッション時間 (秒)',
+    ) if has_time else None)
+
+    # ワーカー内では逐次描画 (セッション単位で並列化している)
+    render_figures(specs, workers=1)
+    stat = path.stat()
+    return {
+        'path': str(path),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'reports': outputs,
+    }
+
+
+# ==================== パイプライン ====================
+def load_manifest(out_dir: Path = REPORT_DIR) -> Dict:
+    """生成済みレポートの一覧 (セッション名 -> エントリー)"""
+    path = Path(out_dir) / MANIFEST_NAME
+    if not path.exists():
+        return {'version': REPORT_VERSION, 'sessions': {}}
+    manifest = json.loads(path.read_text(encoding='utf-8'))
+    if manifest.get('version') != REPORT_VERSION:
+        return {'version': REPORT_VERSION, 'sessions': {}}
+    return manifest
+
+
+def _unchanged(entry: Optional[Dict], path: Path, out_dir: Path) -> bool:
+    """前回から変わっていないセッションか (出力ファイルも残っている)"""
+    if entry is None:
+        return False
+    stat = path.stat()
+    if entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime:
+        return False
+    return all((out_dir / report['json']).exists() for report in entry['reports'])
+
+
+def prune_outputs(manifest: Dict, out_dir: Path = REPORT_DIR) -> int:
+    """マニフェストのどのセッションからも参照されていない content key の出力を消す
+
+    Returns:
+        消したファイル数
+    """
+    out_dir = Path(out_dir)
+    referenced = {
+        name
+        for entry in manifest['sessions'].values()
+        for report in entry['reports']
+        for name in (report['json'], report['png'])
+        if name
+    }
+    removed = 0
+    for path in out_dir.iterdir():
+        if OUTPUT_PATTERN.match(path.name) and path.name not in referenced:
+            path.unlink()
+            removed += 1
+    return removed
+
+
+def build_reports(
+    paths: Sequence,
+    out_dir: Path = REPORT_DIR,
+    workers: Optional[int] = None,
+    refresh: bool = False,
+) -> Dict:
+    """複数セッションのレポートを並列に生成 (変更のあったセッションだけ) し、古い出力を消す
+
+    Returns:
+        マニフェスト ({'version', 'sessions': {ファイル名: エントリー}})
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(out_dir)
+    sessions = manifest['sessions']
+
+    pending = [
+        Path(path) for path in paths
+        if refresh or not _unchanged(sessions.get(Path(path).name), Path(path), out_dir)
+    ]
+    if workers is None:
+        workers = min(len(pending), os.cpu_count() or 1)
+
+    # 1 セッションの失敗 (列がない・読めない・数値エラーなど) で他のセッションの結果を捨てないよう、
+    # ジョブごとに捕まえて最後にまとめて返す
+    failed = {}
+    if workers <= 1 or len(pending) <= 1:
+        results = []
+        for path in pending:
+            try:
+                results.append(_build_session(path, out_dir))
+            except Exception as e:
+                failed[path.name] = f"{type(e).__name__}: {e}"
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {path: pool.submit(_build_session, path, out_dir) for path in pending}
+            results = []
+            for path, future in futures.items():
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    failed[path.name] = f"{type(e).__name__}: {e}"
+
+    for entry in results:
+        sessions[Path(entry['path']).name] = entry
+    manifest['updated'] = [Path(entry['path']).name for entry in results]
+    manifest['failed'] = failed
+    manifest['pruned'] = prune_outputs(manifest, out_dir)
+    (out_dir / MANIFEST_NAME).write_text(
+        json.dumps(_json_safe(manifest), ensure_ascii=False, indent=2), encoding='utf-8'
+    )
+    return manifest
+
+
+if __name__ == "__main__":
+    print("✓ Reports モジュール読み込み完了")
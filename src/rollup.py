@@ -0,0 +1,475 @@
+"""
+F1 25 Rollup Pyramid
+長いセッションを拡大・縮小しながら見るための、チャンネルごとの min / max / mean の多段集約 (ピラミッド)
+
+時間軸 (session_time) と距離軸 (total_distance) のそれぞれに、細かいバケツ (0.1 s / 5 m) の段と、
+そこから FANOUT 倍ずつ粗くした段を持つ。データが届くたびに、届いた分のバケツだけを全段に足し込む。
+一番粗い段が MAX_TOP_BUCKETS を超えたら、その上にもう 1 段作る。
+問い合わせでは「範囲 / 欲しい点数」以下の幅を持つ段のうち一番粗いものだけを読む。
+そのため、レース全体の概要でも読むバケツの数はセッションの長さによらない。
+x が戻った分 (フラッシュバック) は同じバケツに重ねて集約する。
+
+rollup = load_rollup('telemetry_data/telemetry_monza_....csv')   # .rollup.npz か cache/rollup/
+part = rollup.query('speed_kph', axis='distance', start=5000, end=12000, points=800)
+part.x, part.min, part.max, part.mean
+"""
+
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .normalization import INGEST_FORMAT, load_columns, normalize
+from .plotting import Series
+
+
+CACHE_DIR = Path("cache") / "rollup"
+
+# 保存形式を変えたら上げる
+ROLLUP_VERSION = 1
+
+# 軸の名前 -> (x に使う列, 一番細かいバケツの幅)
+AXES: Dict[str, Tuple[str, float]] = {
+    'time': ('session_time', 0.1),          # s (60 Hz で 6 サンプル程度)
+    'distance': ('total_distance', 5.0),    # m
+}
+
+# 集約するチャンネル (正規化後の列名)
+CHANNELS = ('speed_kph', 'throttle', 'brake', 'steering', 'gear', 'rpm')
+
+# 1 段上がるごとのバケツ幅の倍率
+FANOUT = 4
+
+# 一番粗い段のバケツ数の上限 (これを超えたら段を足す)
+MAX_TOP_BUCKETS = 256
+
+# query の点数の既定値
+DEFAULT_POINTS = 1000
+
+# ライブで受け取るフレームは、この数ずつまとめて足し込む
+_CHUNK_ROWS = 256
+
+
+def _file_stamp(path) -> List[float]:
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime]
+
+
+def _reduce(keys: np.ndarray, count, total, low, high):
+    """ソート済みのキーが同じ行をまとめる (キー, 件数, 合計, 最小, 最大)"""
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    return (
+        keys[starts],
+        np.add.reduceat(count, starts),
+        np.add.reduceat(total, starts),
+        np.minimum.reduceat(low, starts),
+        np.maximum.reduceat(high, starts),
+    )
+
+
+class _Level:
+    """1 段分のバケツ (絶対バケツ番号 start から size 個、行 = バケツ、列 = チャンネル)
+
+    空のバケツは件数 0・合計 0・最小 +inf・最大 -inf (足し込んでも結果が変わらない値)。
+    """
+
+    def __init__(self, width: float, channels: int, capacity: int = 64):
+        self.width = width
+        self.start = 0
+        self.size = 0
+        self._channels = channels
+        self.count, self.total, self.low, self.high = self._empty(capacity)
+
+    def _empty(self, rows: int):
+        shape = (rows, self._channels)
+        return (
+            np.zeros(shape, dtype=np.int32),
+            np.zeros(shape, dtype=np.float64),
+            np.full(shape, np.inf, dtype=np.float32),
+            np.full(shape, -np.inf, dtype=np.float32),
+        )
+
+    def arrays(self):
+        """使用中の行 (件数, 合計, 最小, 最大)"""
+        return self.count[:self.size], self.total[:self.size], self.low[:self.size], self.high[:self.size]
+
+    def _reserve(self, lo: int, hi: int):
+        """絶対バケツ番号 [lo, hi) が入るように広げる (前に広がる時は既存の行をずらす)"""
+        if self.size == 0:
+            self.start = lo
+        new_start = min(self.start, lo)
+        new_end = max(self.start + self.size, hi)
+        shift = self.start - new_start
+        needed = new_end - new_start
+        capacity = len(self.count)
+        if shift or needed > capacity:
+            if needed > capacity:
+                capacity = max(capacity * 2, needed)
+            grown = self._empty(capacity)
+            for old, new in zip((self.count, self.total, self.low, self.high), grown):
+                new[shift:shift + self.size] = old[:self.size]
+            self.count, self.total, self.low, self.high = grown
+            self.start = new_start
+        self.size = new_end - new_start
+
+    def merge(self, keys, count, total, low, high):
+        """集約済みのバケツ (キーはソート済み・重複なし) を足し込む"""
+        if not len(keys):
+            return
+        self._reserve(int(keys[0]), int(keys[-1]) + 1)
+        rows = keys - self.start
+        self.count[rows] += count
+        self.total[rows] += total
+        self.low[rows] = np.minimum(self.low[rows], low)
+        self.high[rows] = np.maximum(self.high[rows], high)
+
+
+@dataclass
+class RollupSlice:
+    """1 チャンネルの範囲を 1 段から読んだ結果 (空のバケツは NaN)"""
+    channel: str
+    width: float
+    x: np.ndarray          # バケツの中心
+    min: np.ndarray
+    max: np.ndarray
+    mean: np.ndarray
+    count: np.ndarray
+
+    def __len__(self):
+        return len(self.x)
+
+    def merged(self, points: int) -> 'RollupSlice':
+        """隣り合うバケツを同じ数ずつまとめて points 個以下にする (min / max は正確なまま)"""
+        factor = -(-len(self.x) // points) if points > 0 else 1
+        if factor <= 1:
+            return self
+        starts = np.arange(0, len(self.x), factor)
+        count = np.add.reduceat(self.count, starts)
+        total = np.add.reduceat(np.where(self.count > 0, self.mean * self.count, 0.0), starts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(count > 0, total / count, np.nan)
+        return RollupSlice(
+            self.channel, self.width * factor,
+            np.add.reduceat(self.x, starts) / np.diff(np.append(starts, len(self.x))),
+            np.fmin.reduceat(self.min, starts), np.fmax.reduceat(self.max, starts), mean, count,
+        )
+
+    def envelope(self, points: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """バケツごとに (x, min), (x, max) の 2 点を並べた折れ線 (間引いても山・谷が消えない)
+
+        空のバケツ (サンプル間隔よりバケツが細かい所) は線が途切れないように飛ばす。
+        """
+        part = self.merged(points // 2) if points else self
+        filled = part.count > 0
+        return np.repeat(part.x[filled], 2), np.column_stack((part.min[filled], part.max[filled])).ravel()
+
+    def series(self, scale: float = 1.0, points: Optional[int] = None, **style) -> Series:
+        """plotting の Series (min / max の包絡線)"""
+        x, y = self.envelope(points)
+        return Series(x, y * scale, **style)
+
+
+class RollupPyramid:
+    """1 つの軸 (時間または距離) の多段集約
+
+    pyramid = RollupPyramid(['speed_kph', 'rpm'], base_width=0.1)
+    pyramid.extend(x, values)       # values は (行, チャンネル)、届いた分だけ何度でも
+    pyramid.query('speed_kph', start, end, points=500)
+    """
+
+    def __init__(self, channels: Sequence[str], base_width: float, fanout: int = FANOUT,
+                 max_top_buckets: int = MAX_TOP_BUCKETS):
+        self.channels = list(channels)
+        self._index = {name: i for i, name in enumerate(self.channels)}
+        self.fanout = fanout
+        self.max_top_buckets = max_top_buckets
+        self.levels: List[_Level] = [_Level(base_width, len(self.channels))]
+        self.samples = 0
+
+    @property
+    def base_width(self) -> float:
+        return self.levels[0].width
+
+    def extend(self, x, values):
+        """サンプルを足し込む (x が戻っても良い: 同じバケツに重ねて集約する)"""
+        x = np.asarray(x, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64).reshape(len(x), len(self.channels))
+        valid = np.isfinite(x)
+        if not valid.all():
+            x, values = x[valid], values[valid]
+        if not len(x):
+            return
+        keys = np.floor(x / self.base_width).astype(np.int64)
+        if np.any(keys[1:] < keys[:-1]):
+            order = np.argsort(keys, kind='stable')
+            keys, values = keys[order], values[order]
+        finite = ~np.isnan(values)
+        aggregated = _reduce(
+            keys, finite.astype(np.int32), np.where(finite, values, 0.0),
+            np.where(finite, values, np.inf).astype(np.float32),
+            np.where(finite, values, -np.inf).astype(np.float32),
+        )
+        # 上の段のキーは下の段のキーを FANOUT で割ったもの (ソート順はそのまま)
+        for k, level in enumerate(self.levels):
+            if k:
+                aggregated = _reduce(aggregated[0] // self.fanout, *aggregated[1:])
+            level.merge(*aggregated)
+        self.samples += len(x)
+        self._add_levels()
+
+    def _add_levels(self):
+        while self.levels[-1].size > self.max_top_buckets:
+            top = self.levels[-1]
+            keys = top.start + np.arange(top.size, dtype=np.int64)
+            level = _Level(top.width * self.fanout, len(self.channels))
+            level.merge(*_reduce(keys // self.fanout, *top.arrays()))
+            self.levels.append(level)
+
+    @property
+    def extent(self) -> Tuple[float, float]:
+        """データのある範囲 (一番細かい段のバケツ境界)"""
+        base = self.levels[0]
+        return base.start * base.width, (base.start + base.size) * base.width
+
+    def level_for(self, resolution: float) -> _Level:
+        """バケツ幅が resolution 以下の段のうち一番粗いもの (なければ一番細かい段)"""
+        for level in reversed(self.levels):
+            if level.width <= resolution:
+                return level
+        return self.levels[0]
+
+    def query(self, channel: str, start: Optional[float] = None, end: Optional[float] = None,
+              points: int = DEFAULT_POINTS) -> RollupSlice:
+        """[start, end) を points 点以上の細かさで (読むバケツは points x FANOUT 個まで)"""
+        if channel not in self._index:
+            raise KeyError(f"集約していないチャンネルです: {channel}")
+        lo, hi = self.extent
+        start = lo if start is None else max(start, lo)
+        end = hi if end is None else min(end, hi)
+        level = self.level_for((end - start) / points if points > 0 else 0.0)
+        first = max(int(np.floor(start / level.width)) - level.start, 0)
+        last = min(int(np.ceil(end / level.width)) - level.start, level.size)
+        last = max(last, first)
+        column = self._index[channel]
+        count = level.count[first:last, column].astype(np.int64)
+        empty = count == 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(empty, np.nan, level.total[first:last, column] / count)
+        low = level.low[first:last, column].astype(np.float64)
+        high = level.high[first:last, column].astype(np.float64)
+        low[empty] = np.nan
+        high[empty] = np.nan
+        x = (level.start + np.arange(first, last) + 0.5) * level.width
+        return RollupSlice(channel, level.width, x, low, high, mean, count)
+
+    def stats(self, channel: str, start: Optional[float] = None, end: Optional[float] = None) -> Dict[str, float]:
+        """範囲全体の min / max / mean / 件数 (範囲の端はバケツ単位で丸める)"""
+        part = self.query(channel, start, end, points=1)
+        count = int(part.count.sum())
+        if count == 0:
+            return {'min': np.nan, 'max': np.nan, 'mean': np.nan, 'count': 0}
+        return {
+            'min': float(np.nanmin(part.min)),
+            'max': float(np.nanmax(part.max)),
+            'mean': float(np.nansum(part.mean * part.count) / count),
+            'count': count,
+        }
+
+    def __repr__(self):
+        widths = ', '.join(f"{level.width:g}x{level.size}" for level in self.levels)
+        return f"RollupPyramid(samples={self.samples}, levels=[{widths}])"
+
+
+class SessionRollup:
+    """1 セッション分の時間軸・距離軸のピラミッド
+
+    rollup = SessionRollup()
+    rollup.extend(columns)          # 正規化済みの列 (session_time / total_distance + チャンネル)
+    rollup.add_frame(frame)         # collector の確定フレーム (まとめて足し込む)
+    rollup.query('speed_kph', axis='time', start=600, end=900)
+    """
+
+    def __init__(self, channels: Sequence[str] = CHANNELS, axes: Mapping[str, Tuple[str, float]] = AXES):
+        self.channels = tuple(channels)
+        self.axis_columns = {name: column for name, (column, _) in axes.items()}
+        self.axes = {name: RollupPyramid(self.channels, width) for name, (_, width) in axes.items()}
+        self._pending: List[tuple] = []
+
+    def extend(self, columns: Mapping[str, np.ndarray]):
+        """正規化済みの列を足し込む (x の列がない軸は飛ばす)"""
+        rows = len(next(iter(columns.values()), ()))
+        if rows == 0:
+            return
+        values = np.column_stack([
+            np.asarray(columns[name], dtype=np.float64) if name in columns else np.full(rows, np.nan)
+            for name in self.channels
+        ])
+        for name, pyramid in self.axes.items():
+            column = self.axis_columns[name]
+            if column in columns:
+                pyramid.extend(columns[column], values)
+
+    def add_frame(self, frame: dict):
+        """Lap Data と Telemetry が揃ったフレーム (CSV に出る行) を 1 行ためる"""
+        lap, telemetry = frame.get('lap_data'), frame.get('telemetry')
+        if lap is None or telemetry is None:
+            return
+        self._pending.append((
+            frame['timestamp'], lap.total_distance, telemetry.speed, telemetry.throttle,
+            telemetry.brake, telemetry.steer, telemetry.gear, telemetry.engine_rpm,
+        ))
+        if len(self._pending) >= _CHUNK_ROWS:
+            self.flush()
+
+    def flush(self):
+        """ためたフレームを取り込み時と同じ範囲チェックにかけてから足し込む"""
+        if not self._pending:
+            return
+        time, distance, speed, throttle, brake, steer, gear, rpm = (
+            np.array(values, dtype=np.float64) for values in zip(*self._pending)
+        )
+        self._pending = []
+        columns, _ = normalize({
+            'speed_kph': speed, 'throttle': throttle, 'brake': brake,
+            'steering': steer, 'gear': gear, 'rpm': rpm,
+        }, INGEST_FORMAT, copy=False)
+        columns['session_time'] = time
+        columns['total_distance'] = distance
+        self.extend(columns)
+
+    def pyramid(self, axis: str) -> RollupPyramid:
+        if axis not in self.axes:
+            raise KeyError(f"軸がありません: {axis} ({', '.join(self.axes)})")
+        self.flush()
+        return self.axes[axis]
+
+    def query(self, channel: str, axis: str = 'time', start: Optional[float] = None,
+              end: Optional[float] = None, points: int = DEFAULT_POINTS) -> RollupSlice:
+        return self.pyramid(axis).query(channel, start, end, points)
+
+    def stats(self, channel: str, axis: str = 'time', start: Optional[float] = None,
+              end: Optional[float] = None) -> Dict[str, float]:
+        return self.pyramid(axis).stats(channel, start, end)
+
+    def extent(self, axis: str = 'time') -> Tuple[float, float]:
+        return self.pyramid(axis).extent
+
+    # ==================== 保存 / 読み込み ====================
+    def save(self, path, stamp: Optional[List[float]] = None) -> Path:
+        """npz に保存 (各段の使用中の行だけ)"""
+        self.flush()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {
+            'version': ROLLUP_VERSION,
+            'channels': list(self.channels),
+            'stamp': stamp,
+            'axes': {},
+        }
+        arrays = {}
+        for name, pyramid in self.axes.items():
+            meta['axes'][name] = {
+                'column': self.axis_columns[name],
+                'fanout': pyramid.fanout,
+                'max_top_buckets': pyramid.max_top_buckets,
+                'samples': pyramid.samples,
+                'levels': [[level.width, level.start] for level in pyramid.levels],
+            }
+            for k, level in enumerate(pyramid.levels):
+                for field, values in zip(('count', 'total', 'low', 'high'), level.arrays()):
+                    arrays[f"{name}_{k}_{field}"] = values
+        np.savez_compressed(path, meta=np.array(json.dumps(meta)), **arrays)
+        return path
+
+    @classmethod
+    def load(cls, path, stamp: Optional[List[float]] = None) -> Optional['SessionRollup']:
+        """npz から読み込み (なければ / 古い形式なら / stamp が違えば None)"""
+        path = Path(path)
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            if meta.get('version') != ROLLUP_VERSION:
+                return None
+            if stamp is not None and meta.get('stamp') != stamp:
+                return None
+            axes = {name: (axis['column'], axis['levels'][0][0]) for name, axis in meta['axes'].items()}
+            rollup = cls(meta['channels'], axes)
+            for name, axis in meta['axes'].items():
+                pyramid = rollup.axes[name]
+                pyramid.fanout = axis['fanout']
+                pyramid.max_top_buckets = axis['max_top_buckets']
+                pyramid.samples = axis['samples']
+                pyramid.levels = []
+                for k, (width, start) in enumerate(axis['levels']):
+                    level = _Level(width, len(rollup.channels), capacity=1)
+                    level.count, level.total, level.low, level.high = (
+                        data[f"{name}_{k}_{field}"] for field in ('count', 'total', 'low', 'high')
+                    )
+                    level.start, level.size = start, len(level.count)
+                    pyramid.levels.append(level)
+        return rollup
+
+    def __repr__(self):
+        axes = ', '.join(f"{name}={pyramid}" for name, pyramid in self.axes.items())
+        return f"SessionRollup(channels={len(self.channels)}, {axes})"
+
+
+def _race_distance(columns: Mapping[str, np.ndarray]) -> Optional[np.ndarray]:
+    """total_distance がない形式用: 周回ごとの lap_distance に前の周までの距離を足してつなぐ"""
+    if 'lap_number' not in columns or 'lap_distance' not in columns:
+        return None
+    lap_number = np.asarray(columns['lap_number'], dtype=np.float64)
+    lap_distance = np.asarray(columns['lap_distance'], dtype=np.float64)
+    if not len(lap_number):
+        return None
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(lap_number) != 0) + 1))
+    ends = np.append(starts[1:], len(lap_number))
+    lengths = np.array([
+        np.nanmax(lap_distance[a:b]) if np.isfinite(lap_distance[a:b]).any() else 0.0 for a, b in zip(starts, ends)
+    ])
+    offsets = np.concatenate(([0.0], np.cumsum(np.maximum(lengths, 0.0))[:-1]))
+    return lap_distance + np.repeat(offsets, ends - starts)
+
+
+def build_rollup(columns: Mapping[str, np.ndarray], channels: Sequence[str] = CHANNELS) -> SessionRollup:
+    """正規化済みの列 (load_columns) から作る"""
+    columns = dict(columns)
+    if 'total_distance' not in columns:
+        distance = _race_distance(columns)
+        if distance is not None:
+            columns['total_distance'] = distance
+    rollup = SessionRollup([name for name in channels if name in columns])
+    rollup.extend(columns)
+    return rollup
+
+
+def load_rollup(path, cache_dir: Path = CACHE_DIR, refresh: bool = False) -> SessionRollup:
+    """保存済み CSV のピラミッド
+
+    collector が記録中に作った .rollup.npz (CSV の隣、CSV と stamp が一致するもの) があればそれを、なければ cache/rollup/ の
+    キャッシュ (ファイルのサイズと更新時刻が同じもの) を使い、どちらもなければ CSV から作って保存する。
+    """
+    path = Path(path)
+    stamp = _file_stamp(path)
+    if not refresh:
+        # .rollup.npz は保存時の CSV のサイズ・更新時刻を持つ (CSV が変わっていたら使わない)
+        rollup = SessionRollup.load(path.with_suffix('.rollup.npz'), stamp=stamp)
+        if rollup is not None:
+            return rollup
+    cache_path = Path(cache_dir) / f"{path.name}.npz"
+    if not refresh:
+        rollup = SessionRollup.load(cache_path, stamp=stamp)
+        if rollup is not None:
+            return rollup
+    rollup = build_rollup(load_columns(path))
+    rollup.save(cache_path, stamp=stamp)
+    return rollup
+
+
+if __name__ == "__main__":
+    print("✓ Rollup Pyramid モジュール読み込み完了")
+    print(f"- 軸: {', '.join(f'{name} ({column}, {width:g})' for name, (column, width) in AXES.items())}")
@@ -0,0 +1,234 @@
+"""
+F1 25 Session Table
+確定したフレームを、チャンネルごとの型付き NumPy 列 (容量を倍々に広げる) に追記するセッションテーブル
+
+1 フレーム = 1 行。スロット (lap_data / telemetry / motion / status / damage) ごとに
+dataclass の各フィールドを 1 列にし、4 輪分の値 (温度・空気圧・摩耗など) は (行, 4) の列にする。
+届かなかったスロットは float 列が NaN、整数列が 0 で、present(slot) で区別する。
+
+dataclass + tuple をフレームごとに持つのに比べて 1 行あたり 200 バイト程度で、
+CSV 出力や分析は列をそのまま (ビューで) 使える。
+"""
+
+from operator import attrgetter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+# スロット -> [(列名 = dataclass のフィールド名, dtype, 4 輪なら 4)]
+# dtype はパケットの値をそのまま持てる幅 (telemetry_packets の FORMAT_STRING と同じ)
+SLOT_COLUMNS: Dict[str, List[Tuple[str, str, int]]] = {
+    'lap_data': [
+        ('last_lap_time_in_ms', '<u4', 1), ('current_lap_time_in_ms', '<u4', 1),
+        ('sector_1_time_in_ms', '<u2', 1), ('sector_1_time_minutes', 'u1', 1),
+        ('sector_2_time_in_ms', '<u2', 1), ('sector_2_time_minutes', 'u1', 1),
+        ('delta_to_car_in_front', '<f4', 1), ('delta_to_race_leader', '<f4', 1),
+        ('lap_distance', '<f4', 1), ('total_distance', '<f4', 1), ('safety_car_delta', '<f4', 1),
+        ('car_position', 'u1', 1), ('current_lap_num', 'u1', 1), ('pit_status', 'u1', 1),
+        ('num_pit_stops', 'u1', 1), ('finished', '?', 1), ('sector', 'u1', 1), ('current_lap_invalid', '?', 1),
+    ],
+    'telemetry': [
+        ('speed', '<u2', 1), ('throttle', '<f4', 1), ('steer', '<f4', 1), ('brake', '<f4', 1),
+        ('clutch', 'u1', 1), ('gear', 'i1', 1), ('engine_rpm', '<u2', 1), ('drs_open', '?', 1),
+        ('rev_lights_percent', 'u1', 1),
+        ('brakes_temp', '<u2', 4), ('tyres_surface_temp', 'u1', 4), ('tyres_inner_temp', 'u1', 4),
+        ('tyres_pressure', '<f4', 4),
+    ],
+    'motion': [
+        ('world_position_x', '<f4', 1), ('world_position_y', '<f4', 1), ('world_position_z', '<f4', 1),
+        ('world_velocity_x', '<f4', 1), ('world_velocity_y', '<f4', 1), ('world_velocity_z', '<f4', 1),
+        ('g_force_lateral', '<f4', 1), ('g_force_longitudinal', '<f4', 1), ('g_force_vertical', '<f4', 1),
+        ('yaw', '<f4', 1), ('pitch', '<f4', 1), ('roll', '<f4', 1),
+    ],
+    'status': [
+        ('fuel_mix', 'u1', 1), ('fuel_in_tank', '<f4', 1), ('fuel_capacity', '<f4', 1),
+        ('fuel_remaining_laps', '<f4', 1), ('actual_tyre_compound', 'u1', 1),
+        ('visual_tyre_compound', 'u1', 1), ('tyres_age_laps', 'u1', 1), ('ers_store_energy', '<f4', 1),
+        ('ers_deploy_mode', 'u1', 1), ('ers_harvested_this_lap_mguk', '<f4', 1),
+        ('ers_harvested_this_lap_mguh', '<f4', 1), ('ers_deployed_this_lap', '<f4', 1),
+    ],
+    'damage': [
+        ('tyres_wear', '<f4', 4), ('tyres_damage', 'u1', 4), ('brakes_damage', 'u1', 4),
+        ('front_left_wing_damage', 'u1', 1), ('front_right_wing_damage', 'u1', 1),
+        ('rear_wing_damage', 'u1', 1), ('floor_damage', 'u1', 1), ('gearbox_damage', 'u1', 1),
+        ('engine_damage', 'u1', 1),
+    ],
+}
+SLOTS = tuple(SLOT_COLUMNS)
+
+# 4 輪の列の並び (パケットと同じ)
+WHEELS = ('rl', 'rr', 'fl', 'fr')
+
+# 追記はタプルでためて、この行数ごとにまとめて列に書き込む
+_CHUNK_ROWS = 1024
+
+
+def _fill_value(dtype: np.dtype):
+    """届かなかったスロットの値 (float は NaN、それ以外は 0)"""
+    return np.nan if dtype.kind == 'f' else 0
+
+
+class SessionTable:
+    """確定フレームを列ごとに追記するテーブル
+
+    table = SessionTable()
+    table.append(frame)                 # FrameReorderBuffer の確定フレーム
+    speed = table.column('speed')       # 行順 (確定順) の配列 (できるだけビュー)
+    df = table.to_pandas()
+    """
+
+    def __init__(self, initial_rows: int = 4096):
+        self._capacity = max(int(initial_rows), 1)
+        self._size = 0
+        self._columns: Dict[str, np.ndarray] = {}
+        # スロット -> dataclass からフィールドをタプルで取り出す関数 / 列名
+        self._getters = []
+        self._fields: Dict[str, List[str]] = {}
+        self._add_column('frame_id', np.dtype('<u4'), 1)
+        self._add_column('timestamp', np.dtype('<f8'), 1)
+        for slot, columns in SLOT_COLUMNS.items():
+            self._add_column(f'has_{slot}', np.dtype('?'), 1)
+            for name, dtype, width in columns:
+                self._add_column(name, np.dtype(dtype), width)
+            self._fields[slot] = [name for name, _, _ in columns]
+            self._getters.append((slot, attrgetter(*self._fields[slot])))
+        # 列に書き込む前の行: [(frame_id, timestamp)] と スロット -> [(行, フィールドのタプル)]
+        self._pending: List[tuple] = []
+        self._pending_slots: Dict[str, list] = {slot: [] for slot in SLOT_COLUMNS}
+        # フラッシュバックで frame_id が戻ったか (戻っていなければ全行がそのまま有効)
+        self._last_frame_id = -1
+        self._rewound = False
+        self._rows_cache: Optional[Tuple[int, np.ndarray]] = None
+
+    def _add_column(self, name: str, dtype: np.dtype, width: int):
+        shape = (self._capacity,) if width == 1 else (self._capacity, width)
+        self._columns[name] = np.full(shape, _fill_value(dtype), dtype=dtype)
+
+    def _grow(self):
+        """容量を倍にする (追記済みの分をコピー、残りは欠損値で埋める)"""
+        capacity = self._capacity * 2
+        for name, values in self._columns.items():
+            grown = np.full((capacity,) + values.shape[1:], _fill_value(values.dtype), dtype=values.dtype)
+            grown[:self._size] = values[:self._size]
+            self._columns[name] = grown
+        self._capacity = capacity
+
+    def append(self, frame: dict):
+        """確定フレーム (frame_id, timestamp, スロット -> dataclass / None) を 1 行追記"""
+        frame_id = frame['frame_id']
+        row = self._size + len(self._pending)
+        self._pending.append((frame_id, frame['timestamp']))
+        pending_slots = self._pending_slots
+        for slot, getter in self._getters:
+            value = frame.get(slot)
+            if value is not None:
+                pending_slots[slot].append((row, getter(value)))
+        if frame_id <= self._last_frame_id:
+            self._rewound = True
+        self._last_frame_id = frame_id
+        if len(self._pending) >= _CHUNK_ROWS:
+            self._write_pending()
+
+    def _write_pending(self):
+        """ためた行を列にまとめて書き込む (フィールドごとに転置して代入)"""
+        pending = self._pending
+        if not pending:
+            return
+        while self._size + len(pending) > self._capacity:
+            self._grow()
+        start, end = self._size, self._size + len(pending)
+        columns = self._columns
+        columns['frame_id'][start:end], columns['timestamp'][start:end] = zip(*pending)
+        for slot, samples in self._pending_slots.items():
+            if not samples:
+                continue
+            rows, values = zip(*samples)
+            rows = np.array(rows)
+            columns[f'has_{slot}'][rows] = True
+            for name, field in zip(self._fields[slot], zip(*values)):
+                columns[name][rows] = field
+            samples.clear()
+        self._size = end
+        self._pending = []
+
+    # --- 読み出し ---------------------------------------------------------
+
+    def rows(self):
+        """有効な行 (同じ frame_id が再来した場合は最後のものだけ) を確定順で
+
+        frame_id が一度も戻っていなければ slice (列はビューのまま)、戻っていれば行番号の配列。
+        """
+        self._write_pending()
+        if not self._rewound:
+            return slice(0, self._size)
+        cached = self._rows_cache
+        if cached is None or cached[0] != self._size:
+            frame_ids = self._columns['frame_id'][:self._size]
+            _, last = np.unique(frame_ids[::-1], return_index=True)
+            cached = (self._size, np.sort(self._size - 1 - last))
+            self._rows_cache = cached
+        return cached[1]
+
+    @property
+    def rewound(self) -> bool:
+        """frame_id が一度でも戻ったか (フラッシュバックで置き換えられた行があるか)"""
+        return self._rewound
+
+    def __len__(self):
+        rows = self.rows()
+        return self._size if isinstance(rows, slice) else len(rows)
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._columns)
+
+    def column(self, name: str) -> np.ndarray:
+        """有効な行の列 (4 輪の列は (行, 4))。フラッシュバックがなければコピーなしのビュー"""
+        if name not in self._columns:
+            raise KeyError(f"列がありません: {name}")
+        rows = self.rows()      # ためた行を書き込んでから (容量が広がると列が入れ替わる)
+        return self._columns[name][rows]
+
+    def present(self, slot: str) -> np.ndarray:
+        """そのスロットが届いていた行 (bool)"""
+        return self.column(f'has_{slot}')
+
+    def columns(self, names=None) -> Dict[str, np.ndarray]:
+        """列名 -> 配列 (4 輪の列は name_rl などに分けたビュー)"""
+        out = {}
+        for name in names or self._columns:
+            values = self.column(name)
+            if values.ndim == 2:
+                for i, wheel in enumerate(WHEELS):
+                    out[f'{name}_{wheel}'] = values[:, i]
+            else:
+                out[name] = values
+        return out
+
+    def to_pandas(self, names=None):
+        """pandas.DataFrame (frame_id を index にする)"""
+        import pandas as pd
+
+        columns = self.columns(names)
+        index = columns.pop('frame_id', None)
+        return pd.DataFrame(columns, index=index, copy=False)
+
+    @property
+    def nbytes(self) -> int:
+        """確保済みの列のバイト数"""
+        self._write_pending()
+        return sum(values.nbytes for values in self._columns.values())
+
+    @property
+    def row_bytes(self) -> int:
+        """1 行あたりのバイト数"""
+        return sum(values.itemsize * (values.shape[1] if values.ndim == 2 else 1) for values in self._columns.values())
+
+    def __repr__(self):
+        return f"SessionTable(rows={len(self)}, {self.row_bytes} bytes/row, {self.nbytes / 1e6:.1f} MB allocated)"
+
+
+if __name__ == "__main__":
+    print("✓ Session Table モジュール読み込み完了")
+    print(f"- 1 行: {SessionTable(1).row_bytes} bytes")
@@ -0,0 +1,240 @@
+"""
+F1 25 Stint Analysis
+保存済みの Car Status / Car Damage 列 (燃料・ERS・タイヤ摩耗) をラップ単位にまとめ、
+スティント (タイヤ交換の間) ごとの消費ペースと残り周回を見積もる
+
+生パケットは読み直さず、collector の CSV 列 (正規化後の fuel_in_tank, tyre_wear_* など) だけを使う。
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+WEAR_COLUMNS = ('tyre_wear_rl', 'tyre_wear_rr', 'tyre_wear_fl', 'tyre_wear_fr')
+TYRE_NAMES = ('RL', 'RR', 'FL', 'FR')
+
+# visual_tyre_compound の表示名
+COMPOUND_NAMES = {16: 'Soft', 17: 'Medium', 18: 'Hard', 7: 'Inter', 8: 'Wet'}
+
+# この摩耗 (%) に達するまでの周回を「残り周回」とする
+DEFAULT_WEAR_LIMIT = 70.0
+
+
+def _runs(lap_number: np.ndarray):
+    """lap_number が同じ値で続く区間の (開始, 終了) 配列"""
+    change = np.flatnonzero(np.diff(lap_number) != 0) + 1
+    starts = np.concatenate(([0], change))
+    ends = np.concatenate((change, [len(lap_number)]))
+    return starts, ends
+
+
+def _last_valid(values: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """各区間で最後の欠損でない値 (なければ NaN)"""
+    index = np.where(~np.isnan(values), np.arange(len(values)), -1)
+    index = np.maximum.accumulate(index)[ends - 1]
+    return np.where(index >= starts, values[np.maximum(index, 0)], np.nan)
+
+
+def _first_valid(values: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """各区間で最初の欠損でない値 (なければ NaN)"""
+    n = len(values)
+    index = np.where(~np.isnan(values), np.arange(n), n)
+    index = np.minimum.accumulate(index[::-1])[::-1][starts]
+    return np.where(index < ends, values[np.minimum(index, n - 1)], np.nan)
+
+
+def _run_max(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """各区間の最大値 (NaN は無視、全部 NaN なら NaN)"""
+    return np.fmax.reduceat(values, starts)
+
+
+@dataclass
+class LapResources:
+    """ラップ単位の燃料・ERS・タイヤの推移 (各配列はラップ順)"""
+    lap: np.ndarray
+    fuel_end: np.ndarray              # ラップ終了時の燃料 (kg)
+    fuel_used: np.ndarray             # そのラップの燃料消費 (kg)
+    fuel_remaining_laps: np.ndarray   # ラップ終了時の MFD 表示の残り周回
+    ers_deployed_mj: np.ndarray       # そのラップの ERS 放出 (MJ)
+    ers_harvested_mj: np.ndarray      # そのラップの回生 (MJ)
+    ers_store_end_mj: np.ndarray      # ラップ終了時の蓄電量 (MJ)
+    ers_mode: np.ndarray              # ラップ終了時の ERS モード
+    compound: np.ndarray              # visual_tyre_compound
+    tyre_age: np.ndarray              # ラップ終了時のタイヤ使用周回
+    wear: np.ndarray                  # [lap, 4] ラップ終了時の摩耗 (%, RL, RR, FL, FR)
+    stint: np.ndarray                 # スティント番号 (1 始まり)
+
+    def __len__(self):
+        return len(self.lap)
+
+
+def _fill_missing(values: np.ndarray) -> np.ndarray:
+    """NaN を直前の値で埋め、先頭の NaN は最初の値で埋める (全部 NaN ならそのまま)"""
+    valid = ~np.isnan(values)
+    if not valid.any():
+        return values
+    index = np.where(valid, np.arange(len(values)), 0)
+    np.maximum.accumulate(index, out=index)
+    index[:np.argmax(valid)] = np.argmax(valid)
+    return values[index]
+
+
+def lap_resources(table) -> Optional[LapResources]:
+    """正規化済みテーブル (DataFrame / dict) からラップ単位の推移を作る
+
+    Car Status / Car Damage の列がない古い形式では None。
+    """
+    if 'lap_number' not in table or not any(name in table for name in ('fuel_in_tank', *WEAR_COLUMNS)):
+        return None
+    lap_number = np.asarray(table['lap_number'], dtype=np.float64)
+    if len(lap_number) == 0:
+        return None
+    starts, ends = _runs(lap_number)
+    keep = ~np.isnan(lap_number[starts])
+    n_rows = len(lap_number)
+
+    def column(name):
+        if name in table:
+            return np.asarray(table[name], dtype=np.float64)
+        return np.full(n_rows, np.nan)
+
+    fuel = column('fuel_in_tank')
+    fuel_start = _first_valid(fuel, starts, ends)
+    fuel_end = _last_valid(fuel, starts, ends)
+    # 前のラップが続きならラップ間の消費も含める (前のラップ終了時 - このラップ終了時)
+    previous_end = np.concatenate(([np.nan], fuel_end[:-1]))
+    consecutive = np.concatenate(([False], np.diff(lap_number[starts]) == 1))
+    fuel_used = np.where(consecutive & ~np.isnan(previous_end), previous_end, fuel_start) - fuel_end
+
+    wear = np.stack([_last_valid(column(name), starts, ends) for name in WEAR_COLUMNS], axis=1)
+    # コンパウンドが届いていない周 (記録開始直後など) は前後の周の値で埋める (欠損で区切らない)
+    compound = _fill_missing(_last_valid(column('tyre_compound'), starts, ends))
+    tyre_age = _last_valid(column('tyre_age_laps'), starts, ends)
+
+    # タイヤ使用周回が減った / コンパウンドが変わったら新しいスティント
+    new_stint = np.zeros(len(starts), dtype=bool)
+    new_stint[1:] = (tyre_age[1:] < tyre_age[:-1]) | (compound[1:] != compound[:-1]) & ~np.isnan(compound[:-1])
+    stint = np.cumsum(new_stint) + 1
+
+    # ERS の今周の値はラインでリセットされるので、ラップ内の最大値がそのラップの合計
+    per_lap = {
+        'lap': lap_number[starts],
+        'fuel_end': fuel_end,
+        'fuel_used': fuel_used,
+        'fuel_remaining_laps': _last_valid(column('fuel_remaining_laps'), starts, ends),
+        'ers_deployed_mj': _run_max(column('ers_deployed_lap_mj'), starts),
+        'ers_harvested_mj': _run_max(column('ers_harvested_lap_mj'), starts),
+        'ers_store_end_mj': _last_valid(column('ers_store_mj'), starts, ends),
+        'ers_mode': _last_valid(column('ers_deploy_mode'), starts, ends),
+        'compound': compound,
+        'tyre_age': tyre_age,
+        'wear': wear,
+        'stint': stint,
+    }
+    # lap_number が欠損している区間は除く
+    per_lap = {name: values[keep] for name, values in per_lap.items()}
+    per_lap['lap'] = per_lap['lap'].astype(np.int64)
+    return LapResources(**per_lap)
+
+
+@dataclass
+class Stint:
+    """1 スティント分の消費ペース"""
+    number: int
+    compound: str
+    first_lap: int
+    last_lap: int
+    laps: int
+    wear_now: np.ndarray              # (4,) 最終ラップの摩耗 (%)
+    wear_per_lap: np.ndarray          # (4,) 摩耗の増え方 (%/周、最小二乗の傾き)
+    fuel_per_lap: float               # 燃料消費の中央値 (kg/周)
+    fuel_left: float                  # 最終ラップ終了時の燃料 (kg)
+    ers_deployed_per_lap: float       # ERS 放出の中央値 (MJ/周)
+    ers_harvested_per_lap: float      # 回生の中央値 (MJ/周)
+    laps_to_wear_limit: float         # 一番減っているタイヤが限界に達するまでの周回
+
+    @property
+    def fuel_laps(self) -> float:
+        """残り燃料で走れる周回 (実測の消費ペースから)"""
+        return self.fuel_left / self.fuel_per_lap if self.fuel_per_lap > 0 else float('nan')
+
+    def to_dict(self) -> Dict:
+        return {
+            'stint': self.number,
+            'compound': self.compound,
+            'laps': [self.first_lap, self.last_lap],
+            'wear_now': dict(zip(TYRE_NAMES, np.round(self.wear_now, 2).tolist())),
+            'wear_per_lap': dict(zip(TYRE_NAMES, np.round(self.wear_per_lap, 3).tolist())),
+            'fuel_per_lap': self.fuel_per_lap,
+            'fuel_laps': self.fuel_laps,
+            'ers_deployed_per_lap': self.ers_deployed_per_lap,
+            'ers_harvested_per_lap': self.ers_harvested_per_lap,
+            'laps_to_wear_limit': self.laps_to_wear_limit,
+        }
+
+    def __repr__(self):
+        return (
+            f"Stint(#{self.number} {self.compound}, laps {self.first_lap}-{self.last_lap}, "
+            f"wear {np.nanmax(self.wear_per_lap):.2f}%/lap, fuel {self.fuel_per_lap:.2f}kg/lap)"
+        )
+
+
+def _wear_slopes(age: np.ndarray, wear: np.ndarray) -> np.ndarray:
+    """4 輪の 摩耗 = a * 周回 + b の傾き a をまとめて最小二乗で求める (欠損のある周は除く)"""
+    valid = ~np.isnan(age) & ~np.isnan(wear).any(axis=1)
+    if valid.sum() < 2:
+        return np.full(wear.shape[1], np.nan)
+    x = age[valid] - age[valid].mean()
+    y = wear[valid] - wear[valid].mean(axis=0)
+    denominator = (x * x).sum()
+    if denominator == 0:
+        return np.full(wear.shape[1], np.nan)
+    return x @ y / denominator
+
+
+def _nanmedian(values: np.ndarray) -> float:
+    values = values[~np.isnan(values)]
+    return float(np.median(values)) if len(values) else float('nan')
+
+
+def stint_analysis(table, wear_limit: float = DEFAULT_WEAR_LIMIT) -> List[Stint]:
+    """テーブルをスティントに分けて、摩耗・燃料・ERS のペースを求める"""
+    resources = table if isinstance(table, LapResources) else lap_resources(table)
+    if resources is None or len(resources) == 0:
+        return []
+
+    stints = []
+    for number in np.unique(resources.stint):
+        rows = np.flatnonzero(resources.stint == number)
+        # タイヤの使用周回がなければラップ番号で代用
+        age = resources.tyre_age[rows]
+        if np.isnan(age).all():
+            age = resources.lap[rows].astype(np.float64)
+        slopes = _wear_slopes(age, resources.wear[rows])
+        wear_now = resources.wear[rows[-1]]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            remaining = np.where(slopes > 0, (wear_limit - wear_now) / slopes, np.inf)
+        compound = resources.compound[rows[-1]]
+        # 消費量が 0 以下の周 (データ欠け・フラッシュバックでの巻き戻り) は除く
+        fuel_used = resources.fuel_used[rows]
+        stints.append(Stint(
+            number=int(number),
+            compound=COMPOUND_NAMES.get(int(compound), str(int(compound))) if compound == compound else '-',
+            first_lap=int(resources.lap[rows[0]]),
+            last_lap=int(resources.lap[rows[-1]]),
+            laps=len(rows),
+            wear_now=wear_now,
+            wear_per_lap=slopes,
+            fuel_per_lap=_nanmedian(np.where(fuel_used > 0, fuel_used, np.nan)),
+            fuel_left=float(resources.fuel_end[rows[-1]]),
+            ers_deployed_per_lap=_nanmedian(resources.ers_deployed_mj[rows]),
+            ers_harvested_per_lap=_nanmedian(resources.ers_harvested_mj[rows]),
+            laps_to_wear_limit=float(np.nanmin(remaining)) if not np.isnan(remaining).all() else float('nan'),
+        ))
+    return stints
+
+
+if __name__ == "__main__":
+    print("✓ Stint Analysis モジュール読み込み完了")
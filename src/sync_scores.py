@@ -0,0 +1,244 @@
+"""
+F1 25 Sync Scores
+ラップ距離で揃えた入力 (油門 / ブレーキ / ステアリング) をリファレンスと FFT 相互相関で比べ、
+最もよく一致するズレ (m) とその時の相関 (同期度) をラップ別・コーナー別に求める
+
+ズレ (lag_m) > 0 はリファレンスより後ろ (遅い地点) で同じ操作をしていることを表す
+(例: brake の lag_m = 12 -> 12 m 遅くブレーキング)。
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from .laps import Lap
+
+
+SYNC_CHANNELS = ('throttle', 'brake', 'steering')
+
+DEFAULT_STEP = 1.0        # 距離グリッドの間隔 (m)
+DEFAULT_MAX_LAG = 50.0    # 探すズレの上限 (m)
+CORNER_MARGIN = 30.0      # コーナー区間の前後に足す余白 (m)
+
+
+@dataclass
+class SyncScore:
+    """1 チャンネル分の同期度"""
+    channel: str
+    lag_m: float        # 最も相関が高いズレ (m, > 0 = リファレンスより遅い)
+    peak: float         # そのズレでの相関 (同期度)
+    zero_lag: float     # ズレ 0 での相関
+
+    def to_dict(self) -> Dict:
+        return {'lag_m': self.lag_m, 'peak': self.peak, 'zero_lag': self.zero_lag}
+
+
+def lagged_correlation(user: np.ndarray, reference: np.ndarray, max_lag: int):
+    """ズレ -max_lag..+max_lag の相関を FFT でまとめて計算
+
+    user / reference は (..., n) の配列 (先頭の次元はブロードキャスト)。NaN は欠損扱い。
+
+    Returns:
+        (lags, corr): lags は (2 * max_lag + 1,)、corr は (..., 2 * max_lag + 1)
+    """
+    user = np.asarray(user, dtype=np.float64)
+    reference = np.asarray(reference, dtype=np.float64)
+    n = user.shape[-1]
+    max_lag = max(0, min(int(max_lag), n - 2))
+
+    with np.errstate(invalid='ignore'):
+        u = user - np.nanmean(user, axis=-1, keepdims=True)
+        r = reference - np.nanmean(reference, axis=-1, keepdims=True)
+        u_std = np.nanstd(user, axis=-1)
+        r_std = np.nanstd(reference, axis=-1)
+    u = np.nan_to_num(u)
+    r = np.nan_to_num(r)
+
+    # ゼロ詰めで循環しないようにして cc[k] = sum_i u[i + k] * r[i]
+    size = 1 << (2 * n - 1).bit_length()
+    cc = np.fft.irfft(np.fft.rfft(u, size) * np.conj(np.fft.rfft(r, size)), size)
+    lags = np.arange(-max_lag, max_lag + 1)
+    cc = cc[..., lags % size]
+
+    # 重なっている点数で割って、ズレが大きくても相関のスケールを揃える
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scale = (u_std * r_std)[..., None] * (n - np.abs(lags))
+        corr = np.clip(cc / scale, -1.0, 1.0)
+    return lags, corr
+
+
+def best_lag(user: np.ndarray, reference: np.ndarray, step: float, max_lag: float = DEFAULT_MAX_LAG):
+    """最も相関が高いズレ (m)、その相関、ズレ 0 の相関 を (...,) の配列で返す"""
+    lags, corr = lagged_correlation(user, reference, round(max_lag / step))
+    filled = np.where(np.isnan(corr), -np.inf, corr)
+    index = filled.argmax(axis=-1)
+    peak = np.take_along_axis(corr, index[..., None], axis=-1)[..., 0]
+    zero = corr[..., len(lags) // 2]
+    lag = np.where(np.isnan(peak), np.nan, lags[index] * step)
+    return lag, peak, zero
+
+
+def score_aligned(
+    user: Mapping,
+    reference: Mapping,
+    step: float,
+    channels: Sequence[str] = SYNC_CHANNELS,
+    max_lag: float = DEFAULT_MAX_LAG,
+) -> Dict[str, SyncScore]:
+    """同じ距離グリッド上にある 2 つのテーブルの同期度 (両方にあるチャンネルだけ)"""
+    names = [name for name in channels if name in user and name in reference]
+    if not names:
+        return {}
+    lag, peak, zero = best_lag(
+        np.stack([np.asarray(user[name], dtype=np.float64) for name in names]),
+        np.stack([np.asarray(reference[name], dtype=np.float64) for name in names]),
+        step, max_lag,
+    )
+    return {
+        name: SyncScore(name, float(lag[i]), float(peak[i]), float(zero[i]))
+        for i, name in enumerate(names)
+    }
+
+
+def distance_from_speed(time_s, speed_kph) -> np.ndarray:
+    """速度を台形積分して走行距離 (m) を求める (lap_distance がないデータ用)"""
+    time_s = np.asarray(time_s, dtype=np.float64)
+    speed = np.nan_to_num(np.asarray(speed_kph, dtype=np.float64)) / 3.6
+    steps = np.diff(time_s) * (speed[1:] + speed[:-1]) / 2
+    return np.concatenate(([0.0], np.cumsum(np.maximum(steps, 0.0))))
+
+
+def lap_from_trace(distance, time_s, table: Mapping, channels: Sequence[str] = SYNC_CHANNELS,
+                   number: int = 0, session: str = '') -> Lap:
+    """距離付きの 1 周分のトレース (プロのラップなど) を Lap にする"""
+    distance = np.asarray(distance, dtype=np.float64)
+    time_s = np.asarray(time_s, dtype=np.float64)
+    # 距離が進んでいない点は除いて狭義単調増加にする
+    keep = np.concatenate(([True], np.diff(np.maximum.accumulate(distance)) > 0))
+    columns = {
+        name: np.asarray(table[name], dtype=np.float64)[keep]
+        for name in list(channels) + ['speed_kph'] if name in table
+    }
+    return Lap(
+        number=number,
+        distance=distance[keep],
+        time=time_s[keep] - time_s[keep][0],
+        channels=columns,
+        lap_time=float(time_s[keep][-1] - time_s[keep][0]),
+        complete=True,
+        session=session,
+    )
+
+
+def _on_grid(lap: Lap, grid: np.ndarray, name: str) -> np.ndarray:
+    """ラップのチャンネルを距離グリッドに補間 (走っていない区間は NaN)"""
+    values = lap.channels.get(name)
+    if values is None:
+        return np.full(len(grid), np.nan)
+    valid = ~np.isnan(values)
+    if valid.sum() < 2:
+        return np.full(len(grid), np.nan)
+    out = np.interp(grid, lap.distance[valid], values[valid])
+    out[(grid < lap.distance[0]) | (grid > lap.distance[-1])] = np.nan
+    return out
+
+
+@dataclass
+class SessionSync:
+    """ラップ × チャンネル (× コーナー) の同期度"""
+    channels: List[str]
+    lap_numbers: np.ndarray
+    sessions: List[str]
+    lag_m: np.ndarray                         # [lap, channel]
+    peak: np.ndarray                          # [lap, channel]
+    zero_lag: np.ndarray                      # [lap, channel]
+    corner_lag_m: Optional[np.ndarray] = None     # [lap, corner, channel]
+    corner_peak: Optional[np.ndarray] = None      # [lap, corner, channel]
+
+    def lap_scores(self, index: int) -> Dict[str, SyncScore]:
+        """index 番目のラップのチャンネル別 SyncScore"""
+        return {
+            name: SyncScore(name, float(self.lag_m[index, c]), float(self.peak[index, c]),
+                            float(self.zero_lag[index, c]))
+            for c, name in enumerate(self.channels)
+        }
+
+    def to_frame(self):
+        """ロング形式の DataFrame (lap, channel, lag_m, peak, zero_lag)"""
+        import pandas as pd
+
+        n_laps, n_channels = self.peak.shape
+        return pd.DataFrame({
+            'session': np.repeat(self.sessions, n_channels),
+            'lap': np.repeat(self.lap_numbers, n_channels),
+            'channel': np.tile(self.channels, n_laps),
+            'lag_m': self.lag_m.reshape(-1),
+            'peak': self.peak.reshape(-1),
+            'zero_lag': self.zero_lag.reshape(-1),
+        })
+
+    def corner_frame(self):
+        """コーナー別のロング形式 DataFrame (lap, corner, channel, lag_m, peak)"""
+        import pandas as pd
+
+        if self.corner_peak is None:
+            return pd.DataFrame(columns=['session', 'lap', 'corner', 'channel', 'lag_m', 'peak'])
+        n_laps, n_corners, n_channels = self.corner_peak.shape
+        per_lap = n_corners * n_channels
+        return pd.DataFrame({
+            'session': np.repeat(self.sessions, per_lap),
+            'lap': np.repeat(self.lap_numbers, per_lap),
+            'corner': np.tile(np.repeat(np.arange(1, n_corners + 1), n_channels), n_laps),
+            'channel': np.tile(self.channels, n_laps * n_corners),
+            'lag_m': self.corner_lag_m.reshape(-1),
+            'peak': self.corner_peak.reshape(-1),
+        })
+
+
+def session_sync(
+    laps: Sequence[Lap],
+    reference: Lap,
+    channels: Sequence[str] = SYNC_CHANNELS,
+    step: float = DEFAULT_STEP,
+    max_lag: float = DEFAULT_MAX_LAG,
+    corner_map=None,
+) -> SessionSync:
+    """全ラップをリファレンスと一括で比較
+
+    全ラップを同じ距離グリッドに載せて [lap, channel, grid] の配列にし、
+    FFT は 1 回 (コーナー別はコーナーごとに 1 回) で済ませる。
+    """
+    names = [name for name in channels if name in reference.channels]
+    grid = np.arange(reference.distance[0], reference.distance[-1], step)
+    ref = np.stack([_on_grid(reference, grid, name) for name in names]) if names else np.empty((0, len(grid)))
+    users = np.array([[_on_grid(lap, grid, name) for name in names] for lap in laps]).reshape(
+        len(laps), len(names), len(grid)
+    )
+
+    lag, peak, zero = best_lag(users, ref, step, max_lag)
+    result = SessionSync(
+        channels=names,
+        lap_numbers=np.array([lap.number for lap in laps]),
+        sessions=[lap.session for lap in laps],
+        lag_m=lag, peak=peak, zero_lag=zero,
+    )
+
+    if corner_map is not None and corner_map.corners:
+        n_corners = len(corner_map.corners)
+        corner_lag = np.full((len(laps), n_corners, len(names)), np.nan)
+        corner_peak = np.full_like(corner_lag, np.nan)
+        for k, corner in enumerate(corner_map.corners):
+            lo, hi = np.searchsorted(grid, [corner.entry - CORNER_MARGIN, corner.exit + CORNER_MARGIN])
+            if hi - lo < 4:
+                continue
+            # 短い区間ではズレの上限を区間長の 1/4 までにする
+            window_lag = min(max_lag, (hi - lo) * step / 4)
+            lag_k, peak_k, _ = best_lag(users[..., lo:hi], ref[..., lo:hi], step, window_lag)
+            corner_lag[:, k], corner_peak[:, k] = lag_k, peak_k
+        result.corner_lag_m, result.corner_peak = corner_lag, corner_peak
+    return result
+
+
+if __name__ == "__main__":
+    print("✓ Sync Scores モジュール読み込み完了")
@@ -1,11 +1,14 @@
 """
 F1 25 Telemetry Packet Structures
-Packet 2 (Lap Data) と Packet 6 (Car Telemetry) を定義
+Packet 0 (Motion)、Packet 2 (Lap Data)、Packet 6 (Car Telemetry)、
+Packet 7 (Car Status)、Packet 10 (Car Damage)、Packet 13 (Motion Ex) を定義
 """
 
 import struct
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional
+
+import numpy as np
 
 
 @dataclass
@@ -27,6 +30,8 @@ class LapData:
     pit_status: int                   # Pit Status
     num_pit_stops: int                # Pit Stop 回数
     finished: bool                    # 完了したか
+    sector: int = 0                   # 現在のセクター (0-2)
+    current_lap_invalid: bool = False # 現在のラップが無効か
     
     def __repr__(self):
         return (
@@ -52,6 +57,7 @@ class CarTelemetry:
     tyres_surface_temp: tuple         # タイヤ表面温度
     tyres_inner_temp: tuple           # タイヤ内部温度
     tyres_pressure: tuple             # タイヤ気右 (kPa)
+    surface_type: tuple = (0, 0, 0, 0)  # 各輪の路面 (0 = ターマック, 1 = 縁石, 4 = グラベル, 7 = 芝 など)
     
     def __repr__(self):
         return (
@@ -62,19 +68,213 @@ class CarTelemetry:
         )
 
 
+@dataclass
+class CarMotion:
+    """Motion データ (Packet 0 内の各車輋用)"""
+    world_position_x: float           # ワールド座標 X (m)
+    world_position_y: float           # ワールド座標 Y (m, 高さ)
+    world_position_z: float           # ワールド座標 Z (m)
+    world_velocity_x: float           # 速度ベクトル (m/s)
+    world_velocity_y: float
+    world_velocity_z: float
+    g_force_lateral: float            # 横 G
+    g_force_longitudinal: float       # 縦 G
+    g_force_vertical: float           # 上下 G
+    yaw: float                        # ヨー角 (rad)
+    pitch: float                      # ピッチ角 (rad)
+    roll: float                       # ロール角 (rad)
+    
+    def __repr__(self):
+        return (
+            f"Motion(pos=({self.world_position_x:.1f}, {self.world_position_y:.1f}, "
+            f"{self.world_position_z:.1f}), yaw={self.yaw:.2f})"
+        )
+
+
+@dataclass
+class CarStatus:
+    """Car Status データ (Packet 7 内の各車輋用)"""
+    fuel_mix: int                     # 燃料ミクスチャー (0 = lean .. 3 = max)
+    fuel_in_tank: float               # 燃料残量 (kg)
+    fuel_capacity: float              # 燃料タンク容量 (kg)
+    fuel_remaining_laps: float        # 燃料で走れる残り周回 (MFD 表示値)
+    actual_tyre_compound: int         # 実際のコンパウンド (16 = C5 .. 22 = C1 など)
+    visual_tyre_compound: int         # 見た目のコンパウンド (16 = soft, 17 = medium, 18 = hard, 7 = inter, 8 = wet)
+    tyres_age_laps: int               # タイヤの使用周回
+    ers_store_energy: float           # ERS 蓄電量 (J)
+    ers_deploy_mode: int              # ERS モード (0 = none, 1 = medium, 2 = hotlap, 3 = overtake)
+    ers_harvested_this_lap_mguk: float  # 今周の MGU-K 回生 (J)
+    ers_harvested_this_lap_mguh: float  # 今周の MGU-H 回生 (J)
+    ers_deployed_this_lap: float      # 今周の ERS 放出 (J)
+    
+    def __repr__(self):
+        return (
+            f"Status(fuel={self.fuel_in_tank:.2f}kg, "
+            f"ers={self.ers_store_energy / 1e6:.2f}MJ, "
+            f"tyre={self.visual_tyre_compound}/{self.tyres_age_laps}laps)"
+        )
+
+
+@dataclass
+class CarDamage:
+    """Car Damage データ (Packet 10 内の各車輋用)"""
+    tyres_wear: tuple                 # タイヤ摩耗 (%, RL, RR, FL, FR)
+    tyres_damage: tuple               # タイヤダメージ (%)
+    brakes_damage: tuple              # ブレーキダメージ (%)
+    front_left_wing_damage: int       # フロントウイング左 (%)
+    front_right_wing_damage: int      # フロントウイング右 (%)
+    rear_wing_damage: int             # リアウイング (%)
+    floor_damage: int                 # フロア (%)
+    gearbox_damage: int               # ギアボックス (%)
+    engine_damage: int                # エンジン (%)
+    
+    def __repr__(self):
+        return f"Damage(wear={tuple(round(w, 1) for w in self.tyres_wear)})"
+
+
+@dataclass
+class CarMotionEx:
+    """Motion Ex データ (Packet 13、プレイヤーの車だけ)"""
+    wheel_speed: tuple                # 各輪の速度 (m/s, RL, RR, FL, FR)
+    wheel_slip_ratio: tuple           # 各輪のスリップ率 (負 = ロック側、正 = 空転側)
+    wheel_slip_angle: tuple           # 各輪のスリップ角 (rad)
+    wheel_lat_force: tuple            # 各輪の横力
+    wheel_long_force: tuple           # 各輪の縦力
+    local_velocity_x: float           # 車体座標の速度 (m/s、x = 横、z = 前)
+    local_velocity_z: float
+    angular_velocity_y: float         # ヨーレート (rad/s)
+    front_wheels_angle: float         # 前輪の舵角 (rad)
+    
+    def __repr__(self):
+        return f"MotionEx(slip={tuple(round(s, 2) for s in self.wheel_slip_ratio)})"
+
+
+# Motion 1 台分 (FORMAT_STRING と同じ並び) の numpy dtype
+CAR_MOTION_DTYPE = np.dtype([
+    ('world_position_x', '<f4'), ('world_position_y', '<f4'), ('world_position_z', '<f4'),
+    ('world_velocity_x', '<f4'), ('world_velocity_y', '<f4'), ('world_velocity_z', '<f4'),
+    ('world_forward_dir', '<i2', (3,)),
+    ('world_right_dir', '<i2', (3,)),
+    ('g_force_lateral', '<f4'), ('g_force_longitudinal', '<f4'), ('g_force_vertical', '<f4'),
+    ('yaw', '<f4'), ('pitch', '<f4'), ('roll', '<f4'),
+])
+
+
+def _parse_all(data: bytes, dtype: np.dtype, header_size: int, num_cars: int) -> Optional[np.ndarray]:
+    """全車分を dtype の配列 (num_cars,) として読む (コピーなし)"""
+    if len(data) < header_size + num_cars * dtype.itemsize:
+        return None
+    return np.frombuffer(data, dtype, count=num_cars, offset=header_size)
+
+
+class MotionPacket:
+    """Packet 0: Motion Parser"""
+    
+    HEADER_SIZE = 29
+    # 各車輋ごとのデータサイズ (bytes)
+    SINGLE_CAR_SIZE = 60
+    NUM_CARS = 22
+    
+    # position xyz, velocity xyz (float) / forward dir xyz, right dir xyz (int16 正規化) /
+    # G 横・縦・上下, yaw, pitch, roll (float)
+    FORMAT_STRING = "<ffffff6hffffff"
+    
+    @staticmethod
+    def parse_all(data: bytes) -> Optional[np.ndarray]:
+        """全車分を CAR_MOTION_DTYPE の配列 (NUM_CARS,) として読む (コピーなし)"""
+        return _parse_all(data, CAR_MOTION_DTYPE, MotionPacket.HEADER_SIZE, MotionPacket.NUM_CARS)
+    
+    @staticmethod
+    def parse_car_motion(data: bytes, car_index: int = 0) -> CarMotion:
+        """特定の車輋の Motion を解析"""
+        if car_index < 0 or car_index >= MotionPacket.NUM_CARS:
+            raise ValueError(f"車輋インデックスが不正: {car_index}")
+        
+        start = MotionPacket.HEADER_SIZE + (car_index * MotionPacket.SINGLE_CAR_SIZE)
+        end = start + MotionPacket.SINGLE_CAR_SIZE
+        
+        if len(data) < end:
+            return None
+        
+        try:
+            unpacked = struct.unpack_from(MotionPacket.FORMAT_STRING, data, start)
+            
+            return CarMotion(
+                world_position_x=unpacked[0],
+                world_position_y=unpacked[1],
+                world_position_z=unpacked[2],
+                world_velocity_x=unpacked[3],
+                world_velocity_y=unpacked[4],
+                world_velocity_z=unpacked[5],
+                g_force_lateral=unpacked[12],
+                g_force_longitudinal=unpacked[13],
+                g_force_vertical=unpacked[14],
+                yaw=unpacked[15],
+                pitch=unpacked[16],
+                roll=unpacked[17],
+            )
+        except Exception as e:
+            print(f"エラー: Motion 解析失敗 - {e}")
+            return None
+
+
+# Lap Data 1 台分 (FORMAT_STRING と同じ並び) の numpy dtype: 全車をまとめて np.frombuffer で読む用
+LAP_DATA_DTYPE = np.dtype([
+    ('last_lap_time_in_ms', '<u4'),
+    ('current_lap_time_in_ms', '<u4'),
+    ('sector_1_time_ms_part', '<u2'),
+    ('sector_1_time_minutes', 'u1'),
+    ('sector_2_time_ms_part', '<u2'),
+    ('sector_2_time_minutes', 'u1'),
+    ('delta_to_car_in_front_ms_part', '<u2'),
+    ('delta_to_car_in_front_minutes', 'u1'),
+    ('delta_to_race_leader_ms_part', '<u2'),
+    ('delta_to_race_leader_minutes', 'u1'),
+    ('lap_distance', '<f4'),
+    ('total_distance', '<f4'),
+    ('safety_car_delta', '<f4'),
+    ('car_position', 'u1'),
+    ('current_lap_num', 'u1'),
+    ('pit_status', 'u1'),               # 0 = なし, 1 = ピットイン中, 2 = ピットエリア内
+    ('num_pit_stops', 'u1'),
+    ('sector', 'u1'),
+    ('current_lap_invalid', 'u1'),
+    ('penalties', 'u1'),
+    ('total_warnings', 'u1'),
+    ('corner_cutting_warnings', 'u1'),
+    ('num_unserved_drive_through_pens', 'u1'),
+    ('num_unserved_stop_go_pens', 'u1'),
+    ('grid_position', 'u1'),
+    ('driver_status', 'u1'),
+    ('result_status', 'u1'),            # 2 = 走行中, 3 = 完走, 4 以降 = DNF / 失格など
+    ('pit_lane_timer_active', 'u1'),
+    ('pit_lane_time_in_lane_in_ms', '<u2'),
+    ('pit_stop_timer_in_ms', '<u2'),
+    ('pit_stop_should_serve_pen', 'u1'),
+    ('speed_trap_fastest_speed', '<f4'),
+    ('speed_trap_fastest_lap', 'u1'),
+])
+
+
 class LapDataPacket:
     """Packet 2: Lap Data Parser"""
     
-    HEADER_SIZE = 24
+    HEADER_SIZE = 29
     # 各車輋ごとのデータサイズ (bytes)
-    SINGLE_CAR_SIZE = 82
+    SINGLE_CAR_SIZE = 57
+    NUM_CARS = 22
+    
+    FORMAT_STRING = "<IIHBHBHBHBfffBBBBBBBBBBBBBBBHHBfB"
     
-    FORMAT_STRING = "<IffIIffffIBBBBB"
+    @staticmethod
+    def parse_all(data: bytes) -> Optional[np.ndarray]:
+        """全車の Lap Data を LAP_DATA_DTYPE の配列 (NUM_CARS,) として読む (コピーなし)"""
+        return _parse_all(data, LAP_DATA_DTYPE, LapDataPacket.HEADER_SIZE, LapDataPacket.NUM_CARS)
     
     @staticmethod
     def parse_lap_data(data: bytes, car_index: int = 0) -> LapData:
         """特定の車輋の Lap Data を解析"""
-        if car_index < 0 or car_index >= 20:
+        if car_index < 0 or car_index >= LapDataPacket.NUM_CARS:
             raise ValueError(f"車輋インデックスが不正: {car_index}")
         
         # 車輋ごとのデータを抽出
@@ -84,10 +284,8 @@ class LapDataPacket:
         if len(data) < end:
             return None
         
-        car_data = data[start:end]
-        
         try:
-            unpacked = struct.unpack(LapDataPacket.FORMAT_STRING, car_data[:74])
+            unpacked = struct.unpack_from(LapDataPacket.FORMAT_STRING, data, start)
             
             return LapData(
                 last_lap_time_in_ms=unpacked[0],
@@ -96,35 +294,64 @@ class LapDataPacket:
                 sector_1_time_minutes=unpacked[3],
                 sector_2_time_in_ms=unpacked[4],
                 sector_2_time_minutes=unpacked[5],
-                delta_to_car_in_front=unpacked[6],
-                delta_to_race_leader=unpacked[7],
-                lap_distance=unpacked[8],
-                total_distance=unpacked[9],
-                safety_car_delta=unpacked[10],
-                car_position=unpacked[11],
-                current_lap_num=unpacked[12],
-                pit_status=unpacked[13],
-                num_pit_stops=unpacked[14],
-                finished=bool(unpacked[15]),
+                delta_to_car_in_front=unpacked[7] * 60000.0 + unpacked[6],   # ms
+                delta_to_race_leader=unpacked[9] * 60000.0 + unpacked[8],    # ms
+                lap_distance=unpacked[10],
+                total_distance=unpacked[11],
+                safety_car_delta=unpacked[12],
+                car_position=unpacked[13],
+                current_lap_num=unpacked[14],
+                pit_status=unpacked[15],
+                num_pit_stops=unpacked[16],
+                finished=unpacked[26] == 3,   # resultStatus 3 = finished
+                sector=unpacked[17],
+                current_lap_invalid=bool(unpacked[18]),
             )
         except Exception as e:
             print(f"エラー: Lap Data 解析失敗 - {e}")
             return None
 
 
+# Car Telemetry 1 台分 (FORMAT_STRING と同じ並び) の numpy dtype
+CAR_TELEMETRY_DTYPE = np.dtype([
+    ('speed', '<u2'),
+    ('throttle', '<f4'),
+    ('steer', '<f4'),
+    ('brake', '<f4'),
+    ('clutch', 'u1'),
+    ('gear', 'i1'),
+    ('engine_rpm', '<u2'),
+    ('drs', 'u1'),
+    ('rev_lights_percent', 'u1'),
+    ('rev_lights_bit_value', '<u2'),
+    ('brakes_temperature', '<u2', (4,)),        # RL, RR, FL, FR
+    ('tyres_surface_temperature', 'u1', (4,)),
+    ('tyres_inner_temperature', 'u1', (4,)),
+    ('engine_temperature', '<u2'),
+    ('tyres_pressure', '<f4', (4,)),
+    ('surface_type', 'u1', (4,)),
+])
+
+
 class CarTelemetryPacket:
     """Packet 6: Car Telemetry Parser"""
     
-    HEADER_SIZE = 24
+    HEADER_SIZE = 29
     # 各車輋ごとのテレメトリーデータサイズ
-    SINGLE_CAR_SIZE = 68
+    SINGLE_CAR_SIZE = 60
+    NUM_CARS = 22
     
-    FORMAT_STRING = "<HfffffBHBBBBBBBBBBBBBBBBffffff"
+    FORMAT_STRING = "<HfffBbHBBH4H4B4BH4f4B"
+    
+    @staticmethod
+    def parse_all(data: bytes) -> Optional[np.ndarray]:
+        """全車分を CAR_TELEMETRY_DTYPE の配列 (NUM_CARS,) として読む (コピーなし)"""
+        return _parse_all(data, CAR_TELEMETRY_DTYPE, CarTelemetryPacket.HEADER_SIZE, CarTelemetryPacket.NUM_CARS)
     
     @staticmethod
     def parse_car_telemetry(data: bytes, car_index: int = 0) -> CarTelemetry:
         """特定の車輋の Telemetry を解析"""
-        if car_index < 0 or car_index >= 20:
+        if car_index < 0 or car_index >= CarTelemetryPacket.NUM_CARS:
             raise ValueError(f"車輋インデックスが不正: {car_index}")
         
         # 車輋ごとのデータを抽出
@@ -134,10 +361,8 @@ class CarTelemetryPacket:
         if len(data) < end:
             return None
         
-        car_data = data[start:end]
-        
         try:
-            unpacked = struct.unpack(CarTelemetryPacket.FORMAT_STRING, car_data)
+            unpacked = struct.unpack_from(CarTelemetryPacket.FORMAT_STRING, data, start)
             
             return CarTelemetry(
                 speed=unpacked[0],
@@ -150,19 +375,22 @@ class CarTelemetryPacket:
                 drs_open=bool(unpacked[7]),
                 rev_lights_percent=unpacked[8],
                 brakes_temp=(
-                    unpacked[9],   # 前後
-                    unpacked[10],  # 左右
+                    unpacked[10],  # RL, RR, FL, FR
                     unpacked[11],
                     unpacked[12],
+                    unpacked[13],
                 ),
                 tyres_surface_temp=(
-                    unpacked[13], unpacked[14], unpacked[15], unpacked[16],  # RL, RR, FL, FR
+                    unpacked[14], unpacked[15], unpacked[16], unpacked[17],  # RL, RR, FL, FR
                 ),
                 tyres_inner_temp=(
-                    unpacked[17], unpacked[18], unpacked[19], unpacked[20],
+                    unpacked[18], unpacked[19], unpacked[20], unpacked[21],
                 ),
                 tyres_pressure=(
-                    unpacked[21], unpacked[22], unpacked[23], unpacked[24],
+                    unpacked[23], unpacked[24], unpacked[25], unpacked[26],
+                ),
+                surface_type=(
+                    unpacked[27], unpacked[28], unpacked[29], unpacked[30],
                 ),
             )
         except Exception as e:
@@ -170,7 +398,235 @@ class CarTelemetryPacket:
             return None
 
 
+# Car Status 1 台分 (FORMAT_STRING と同じ並び) の numpy dtype
+CAR_STATUS_DTYPE = np.dtype([
+    ('traction_control', 'u1'),
+    ('anti_lock_brakes', 'u1'),
+    ('fuel_mix', 'u1'),
+    ('front_brake_bias', 'u1'),
+    ('pit_limiter_status', 'u1'),
+    ('fuel_in_tank', '<f4'),
+    ('fuel_capacity', '<f4'),
+    ('fuel_remaining_laps', '<f4'),
+    ('max_rpm', '<u2'),
+    ('idle_rpm', '<u2'),
+    ('max_gears', 'u1'),
+    ('drs_allowed', 'u1'),
+    ('drs_activation_distance', '<u2'),
+    ('actual_tyre_compound', 'u1'),
+    ('visual_tyre_compound', 'u1'),
+    ('tyres_age_laps', 'u1'),
+    ('vehicle_fia_flags', 'i1'),
+    ('engine_power_ice', '<f4'),
+    ('engine_power_mguk', '<f4'),
+    ('ers_store_energy', '<f4'),
+    ('ers_deploy_mode', 'u1'),
+    ('ers_harvested_this_lap_mguk', '<f4'),
+    ('ers_harvested_this_lap_mguh', '<f4'),
+    ('ers_deployed_this_lap', '<f4'),
+    ('network_paused', 'u1'),
+])
+
+
+class CarStatusPacket:
+    """Packet 7: Car Status Parser"""
+    
+    HEADER_SIZE = 29
+    # 各車輋ごとのデータサイズ (bytes)
+    SINGLE_CAR_SIZE = 55
+    NUM_CARS = 22
+    
+    # TC, ABS, fuel mix, brake bias, pit limiter / fuel in tank, capacity, remaining laps /
+    # max RPM, idle RPM / max gears, DRS allowed, DRS distance / actual, visual compound, tyre age, FIA flag /
+    # ICE, MGU-K power / ERS store, deploy mode, harvested MGU-K, MGU-H, deployed / network paused
+    FORMAT_STRING = "<BBBBBfffHHBBHBBBbfffBfffB"
+    
+    @staticmethod
+    def parse_all(data: bytes) -> Optional[np.ndarray]:
+        """全車分を CAR_STATUS_DTYPE の配列 (NUM_CARS,) として読む (コピーなし)"""
+        return _parse_all(data, CAR_STATUS_DTYPE, CarStatusPacket.HEADER_SIZE, CarStatusPacket.NUM_CARS)
+    
+    @staticmethod
+    def parse_car_status(data: bytes, car_index: int = 0) -> CarStatus:
+        """特定の車輋の Car Status を解析"""
+        if car_index < 0 or car_index >= CarStatusPacket.NUM_CARS:
+            raise ValueError(f"車輋インデックスが不正: {car_index}")
+        
+        start = CarStatusPacket.HEADER_SIZE + (car_index * CarStatusPacket.SINGLE_CAR_SIZE)
+        end = start + CarStatusPacket.SINGLE_CAR_SIZE
+        
+        if len(data) < end:
+            return None
+        
+        try:
+            unpacked = struct.unpack_from(CarStatusPacket.FORMAT_STRING, data, start)
+            
+            return CarStatus(
+                fuel_mix=unpacked[2],
+                fuel_in_tank=unpacked[5],
+                fuel_capacity=unpacked[6],
+                fuel_remaining_laps=unpacked[7],
+                actual_tyre_compound=unpacked[13],
+                visual_tyre_compound=unpacked[14],
+                tyres_age_laps=unpacked[15],
+                ers_store_energy=unpacked[19],
+                ers_deploy_mode=unpacked[20],
+                ers_harvested_this_lap_mguk=unpacked[21],
+                ers_harvested_this_lap_mguh=unpacked[22],
+                ers_deployed_this_lap=unpacked[23],
+            )
+        except Exception as e:
+            print(f"エラー: Car Status 解析失敗 - {e}")
+            return None
+
+
+# Car Damage 1 台分 (FORMAT_STRING と同じ並び) の numpy dtype
+CAR_DAMAGE_DTYPE = np.dtype([
+    ('tyres_wear', '<f4', (4,)),                # RL, RR, FL, FR
+    ('tyres_damage', 'u1', (4,)),
+    ('brakes_damage', 'u1', (4,)),
+    ('tyre_blisters', 'u1', (4,)),
+    ('front_left_wing_damage', 'u1'),
+    ('front_right_wing_damage', 'u1'),
+    ('rear_wing_damage', 'u1'),
+    ('floor_damage', 'u1'),
+    ('diffuser_damage', 'u1'),
+    ('sidepod_damage', 'u1'),
+    ('drs_fault', 'u1'),
+    ('ers_fault', 'u1'),
+    ('gearbox_damage', 'u1'),
+    ('engine_damage', 'u1'),
+    ('engine_mguh_wear', 'u1'),
+    ('engine_es_wear', 'u1'),
+    ('engine_ce_wear', 'u1'),
+    ('engine_ice_wear', 'u1'),
+    ('engine_mguk_wear', 'u1'),
+    ('engine_tc_wear', 'u1'),
+    ('engine_blown', 'u1'),
+    ('engine_seized', 'u1'),
+])
+
+
+class CarDamagePacket:
+    """Packet 10: Car Damage Parser"""
+    
+    HEADER_SIZE = 29
+    # 各車輋ごとのデータサイズ (bytes)
+    SINGLE_CAR_SIZE = 46
+    NUM_CARS = 22
+    
+    # tyre wear x4 (float) / tyre damage x4, brake damage x4, tyre blisters x4 /
+    # FL wing, FR wing, rear wing, floor, diffuser, sidepod, DRS fault, ERS fault, gearbox, engine,
+    # MGU-H, ES, CE, ICE, MGU-K, TC wear, engine blown, engine seized
+    FORMAT_STRING = "<4f4B4B4B18B"
+    
+    @staticmethod
+    def parse_all(data: bytes) -> Optional[np.ndarray]:
+        """全車分を CAR_DAMAGE_DTYPE の配列 (NUM_CARS,) として読む (コピーなし)"""
+        return _parse_all(data, CAR_DAMAGE_DTYPE, CarDamagePacket.HEADER_SIZE, CarDamagePacket.NUM_CARS)
+    
+    @staticmethod
+    def parse_car_damage(data: bytes, car_index: int = 0) -> CarDamage:
+        """特定の車輋の Car Damage を解析"""
+        if car_index < 0 or car_index >= CarDamagePacket.NUM_CARS:
+            raise ValueError(f"車輋インデックスが不正: {car_index}")
+        
+        start = CarDamagePacket.HEADER_SIZE + (car_index * CarDamagePacket.SINGLE_CAR_SIZE)
+        end = start + CarDamagePacket.SINGLE_CAR_SIZE
+        
+        if len(data) < end:
+            return None
+        
+        try:
+            unpacked = struct.unpack_from(CarDamagePacket.FORMAT_STRING, data, start)
+            
+            return CarDamage(
+                tyres_wear=tuple(unpacked[0:4]),     # RL, RR, FL, FR
+                tyres_damage=tuple(unpacked[4:8]),
+                brakes_damage=tuple(unpacked[8:12]),
+                front_left_wing_damage=unpacked[16],
+                front_right_wing_damage=unpacked[17],
+                rear_wing_damage=unpacked[18],
+                floor_damage=unpacked[19],
+                gearbox_damage=unpacked[24],
+                engine_damage=unpacked[25],
+            )
+        except Exception as e:
+            print(f"エラー: Car Damage 解析失敗 - {e}")
+            return None
+
+
+# Motion Ex (ヘッダーの後) の numpy dtype: F1 25 は 244 bytes (F1 24 は chassis_pitch 以降がない)
+MOTION_EX_DTYPE = np.dtype([
+    ('suspension_position', '<f4', (4,)),       # RL, RR, FL, FR
+    ('suspension_velocity', '<f4', (4,)),
+    ('suspension_acceleration', '<f4', (4,)),
+    ('wheel_speed', '<f4', (4,)),
+    ('wheel_slip_ratio', '<f4', (4,)),
+    ('wheel_slip_angle', '<f4', (4,)),
+    ('wheel_lat_force', '<f4', (4,)),
+    ('wheel_long_force', '<f4', (4,)),
+    ('height_of_cog_above_ground', '<f4'),
+    ('local_velocity', '<f4', (3,)),
+    ('angular_velocity', '<f4', (3,)),
+    ('angular_acceleration', '<f4', (3,)),
+    ('front_wheels_angle', '<f4'),
+    ('wheel_vert_force', '<f4', (4,)),
+    ('front_aero_height', '<f4'), ('rear_aero_height', '<f4'),
+    ('front_roll_angle', '<f4'), ('rear_roll_angle', '<f4'),
+    ('chassis_yaw', '<f4'), ('chassis_pitch', '<f4'),
+    ('wheel_camber', '<f4', (4,)),
+    ('wheel_camber_gain', '<f4', (4,)),
+])
+
+
+class MotionExPacket:
+    """Packet 13: Motion Ex Parser (プレイヤーの車だけ)"""
+    
+    HEADER_SIZE = 29
+    SIZE = MOTION_EX_DTYPE.itemsize
+    
+    # 4 輪 x 8 (サスペンション位置・速度・加速度 / 車輪速度 / スリップ率 / スリップ角 / 横力 / 縦力),
+    # 重心高さ, ローカル速度 xyz, 角速度 xyz, 角加速度 xyz, 前輪舵角 (ここまでは F1 24 と共通)
+    FORMAT_STRING = "<32ff3f3f3ff"
+    
+    @staticmethod
+    def parse(data: bytes) -> Optional[np.ndarray]:
+        """MOTION_EX_DTYPE のレコード 1 つとして読む (コピーなし、F1 25 の長さが必要)"""
+        records = _parse_all(data, MOTION_EX_DTYPE, MotionExPacket.HEADER_SIZE, 1)
+        return None if records is None else records[0]
+    
+    @staticmethod
+    def parse_motion_ex(data: bytes) -> CarMotionEx:
+        """Motion Ex を解析 (F1 24 の短いパケットも読める)"""
+        start = MotionExPacket.HEADER_SIZE
+        if len(data) < start + struct.calcsize(MotionExPacket.FORMAT_STRING):
+            return None
+        
+        try:
+            unpacked = struct.unpack_from(MotionExPacket.FORMAT_STRING, data, start)
+            
+            return CarMotionEx(
+                wheel_speed=tuple(unpacked[12:16]),      # RL, RR, FL, FR
+                wheel_slip_ratio=tuple(unpacked[16:20]),
+                wheel_slip_angle=tuple(unpacked[20:24]),
+                wheel_lat_force=tuple(unpacked[24:28]),
+                wheel_long_force=tuple(unpacked[28:32]),
+                local_velocity_x=unpacked[33],
+                local_velocity_z=unpacked[35],
+                angular_velocity_y=unpacked[37],
+                front_wheels_angle=unpacked[42],
+            )
+        except Exception as e:
+            print(f"エラー: Motion Ex 解析失敗 - {e}")
+            return None
+
+
 if __name__ == "__main__":
     print("✓ Telemetry Packets モジュール読み込み完了")
+    print("- CarMotion 批出可能")
     print("- LapData 批出可能")
     print("- CarTelemetry 批出可能")
+    print("- CarStatus 批出可能")
+    print("- CarDamage 批出可能")
+    print("- CarMotionEx 批出可能")
@@ -0,0 +1,235 @@
+"""
+F1 25 Theoretical Best Lap
+全ラップを距離ベースの mini-sector に分割し、区間ベストをつなぎ合わせた理論ベストラップを作る
+
+新しいラップは add_lap で 1 本ずつ取り込むだけで、過去のラップを再処理しない。
+保存済みセッションからは完走した有効ラップだけを使う (無効の判定は .laps.npz の Session History)。
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .laps import DEFAULT_CHANNELS, LAP_START_TOLERANCE, Lap, extract_laps, track_name_from_path
+
+
+CACHE_DIR = Path("cache") / "theoretical_best"
+
+
+class TheoreticalBestLap:
+    """mini-sector ごとのベストタイムとそのトレースを保持する"""
+
+    def __init__(
+        self,
+        track: str,
+        track_length: float,
+        mini_sectors: int = 50,
+        points_per_sector: int = 20,
+        channels: Sequence[str] = DEFAULT_CHANNELS,
+    ):
+        self.track = track
+        self.track_length = float(track_length)
+        self.mini_sectors = mini_sectors
+        self.points_per_sector = points_per_sector
+        self.channels = list(channels)
+
+        self.boundaries = np.linspace(0.0, self.track_length, mini_sectors + 1)
+        # 各区間内のトレース用グリッド (区間の終点は次の区間の始点なので含めない)
+        offsets = np.arange(points_per_sector) / points_per_sector
+        self.grid = self.boundaries[:-1, None] + offsets[None, :] * np.diff(self.boundaries)[:, None]
+
+        self.best_times = np.full(mini_sectors, np.inf)
+        self.best_sources: List[Optional[Tuple[str, int]]] = [None] * mini_sectors
+        # 区間開始からの経過時間 / チャンネル値: (mini_sectors, points_per_sector)
+        self.relative_time = np.full(self.grid.shape, np.nan)
+        self.traces: Dict[str, np.ndarray] = {
+            name: np.full(self.grid.shape, np.nan) for name in self.channels
+        }
+        self.seen = set()
+        self.file_sizes: Dict[str, int] = {}   # 取り込み済みファイルのサイズ
+
+    def covers(self, lap: Lap) -> bool:
+        """ラップがコース全周をカバーしているか"""
+        return (
+            lap.distance[0] <= LAP_START_TOLERANCE
+            and lap.distance[-1] >= self.track_length - LAP_START_TOLERANCE
+        )
+
+    def add_lap(self, lap: Lap) -> int:
+        """1 ラップを取り込み、更新された mini-sector の数を返す"""
+        key = (lap.session, lap.number)
+        if key in self.seen or not self.covers(lap):
+            return 0
+        self.seen.add(key)
+
+        # 区間境界の通過時刻 -> 区間タイム (境界の外側は端の値で補間)
+        crossing = np.interp(self.boundaries, lap.distance, lap.time)
+        # スタートラインは time=0, フィニッシュは公式ラップタイムで固定
+        crossing[0] = 0.0
+        if lap.lap_time == lap.lap_time:
+            crossing[-1] = lap.lap_time
+        sector_times = np.diff(crossing)
+
+        improved = sector_times < self.best_times
+        if not improved.any():
+            return 0
+
+        rows = np.flatnonzero(improved)
+        grid = self.grid[rows]
+        self.best_times[rows] = sector_times[rows]
+        self.relative_time[rows] = np.interp(grid, lap.distance, lap.time) - crossing[rows, None]
+        for name in self.channels:
+            values = lap.channels.get(name)
+            if values is None:
+                continue
+            valid = ~np.isnan(values)
+            if valid.sum() >= 2:
+                self.traces[name][rows] = np.interp(grid, lap.distance[valid], values[valid])
+        for row in rows:
+            self.best_sources[row] = key
+        return len(rows)
+
+    def add_laps(self, laps: Iterable[Lap]) -> int:
+        """複数ラップを取り込む"""
+        return sum(self.add_lap(lap) for lap in laps)
+
+    @property
+    def complete(self) -> bool:
+        return bool(np.isfinite(self.best_times).all())
+
+    @property
+    def total_time(self) -> float:
+        """理論ベストのラップタイム (s)"""
+        return float(self.best_times.sum()) if self.complete else float('nan')
+
+    def synthesize(self) -> Dict[str, np.ndarray]:
+        """区間ベストをつないだトレース (distance, time, 各チャンネル)"""
+        start = np.concatenate(([0.0], np.cumsum(self.best_times)[:-1]))
+        trace = {
+            'distance': self.grid.reshape(-1),
+            'time': (start[:, None] + self.relative_time).reshape(-1),
+        }
+        for name, values in self.traces.items():
+            trace[name] = values.reshape(-1)
+        return trace
+
+    def sector_gaps(self, lap: Lap) -> np.ndarray:
+        """あるラップの mini-sector ごとの理論ベストとの差 (s)"""
+        crossing = np.interp(self.boundaries, lap.distance, lap.time)
+        return np.diff(crossing) - self.best_times
+
+    def update_from_captures(self, paths: Iterable) -> int:
+        """保存済みセッションから未処理の完走ラップだけを取り込む
+
+        前回からサイズが変わっていないファイルは読み込み自体を省く。
+        同じ名前の .laps.npz があれば、ゲームが無効にした周 (トラックリミットなど) は使わない。
+        """
+        from .lap_index import LapHistory
+        from .normalization import load_capture
+
+        updated = 0
+        for path in paths:
+            path = Path(path)
+            size = path.stat().st_size
+            if self.file_sizes.get(path.name) == size:
+                continue
+            laps = extract_laps(load_capture(path), self.channels, session=path.name, complete_only=True)
+            sidecar = path.with_suffix('.laps.npz')
+            if sidecar.exists():
+                invalid = LapHistory.load(sidecar).invalid_player_laps()
+                laps = [lap for lap in laps if lap.number not in invalid]
+            updated += self.add_laps(laps)
+            self.file_sizes[path.name] = size
+        return updated
+
+    # ==================== 保存 / 読み込み ====================
+    @staticmethod
+    def cache_path(track: str, mini_sectors: int, cache_dir: Path = CACHE_DIR) -> Path:
+        """区間数ごとのキャッシュ (区間数が違うと区間ベストを足し合わせられない)"""
+        return Path(cache_dir) / f"{track}_{mini_sectors}.npz"
+
+    def save(self, cache_dir: Path = CACHE_DIR) -> Path:
+        """状態を npz に保存 (次回はここから増分更新)"""
+        path = self.cache_path(self.track, self.mini_sectors, cache_dir)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {
+            'track': self.track,
+            'track_length': self.track_length,
+            'mini_sectors': self.mini_sectors,
+            'points_per_sector': self.points_per_sector,
+            'channels': self.channels,
+            'best_sources': self.best_sources,
+            'seen': sorted(self.seen),
+            'file_sizes': self.file_sizes,
+        }
+        np.savez_compressed(
+            path,
+            meta=np.array(json.dumps(meta, ensure_ascii=False)),
+            best_times=self.best_times,
+            relative_time=self.relative_time,
+            **{f"trace_{name}": values for name, values in self.traces.items()},
+        )
+        return path
+
+    @classmethod
+    def load(cls, track: str, cache_dir: Path = CACHE_DIR,
+             mini_sectors: int = 50) -> Optional['TheoreticalBestLap']:
+        """保存した状態を読み込み (なければ None)"""
+        path = cls.cache_path(track, mini_sectors, cache_dir)
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            best = cls(
+                meta['track'], meta['track_length'], meta['mini_sectors'],
+                meta['points_per_sector'], meta['channels'],
+            )
+            best.best_times = data['best_times']
+            best.relative_time = data['relative_time']
+            for name in best.channels:
+                best.traces[name] = data[f"trace_{name}"]
+        best.best_sources = [tuple(s) if s else None for s in meta['best_sources']]
+        best.seen = {tuple(key) for key in meta['seen']}
+        best.file_sizes = meta.get('file_sizes', {})
+        return best
+
+    def __repr__(self):
+        return (
+            f"TheoreticalBestLap({self.track}, {self.mini_sectors} sectors, "
+            f"laps={len(self.seen)}, best={self.total_time:.3f}s)"
+        )
+
+
+def theoretical_best_for_captures(
+    paths: Sequence,
+    track: Optional[str] = None,
+    mini_sectors: int = 50,
+    cache_dir: Path = CACHE_DIR,
+) -> TheoreticalBestLap:
+    """キャッシュ済みの状態に新しいラップだけを足して保存する"""
+    from .laps import track_length
+    from .normalization import load_capture
+
+    paths = list(paths)
+    track = track or track_name_from_path(paths[0])
+    best = TheoreticalBestLap.load(track, cache_dir, mini_sectors)
+    if best is None:
+        # コース長は完走ラップのある最初のセッションから決める
+        for path in paths:
+            laps = extract_laps(load_capture(path), session=Path(path).name, complete_only=True)
+            if laps:
+                break
+        else:
+            raise ValueError(f"完走ラップがありません: {len(paths)} ファイル")
+        best = TheoreticalBestLap(track, track_length(laps), mini_sectors)
+    before = dict(best.file_sizes)
+    best.update_from_captures(paths)
+    if best.file_sizes != before:
+        best.save(cache_dir)
+    return best
+
+
+if __name__ == "__main__":
+    print("✓ Theoretical Best モジュール読み込み完了")
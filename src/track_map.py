@@ -0,0 +1,344 @@
+"""
+F1 25 Track Map
+Motion パケットのワールド座標 (x, z) から複数ラップ平均の中心線を作り、
+グリッド空間インデックスで任意の位置 -> (コース上の距離, 横オフセット) を一括で引く
+
+中心線は lap_distance でパラメーター化するので、得られる距離は LapData の lap_distance と同じ基準。
+"""
+
+import json
+import warnings
+from pathlib import Path
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from .laps import Lap, extract_laps
+
+
+CACHE_DIR = Path("cache") / "track_maps"
+TRACK_MAP_VERSION = 2
+
+POSITION_CHANNELS = ('position_x', 'position_y', 'position_z')
+
+DEFAULT_STEP = 2.0          # 中心線の点間隔 (m)
+DEFAULT_CELL = 15.0         # 空間インデックスのセルサイズ (m)
+MIN_HALF_WIDTH = 5.0        # コース端 (片側) の下限 (m)
+MAX_HALF_WIDTH = 15.0       # コース端 (片側) の上限 (m)
+WIDTH_PERCENTILE = 75.0     # 中心線の点ごとの、ラップ間のはみ出し幅のこのパーセンタイルをコース端にする
+WIDTH_OUTLIER = 3.0         # ラップ間の中央値よりこれ以上外に出たラップは中央値 + これに切り詰める (m)
+QUERY_CHUNK = 16384         # 一度に検索する点数 (候補配列のメモリ上限)
+
+
+class TrackMap:
+    """中心線 + グリッド空間インデックス
+
+    横オフセットは x-z 平面で進行方向から反時計回り側 (左) が正。
+    """
+
+    def __init__(
+        self,
+        track: str,
+        x: np.ndarray,
+        z: np.ndarray,
+        distance: np.ndarray,
+        y: Optional[np.ndarray] = None,
+        left: Optional[np.ndarray] = None,
+        right: Optional[np.ndarray] = None,
+        closed: bool = True,
+        cell_size: float = DEFAULT_CELL,
+        laps_used: int = 0,
+        sources: Sequence[str] = (),
+    ):
+        self.track = track
+        self.x = np.asarray(x, dtype=np.float64)
+        self.z = np.asarray(z, dtype=np.float64)
+        self.y = np.zeros_like(self.x) if y is None else np.asarray(y, dtype=np.float64)
+        self.distance = np.asarray(distance, dtype=np.float64)
+        n = len(self.x)
+        # コース端までの距離 (左 / 右、正の値)
+        self.left = np.full(n, MIN_HALF_WIDTH) if left is None else np.asarray(left, dtype=np.float64)
+        self.right = np.full(n, MIN_HALF_WIDTH) if right is None else np.asarray(right, dtype=np.float64)
+        self.closed = closed
+        self.cell_size = float(cell_size)
+        self.laps_used = laps_used
+        # 中心線・コース幅を作ったラップ ("セッション#周回番号")
+        self.sources = set(sources)
+
+        # 各点から次の点への線分 (閉じたコースは最後 -> 最初も線分)
+        next_x = np.roll(self.x, -1) if closed else np.append(self.x[1:], self.x[-1])
+        next_z = np.roll(self.z, -1) if closed else np.append(self.z[1:], self.z[-1])
+        self._seg_dx = next_x - self.x
+        self._seg_dz = next_z - self.z
+        self._seg_len2 = self._seg_dx ** 2 + self._seg_dz ** 2
+        self.length = float(self.distance[-1] + (np.sqrt(self._seg_len2[-1]) if closed else 0.0))
+        self._build_index()
+
+    # ==================== 空間インデックス ====================
+    def _cell(self, x: np.ndarray, z: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return (
+            np.floor((x - self._origin[0]) / self.cell_size).astype(np.int64),
+            np.floor((z - self._origin[1]) / self.cell_size).astype(np.int64),
+        )
+
+    def _build_index(self):
+        """中心線の点をセルごとにまとめた CSR 形式のインデックス"""
+        self._origin = (self.x.min() - self.cell_size, self.z.min() - self.cell_size)
+        cx, cz = self._cell(self.x, self.z)
+        self._ncx = int(cx.max()) + 2
+        self._ncz = int(cz.max()) + 2
+        keys = cx * self._ncz + cz
+        order = np.argsort(keys, kind='stable')
+        self._points = order
+        counts = np.bincount(keys, minlength=self._ncx * self._ncz)
+        self._start = np.concatenate(([0], np.cumsum(counts)))
+
+    def _nearest_points(self, x: np.ndarray, z: np.ndarray) -> np.ndarray:
+        """各位置に最も近い中心線の点 (周囲 3x3 セルに候補がなければ全点から探す)"""
+        cx, cz = self._cell(x, z)
+        nearest = np.full(len(x), -1, dtype=np.int64)
+        best = np.full(len(x), np.inf)
+        for dx in (-1, 0, 1):
+            for dz in (-1, 0, 1):
+                nx, nz = cx + dx, cz + dz
+                inside = (nx >= 0) & (nx < self._ncx) & (nz >= 0) & (nz < self._ncz)
+                key = nx[inside] * self._ncz + nz[inside]
+                count = self._start[key + 1] - self._start[key]
+                hit = count > 0
+                if not hit.any():
+                    continue
+                q = np.flatnonzero(inside)[hit]
+                start, count = self._start[key[hit]], count[hit]
+                # 可変長の範囲 [start, stop) を 1 本の配列に展開 (クエリごとに連続)
+                first = np.cumsum(count) - count
+                points = self._points[np.repeat(start - first, count) + np.arange(count.sum())]
+                qr = np.repeat(q, count)
+                d2 = (self.x[points] - x[qr]) ** 2 + (self.z[points] - z[qr]) ** 2
+                # クエリごとの最小値と、その位置 (最初に一致したもの)
+                cell_min = np.minimum.reduceat(d2, first)
+                match = np.flatnonzero(d2 == np.repeat(cell_min, count))
+                argmin = points[match[np.searchsorted(match, first)]]
+                better = cell_min < best[q]
+                best[q[better]] = cell_min[better]
+                nearest[q[better]] = argmin[better]
+        # コースから大きく離れた点 (周囲セルに中心線がない) は総当たり
+        for i in np.flatnonzero(nearest < 0):
+            nearest[i] = int(np.argmin((self.x - x[i]) ** 2 + (self.z - z[i]) ** 2))
+        return nearest
+
+    # ==================== 検索 ====================
+    def locate(self, x, z) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ワールド座標 -> (コース上の距離 m, 横オフセット m, 最近傍の中心線インデックス)
+
+        配列をまとめて渡すと全点を一括で処理する (NaN の点は NaN を返す)。
+        """
+        x = np.atleast_1d(np.asarray(x, dtype=np.float64))
+        z = np.atleast_1d(np.asarray(z, dtype=np.float64))
+        distance = np.full(len(x), np.nan)
+        offset = np.full(len(x), np.nan)
+        index = np.full(len(x), -1, dtype=np.int64)
+        valid = np.flatnonzero(~(np.isnan(x) | np.isnan(z)))
+
+        n = len(self.x)
+        for chunk in range(0, len(valid), QUERY_CHUNK):
+            rows = valid[chunk:chunk + QUERY_CHUNK]
+            qx, qz = x[rows], z[rows]
+            nearest = self._nearest_points(qx, qz)
+
+            # 最近傍点の前後 2 本の線分に射影し、近い方を採用
+            best_d2 = np.full(len(rows), np.inf)
+            for seg in (nearest - 1, nearest):
+                if self.closed:
+                    seg = seg % n
+                else:
+                    seg = np.clip(seg, 0, n - 2)
+                px, pz = qx - self.x[seg], qz - self.z[seg]
+                len2 = np.where(self._seg_len2[seg] > 0, self._seg_len2[seg], 1.0)
+                t = np.clip((px * self._seg_dx[seg] + pz * self._seg_dz[seg]) / len2, 0.0, 1.0)
+                ex, ez = px - t * self._seg_dx[seg], pz - t * self._seg_dz[seg]
+                d2 = ex ** 2 + ez ** 2
+                better = d2 < best_d2
+                best_d2 = np.where(better, d2, best_d2)
+                seg_len = np.sqrt(self._seg_len2[seg])
+                # 進行方向と (位置 - 線分始点) の外積の符号で左右を決める
+                side = np.sign(self._seg_dx[seg] * pz - self._seg_dz[seg] * px)
+                distance[rows] = np.where(better, self.distance[seg] + t * seg_len, distance[rows])
+                offset[rows] = np.where(better, side * np.sqrt(d2), offset[rows])
+                index[rows] = np.where(better, np.where(t > 0.5, (seg + 1) % n, seg), index[rows])
+
+        if self.closed:
+            distance = np.mod(distance, self.length)
+        return distance, offset, index
+
+    def built_from(self, lap: Lap) -> bool:
+        """このラップがマップを作るのに使われたか (コース外の判定はそれ以外のラップで見る)"""
+        return _lap_key(lap) in self.sources
+
+    def off_track(self, x, z, margin: float = 1.0) -> np.ndarray:
+        """コース端 (+ margin) より外にいる点のマスク"""
+        _, offset, index = self.locate(x, z)
+        safe = np.maximum(index, 0)
+        with np.errstate(invalid='ignore'):
+            outside = (offset > self.left[safe] + margin) | (-offset > self.right[safe] + margin)
+        return outside & (index >= 0)
+
+    def racing_line(self, lap: Lap, grid: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """ラップの走行ライン (中心線からの横オフセット) を距離グリッド上で返す"""
+        distance, offset, _ = self.locate(lap.channels['position_x'], lap.channels['position_z'])
+        valid = ~np.isnan(distance)
+        order = np.argsort(distance[valid])
+        distance, offset = distance[valid][order], offset[valid][order]
+        if grid is None:
+            grid = self.distance
+        if len(distance) < 2:
+            return grid, np.full(len(grid), np.nan)
+        line = np.interp(grid, distance, offset)
+        line[(grid < distance[0]) | (grid > distance[-1])] = np.nan
+        return grid, line
+
+    # ==================== 保存 / 読み込み ====================
+    def save(self, cache_dir: Path = CACHE_DIR) -> Path:
+        """npz でキャッシュに保存"""
+        cache_dir = Path(cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        path = cache_dir / f"{self.track}.npz"
+        meta = {
+            'track': self.track,
+            'closed': self.closed,
+            'cell_size': self.cell_size,
+            'laps_used': self.laps_used,
+            'sources': sorted(self.sources),
+            'version': TRACK_MAP_VERSION,
+        }
+        np.savez_compressed(
+            path, meta=np.array(json.dumps(meta)), x=self.x, y=self.y, z=self.z,
+            distance=self.distance, left=self.left, right=self.right,
+        )
+        return path
+
+    @classmethod
+    def load(cls, track: str, cache_dir: Path = CACHE_DIR) -> Optional['TrackMap']:
+        """キャッシュから読み込み (なければ / 古い形式なら None)"""
+        path = Path(cache_dir) / f"{track}.npz"
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            if meta.get('version') != TRACK_MAP_VERSION:
+                return None
+            return cls(
+                meta['track'], data['x'], data['z'], data['distance'], y=data['y'],
+                left=data['left'], right=data['right'], closed=meta['closed'],
+                cell_size=meta['cell_size'], laps_used=meta['laps_used'],
+                sources=meta['sources'],
+            )
+
+    def __repr__(self):
+        return (
+            f"TrackMap({self.track}, {self.length:.0f}m, points={len(self.x)}, "
+            f"laps={self.laps_used})"
+        )
+
+
+def _lap_key(lap: Lap) -> str:
+    return f"{lap.session}#{lap.number}"
+
+
+def _has_positions(lap: Lap) -> bool:
+    if not all(name in lap.channels for name in POSITION_CHANNELS):
+        return False
+    return (~np.isnan(lap.channels['position_x'])).sum() >= 2
+
+
+def build_track_map(
+    track: str,
+    laps: Sequence[Lap],
+    step: float = DEFAULT_STEP,
+    cell_size: float = DEFAULT_CELL,
+) -> TrackMap:
+    """位置付きの完走ラップから中心線を作る
+
+    各ラップの (x, y, z) を lap_distance のグリッドに補間し、ラップ間の中央値を中心線とする。
+    コース端は中心線の点ごとに、各ラップの最大の横オフセットをラップ間で WIDTH_PERCENTILE
+    パーセンタイルにしたもの (1 周だけ大きくはみ出したラップで広がらないよう、中央値 + WIDTH_OUTLIER で切り詰める)。
+    """
+    laps = [lap for lap in laps if lap.complete and _has_positions(lap)]
+    if not laps:
+        raise ValueError(f"位置情報 (position_x/y/z) 付きの完走ラップがありません: {track}")
+
+    length = float(np.median([lap.distance[-1] for lap in laps]))
+    grid = np.arange(0.0, length, step)
+    stacked = {}
+    for name in POSITION_CHANNELS:
+        rows = []
+        for lap in laps:
+            values = lap.channels[name]
+            valid = ~np.isnan(values)
+            row = np.interp(grid, lap.distance[valid], values[valid])
+            row[(grid < lap.distance[valid][0]) | (grid > lap.distance[valid][-1])] = np.nan
+            rows.append(row)
+        with warnings.catch_warnings():
+            # どのラップも走っていないグリッド点 (All-NaN) は後で除く
+            warnings.simplefilter('ignore', RuntimeWarning)
+            stacked[name] = np.nanmedian(np.array(rows), axis=0)
+
+    keep = ~(np.isnan(stacked['position_x']) | np.isnan(stacked['position_z']))
+    track_map = TrackMap(
+        track, stacked['position_x'][keep], stacked['position_z'][keep], grid[keep],
+        y=stacked['position_y'][keep], cell_size=cell_size, laps_used=len(laps),
+        sources=[_lap_key(lap) for lap in laps],
+    )
+
+    # コース幅: ラップごとの左右の最大オフセット [ラップ, 中心線の点] -> ラップ間の頑健な上側の値
+    n = len(track_map.x)
+    left = np.full((len(laps), n), np.nan)
+    right = np.full((len(laps), n), np.nan)
+    for i, lap in enumerate(laps):
+        _, offset, index = track_map.locate(lap.channels['position_x'], lap.channels['position_z'])
+        valid = index >= 0
+        np.fmax.at(left[i], index[valid], np.maximum(offset[valid], 0.0))
+        np.fmax.at(right[i], index[valid], np.maximum(-offset[valid], 0.0))
+    left, right = (_robust_width(widths, track_map.distance) for widths in (left, right))
+    track_map.left, track_map.right = left, right
+    return track_map
+
+
+def _robust_width(widths: np.ndarray, distance: np.ndarray) -> np.ndarray:
+    """[ラップ, 点] のはみ出し幅 -> 点ごとのコース端 (外れ値を切り詰めたパーセンタイル)"""
+    with warnings.catch_warnings():
+        # どのラップのサンプルもない点 (All-NaN) は前後の点から補間する
+        warnings.simplefilter('ignore', RuntimeWarning)
+        median = np.nanmedian(widths, axis=0)
+        width = np.nanpercentile(np.minimum(widths, median + WIDTH_OUTLIER), WIDTH_PERCENTILE, axis=0)
+    known = ~np.isnan(width)
+    if not known.any():
+        return np.full(len(distance), MIN_HALF_WIDTH)
+    width = np.interp(distance, distance[known], width[known])
+    return np.clip(width, MIN_HALF_WIDTH, MAX_HALF_WIDTH)
+
+
+def get_track_map(
+    track: str,
+    laps: Sequence[Lap] = (),
+    cache_dir: Path = CACHE_DIR,
+    refresh: bool = False,
+) -> TrackMap:
+    """キャッシュ済みのトラックマップを返す (なければ laps から作って保存)"""
+    if not refresh:
+        cached = TrackMap.load(track, cache_dir)
+        if cached is not None:
+            return cached
+    track_map = build_track_map(track, laps)
+    track_map.save(cache_dir)
+    return track_map
+
+
+def laps_with_positions(table, session: str = '') -> list:
+    """正規化済みテーブルから位置チャンネル付きでラップを切り出す"""
+    from .laps import DEFAULT_CHANNELS
+
+    return extract_laps(table, DEFAULT_CHANNELS + POSITION_CHANNELS, session=session)
+
+
+if __name__ == "__main__":
+    print("✓ Track Map モジュール読み込み完了")